@@ -0,0 +1,151 @@
+"""Cost of merging a ledger's forecasts into its actual transactions, before and after the merge became lazy.
+
+Originally every schedule's occurrences were projected into one list, sorted, and merged into the ledger with two
+pointers. Now each schedule yields its occurrences lazily, a heap merges them, and the ledger carries the running balance
+as it goes, so only one pending occurrence per schedule is held at a time.
+
+Usage: python -m benchmarks.forecast_merge [schedules] [days] [actual transactions] [runs]
+"""
+
+import sys
+import tracemalloc
+from datetime import date, timedelta
+from statistics import median
+from time import perf_counter
+from typing import Any, Callable, Iterator
+
+from miapeer.adapter.forecast import (
+    ForecastLedger,
+    ForecastOccurrence,
+    merge_forecasts,
+)
+from miapeer.adapter.recurrence import compile_recurrence
+from miapeer.models.quantum.scheduled_transaction import ScheduledTransaction
+from miapeer.models.quantum.transaction import TransactionRead
+from miapeer.routers.quantum import scheduled_transaction
+
+START_DATE = date(2024, 1, 1)
+
+
+def _schedules(count: int) -> list[ScheduledTransaction]:
+    return [
+        ScheduledTransaction(
+            scheduled_transaction_id=i + 1,
+            account_id=1,
+            payee_id=i,
+            category_id=i,
+            fixed_amount=-(i + 1) * 100,
+            start_date=START_DATE + timedelta(days=i % 7),
+            repeat_option_id=1,
+            notes=f"schedule {i}",
+            on_autopay=False,
+        )
+        for i in range(count)
+    ]
+
+
+def _actual_transactions(count: int, days: int) -> list[TransactionRead]:
+    return [
+        TransactionRead(
+            transaction_id=i + 1,
+            transaction_type_id=1,
+            payee_id=1,
+            category_id=1,
+            amount=1000,
+            transaction_date=START_DATE + timedelta(days=i * days // max(count, 1)),
+            account_id=1,
+        )
+        for i in range(count)
+    ]
+
+
+def _project(schedules: list[ScheduledTransaction], end_date: date) -> list[Iterator[ForecastOccurrence]]:
+    recurrence = compile_recurrence("Day", 1)
+
+    return [
+        scheduled_transaction._project_iterations(
+            scheduled_transaction=st, previous_transactions=[], recurrence=recurrence, override_end_date=end_date, override_limit=None
+        )
+        for st in schedules
+    ]
+
+
+def _original(schedules: list[ScheduledTransaction], end_date: date, transactions: list[TransactionRead]) -> int:
+    forecasted_transactions = [occurrence for occurrences in _project(schedules, end_date) for occurrence in occurrences]
+    forecasted_transactions.sort(key=lambda x: x.transaction_date)
+
+    merged: list[TransactionRead | ForecastOccurrence] = []
+    transaction_index = 0
+    forecast_index = 0
+    while transaction_index < len(transactions) and forecast_index < len(forecasted_transactions):
+        if (
+            transactions[transaction_index].clear_date
+            or transactions[transaction_index].transaction_date <= forecasted_transactions[forecast_index].transaction_date
+        ):
+            merged.append(transactions[transaction_index])
+            transaction_index += 1
+        else:
+            merged.append(forecasted_transactions[forecast_index])
+            forecast_index += 1
+    merged.extend(transactions[transaction_index:])
+    merged.extend(forecasted_transactions[forecast_index:])
+
+    balance = 0
+    for t in merged:
+        balance += t.amount
+        if isinstance(t, ForecastOccurrence):
+            t.to_transaction_read(balance=balance)
+
+    return balance
+
+
+def _current(schedules: list[ScheduledTransaction], end_date: date, transactions: list[TransactionRead]) -> int:
+    ledger = ForecastLedger(opening_balance=0, forecasts=merge_forecasts(_project(schedules, end_date)))
+
+    # Consumed row by row, the way the streaming endpoint does
+    for t in transactions:
+        for _ in ledger.add(t):
+            pass
+    for _ in ledger.finish():
+        pass
+
+    return ledger.balance
+
+
+def _measure(run: Callable[[], Any], runs: int) -> tuple[float, int, Any]:
+    timings = []
+    for _ in range(runs):
+        started = perf_counter()
+        result = run()
+        timings.append(perf_counter() - started)
+
+    tracemalloc.start()
+    result = run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return median(timings), peak, result
+
+
+def main(schedules: int, days: int, transactions: int, runs: int) -> None:
+    end_date = START_DATE + timedelta(days=days)
+    sts = _schedules(schedules)
+    actual = _actual_transactions(transactions, days)
+
+    original_seconds, original_bytes, original_balance = _measure(lambda: _original(sts, end_date, actual), runs)
+    current_seconds, current_bytes, current_balance = _measure(lambda: _current(sts, end_date, actual), runs)
+
+    assert original_balance == current_balance
+
+    print(f"{schedules} daily schedules over {days} days merged into {transactions} transactions, median of {runs} runs")
+    print(f"  original: {original_seconds * 1000:8.1f} ms {original_bytes / 1024 / 1024:8.2f} MiB peak")
+    print(f"  current:  {current_seconds * 1000:8.1f} ms {current_bytes / 1024 / 1024:8.2f} MiB peak")
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 20,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 365,
+        int(sys.argv[3]) if len(sys.argv) > 3 else 1000,
+        int(sys.argv[4]) if len(sys.argv) > 4 else 5,
+    )
@@ -0,0 +1,114 @@
+"""Cost of forecasting a ledger's scheduled transactions, before and after forecasts became lightweight records.
+
+Originally each occurrence was validated into a Transaction while projecting, then dumped and validated again into a
+TransactionRead. Now projecting makes a ForecastOccurrence (a named tuple sharing its schedule) and the TransactionRead is
+only built when the row is serialized.
+
+Usage: python -m benchmarks.forecast_records [schedules] [days] [runs]
+"""
+
+import sys
+import tracemalloc
+from datetime import date, timedelta
+from statistics import median
+from time import perf_counter
+from typing import Any, Callable
+
+from miapeer.adapter.recurrence import compile_recurrence
+from miapeer.models.quantum.scheduled_transaction import ScheduledTransaction
+from miapeer.models.quantum.transaction import Transaction, TransactionRead
+from miapeer.routers.quantum import scheduled_transaction
+
+START_DATE = date(2024, 1, 1)
+
+
+def _schedules(count: int) -> list[ScheduledTransaction]:
+    return [
+        ScheduledTransaction(
+            scheduled_transaction_id=i + 1,
+            account_id=1,
+            payee_id=i,
+            category_id=i,
+            fixed_amount=-(i + 1) * 100,
+            start_date=START_DATE + timedelta(days=i % 7),
+            repeat_option_id=1,
+            notes=f"schedule {i}",
+            on_autopay=False,
+        )
+        for i in range(count)
+    ]
+
+
+def _original(schedules: list[ScheduledTransaction], end_date: date) -> list[TransactionRead]:
+    recurrence = compile_recurrence("Day", 1)
+    assert recurrence
+
+    forecasted_transactions: list[TransactionRead] = []
+    for st in schedules:
+        projected = [
+            Transaction.model_validate(st.model_dump(), update={"transaction_date": occurrence_date, "amount": st.fixed_amount})
+            for occurrence_date in recurrence.occurrences(st.start_date, until=end_date)
+        ]
+        for ft in projected:
+            forecasted_transactions.append(
+                TransactionRead.model_validate(
+                    ft.model_dump(), update={"transaction_id": 0, "forecast_from_scheduled_transaction_id": st.scheduled_transaction_id}
+                )
+            )
+
+    return forecasted_transactions
+
+
+def _current(schedules: list[ScheduledTransaction], end_date: date) -> list[Any]:
+    recurrence = compile_recurrence("Day", 1)
+
+    return [
+        occurrence
+        for st in schedules
+        for occurrence in scheduled_transaction._project_iterations(
+            scheduled_transaction=st, previous_transactions=[], recurrence=recurrence, override_end_date=end_date, override_limit=None
+        )
+    ]
+
+
+def _measure(run: Callable[[], Any], runs: int) -> tuple[float, int, Any]:
+    timings = []
+    for _ in range(runs):
+        started = perf_counter()
+        result = run()
+        timings.append(perf_counter() - started)
+
+    tracemalloc.start()
+    result = run()
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return median(timings), held, result
+
+
+def main(schedules: int, days: int, runs: int) -> None:
+    end_date = START_DATE + timedelta(days=days)
+    sts = _schedules(schedules)
+
+    original_seconds, original_bytes, original = _measure(lambda: _original(sts, end_date), runs)
+    current_seconds, current_bytes, current = _measure(lambda: _current(sts, end_date), runs)
+
+    # Serializing is where the records finally become response models
+    serialize_original_seconds = _measure(lambda: [t.model_dump_json() for t in original], runs)[0]
+    serialize_current_seconds = _measure(lambda: [o.to_transaction_read().model_dump_json() for o in current], runs)[0]
+
+    assert [t.model_dump() for t in original] == [o.to_transaction_read().model_dump() for o in current]
+
+    print(f"{len(current)} forecast occurrences from {schedules} daily schedules, median of {runs} runs")
+    print(f"  project    original: {original_seconds * 1000:8.1f} ms {original_bytes / 1024 / 1024:8.1f} MiB held")
+    print(f"  project    current:  {current_seconds * 1000:8.1f} ms {current_bytes / 1024 / 1024:8.1f} MiB held")
+    print(f"  +serialize original: {(original_seconds + serialize_original_seconds) * 1000:8.1f} ms")
+    print(f"  +serialize current:  {(current_seconds + serialize_current_seconds) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 20,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 365,
+        int(sys.argv[3]) if len(sys.argv) > 3 else 5,
+    )
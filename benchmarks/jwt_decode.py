@@ -0,0 +1,35 @@
+"""Per-request cost of `decode_jwt`, with and without the decoded-token cache.
+
+Usage: python -m benchmarks.jwt_decode [iterations]
+"""
+
+import sys
+from datetime import timedelta
+from timeit import timeit
+
+from miapeer.auth.jwt import decode_jwt, encode_jwt, token_cache
+
+JWT_KEY = "benchmark key"
+
+
+def main(iterations: int) -> None:
+    token = encode_jwt(jwt_key=JWT_KEY, data={"sub": "someone@miapeer.com", "exp": None}, expires_delta=timedelta(minutes=300))
+
+    def uncached() -> None:
+        token_cache.clear()
+        decode_jwt(jwt_key=JWT_KEY, token=token)
+
+    def cached() -> None:
+        decode_jwt(jwt_key=JWT_KEY, token=token)
+
+    uncached_seconds = timeit(uncached, number=iterations)
+    cached_seconds = timeit(cached, number=iterations)
+
+    print(f"decode_jwt over {iterations} calls")
+    print(f"  uncached: {uncached_seconds / iterations * 1_000_000:8.2f} us/call")
+    print(f"  cached:   {cached_seconds / iterations * 1_000_000:8.2f} us/call")
+    print(f"  speedup:  {uncached_seconds / cached_seconds:8.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
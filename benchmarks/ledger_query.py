@@ -0,0 +1,153 @@
+"""Ledger query cost on a single account with a long history.
+
+Compares the original GET_ALL (an anti-join to sum the transactions before the reporting period, plus a window SUM over
+every row) with the current pair of queries: one range aggregate for the opening balance, then only the reporting period.
+
+Usage: python -m benchmarks.ledger_query [transactions] [runs]
+"""
+
+import sys
+import tempfile
+from datetime import date, timedelta
+from pathlib import Path
+from statistics import median
+from time import perf_counter
+from typing import Any, Callable
+
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import bindparam, create_engine, insert, text
+from sqlalchemy.engine import Connection
+
+from miapeer.adapter.migrations import upgrade
+from miapeer.adapter.sql import transaction as transaction_sql
+from miapeer.models.quantum.account import Account
+from miapeer.models.quantum.transaction import Transaction
+
+ACCOUNT_ID = 1
+UNCLEARED_TRANSACTIONS = 20
+INSERT_BATCH_SIZE = 50_000
+
+ORIGINAL_GET_ALL = text(
+    """
+    with
+        recent_transactions as (
+            select t.account_id, t.transaction_id, t.transaction_date, t.clear_date, t.transaction_type_id, t.check_number,
+                t.payee_id, t.category_id, t.amount, t.notes, t.exclude_from_forecast
+            from quantum_transaction t
+            where t.account_id = :account_id and (clear_date is null or clear_date >= :limit_date)
+        ),
+        older_transactions_sum as (
+            select min(t.account_id) as account_id, sum(t.amount) as sum_of_old
+            from quantum_transaction t
+                left join recent_transactions rt
+                    on rt.transaction_id = t.transaction_id
+            where t.account_id = :account_id and rt.transaction_id is null
+            group by t.account_id
+        ),
+        ordered_transactions as (
+            select account_id, null as transaction_id, null as transaction_date, null as clear_date, null as transaction_type_id,
+                null as check_number, null as payee_id, null as category_id, starting_balance as amount, null as notes,
+                null as exclude_from_forecast, -2 as order_index
+            from quantum_account
+            where account_id = :account_id
+
+            union all
+
+            select account_id, null, null, null, null, null, null, null, sum_of_old, null, null, -1
+            from older_transactions_sum
+
+            union all
+
+            select account_id, transaction_id, transaction_date, clear_date, transaction_type_id, check_number, payee_id,
+                category_id, amount, notes, exclude_from_forecast,
+                row_number() over (ORDER BY ifnull(clear_date, '9999-01-01'), transaction_date) as order_index
+            from recent_transactions
+        )
+    select *, SUM(amount) OVER (ORDER BY order_index) AS balance
+    from ordered_transactions
+    order by order_index;
+"""
+).bindparams(bindparam("account_id"), bindparam("limit_date"))
+
+
+def _seed(connection: Connection, transactions: int) -> None:
+    connection.execute(insert(Account), [{"account_id": ACCOUNT_ID, "portfolio_id": 1, "name": "checking", "starting_balance": 1000}])
+
+    # Spread the history over ten years, ending today, with the newest few still uncleared
+    first_date = date.today() - timedelta(days=3650)
+    rows: list[dict[str, Any]] = []
+    for i in range(transactions):
+        transaction_date = first_date + timedelta(days=i * 3650 // transactions)
+        cleared = i < transactions - UNCLEARED_TRANSACTIONS
+        rows.append(
+            {
+                "account_id": ACCOUNT_ID,
+                "transaction_date": transaction_date,
+                "clear_date": transaction_date + timedelta(days=1) if cleared else None,
+                "amount": (i % 200) - 100,
+                "exclude_from_forecast": False,
+            }
+        )
+
+        if len(rows) == INSERT_BATCH_SIZE:
+            connection.execute(insert(Transaction), rows)
+            rows = []
+
+    if rows:
+        connection.execute(insert(Transaction), rows)
+
+    connection.exec_driver_sql("ANALYZE")
+
+
+def _time(run: Callable[[], Any], runs: int) -> tuple[float, Any]:
+    timings = []
+    for _ in range(runs):
+        started = perf_counter()
+        result = run()
+        timings.append(perf_counter() - started)
+
+    return median(timings), result
+
+
+def main(transactions: int, runs: int) -> None:
+    limit_date = date(year=date.today().year, month=date.today().month, day=1) - relativedelta(months=3)
+    params = {"account_id": ACCOUNT_ID, "limit_date": limit_date}
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{Path(directory) / 'ledger.db'}")
+        upgrade(engine)
+
+        started = perf_counter()
+        with engine.begin() as connection:
+            _seed(connection, transactions)
+        print(f"seeded {transactions} transactions in {perf_counter() - started:.1f}s")
+
+        with engine.connect() as connection:
+
+            def original() -> tuple[int, int]:
+                rows = connection.execute(ORIGINAL_GET_ALL, params).all()
+                return len([row for row in rows if row.order_index > 0]), rows[-1].balance
+
+            def current() -> tuple[int, int]:
+                balance = connection.execute(transaction_sql.GET_OPENING_BALANCE, params).scalar_one()
+                rows = [row for sql in transaction_sql.GET_ALL for row in connection.execute(sql, params).all()]
+                return len(rows), balance + sum(row.amount for row in rows)
+
+            original_seconds, original_result = _time(original, runs)
+            current_seconds, current_result = _time(current, runs)
+
+        engine.dispose()
+
+    assert original_result == current_result, (original_result, current_result)
+
+    print(f"ledger of {original_result[0]} rows since {limit_date}, median of {runs} runs")
+    print(f"  original: {original_seconds * 1000:8.1f} ms")
+    print(f"  current:  {current_seconds * 1000:8.1f} ms")
+    print(f"  speedup:  {original_seconds / current_seconds:8.1f}x")
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 5,
+    )
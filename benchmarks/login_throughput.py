@@ -0,0 +1,105 @@
+"""Event-loop responsiveness during a burst of logins.
+
+Fires a burst of concurrent logins at /miapeer/v1/auth/token while a second task keeps
+hitting a cheap endpoint, then reports login throughput and how long those other
+requests had to wait. "inline" hashes on the event loop (the old behaviour), "pool"
+uses the dedicated password-hashing pool.
+
+Usage: python -m benchmarks.login_throughput [logins]
+"""
+
+import asyncio
+import os
+import sys
+from statistics import median
+from time import perf_counter
+from typing import Any, AsyncIterator, Callable
+
+os.environ.setdefault("APP_SECRET_KEY", "benchmark")
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark")
+
+import httpx  # noqa: E402
+from sqlalchemy.ext.asyncio import create_async_engine  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+from sqlmodel import SQLModel  # noqa: E402
+from sqlmodel.ext.asyncio.session import AsyncSession  # noqa: E402
+
+from miapeer.app import app  # noqa: E402
+from miapeer.dependencies import get_db  # noqa: E402
+from miapeer.models.miapeer import User  # noqa: E402
+from miapeer.routers import auth  # noqa: E402
+
+USERNAME = "someone@miapeer.com"
+PASSWORD = "benchmark password"
+
+
+async def _run_inline(func: Callable[..., Any], *args: str) -> Any:
+    return func(*args)
+
+
+async def _burst(client: httpx.AsyncClient, logins: int) -> tuple[float, list[float]]:
+    # Time between consecutive responses to the cheap endpoint; a blocked event loop shows up as a long gap
+    ping_gaps: list[float] = []
+    burst_done = asyncio.Event()
+
+    async def ping() -> None:
+        last_response = perf_counter()
+        while not burst_done.is_set():
+            await client.get("/")
+            now = perf_counter()
+            ping_gaps.append(now - last_response)
+            last_response = now
+            await asyncio.sleep(0.005)
+
+    async def login() -> None:
+        response = await client.post("/miapeer/v1/auth/token", data={"username": USERNAME, "password": PASSWORD})
+        response.raise_for_status()
+
+    pinger = asyncio.create_task(ping())
+    await asyncio.sleep(0.05)
+
+    start = perf_counter()
+    await asyncio.gather(*[login() for _ in range(logins)])
+    elapsed = perf_counter() - start
+
+    burst_done.set()
+    await pinger
+
+    return elapsed, ping_gaps
+
+
+async def main(logins: int) -> None:
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as connection:
+        await connection.run_sync(SQLModel.metadata.create_all)
+
+    async with AsyncSession(engine) as db:
+        db.add(User(email=USERNAME, password=await auth.get_password_hash(PASSWORD), disabled=False))
+        await db.commit()
+
+    async def override_get_db() -> AsyncIterator[AsyncSession]:
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+
+    pooled = auth._run_in_password_pool
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark") as client:  # type: ignore
+        for mode, runner in [("inline", _run_inline), ("pool", pooled)]:
+            auth._run_in_password_pool = runner  # type: ignore
+            elapsed, ping_gaps = await _burst(client, logins)
+
+            print(f"{mode}: {logins} logins in {elapsed:.2f}s ({logins / elapsed:.1f}/s)")
+            print(
+                f"  other requests during burst: {len(ping_gaps)} served, "
+                f"median gap {median(ping_gaps) * 1000:.1f}ms, worst gap {max(ping_gaps) * 1000:.1f}ms"
+            )
+
+    auth._run_in_password_pool = pooled  # type: ignore
+    app.dependency_overrides.clear()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20))
@@ -0,0 +1,101 @@
+"""Cost of a portfolio's daily balance series, computed row by row in Python versus as NumPy arrays.
+
+Row by row is what a client does today with one ledger per account: sort each account's forecast, carry a running balance
+through it, and fill in the days between. The endpoint instead adds every amount into an (account, day) matrix and takes
+a cumulative sum along the days.
+
+Usage: python -m benchmarks.portfolio_forecast [accounts] [schedules per account] [months] [runs]
+"""
+
+import sys
+from datetime import date, timedelta
+from statistics import median
+from time import perf_counter
+from typing import Any, Callable
+
+from dateutil.relativedelta import relativedelta
+
+from miapeer.adapter.balance_forecast import (
+    BalanceEntry,
+    project_daily_balances,
+    sample_balances,
+)
+from miapeer.adapter.recurrence import compile_recurrence
+
+START_DATE = date(2024, 1, 1)
+
+
+def _entries(accounts: int, schedules: int, end_date: date) -> list[BalanceEntry]:
+    weekly = compile_recurrence("Day", 7)
+    monthly = compile_recurrence("Month", 1)
+    assert weekly and monthly
+
+    entries: list[BalanceEntry] = []
+    for account_index in range(accounts):
+        for i in range(schedules):
+            recurrence = weekly if i % 2 else monthly
+            start = START_DATE + timedelta(days=i % 28)
+            entries.extend(BalanceEntry(account_index, d, -(i + 1) * 100) for d in recurrence.occurrences(start, until=end_date))
+
+    return entries
+
+
+def _row_by_row(opening_balances: list[int], end_date: date, entries: list[BalanceEntry]) -> list[list[int]]:
+    days = (end_date - START_DATE).days + 1
+
+    series: list[list[int]] = []
+    for account_index, opening_balance in enumerate(opening_balances):
+        account_entries = sorted((e for e in entries if e.account_index == account_index), key=lambda e: e.transaction_date)
+
+        balance = opening_balance
+        balances: list[int] = []
+        entry_index = 0
+        for day in range(days):
+            current_date = START_DATE + timedelta(days=day)
+            while entry_index < len(account_entries) and account_entries[entry_index].transaction_date <= current_date:
+                balance += account_entries[entry_index].amount
+                entry_index += 1
+            balances.append(balance)
+
+        series.append(balances)
+
+    return series
+
+
+def _vectorized(opening_balances: list[int], end_date: date, entries: list[BalanceEntry]) -> list[list[int]]:
+    daily_balances = project_daily_balances(opening_balances=opening_balances, start=START_DATE, end=end_date, entries=entries)
+    return sample_balances(daily_balances, start=START_DATE, interval_days=1).balances.tolist()
+
+
+def _measure(run: Callable[[], Any], runs: int) -> tuple[float, Any]:
+    timings = []
+    for _ in range(runs):
+        started = perf_counter()
+        result = run()
+        timings.append(perf_counter() - started)
+
+    return median(timings), result
+
+
+def main(accounts: int, schedules: int, months: int, runs: int) -> None:
+    end_date = START_DATE + relativedelta(months=months)
+    entries = _entries(accounts, schedules, end_date)
+    opening_balances = [(i + 1) * 10000 for i in range(accounts)]
+
+    row_by_row_seconds, row_by_row = _measure(lambda: _row_by_row(opening_balances, end_date, entries), runs)
+    vectorized_seconds, vectorized = _measure(lambda: _vectorized(opening_balances, end_date, entries), runs)
+
+    assert row_by_row == vectorized
+
+    print(f"{accounts} accounts x {schedules} schedules over {months} months ({len(entries)} forecast rows), median of {runs} runs")
+    print(f"  row by row: {row_by_row_seconds * 1000:8.1f} ms")
+    print(f"  vectorized: {vectorized_seconds * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 10,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 20,
+        int(sys.argv[3]) if len(sys.argv) > 3 else 24,
+        int(sys.argv[4]) if len(sys.argv) > 4 else 5,
+    )
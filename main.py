@@ -1,10 +1,14 @@
-from miapeer.adapter.database import create_db_and_tables
+from miapeer.adapter.database import async_session_maker, migrate_db
+from miapeer.adapter.repeat_option_registry import load_repeat_option_registry
 from miapeer.app import app
 
 
 @app.on_event("startup")
-def on_startup() -> None:
-    create_db_and_tables()
+async def on_startup() -> None:
+    migrate_db()
+
+    async with async_session_maker() as db:
+        await load_repeat_option_registry(db)
 
 
 if __name__ == "__main__":
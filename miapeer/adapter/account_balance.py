@@ -0,0 +1,148 @@
+"""Maintained balances on quantum_account.
+
+`current_balance` is the starting balance plus every transaction and `cleared_balance` is the starting balance plus the
+cleared ones. Both are kept up to date in the same unit of work as each transaction change, so reading an account's
+balance doesn't have to aggregate its transactions.
+"""
+
+from datetime import date
+from typing import Iterable, NamedTuple, Optional
+
+from sqlmodel import case, col, extract, func, or_, select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from miapeer.models.quantum.account import Account
+from miapeer.models.quantum.transaction import Transaction
+from miapeer.models.quantum.transaction_summary import TransactionSummary
+
+
+class AccountBalances(NamedTuple):
+    current: int
+    cleared: int
+
+
+class AccountBalanceDrift(NamedTuple):
+    account_id: int
+    stored: AccountBalances
+    expected: AccountBalances
+
+
+async def adjust_account_balances(
+    db: AsyncSession,
+    account_id: int,
+    changes: Iterable[tuple[Optional[date], int]],
+    starting_balance_delta: int = 0,
+) -> None:
+    """Apply (clear_date, amount) transaction changes, and any change to the starting balance, to the account's balances.
+
+    The columns are incremented in the database rather than rewritten, so concurrent changes to the same account can't
+    overwrite each other. Nothing is committed.
+    """
+
+    current_delta = starting_balance_delta
+    cleared_delta = starting_balance_delta
+    for clear_date, amount in changes:
+        current_delta += amount
+        if clear_date is not None:
+            cleared_delta += amount
+
+    if current_delta == 0 and cleared_delta == 0:
+        return
+
+    sql = (
+        update(Account)
+        .where(col(Account.account_id) == account_id)
+        .values(current_balance=Account.current_balance + current_delta, cleared_balance=Account.cleared_balance + cleared_delta)
+    )
+    await db.exec(sql)  # type: ignore
+
+
+async def compute_account_balances(db: AsyncSession, accounts: list[Account]) -> list[AccountBalances]:
+    """Recompute balances (in the same order as `accounts`) from the transaction summaries and the transactions they don't cover.
+
+    Two grouped queries cover every account, however many there are.
+    """
+
+    account_ids = [account.account_id for account in accounts if account.account_id is not None]
+    if not account_ids:
+        return [AccountBalances(account.starting_balance, account.starting_balance) for account in accounts]
+
+    summary_month = TransactionSummary.year * 12 + TransactionSummary.month - 1
+    clear_month = extract("year", Transaction.clear_date) * 12 + extract("month", Transaction.clear_date) - 1
+
+    # Get sum of transaction summaries (only cleared transactions are ever summarized)
+    summaries_sql = (
+        select(TransactionSummary.account_id, func.sum(TransactionSummary.balance))
+        .where(col(TransactionSummary.account_id).in_(account_ids))
+        .group_by(TransactionSummary.account_id)
+    )
+    sum_of_summaries: dict[int, int] = dict((await db.exec(summaries_sql)).all())  # type: ignore
+
+    # Get sum of transactions that don't have summaries
+    latest_summaries = (
+        select(TransactionSummary.account_id, func.max(summary_month).label("latest_month"))
+        .where(col(TransactionSummary.account_id).in_(account_ids))
+        .group_by(TransactionSummary.account_id)
+        .subquery()
+    )
+    transaction_sums_sql = (
+        select(
+            Transaction.account_id,
+            func.sum(Transaction.amount),
+            func.sum(case((col(Transaction.clear_date).is_not(None), Transaction.amount), else_=0)),
+        )
+        .outerjoin(latest_summaries, latest_summaries.c.account_id == Transaction.account_id)
+        .where(col(Transaction.account_id).in_(account_ids))
+        .where(
+            or_(
+                latest_summaries.c.latest_month == None,
+                Transaction.clear_date == None,
+                clear_month > latest_summaries.c.latest_month,
+            )
+        )
+        .group_by(Transaction.account_id)
+    )
+    transaction_sums = {account_id: (current, cleared) for account_id, current, cleared in (await db.exec(transaction_sums_sql)).all()}
+
+    # Put them all together
+    balances: list[AccountBalances] = []
+    for account in accounts:
+        summarized = sum_of_summaries.get(account.account_id or 0) or 0
+        current, cleared = transaction_sums.get(account.account_id or 0, (0, 0))
+
+        balances.append(
+            AccountBalances(
+                current=account.starting_balance + summarized + (current or 0),
+                cleared=account.starting_balance + summarized + (cleared or 0),
+            )
+        )
+
+    return balances
+
+
+async def verify_account_balances(db: AsyncSession, account_ids: Optional[list[int]] = None, repair: bool = False) -> list[AccountBalanceDrift]:
+    """Compare the maintained balances with recomputed ones and return every account that has drifted.
+
+    With `repair`, drifted accounts are reset to the recomputed balances (not committed).
+    """
+
+    sql = select(Account).order_by(Account.account_id)
+    if account_ids is not None:
+        sql = sql.where(col(Account.account_id).in_(account_ids))
+    accounts = list((await db.exec(sql)).all())
+
+    drifts: list[AccountBalanceDrift] = []
+    for account, expected in zip(accounts, await compute_account_balances(db, accounts)):
+        stored = AccountBalances(current=account.current_balance, cleared=account.cleared_balance)
+
+        if stored == expected:
+            continue
+
+        drifts.append(AccountBalanceDrift(account_id=account.account_id or 0, stored=stored, expected=expected))
+
+        if repair:
+            account.current_balance = expected.current
+            account.cleared_balance = expected.cleared
+            db.add(account)
+
+    return drifts
@@ -0,0 +1,84 @@
+"""Projected balances for many accounts at once.
+
+Rather than walking a ledger row by row, every amount lands in a (account, day) matrix and each account's daily balances
+are its opening balance plus a cumulative sum along the days. The series for every account in a portfolio, and their
+total, come out of a handful of array operations however many transactions go into them.
+"""
+
+from datetime import date, timedelta
+from typing import Iterable, NamedTuple, Sequence
+
+import numpy as np
+import numpy.typing as npt
+
+
+class BalanceEntry(NamedTuple):
+    account_index: int
+    transaction_date: date
+    amount: int
+
+
+class BalanceSeries(NamedTuple):
+    dates: list[date]
+
+    # One row per account, one column per date
+    balances: npt.NDArray[np.int64]
+
+    # Lowest daily balance of each account over the whole horizon, even if the series itself is weekly
+    lowest_balances: npt.NDArray[np.int64]
+    lowest_balance_dates: list[date]
+
+
+def project_daily_balances(opening_balances: Sequence[int], start: date, end: date, entries: Iterable[BalanceEntry]) -> npt.NDArray[np.int64]:
+    """Each account's balance at the end of every day from `start` to `end` (which can't be before it), as an (accounts, days) array.
+
+    Entries dated before `start` are still expected to happen, so they count on `start`. Those after `end` are left out.
+    """
+
+    days = (end - start).days + 1
+    amounts = np.zeros((len(opening_balances), days), dtype=np.int64)
+
+    rows, day_indices, values = _as_arrays(entries, start)
+    in_horizon = day_indices < days
+
+    # add.at, unlike fancy-index assignment, adds every entry that lands on the same day rather than just the last
+    np.add.at(amounts, (rows[in_horizon], np.maximum(day_indices[in_horizon], 0)), values[in_horizon])
+
+    return np.asarray(opening_balances, dtype=np.int64)[:, np.newaxis] + np.cumsum(amounts, axis=1)
+
+
+def sample_balances(daily_balances: npt.NDArray[np.int64], start: date, interval_days: int) -> BalanceSeries:
+    """The balance at the end of every `interval_days` days (and on the last day), along with each account's lowest."""
+
+    days = daily_balances.shape[1]
+    closing_days = np.arange(interval_days - 1, days, interval_days)
+    if not closing_days.size or closing_days[-1] != days - 1:
+        closing_days = np.append(closing_days, days - 1)
+
+    # argmin picks the first day a lowest balance is reached
+    lowest_days = np.argmin(daily_balances, axis=1)
+    lowest_balances = np.take_along_axis(daily_balances, lowest_days[:, np.newaxis], axis=1)[:, 0]
+
+    return BalanceSeries(
+        dates=[start + timedelta(days=int(day)) for day in closing_days],
+        balances=daily_balances[:, closing_days],
+        lowest_balances=lowest_balances,
+        lowest_balance_dates=[start + timedelta(days=int(day)) for day in lowest_days],
+    )
+
+
+def _as_arrays(entries: Iterable[BalanceEntry], start: date) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+    """The entries' account indices, days since `start`, and amounts, as arrays."""
+
+    # Days are counted with ordinals because converting dates to datetime64 one at a time is far slower
+    start_ordinal = start.toordinal()
+
+    rows: list[int] = []
+    days: list[int] = []
+    values: list[int] = []
+    for account_index, transaction_date, amount in entries:
+        rows.append(account_index)
+        days.append(transaction_date.toordinal() - start_ordinal)
+        values.append(amount)
+
+    return np.array(rows, dtype=np.int64), np.array(days, dtype=np.int64), np.array(values, dtype=np.int64)
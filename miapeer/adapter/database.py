@@ -1,12 +1,25 @@
 from os import environ as env
+from threading import Lock
+from time import perf_counter
+from typing import Any, Optional
 from urllib.parse import quote_plus
 
+from sqlalchemy.engine import make_url
 from sqlalchemy.engine.base import Engine
-from sqlmodel import Session, SQLModel, create_engine
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, QueuePool, StaticPool
+from sqlmodel import Session, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 
+from miapeer.adapter.migrations import upgrade
 from miapeer.models.miapeer import (
     Application,
     ApplicationRole,
+    DatabasePoolStatus,
     Permission,
     Role,
     User,
@@ -34,7 +47,132 @@ def db_uri() -> str:
     return prod_db_uri if env.get("MIAPEER_ENV") == "Production" else dev_db_uri
 
 
-engine: Engine = create_engine(db_uri(), connect_args={"check_same_thread": False}, echo=False)
+def async_db_uri() -> str:
+    # aioodbc drives pyodbc from a thread executor, so MSSQL I/O no longer blocks the event loop either
+    dev_db_uri = f"sqlite+aiosqlite:///./miapeer.db"
+    prod_db_uri = f"mssql+aioodbc:///?odbc_connect={quote_plus(connection_string())}"
+
+    default_db_uri = prod_db_uri if env.get("MIAPEER_ENV") == "Production" else dev_db_uri
+
+    return env.get("MIAPEER_ASYNC_DB_URI", default_db_uri)
+
+
+DEFAULT_POOL_OPTIONS: dict[str, dict[str, Any]] = {
+    # Azure SQL drops connections that sit idle for 30 minutes, so ping them on checkout and recycle them well before that
+    "mssql": {"pool_size": 5, "max_overflow": 10, "pool_timeout": 30, "pool_pre_ping": True, "pool_recycle": 1200},
+    "sqlite": {"pool_size": 5, "max_overflow": 10, "pool_timeout": 30, "pool_pre_ping": False, "pool_recycle": -1},
+}
+
+
+def _env_pool_option(name: str, default: Any) -> Any:
+    value = env.get(f"MIAPEER_DB_{name.upper()}")
+
+    if value is None:
+        return default
+
+    if isinstance(default, bool):
+        return value.lower() == "true"
+
+    return int(value)
+
+
+def pool_options(uri: str) -> dict[str, Any]:
+    """Pool settings for a database URI: the dialect's defaults, each overridable through a `MIAPEER_DB_<OPTION>` variable."""
+
+    url = make_url(uri)
+    dialect = url.get_backend_name()
+
+    if dialect == "sqlite" and url.database in (None, "", ":memory:"):
+        # Every connection to an in-memory DB is a separate, empty DB, so there's nothing to pool
+        return {"poolclass": StaticPool}
+
+    options = {name: _env_pool_option(name, default) for name, default in DEFAULT_POOL_OPTIONS.get(dialect, DEFAULT_POOL_OPTIONS["mssql"]).items()}
+    options["poolclass"] = TimedAsyncAdaptedQueuePool if url.get_dialect().is_async else TimedQueuePool
+
+    return options
+
+
+def engine_options(uri: str) -> dict[str, Any]:
+    options = pool_options(uri)
+
+    # Only pysqlite refuses to share a connection across threads; no other driver understands the argument
+    if make_url(uri).get_driver_name() == "pysqlite":
+        options["connect_args"] = {"check_same_thread": False}
+
+    return options
+
+
+class PoolMetrics:
+    """How long callers have waited to check a connection out of a pool (including any time spent connecting)."""
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.checkouts = 0
+            self.total_wait_seconds = 0.0
+            self.max_wait_seconds = 0.0
+
+    def record_checkout(self, wait_seconds: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait_seconds += wait_seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+
+
+class _TimedCheckoutMixin:
+    metrics: PoolMetrics
+
+    def _do_get(self) -> Any:
+        started = perf_counter()
+
+        try:
+            return super()._do_get()  # type: ignore
+        finally:
+            self.metrics.record_checkout(perf_counter() - started)
+
+
+class TimedQueuePool(_TimedCheckoutMixin, QueuePool):
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+
+class TimedAsyncAdaptedQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+
+def get_pool_status(pool: Pool) -> DatabasePoolStatus:
+    status = DatabasePoolStatus(pool_class=type(pool).__name__)
+
+    if isinstance(pool, QueuePool):
+        status.size = pool.size()
+        status.max_overflow = pool._max_overflow
+        status.checked_out = pool.checkedout()
+        status.idle = pool.checkedin()
+        # Negative until the pool has opened `size` connections
+        status.overflow = max(pool.overflow(), 0)
+
+    metrics: Optional[PoolMetrics] = getattr(pool, "metrics", None)
+    if metrics is not None:
+        status.checkouts = metrics.checkouts
+        status.average_wait_ms = metrics.total_wait_seconds * 1000 / metrics.checkouts if metrics.checkouts else 0.0
+        status.max_wait_ms = metrics.max_wait_seconds * 1000
+
+    return status
+
+
+# The sync engine is only used for startup tasks (migrations and seeding); requests go through `async_engine`
+engine: Engine = create_engine(db_uri(), echo=False, **engine_options(db_uri()))
+
+async_engine: AsyncEngine = create_async_engine(async_db_uri(), echo=False, **engine_options(async_db_uri()))
+
+# Expired attributes can't be lazily reloaded under asyncio, so keep objects populated after a commit
+async_session_maker = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
 
 
 def get_user_count() -> int:  # pragma: no cover
@@ -44,8 +182,8 @@ def get_user_count() -> int:  # pragma: no cover
             return user_count
 
 
-def create_db_and_tables() -> None:  # pragma: no cover
-    SQLModel.metadata.create_all(engine)
+def migrate_db() -> None:  # pragma: no cover
+    upgrade(engine)
 
     if get_user_count() == 0:
         seed_db()
@@ -0,0 +1,95 @@
+"""Forecasted occurrences of scheduled transactions.
+
+A forecast can run to thousands of occurrences, and all but the date and amount of each one come straight from its
+schedule. So an occurrence is just those two values plus a reference to the schedule, and the transaction models are
+only built from it when a response needs one.
+
+Each schedule's occurrences come from their own lazy, date-ordered iterator, and a heap merges them into the ledger, so
+a forecast holds one pending occurrence per schedule rather than all of them.
+"""
+
+import heapq
+from datetime import date
+from operator import attrgetter
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+from miapeer.models.quantum.scheduled_transaction import (
+    ScheduledTransaction,
+    ScheduledTransactionRead,
+)
+from miapeer.models.quantum.transaction import Transaction, TransactionRead
+
+
+class ForecastOccurrence(NamedTuple):
+    transaction_date: date
+    amount: int
+    scheduled_transaction_id: Optional[int]
+    schedule: ScheduledTransaction | ScheduledTransactionRead
+
+    def to_transaction(self) -> Transaction:
+        return Transaction(
+            transaction_type_id=self.schedule.transaction_type_id,
+            payee_id=self.schedule.payee_id,
+            category_id=self.schedule.category_id,
+            amount=self.amount,
+            transaction_date=self.transaction_date,
+            notes=self.schedule.notes,
+            account_id=self.schedule.account_id,
+        )
+
+    def to_transaction_read(self, balance: Optional[int] = None, linked_to_schedule: bool = True) -> TransactionRead:
+        return TransactionRead(
+            transaction_type_id=self.schedule.transaction_type_id,
+            payee_id=self.schedule.payee_id,
+            category_id=self.schedule.category_id,
+            amount=self.amount,
+            transaction_date=self.transaction_date,
+            notes=self.schedule.notes,
+            transaction_id=0,
+            account_id=self.schedule.account_id,
+            balance=balance,
+            forecast_from_scheduled_transaction_id=self.scheduled_transaction_id if linked_to_schedule else None,
+        )
+
+
+def merge_forecasts(forecasts: Iterable[Iterable[ForecastOccurrence]]) -> Iterator[ForecastOccurrence]:
+    """Every schedule's occurrences in date order, given each schedule's in date order.
+
+    Occurrences on the same date keep the order their schedules were given in.
+    """
+
+    return heapq.merge(*forecasts, key=attrgetter("transaction_date"))
+
+
+class ForecastLedger:
+    """Interleaves forecasts with a ledger's actual transactions, carrying the running balance through both.
+
+    Transactions have to be added in ledger order. Cleared ones always come first; a forecast goes in ahead of the first
+    uncleared transaction dated after it.
+    """
+
+    def __init__(self, opening_balance: int, forecasts: Iterable[ForecastOccurrence]) -> None:
+        self.balance = opening_balance
+        self._forecasts = iter(forecasts)
+        self._next_forecast = next(self._forecasts, None)
+
+    def add(self, transaction: TransactionRead) -> Iterator[TransactionRead]:
+        """The forecasts due before the transaction, then the transaction itself."""
+
+        if not transaction.clear_date:
+            yield from self._forecasts_until(transaction.transaction_date)
+
+        self.balance += transaction.amount
+        transaction.balance = self.balance
+        yield transaction
+
+    def finish(self) -> Iterator[TransactionRead]:
+        """Whatever forecasts are left once every transaction has been added."""
+
+        yield from self._forecasts_until(None)
+
+    def _forecasts_until(self, before: Optional[date]) -> Iterator[TransactionRead]:
+        while self._next_forecast is not None and (before is None or self._next_forecast.transaction_date < before):
+            self.balance += self._next_forecast.amount
+            yield self._next_forecast.to_transaction_read(balance=self.balance)
+            self._next_forecast = next(self._forecasts, None)
@@ -0,0 +1,236 @@
+"""Versioned schema migrations, applied in order at startup and recorded in miapeer_schema_migration.
+
+Migration 1 creates any missing tables from the current models, so on a new database the later migrations find their
+changes already in place. SQLite also commits DDL as it goes, so a migration that fails halfway is run again in full next
+time. Every migration therefore has to check for what it's about to add before adding it.
+"""
+
+from datetime import datetime
+from typing import Callable, NamedTuple
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    inspect,
+    select,
+    text,
+)
+from sqlalchemy.engine import Connection, Engine
+from sqlmodel import SQLModel
+
+# Every table has to be registered with SQLModel.metadata before migration 1 runs
+from miapeer.models import miapeer  # noqa: F401
+from miapeer.models.quantum import (  # noqa: F401
+    account,
+    budget,
+    category,
+    import_definition,
+    payee,
+    portfolio,
+    portfolio_user,
+    portfolio_user_setting,
+    repeat_option,
+    repeat_unit,
+    scheduled_transaction,
+    scheduled_transaction_history,
+    setting,
+    transaction,
+    transaction_summary,
+    transaction_type,
+)
+
+migration_metadata = MetaData()
+
+schema_migration = Table(
+    "miapeer_schema_migration",
+    migration_metadata,
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("description", String(255), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]
+
+
+def _add_column_if_missing(connection: Connection, table_name: str, column_definition: str) -> bool:
+    column_name = column_definition.split()[0]
+    if column_name in {column["name"] for column in inspect(connection).get_columns(table_name)}:
+        return False
+
+    # `ADD <column>` (without COLUMN) is understood by both SQLite and MSSQL
+    connection.execute(text(f"ALTER TABLE {table_name} ADD {column_definition}"))
+    return True
+
+
+def _drop_index(connection: Connection, table_name: str, index_name: str) -> None:
+    if connection.dialect.name == "mssql":
+        connection.execute(text(f"DROP INDEX {index_name} ON {table_name}"))
+    else:
+        connection.execute(text(f"DROP INDEX {index_name}"))
+
+
+def _create_index_if_missing(connection: Connection, table_name: str, index_name: str, column_names: list[str], unique: bool = False) -> bool:
+    if index_name in {index["name"] for index in inspect(connection).get_indexes(table_name)}:
+        return False
+
+    connection.execute(text(f"CREATE {'UNIQUE ' if unique else ''}INDEX {index_name} ON {table_name} ({', '.join(column_names)})"))
+    return True
+
+
+def _create_tables(connection: Connection) -> None:
+    SQLModel.metadata.create_all(connection)
+
+
+def _add_account_balances(connection: Connection) -> None:
+    added_current = _add_column_if_missing(connection, "quantum_account", "current_balance INTEGER NOT NULL DEFAULT 0")
+    added_cleared = _add_column_if_missing(connection, "quantum_account", "cleared_balance INTEGER NOT NULL DEFAULT 0")
+
+    if not (added_current or added_cleared):
+        return
+
+    # Existing accounts start out with the balances their transactions add up to
+    connection.execute(
+        text(
+            """
+            update quantum_account
+            set
+                current_balance = starting_balance + coalesce((
+                    select sum(t.amount) from quantum_transaction t where t.account_id = quantum_account.account_id
+                ), 0),
+                cleared_balance = starting_balance + coalesce((
+                    select sum(t.amount) from quantum_transaction t where t.account_id = quantum_account.account_id and t.clear_date is not null
+                ), 0)
+            """
+        )
+    )
+
+
+# String columns that get indexed. Before they were given a length they were VARCHAR(max) on MSSQL, which can't be an
+#   index key, so they're bounded before any index on them is created.
+INDEXED_STRING_COLUMNS: list[tuple[str, str]] = [
+    ("miapeer_user", "email"),
+    ("quantum_payee", "name"),
+    ("quantum_category", "name"),
+    ("quantum_transaction_type", "name"),
+]
+
+
+def _bound_indexed_string_columns(connection: Connection) -> None:
+    # SQLite doesn't enforce lengths, so only MSSQL has anything to change
+    if connection.dialect.name != "mssql":
+        return
+
+    for table_name, column_name in INDEXED_STRING_COLUMNS:
+        length = SQLModel.metadata.tables[table_name].c[column_name].type.length  # type: ignore
+        column = next(column for column in inspect(connection).get_columns(table_name) if column["name"] == column_name)
+
+        # VARCHAR(max) is reflected without a length
+        if getattr(column["type"], "length", None) == length:
+            continue
+
+        nullability = "NULL" if column["nullable"] else "NOT NULL"
+        connection.execute(text(f"ALTER TABLE {table_name} ALTER COLUMN {column_name} VARCHAR({length}) {nullability}"))
+
+
+# Ledger, keyset pages and balances all filter on the account and walk the clear date. Pages seek past their cursor's
+#   (clear_date, transaction_date, transaction_id), so the index ends with all three.
+LEDGER_INDEX: tuple[str, str, list[str]] = (
+    "quantum_transaction",
+    "ix_quantum_transaction_account_id_clear_date",
+    ["account_id", "clear_date", "transaction_date", "transaction_id"],
+)
+
+HOT_PATH_INDEXES: list[tuple[str, str, list[str]]] = [
+    LEDGER_INDEX,
+    ("quantum_transaction_summary", "ix_quantum_transaction_summary_account_id_year_month", ["account_id", "year", "month"]),
+    # Portfolio access is resolved from the user on every request
+    ("quantum_portfolio_user", "ix_quantum_portfolio_user_user_id_portfolio_id", ["user_id", "portfolio_id"]),
+    ("quantum_account", "ix_quantum_account_portfolio_id", ["portfolio_id"]),
+    ("miapeer_permission", "ix_miapeer_permission_user_id", ["user_id"]),
+    ("quantum_scheduled_transaction", "ix_quantum_scheduled_transaction_account_id", ["account_id"]),
+    ("quantum_scheduled_transaction_history", "ix_quantum_scheduled_transaction_history_scheduled_transaction_id", ["scheduled_transaction_id"]),
+    ("quantum_scheduled_transaction_history", "ix_quantum_scheduled_transaction_history_transaction_id", ["transaction_id"]),
+    ("quantum_budget", "ix_quantum_budget_category_id", ["category_id"]),
+    # The payee, category and transaction type lists filter on the user's portfolios and sort by name
+    ("quantum_payee", "ix_quantum_payee_portfolio_id_name", ["portfolio_id", "name"]),
+    ("quantum_category", "ix_quantum_category_portfolio_id_name", ["portfolio_id", "name"]),
+    ("quantum_transaction_type", "ix_quantum_transaction_type_portfolio_id_name", ["portfolio_id", "name"]),
+]
+
+
+def _create_hot_path_indexes(connection: Connection) -> None:
+    for table_name, index_name, column_names in HOT_PATH_INDEXES:
+        _create_index_if_missing(connection, table_name, index_name, column_names)
+
+
+def _create_user_email_index(connection: Connection) -> None:
+    # Every request that misses the user cache looks the user up by email. The name matches the one create_all gives the
+    # model's index, so a database created after the column was indexed already has it.
+    _create_index_if_missing(connection, "miapeer_user", "ix_miapeer_user_email", ["email"], unique=True)
+
+
+def _add_permissions_version(connection: Connection) -> None:
+    _add_column_if_missing(connection, "miapeer_user", "permissions_version INTEGER NOT NULL DEFAULT 0")
+
+
+def _add_transaction_id_to_ledger_index(connection: Connection) -> None:
+    table_name, index_name, column_names = LEDGER_INDEX
+
+    indexes = {index["name"]: index for index in inspect(connection).get_indexes(table_name)}
+    if index_name in indexes and indexes[index_name]["column_names"] != column_names:
+        _drop_index(connection, table_name, index_name)
+
+    _create_index_if_missing(connection, table_name, index_name, column_names)
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(1, "Create tables", _create_tables),
+    Migration(2, "Maintained account balances", _add_account_balances),
+    Migration(3, "Bounded lengths for indexed string columns", _bound_indexed_string_columns),
+    Migration(4, "Indexes for the hot Quantum query paths", _create_hot_path_indexes),
+    Migration(5, "Unique index on miapeer_user.email", _create_user_email_index),
+    Migration(6, "Permissions version on miapeer_user", _add_permissions_version),
+    Migration(7, "Ledger index ends with transaction_id", _add_transaction_id_to_ledger_index),
+]
+
+
+def get_schema_version(connection: Connection) -> int:
+    if not inspect(connection).has_table(schema_migration.name):
+        return 0
+
+    versions = connection.execute(select(schema_migration.c.version)).scalars().all()
+    return max(versions, default=0)
+
+
+def upgrade(engine: Engine, migrations: list[Migration] = MIGRATIONS) -> list[int]:
+    """Apply every migration newer than the database's version and return the versions that were applied."""
+
+    applied: list[int] = []
+
+    with engine.begin() as connection:
+        if connection.dialect.name == "mssql":
+            # Keep app instances that start together from migrating at the same time
+            connection.execute(text("exec sp_getapplock @Resource = 'miapeer_schema_migration', @LockMode = 'Exclusive', @LockOwner = 'Transaction'"))
+
+        migration_metadata.create_all(connection)
+        current_version = get_schema_version(connection)
+
+        for migration in sorted(migrations, key=lambda m: m.version):
+            if migration.version <= current_version:
+                continue
+
+            migration.upgrade(connection)
+            connection.execute(
+                schema_migration.insert().values(version=migration.version, description=migration.description, applied_at=datetime.utcnow())
+            )
+            applied.append(migration.version)
+
+    return applied
@@ -0,0 +1,155 @@
+"""The dates a repeat option lands on.
+
+Each repeat option compiles to a `Recurrence`, which works out its n-th occurrence from a start date directly rather than
+by stepping there, so a forecast can seek straight into any window and walk it lazily, with no cap on its length.
+"""
+
+from abc import ABC, abstractmethod
+from calendar import isleap, monthrange
+from dataclasses import dataclass
+from datetime import date, timedelta
+from enum import Enum
+from functools import lru_cache
+from math import gcd
+from typing import Iterator, Optional
+
+
+class RepeatUnits(str, Enum):
+    DAY = "Day"
+    SEMI_MONTH = "Semi-Month"
+    MONTH = "Month"
+    YEAR = "Year"
+
+
+class Recurrence(ABC):
+    @abstractmethod
+    def nth(self, start: date, n: int) -> date:
+        """The n-th occurrence (from 0) of a schedule starting on `start`."""
+
+    @abstractmethod
+    def index_on_or_after(self, start: date, on_or_after: date) -> int:
+        """The index of the first occurrence on or after `on_or_after`."""
+
+    def first_on_or_after(self, start: date, on_or_after: date) -> date:
+        return self.nth(start, self.index_on_or_after(start, on_or_after))
+
+    def occurrences(self, start: date, on_or_after: Optional[date] = None, until: date = date.max) -> Iterator[date]:
+        """Every occurrence from `on_or_after` (or the first) up to and including `until`, generated as they're needed."""
+
+        n = self.index_on_or_after(start, on_or_after) if on_or_after else 0
+        while True:
+            try:
+                occurrence = self.nth(start, n)
+            except (OverflowError, ValueError):
+                # Past the last representable date
+                return
+
+            if occurrence > until:
+                return
+
+            yield occurrence
+            n += 1
+
+
+@dataclass(frozen=True)
+class DailyRecurrence(Recurrence):
+    days: int
+
+    def nth(self, start: date, n: int) -> date:
+        return start + timedelta(days=n * self.days)
+
+    def index_on_or_after(self, start: date, on_or_after: date) -> int:
+        return max(0, -(-(on_or_after - start).days // self.days))
+
+
+@dataclass(frozen=True)
+class MonthlyRecurrence(Recurrence):
+    months: int
+
+    def nth(self, start: date, n: int) -> date:
+        year, month = divmod(start.year * 12 + start.month - 1 + n * self.months, 12)
+        return date(year, month + 1, self._day(start, n))
+
+    def index_on_or_after(self, start: date, on_or_after: date) -> int:
+        months_apart = (on_or_after.year - start.year) * 12 + on_or_after.month - start.month
+
+        # That many steps lands in on_or_after's month at the latest, so at most two more are needed
+        n = max(0, months_apart // self.months)
+        while self.nth(start, n) < on_or_after:
+            n += 1
+
+        return n
+
+    def _day(self, start: date, n: int) -> int:
+        """The day of the month the n-th occurrence falls on.
+
+        Progressing a schedule moves its start date to the occurrence just made, so each step starts from the last one:
+        a day that doesn't exist in a month passed through is clamped to that month's last day, and stays clamped.
+        """
+
+        day = start.day
+        if day <= 28 or n == 0:
+            return day
+
+        # The calendar month repeats after `period` steps, during which the year moves on by `years`
+        period = 12 // gcd(self.months, 12)
+        years = period * self.months // 12
+
+        february: Optional[tuple[int, int]] = None
+        for step in range(1, min(n, period) + 1):
+            year, month = divmod(start.year * 12 + start.month - 1 + step * self.months, 12)
+            if month + 1 == 2:
+                february = (step, year)
+            else:
+                day = min(day, monthrange(year, month + 1)[1])
+
+        if february:
+            # Only 29 if every February passed through is in a leap year. Leap years repeat every 400 years, so there's
+            # no need to look further than that.
+            first_step, first_year = february
+            februaries = (n - first_step) // period + 1
+            all_leap = all(isleap(first_year + i * years) for i in range(min(februaries, 400)))
+            day = min(day, 29 if all_leap else 28)
+
+        return day
+
+
+@dataclass(frozen=True)
+class SemiMonthlyRecurrence(Recurrence):
+    """The 1st and 16th of every month. A start date on any other day begins at the next of those."""
+
+    def nth(self, start: date, n: int) -> date:
+        month_index, half = divmod(self._half_month(start) + n, 2)
+        year, month = divmod(month_index, 12)
+        return date(year, month + 1, 16 if half else 1)
+
+    def index_on_or_after(self, start: date, on_or_after: date) -> int:
+        return max(0, self._half_month(on_or_after) - self._half_month(start))
+
+    @staticmethod
+    def _half_month(on_or_after: date) -> int:
+        """Counts the 1sts and 16ths up to the first one on or after the given date."""
+
+        month_index = on_or_after.year * 12 + on_or_after.month - 1
+        if on_or_after.day == 1:
+            return month_index * 2
+        elif on_or_after.day <= 16:
+            return month_index * 2 + 1
+        else:
+            return month_index * 2 + 2
+
+
+@lru_cache(maxsize=None)
+def compile_recurrence(repeat_unit_name: str, quantity: int) -> Optional[Recurrence]:
+    """The recurrence for a repeat option, or None if its unit isn't one that repeats."""
+
+    if repeat_unit_name == RepeatUnits.DAY and quantity > 0:
+        return DailyRecurrence(days=quantity)
+    elif repeat_unit_name == RepeatUnits.SEMI_MONTH:
+        return SemiMonthlyRecurrence()
+    elif repeat_unit_name == RepeatUnits.MONTH and quantity > 0:
+        return MonthlyRecurrence(months=quantity)
+    elif repeat_unit_name == RepeatUnits.YEAR and quantity > 0:
+        return MonthlyRecurrence(months=quantity * 12)
+
+    return None
@@ -0,0 +1,92 @@
+"""The repeat options and units, held in memory.
+
+They're seed data, so rather than querying them for every forecast they're loaded at startup into an immutable snapshot.
+Refreshing builds a whole new snapshot and swaps it in, so readers never see a half-loaded registry. Each process holds
+its own snapshot and reads the options again once it's REPEAT_OPTION_REGISTRY_TTL_SECONDS old, so a refresh made
+through one process reaches the others within that time.
+"""
+
+import hashlib
+import json
+from dataclasses import dataclass
+from os import environ as env
+from time import monotonic
+from types import MappingProxyType
+from typing import Iterable, Mapping, Optional
+
+from sqlmodel import asc, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from miapeer.models.quantum.repeat_option import RepeatOption, RepeatOptionRead
+from miapeer.models.quantum.repeat_unit import RepeatUnit, RepeatUnitRead
+
+
+@dataclass(frozen=True)
+class RepeatOptionRegistry:
+    # In display order
+    repeat_options: tuple[RepeatOptionRead, ...]
+    repeat_units: tuple[RepeatUnitRead, ...]
+
+    # Changes whenever the content does, so clients can revalidate their cached copy
+    etag: str
+
+    options_by_id: Mapping[int, RepeatOptionRead]
+    units_by_id: Mapping[int, RepeatUnitRead]
+
+    @classmethod
+    def build(
+        cls, repeat_options: Iterable[RepeatOption | RepeatOptionRead], repeat_units: Iterable[RepeatUnit | RepeatUnitRead]
+    ) -> "RepeatOptionRegistry":
+        options = tuple(RepeatOptionRead.model_validate(repeat_option) for repeat_option in repeat_options)
+        units = tuple(RepeatUnitRead.model_validate(repeat_unit) for repeat_unit in repeat_units)
+
+        content = json.dumps([[option.model_dump() for option in options], [unit.model_dump() for unit in units]], sort_keys=True)
+
+        return cls(
+            repeat_options=options,
+            repeat_units=units,
+            etag=f'"{hashlib.sha256(content.encode()).hexdigest()[:32]}"',
+            options_by_id=MappingProxyType({option.repeat_option_id: option for option in options}),
+            units_by_id=MappingProxyType({unit.repeat_unit_id: unit for unit in units}),
+        )
+
+    def get_repeat_option(self, repeat_option_id: int) -> Optional[RepeatOptionRead]:
+        return self.options_by_id.get(repeat_option_id)
+
+    def get_repeat_unit(self, repeat_unit_id: int) -> Optional[RepeatUnitRead]:
+        return self.units_by_id.get(repeat_unit_id)
+
+
+DEFAULT_REPEAT_OPTION_REGISTRY_TTL_SECONDS = 300
+
+REPEAT_OPTION_REGISTRY_TTL_SECONDS = float(env.get("REPEAT_OPTION_REGISTRY_TTL_SECONDS", DEFAULT_REPEAT_OPTION_REGISTRY_TTL_SECONDS))
+
+_registry: Optional[RepeatOptionRegistry] = None
+_loaded_at = 0.0
+
+
+async def load_repeat_option_registry(db: AsyncSession) -> RepeatOptionRegistry:
+    """Reads the repeat options and units from the database and makes them the current registry."""
+
+    global _registry, _loaded_at
+
+    repeat_options = (await db.exec(select(RepeatOption).order_by(asc(RepeatOption.order_index), asc(RepeatOption.repeat_option_id)))).all()
+    repeat_units = (await db.exec(select(RepeatUnit).order_by(asc(RepeatUnit.repeat_unit_id)))).all()
+
+    _registry = RepeatOptionRegistry.build(repeat_options, repeat_units)
+    _loaded_at = monotonic()
+    return _registry
+
+
+async def get_repeat_option_registry(db: AsyncSession) -> RepeatOptionRegistry:
+    """The current registry. It's loaded on first use if startup hasn't loaded it already, and again once it's expired."""
+
+    if _registry is None or monotonic() - _loaded_at >= REPEAT_OPTION_REGISTRY_TTL_SECONDS:
+        return await load_repeat_option_registry(db)
+
+    return _registry
+
+
+def clear_repeat_option_registry() -> None:
+    global _registry
+    _registry = None
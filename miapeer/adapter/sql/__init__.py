@@ -1,4 +1,30 @@
-from os import environ as env
+"""Building blocks for the hand-tuned Quantum queries.
 
-ifnull = "isnull" if env.get("MIAPEER_ENV") == "Production" else "ifnull"
-substr = "substring" if env.get("MIAPEER_ENV") == "Production" else "substr"
+The queries are SQLAlchemy Core constructs rather than SQL strings, so each one is compiled for the dialect of whichever
+engine executes it. Anything without a portable spelling gets its own construct here, with one compilation per dialect.
+"""
+
+from typing import Any
+
+from sqlalchemy import String
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.compiler import SQLCompiler
+from sqlalchemy.sql.functions import GenericFunction
+
+
+class report_month(GenericFunction[str]):
+    """The 'YYYY-MM' month a date falls in."""
+
+    type = String()
+    inherit_cache = True
+
+
+@compiles(report_month)
+def _compile_report_month(element: report_month, compiler: SQLCompiler, **kw: Any) -> str:
+    return f"strftime('%Y-%m', {compiler.process(element.clauses, **kw)})"
+
+
+@compiles(report_month, "mssql")
+def _compile_report_month_mssql(element: report_month, compiler: SQLCompiler, **kw: Any) -> str:
+    # Style 126 is ISO 8601, so the first seven characters are yyyy-mm
+    return f"convert(varchar(7), {compiler.process(element.clauses, **kw)}, 126)"
@@ -1,139 +1,39 @@
-from sqlmodel import text
+from sqlalchemy import bindparam, func, or_, select
 
-from miapeer.adapter import sql
+from miapeer.adapter.sql import report_month
+from miapeer.models.quantum.budget import Budget
+from miapeer.models.quantum.transaction import Transaction
 
-GET_ALL = text(
-    """
-    with
-        recent_transactions as (
-            select
-                t.transaction_id,
-                substr(cast(coalesce(t.clear_date, t.transaction_date) as varchar), 1, 7) as report_date,
-                t.category_id,
-                t.amount
-            from quantum_transaction t
-                inner join quantum_budget b
-                    on b.category_id = t.category_id
-                inner join quantum_account a
-                    on a.account_id = t.account_id
-                inner join quantum_portfolio p
-                    on p.portfolio_id = a.portfolio_id
-                inner join quantum_portfolio_user pu
-                    on pu.portfolio_id = p.portfolio_id
-            where
-                pu.user_id = :user_id and
-                (clear_date is null or clear_date >= :limit_date)
-        ),
-        older_transactions as (
-            select
-                t.transaction_id,
-                substr(cast(t.clear_date as varchar), 1, 7) as report_date,
-                t.category_id,
-                t.amount
-            from quantum_transaction t
-                inner join quantum_budget b
-                    on b.category_id = t.category_id
-                inner join quantum_account a
-                    on a.account_id = t.account_id
-                inner join quantum_portfolio p
-                    on p.portfolio_id = a.portfolio_id
-                inner join quantum_portfolio_user pu
-                    on pu.portfolio_id = p.portfolio_id
-                left join recent_transactions rt
-                    on rt.transaction_id = t.transaction_id
-            where
-                pu.user_id = :user_id and
-                clear_date >= :limit_date and
-                rt.transaction_id is null
-        ),
-        transactions as (
-            select report_date, category_id, amount
-            from older_transactions
+t = Transaction.__table__.alias("t")  # type: ignore
+b = Budget.__table__.alias("b")  # type: ignore
 
-            union all
+# Uncleared transactions are reported in the month they were entered
+_report_date = report_month(func.coalesce(t.c.clear_date, t.c.transaction_date)).label("report_date")
 
-            select report_date, category_id, amount
-            from recent_transactions
-        ),
-        aggregated_data as (
-            select report_date, category_id, sum(amount) as amount
-            from transactions
-            group by category_id, report_date
-        )
-    select category_id, report_date, amount
-    from aggregated_data
-    order by category_id, report_date, amount;
-""".replace(
-        "ifnull", sql.ifnull
-    ).replace(
-        "substr", sql.substr
-    )
+# Both sides of the OR can seek the (account_id, clear_date) index
+_in_reporting_period = or_(t.c.clear_date.is_(None), t.c.clear_date >= bindparam("limit_date"))
+
+_budget_transactions = select(t.c.category_id, _report_date, t.c.amount).join(b, b.c.category_id == t.c.category_id)
+
+_all_transactions = (
+    _budget_transactions.where(t.c.account_id.in_(bindparam("account_ids", expanding=True))).where(_in_reporting_period).subquery("transactions")
 )
 
-GET_ONE = text(
-    """
-    with
-        recent_transactions as (
-            select
-                t.transaction_id,
-                substr(cast(coalesce(t.clear_date, t.transaction_date) as varchar), 1, 7) as report_date,
-                t.amount
-            from quantum_transaction t
-                inner join quantum_budget b
-                    on b.category_id = t.category_id
-                inner join quantum_account a
-                    on a.account_id = t.account_id
-                inner join quantum_portfolio p
-                    on p.portfolio_id = a.portfolio_id
-                inner join quantum_portfolio_user pu
-                    on pu.portfolio_id = p.portfolio_id
-            where
-                b.budget_id = :budget_id and
-                pu.user_id = :user_id and
-                (clear_date is null or clear_date >= :limit_date)
-        ),
-        older_transactions as (
-            select
-                t.transaction_id,
-                substr(cast(t.clear_date as varchar), 1, 7) as report_date,
-                t.amount
-            from quantum_transaction t
-                inner join quantum_budget b
-                    on b.category_id = t.category_id
-                inner join quantum_account a
-                    on a.account_id = t.account_id
-                inner join quantum_portfolio p
-                    on p.portfolio_id = a.portfolio_id
-                inner join quantum_portfolio_user pu
-                    on pu.portfolio_id = p.portfolio_id
-                left join recent_transactions rt
-                    on rt.transaction_id = t.transaction_id
-            where
-                b.budget_id = :budget_id and
-                pu.user_id = :user_id and
-                clear_date >= :limit_date and
-                rt.transaction_id is null
-        ),
-        transactions as (
-            select report_date, amount
-            from older_transactions
+GET_ALL = (
+    select(_all_transactions.c.category_id, _all_transactions.c.report_date, func.sum(_all_transactions.c.amount).label("amount"))
+    .group_by(_all_transactions.c.category_id, _all_transactions.c.report_date)
+    .order_by(_all_transactions.c.category_id, _all_transactions.c.report_date, "amount")
+)
 
-            union all
+_budget_transactions_for_one = (
+    _budget_transactions.where(b.c.budget_id == bindparam("budget_id"))
+    .where(t.c.account_id.in_(bindparam("account_ids", expanding=True)))
+    .where(_in_reporting_period)
+    .subquery("transactions")
+)
 
-            select report_date, amount
-            from recent_transactions
-        ),
-        aggregated_data as (
-            select report_date, sum(amount) as amount
-            from transactions
-            group by report_date
-        )
-    select report_date, amount
-    from aggregated_data
-    order by report_date, amount;
-""".replace(
-        "ifnull", sql.ifnull
-    ).replace(
-        "substr", sql.substr
-    )
+GET_ONE = (
+    select(_budget_transactions_for_one.c.report_date, func.sum(_budget_transactions_for_one.c.amount).label("amount"))
+    .group_by(_budget_transactions_for_one.c.report_date)
+    .order_by(_budget_transactions_for_one.c.report_date, "amount")
 )
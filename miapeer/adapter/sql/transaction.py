@@ -1,123 +1,53 @@
-from sqlmodel import text
+from sqlalchemy import bindparam, func, select
 
-from miapeer.adapter import sql
+from miapeer.models.quantum.account import Account
+from miapeer.models.quantum.transaction import Transaction
 
-GET_ALL = text(
-    """
-    with
-        recent_transactions as (
-            select
-                t.account_id,
-                t.transaction_id,
-                t.transaction_date,
-                t.clear_date,
-                t.transaction_type_id,
-                t.check_number,
-                t.payee_id,
-                t.category_id,
-                t.amount,
-                t.notes,
-                t.exclude_from_forecast
-            from quantum_transaction t
-                inner join quantum_account a
-                    on a.account_id = t.account_id
-                inner join quantum_portfolio p
-                    on p.portfolio_id = a.portfolio_id
-                inner join quantum_portfolio_user pu
-                    on pu.portfolio_id = p.portfolio_id
-            where
-               a.account_id = :account_id and
-               pu.user_id = :user_id and
-               (clear_date is null or clear_date >= :limit_date)
-        ),
-        older_transactions_sum as (
-            select min(t.account_id) as account_id, sum(t.amount) as sum_of_old
-            from quantum_transaction t
-                left join recent_transactions rt
-                    on rt.transaction_id = t.transaction_id
-                inner join quantum_account a
-                    on a.account_id = t.account_id
-                inner join quantum_portfolio p
-                    on p.portfolio_id = a.portfolio_id
-                inner join quantum_portfolio_user pu
-                    on pu.portfolio_id = p.portfolio_id
-            where
-                a.account_id = :account_id and
-                pu.user_id = :user_id and
-                rt.transaction_id is null
-            group by t.account_id
-        ),
-        ordered_transactions as (
-            -- Starting balance
-            select
-                account_id,
-                null as transaction_id,
-                null as transaction_date,
-                null as clear_date,
-                null as transaction_type_id,
-                null as check_number,
-                null as payee_id,
-                null as category_id,
-                starting_balance as amount,
-                null as notes,
-                null as exclude_from_forecast,
-                -2 as order_index
-            from quantum_account
-            where account_id = :account_id
+t = Transaction.__table__.alias("t")  # type: ignore
+a = Account.__table__  # type: ignore
 
-            union all
+LEDGER_COLUMNS = [
+    "account_id",
+    "transaction_id",
+    "transaction_date",
+    "clear_date",
+    "transaction_type_id",
+    "check_number",
+    "payee_id",
+    "category_id",
+    "amount",
+    "notes",
+    "exclude_from_forecast",
+]
 
-            -- Sum of older transactions
-            select
-                account_id,
-                null as transaction_id,
-                null as transaction_date,
-                null as clear_date,
-                null as transaction_type_id,
-                null as check_number,
-                null as payee_id,
-                null as category_id,
-                sum_of_old as amount,
-                null as notes,
-                null as exclude_from_forecast,
-                -1 as order_index
-            from older_transactions_sum
+# Everything that cleared before the reporting period. Uncleared transactions are always in the reporting period, so
+# this is a single range over the (account_id, clear_date) index.
+_sum_of_older = (
+    select(func.sum(t.c.amount)).where(t.c.account_id == bindparam("account_id")).where(t.c.clear_date < bindparam("limit_date")).scalar_subquery()
+)
+
+GET_OPENING_BALANCE = select((a.c.starting_balance + func.coalesce(_sum_of_older, 0)).label("opening_balance")).where(
+    a.c.account_id == bindparam("account_id")
+)
 
-            union all
+_ledger_columns = [t.c[name] for name in LEDGER_COLUMNS]
 
-            -- Recent transactions
-            select
-                account_id,
-                transaction_id,
-                transaction_date,
-                clear_date,
-                transaction_type_id,
-                check_number,
-                payee_id,
-                category_id,
-                amount,
-                notes,
-                exclude_from_forecast,
-                row_number() over (ORDER BY ifnull(clear_date, '9999-01-01'), transaction_date) as order_index
-            from recent_transactions
-        )
-    select
-        account_id,
-        transaction_id,
-        transaction_date,
-        clear_date,
-        transaction_type_id,
-        check_number,
-        payee_id,
-        category_id,
-        amount,
-        notes,
-        exclude_from_forecast,
-        order_index,
-        SUM(amount) OVER (ORDER BY order_index) AS balance
-    from ordered_transactions
-    order by order_index;
-""".replace(
-        "ifnull", sql.ifnull
-    )
+# Only the reporting period, in ledger order: what cleared in it by clear date, then everything still uncleared in the
+#   order it was entered. Each part reads the (account_id, clear_date, transaction_date, transaction_id) index in order,
+#   so neither has to be sorted. The caller runs them one after the other and carries the running balance on from
+#   GET_OPENING_BALANCE.
+GET_ALL_CLEARED = (
+    select(*_ledger_columns)
+    .where(t.c.account_id == bindparam("account_id"))
+    .where(t.c.clear_date >= bindparam("limit_date"))
+    .order_by(t.c.clear_date, t.c.transaction_date, t.c.transaction_id)
 )
+
+GET_ALL_UNCLEARED = (
+    select(*_ledger_columns)
+    .where(t.c.account_id == bindparam("account_id"))
+    .where(t.c.clear_date.is_(None))
+    .order_by(t.c.transaction_date, t.c.transaction_id)
+)
+
+GET_ALL = (GET_ALL_CLEARED, GET_ALL_UNCLEARED)
@@ -0,0 +1,114 @@
+"""Monthly rollups of cleared transactions (quantum_transaction_summary).
+
+Each summary holds the sum of an account's transactions that cleared in one calendar month. An account's summaries
+always cover every month up to and including its latest summary, so a balance only has to add up the summaries and the
+transactions that cleared after the latest one (or haven't cleared yet).
+"""
+
+from collections import defaultdict
+from datetime import date
+from typing import Iterable, Optional
+
+from sqlmodel import col, delete, desc, extract, func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from miapeer.models.quantum.transaction import Transaction
+from miapeer.models.quantum.transaction_summary import TransactionSummary
+
+
+def _month_index(year: int, month: int) -> int:
+    return year * 12 + month - 1
+
+
+async def adjust_transaction_summaries(db: AsyncSession, account_id: int, changes: Iterable[tuple[Optional[date], int]]) -> None:
+    """Apply (clear_date, amount) changes to the account's summaries; months that haven't been rolled up yet are left alone.
+
+    Nothing is committed, so the adjustment lands in the same unit of work as the transaction change itself.
+    """
+
+    deltas: dict[tuple[int, int], int] = defaultdict(int)
+    for clear_date, amount in changes:
+        if clear_date is not None:
+            deltas[(clear_date.year, clear_date.month)] += amount
+
+    deltas = {month: amount for month, amount in deltas.items() if amount != 0}
+    if not deltas:
+        return
+
+    latest_sql = (
+        select(TransactionSummary)
+        .where(TransactionSummary.account_id == account_id)
+        .order_by(desc(TransactionSummary.year), desc(TransactionSummary.month))
+        .limit(1)
+    )
+    latest_summary = (await db.exec(latest_sql)).first()
+
+    if latest_summary is None:
+        return
+
+    for (year, month), amount in deltas.items():
+        if (year, month) > (latest_summary.year, latest_summary.month):
+            continue
+
+        summary_sql = (
+            select(TransactionSummary)
+            .where(TransactionSummary.account_id == account_id)
+            .where(TransactionSummary.year == year)
+            .where(TransactionSummary.month == month)
+        )
+        summary = (await db.exec(summary_sql)).one_or_none()
+
+        if summary is None:
+            summary = TransactionSummary(account_id=account_id, year=year, month=month, balance=0)
+
+        summary.balance += amount
+        db.add(summary)
+
+
+async def roll_up_closed_months(
+    db: AsyncSession,
+    account_ids: Optional[list[int]] = None,
+    rebuild: bool = False,
+    today: Optional[date] = None,
+) -> int:
+    """Summarize every month before the current one that isn't summarized yet and return how many summaries were added.
+
+    `rebuild` throws away the existing summaries first. Nothing is committed.
+    """
+
+    today = today or date.today()
+    first_open_month = date(today.year, today.month, 1)
+
+    if rebuild:
+        delete_sql = delete(TransactionSummary)
+        if account_ids is not None:
+            delete_sql = delete_sql.where(col(TransactionSummary.account_id).in_(account_ids))
+        await db.exec(delete_sql)  # type: ignore
+
+    latest_sql = select(TransactionSummary.account_id, func.max(TransactionSummary.year * 12 + TransactionSummary.month - 1)).group_by(
+        TransactionSummary.account_id
+    )
+    if account_ids is not None:
+        latest_sql = latest_sql.where(col(TransactionSummary.account_id).in_(account_ids))
+    latest_month_index = {account_id: month_index for account_id, month_index in (await db.exec(latest_sql)).all()}
+
+    clear_year = extract("year", Transaction.clear_date)
+    clear_month = extract("month", Transaction.clear_date)
+    monthly_sql = (
+        select(Transaction.account_id, clear_year, clear_month, func.sum(Transaction.amount))
+        .where(col(Transaction.clear_date).is_not(None))
+        .where(col(Transaction.clear_date) < first_open_month)
+        .group_by(Transaction.account_id, clear_year, clear_month)
+    )
+    if account_ids is not None:
+        monthly_sql = monthly_sql.where(col(Transaction.account_id).in_(account_ids))
+
+    added = 0
+    for account_id, year, month, balance in (await db.exec(monthly_sql)).all():
+        if _month_index(int(year), int(month)) <= latest_month_index.get(account_id, -1):
+            continue
+
+        db.add(TransactionSummary(account_id=account_id, year=int(year), month=int(month), balance=balance))
+        added += 1
+
+    return added
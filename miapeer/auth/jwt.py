@@ -1,16 +1,40 @@
 from datetime import datetime, timedelta
 from enum import Enum
 from os import environ as env
+from time import time
 from typing import Any, Optional
 
 from jose import jwt
 from jose.exceptions import JWTError
-from typing_extensions import TypedDict
+from typing_extensions import NotRequired, TypedDict
+
+from miapeer.adapter.cache import TtlCache
 
 DEFAULT_JWT_ALGORITHM = "HS256"
 DEFAULT_ACCESS_TOKEN_EXPIRE_MINUTES = 30
-
-TokenData = TypedDict("TokenData", {"sub": str, "exp": Optional[int]})
+DEFAULT_TOKEN_CACHE_TTL_SECONDS = 300
+DEFAULT_TOKEN_CACHE_MAX_SIZE = 1024
+
+# "uid", "disabled", "perms" and "pv" are only present on tokens that embed authorization claims
+TokenData = TypedDict(
+    "TokenData",
+    {
+        "sub": str,
+        "exp": Optional[int],
+        "uid": NotRequired[int],
+        "disabled": NotRequired[bool],
+        "perms": NotRequired[list[list[str]]],
+        "pv": NotRequired[int],
+    },
+)
+
+OPTIONAL_CLAIMS = ("uid", "disabled", "perms", "pv")
+
+# Verified tokens, keyed by (key, algorithm, token). Entries never outlive the token's own "exp".
+token_cache: TtlCache[tuple[str, str, str], TokenData] = TtlCache(
+    max_size=int(env.get("JWT_TOKEN_CACHE_MAX_SIZE", DEFAULT_TOKEN_CACHE_MAX_SIZE)),
+    ttl_seconds=float(env.get("JWT_TOKEN_CACHE_TTL_SECONDS", DEFAULT_TOKEN_CACHE_TTL_SECONDS)),
+)
 
 
 class JwtException(Exception):
@@ -46,11 +70,25 @@ def decode_jwt(jwt_key: str, token: str) -> TokenData:
     if jwt_key == "":
         raise JwtException(JwtErrorMessage.INVALID_JWK.value)
 
+    algorithm = env.get("JWT_ALGORITHM", DEFAULT_JWT_ALGORITHM)
+    cache_key = (jwt_key, algorithm, token)
+
+    cached_payload = token_cache.get(cache_key)
+    if cached_payload is not None:
+        return cached_payload.copy()
+
     try:
-        payload: dict[str, Any] = jwt.decode(token=token, key=jwt_key, algorithms=env.get("JWT_ALGORITHM", DEFAULT_JWT_ALGORITHM))
+        payload: dict[str, Any] = jwt.decode(token=token, key=jwt_key, algorithms=algorithm)
 
         typed_payload: TokenData = {"sub": payload.get("sub", ""), "exp": payload.get("exp", None)}
+
+        for claim in OPTIONAL_CLAIMS:
+            if claim in payload:
+                typed_payload[claim] = payload[claim]  # type: ignore
     except JWTError:
         raise JwtException(JwtErrorMessage.INVALID_TOKEN.value)
 
+    token_exp = typed_payload.get("exp")
+    token_cache.set(cache_key, typed_payload.copy(), ttl_seconds=None if token_exp is None else token_exp - time())
+
     return typed_payload
@@ -0,0 +1,52 @@
+"""Check the maintained balances on quantum_account against recomputed ones and report any drift.
+
+The recomputation trusts the monthly transaction summaries; rebuild those first (see miapeer.commands.transaction_summaries)
+for a check that goes all the way back to the transactions.
+
+Usage: python -m miapeer.commands.account_balances [--account-id ID ...] [--repair]
+"""
+
+import argparse
+import asyncio
+import sys
+from typing import Optional
+
+from miapeer.adapter.account_balance import (
+    AccountBalanceDrift,
+    verify_account_balances,
+)
+from miapeer.adapter.database import async_session_maker
+
+
+async def run(account_ids: Optional[list[int]], repair: bool) -> list[AccountBalanceDrift]:
+    async with async_session_maker() as db:
+        drifts = await verify_account_balances(db, account_ids=account_ids, repair=repair)
+        await db.commit()
+
+    return drifts
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Verify (and optionally repair) the maintained account balances")
+    parser.add_argument("--account-id", dest="account_ids", type=int, action="append", help="limit to this account (repeatable)")
+    parser.add_argument("--repair", action="store_true", help="reset drifted accounts to the recomputed balances")
+    args = parser.parse_args(argv)
+
+    drifts = asyncio.run(run(account_ids=args.account_ids, repair=args.repair))
+
+    for drift in drifts:
+        print(
+            f"Account {drift.account_id}: "
+            f"current {drift.stored.current} (expected {drift.expected.current}), "
+            f"cleared {drift.stored.cleared} (expected {drift.expected.cleared})"
+        )
+
+    print(f"{len(drifts)} account(s) {'repaired' if args.repair else 'drifted'}")
+
+    # Unrepaired drift is a failure, so this can run as a scheduled check
+    if drifts and not args.repair:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
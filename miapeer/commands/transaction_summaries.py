@@ -0,0 +1,36 @@
+"""Roll cleared transactions in closed months up into quantum_transaction_summary.
+
+Meant to run shortly after each month ends (and once to backfill existing accounts). Transactions created, edited or
+deleted in months that are already summarized keep their summaries current on their own.
+
+Usage: python -m miapeer.commands.transaction_summaries [--account-id ID ...] [--rebuild]
+"""
+
+import argparse
+import asyncio
+from typing import Optional
+
+from miapeer.adapter.database import async_session_maker
+from miapeer.adapter.transaction_summary import roll_up_closed_months
+
+
+async def run(account_ids: Optional[list[int]], rebuild: bool) -> int:
+    async with async_session_maker() as db:
+        added = await roll_up_closed_months(db, account_ids=account_ids, rebuild=rebuild)
+        await db.commit()
+
+    return added
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Summarize cleared transactions in closed months")
+    parser.add_argument("--account-id", dest="account_ids", type=int, action="append", help="limit to this account (repeatable)")
+    parser.add_argument("--rebuild", action="store_true", help="discard existing summaries and rebuild them from scratch")
+    args = parser.parse_args(argv)
+
+    added = asyncio.run(run(account_ids=args.account_ids, rebuild=args.rebuild))
+    print(f"Added {added} transaction summaries")
+
+
+if __name__ == "__main__":
+    main()
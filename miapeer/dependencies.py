@@ -1,24 +1,34 @@
 from enum import Enum
 from os import environ as env
-from typing import Annotated, Iterator, Optional
+from typing import Annotated, Any, AsyncIterator, Callable, Iterable, Optional
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlmodel import Session, select
+from sqlmodel import col, select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from miapeer.adapter.database import engine
+from miapeer.adapter.cache import TtlCache
+from miapeer.adapter.database import async_session_maker
+from miapeer.auth.jwt import TokenData as JwtTokenData
 from miapeer.auth.jwt import decode_jwt
 from miapeer.models.miapeer import (
     Application,
     ApplicationRole,
+    AuthenticatedUser,
     Permission,
     Role,
     TokenData,
     User,
 )
+from miapeer.models.quantum.account import Account
+from miapeer.models.quantum.portfolio_user import PortfolioUser
 
 DEFAULT_JWT_ALGORITHM = "HS256"
 DEFAULT_ACCESS_TOKEN_EXPIRE_MINUTES = 30
+DEFAULT_PERMISSION_CACHE_TTL_SECONDS = 60
+DEFAULT_PERMISSION_CACHE_MAX_SIZE = 1024
+DEFAULT_USER_CACHE_TTL_SECONDS = 30
+DEFAULT_USER_CACHE_MAX_SIZE = 1024
 
 
 class Applications(str, Enum):
@@ -32,29 +42,104 @@ class Roles(str, Enum):
     SUPER_USER = "Super User"
 
 
-permission_cache: set[str] = set()
+# Every (application, role) pair granted to a user
+UserPermissions = frozenset[tuple[str, str]]
+
+permission_cache: TtlCache[int, UserPermissions] = TtlCache(
+    max_size=int(env.get("PERMISSION_CACHE_MAX_SIZE", DEFAULT_PERMISSION_CACHE_MAX_SIZE)),
+    ttl_seconds=float(env.get("PERMISSION_CACHE_TTL_SECONDS", DEFAULT_PERMISSION_CACHE_TTL_SECONDS)),
+)
+
+# Snapshots of authenticated users, keyed by email
+user_cache: TtlCache[str, dict[str, Any]] = TtlCache(
+    max_size=int(env.get("USER_CACHE_MAX_SIZE", DEFAULT_USER_CACHE_MAX_SIZE)),
+    ttl_seconds=float(env.get("USER_CACHE_TTL_SECONDS", DEFAULT_USER_CACHE_TTL_SECONDS)),
+)
+
+
+# Each user's permissions_version, which authorization claims are checked against. It's read from the database (which
+#   every instance shares) at most once per TTL, so a change made through any instance is seen everywhere within that time.
+permissions_version_cache: TtlCache[int, int] = TtlCache(
+    max_size=int(env.get("PERMISSION_CACHE_MAX_SIZE", DEFAULT_PERMISSION_CACHE_MAX_SIZE)),
+    ttl_seconds=float(env.get("PERMISSION_CACHE_TTL_SECONDS", DEFAULT_PERMISSION_CACHE_TTL_SECONDS)),
+)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/miapeer/v1/auth/token")
 
 
-def get_db() -> Iterator[Session]:
-    with Session(engine) as session:
+async def get_db() -> AsyncIterator[AsyncSession]:
+    async with async_session_maker() as session:
         yield session
 
 
-DbSession = Annotated[Session, Depends(get_db)]
+DbSession = Annotated[AsyncSession, Depends(get_db)]
+
+
+def get_db_session_factory() -> Callable[[], AsyncSession]:
+    # Yield dependencies are torn down before a streamed body is sent, so streaming routes open (and close) their own session
+    return async_session_maker
+
+
+DbSessionFactory = Annotated[Callable[[], AsyncSession], Depends(get_db_session_factory)]
 
 
 def get_jwk() -> Optional[str]:
     return env.get("JWT_SECRET_KEY")
 
 
-# TODO: Cache results to prevent multiple DB lookups
-async def get_current_user(
-    token: str = Depends(oauth2_scheme), jwt_key: str = Depends(get_jwk), db: Session = Depends(get_db)
-) -> User:
-    payload = decode_jwt(token=token, jwt_key=jwt_key)
+# With JWT_AUTHORIZATION_CLAIMS, tokens carry the user's permissions and the permissions_version they were issued at, and
+#   requests trust them rather than looking the user and permissions up. Every permission or user change advances the
+#   version in the same commit, but other instances only re-read it once their cached copy expires. So a revoked
+#   permission or disabled user can still be honoured for up to PERMISSION_CACHE_TTL_SECONDS, the same window the
+#   permission cache already allows.
+def use_token_claims() -> bool:
+    return env.get("JWT_AUTHORIZATION_CLAIMS", "").lower() == "true"
+
+
+async def get_permissions_version(db: AsyncSession, user_id: int) -> Optional[int]:
+    cached_version = permissions_version_cache.get(user_id)
+    if cached_version is not None:
+        return cached_version
+
+    version = (await db.exec(select(User.permissions_version).where(User.user_id == user_id))).first()
+    if version is not None:
+        permissions_version_cache.set(user_id, version)
+
+    return version
+
+
+async def advance_permissions_version(db: AsyncSession, user_id: Optional[int] = None) -> None:
+    """Make the authorization claims already issued to a user (or, without one, to everyone) out of date.
+
+    Nothing is committed, so the new version is saved along with the change that called for it.
+    """
+
+    sql = update(User).values(permissions_version=User.permissions_version + 1)
+    if user_id is not None:
+        sql = sql.where(col(User.user_id) == user_id)
+
+    await db.exec(sql)  # type: ignore
+
+
+async def token_claims_are_current(db: AsyncSession, payload: JwtTokenData) -> bool:
+    if not use_token_claims():
+        return False
+
+    if "uid" not in payload or "disabled" not in payload or "perms" not in payload or "pv" not in payload:
+        return False
+
+    return payload["pv"] == await get_permissions_version(db, payload["uid"])
+
+
+async def get_token_payload(token: str = Depends(oauth2_scheme), jwt_key: str = Depends(get_jwk)) -> JwtTokenData:
+    return decode_jwt(token=token, jwt_key=jwt_key)
 
+
+def invalidate_user_cache(email: str) -> None:
+    user_cache.delete(email)
+
+
+async def get_current_user(payload: JwtTokenData = Depends(get_token_payload), db: AsyncSession = Depends(get_db)) -> AuthenticatedUser:
     username: Optional[str] = payload.get("sub")
 
     if username is None or username == "":
@@ -64,9 +149,18 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    # Trust the token's own claims until the user's permissions change
+    if await token_claims_are_current(db, payload):
+        return AuthenticatedUser(user_id=payload["uid"], email=username, disabled=payload["disabled"], permissions_version=payload["pv"])
+
+    # Hand out a fresh, session-less copy so one request can't modify (or expire) another request's user
+    cached_user = user_cache.get(username)
+    if cached_user is not None:
+        return AuthenticatedUser.model_validate(cached_user)
+
     token_data = TokenData(username=username)
 
-    user = db.exec(select(User).where(User.email == token_data.username)).first()
+    user = (await db.exec(select(User).where(User.email == token_data.username))).first()
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -74,23 +168,24 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    # print(f"\n{permission_cache = }\n")  # TODO: Remove this!!!
+    authenticated_user = AuthenticatedUser.model_validate(user)
+    user_cache.set(username, authenticated_user.model_dump())
 
-    return user
+    return authenticated_user
 
 
-CurrentUser = Annotated[User, Depends(get_current_user)]
+CurrentUser = Annotated[AuthenticatedUser, Depends(get_current_user)]
 
 
 async def get_current_active_user(
-    current_user: User = Depends(get_current_user),
-) -> User:
+    current_user: AuthenticatedUser = Depends(get_current_user),
+) -> AuthenticatedUser:
     if current_user.disabled:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
 
-CurrentActiveUser = Annotated[User, Depends(get_current_active_user)]
+CurrentActiveUser = Annotated[AuthenticatedUser, Depends(get_current_active_user)]
 
 
 # async def is_authorized(user: str = Cookie(None)) -> None:
@@ -105,53 +200,75 @@ CurrentActiveUser = Annotated[User, Depends(get_current_active_user)]
 #         raise HTTPException(status_code=401, detail="Error decoding access token")
 
 
-def has_permission(db: Session, email: str, application: Applications, role: Roles) -> bool:
-    print("has_permission")
-    # TODO: https://sqlmodel.tiangolo.com/tutorial/fastapi/relationships/
+def invalidate_permission_cache(user_id: Optional[int] = None) -> None:
+    # Changes to applications or roles can affect anyone, so without a user everything is dropped
+    if user_id is None:
+        permission_cache.clear()
+        permissions_version_cache.clear()
+    else:
+        permission_cache.delete(user_id)
+        permissions_version_cache.delete(user_id)
+
 
-    # # Check the cache first
-    # if f"{email}-{application}-{role}" in permission_cache:
-    #     return True
+async def get_permissions(db: AsyncSession, user_id: int) -> UserPermissions:
+    cached_permissions = permission_cache.get(user_id)
+    if cached_permissions is not None:
+        return cached_permissions
 
     sql = (
-        select(User.email, Application.name, Role.name)
-        .join(Permission)
+        select(Application.name, Role.name)
+        .select_from(Permission)
         .join(ApplicationRole)
         .join(Application)
         .join(Role)
-        .where(User.email == email)
-        .where(Role.name == role)
-        .where(Application.name == application)
+        .where(Permission.user_id == user_id)
     )
-    users = db.exec(sql).all()
+    permissions = frozenset((application_name, role_name) for application_name, role_name in (await db.exec(sql)).all())
+    permission_cache.set(user_id, permissions)
+
+    return permissions
 
-    # print(f'\n{users = }\n') # TODO: Remove this!!!
 
-    # for u in users:
-    #     permission_cache.add(f"{u[0]}-{u[1]}-{u[2]}")
+async def add_authorization_claims(db: AsyncSession, user: User, token_data: JwtTokenData) -> None:
+    user_id = user.user_id if user.user_id else 0
 
-    # print(f'\n{permission_cache = }\n') # TODO: Remove this!!!
+    token_data["uid"] = user_id
+    token_data["disabled"] = user.disabled
+    token_data["perms"] = sorted([application, role] for application, role in await get_permissions(db, user_id))
+    token_data["pv"] = user.permissions_version
 
-    # TODO: Improve memoization
-    # TODO: Add expiration
 
-    # return f"{email}-{application}-{role}" in permission_cache
+# FastAPI caches dependency results per request, so however many `is_*` checks a route combines, this only runs once
+async def get_current_user_permissions(
+    db: AsyncSession = Depends(get_db),
+    user: AuthenticatedUser = Depends(get_current_active_user),
+    payload: JwtTokenData = Depends(get_token_payload),
+) -> UserPermissions:
+    if await token_claims_are_current(db, payload):
+        return frozenset((application, role) for application, role in payload.get("perms", []))
 
-    return len(users) > 0
+    return await get_permissions(db, user.user_id)
 
 
-def is_miapeer_user(db: Session = Depends(get_db), user: User = Depends(get_current_active_user)) -> None:
-    if not has_permission(db, user.email, Applications.MIAPEER, Roles.USER):
+CurrentUserPermissions = Annotated[UserPermissions, Depends(get_current_user_permissions)]
+
+
+def has_permission(permissions: UserPermissions, application: Applications, role: Roles) -> bool:
+    return (application.value, role.value) in permissions
+
+
+async def is_miapeer_user(permissions: CurrentUserPermissions) -> None:
+    if not has_permission(permissions, Applications.MIAPEER, Roles.USER):
         raise HTTPException(status_code=400, detail="Unauthorized: is_miapeer_user")
 
 
-def is_miapeer_admin(db: Session = Depends(get_db), user: User = Depends(get_current_active_user)) -> None:
-    if not has_permission(db, user.email, Applications.MIAPEER, Roles.ADMIN):
+async def is_miapeer_admin(permissions: CurrentUserPermissions) -> None:
+    if not has_permission(permissions, Applications.MIAPEER, Roles.ADMIN):
         raise HTTPException(status_code=400, detail="Unauthorized: is_miapeer_admin")
 
 
-def is_miapeer_super_user(db: Session = Depends(get_db), user: User = Depends(get_current_active_user)) -> None:
-    if not has_permission(db, user.email, Applications.MIAPEER, Roles.SUPER_USER):
+async def is_miapeer_super_user(permissions: CurrentUserPermissions) -> None:
+    if not has_permission(permissions, Applications.MIAPEER, Roles.SUPER_USER):
         raise HTTPException(status_code=400, detail="Unauthorized: is_miapeer_super_user")
 
 
@@ -160,16 +277,57 @@ def is_miapeer_super_user(db: Session = Depends(get_db), user: User = Depends(ge
 # TODO: https://fastapi.tiangolo.com/advanced/advanced-dependencies/
 
 
-def is_quantum_user(db: Session = Depends(get_db), user: User = Depends(get_current_active_user)) -> None:
-    if not has_permission(db, user.email, Applications.QUANTUM, Roles.USER):
+async def is_quantum_user(permissions: CurrentUserPermissions) -> None:
+    if not has_permission(permissions, Applications.QUANTUM, Roles.USER):
         raise HTTPException(status_code=400, detail="Unauthorized: is_quantum_user")
 
 
-def is_quantum_admin(db: Session = Depends(get_db), user: User = Depends(get_current_active_user)) -> None:
-    if not has_permission(db, user.email, Applications.QUANTUM, Roles.ADMIN):
+async def is_quantum_admin(permissions: CurrentUserPermissions) -> None:
+    if not has_permission(permissions, Applications.QUANTUM, Roles.ADMIN):
         raise HTTPException(status_code=400, detail="Unauthorized: is_quantum_admin")
 
 
-def is_quantum_super_user(db: Session = Depends(get_db), user: User = Depends(get_current_active_user)) -> None:
-    if not has_permission(db, user.email, Applications.QUANTUM, Roles.SUPER_USER):
+async def is_quantum_super_user(permissions: CurrentUserPermissions) -> None:
+    if not has_permission(permissions, Applications.QUANTUM, Roles.SUPER_USER):
         raise HTTPException(status_code=400, detail="Unauthorized: is_quantum_super_user")
+
+
+class PortfolioAccess:
+    """The portfolios a user belongs to, along with every account in them."""
+
+    def __init__(self, portfolio_ids: Iterable[int], account_portfolios: dict[int, int]) -> None:
+        self._portfolio_ids = frozenset(portfolio_ids)
+        self._account_portfolios = account_portfolios
+
+        # Sorted so that `IN (...)` clauses built from these always render the same way
+        self.portfolio_ids = sorted(self._portfolio_ids)
+        self.account_ids = sorted(account_portfolios)
+
+    def has_portfolio(self, portfolio_id: Optional[int]) -> bool:
+        return portfolio_id in self._portfolio_ids
+
+    def has_account(self, account_id: Optional[int]) -> bool:
+        return account_id in self._account_portfolios
+
+    def portfolio_of(self, account_id: int) -> Optional[int]:
+        return self._account_portfolios.get(account_id)
+
+
+# Resolved once per request (like the user's permissions) so that routers can filter by `portfolio_id IN (...)`
+#   rather than joining Account -> Portfolio -> PortfolioUser in every query
+async def get_portfolio_access(db: DbSession, user: AuthenticatedUser = Depends(get_current_active_user)) -> PortfolioAccess:
+    sql = (
+        select(PortfolioUser.portfolio_id, Account.account_id)
+        .select_from(PortfolioUser)
+        .outerjoin(Account, Account.portfolio_id == PortfolioUser.portfolio_id)  # type: ignore
+        .where(PortfolioUser.user_id == user.user_id)
+    )
+    rows = (await db.exec(sql)).all()
+
+    return PortfolioAccess(
+        portfolio_ids=[portfolio_id for portfolio_id, _ in rows],
+        account_portfolios={account_id: portfolio_id for portfolio_id, account_id in rows if account_id is not None},
+    )
+
+
+CurrentPortfolioAccess = Annotated[PortfolioAccess, Depends(get_portfolio_access)]
@@ -1,6 +1,7 @@
 from typing import List, Optional
 
 from pydantic import BaseModel
+from sqlalchemy import String
 from sqlmodel import Field, Relationship, SQLModel, UniqueConstraint
 
 # region: Auth
@@ -22,7 +23,8 @@ class TokenData(BaseModel):
 
 
 class UserBase(SQLModel):
-    email: str
+    # SQLModel doesn't turn max_length into a column length, and MSSQL can't index an unbounded VARCHAR(max)
+    email: str = Field(index=True, unique=True, max_length=255, sa_type=String(255))
     disabled: bool
 
 
@@ -32,6 +34,9 @@ class User(UserBase, table=True):
     user_id: Optional[int] = Field(default=None, primary_key=True)
     password: str
 
+    # Advanced with every change to the user or their permissions (see miapeer.dependencies.advance_permissions_version)
+    permissions_version: int = 0
+
     permissions: List["Permission"] = Relationship(back_populates="user")
     # portfolio_users: List["PortfolioUser"] = Relationship(back_populates="user")
 
@@ -44,8 +49,14 @@ class UserRead(UserBase):
     user_id: int
 
 
+# Who a request is made by: the parts of the user that authentication and authorization rely on, whether they came from
+#   the database or from the token's own claims
+class AuthenticatedUser(UserRead):
+    permissions_version: int
+
+
 class UserUpdate(SQLModel):
-    email: Optional[str] = None
+    email: Optional[str] = Field(default=None, max_length=255)
     password: Optional[str] = None
 
 
@@ -195,6 +206,24 @@ class PermissionUpdate(SQLModel):
 # endregion
 
 
+# region: Database
+
+
+class DatabasePoolStatus(BaseModel):
+    pool_class: str
+    size: Optional[int] = None
+    max_overflow: Optional[int] = None
+    checked_out: Optional[int] = None
+    idle: Optional[int] = None
+    overflow: Optional[int] = None
+    checkouts: Optional[int] = None
+    average_wait_ms: Optional[float] = None
+    max_wait_ms: Optional[float] = None
+
+
+# endregion
+
+
 # region Finalization steps
 
 ApplicationRoleRead.model_rebuild()
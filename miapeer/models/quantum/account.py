@@ -14,6 +14,10 @@ class Account(AccountBase, table=True):
 
     account_id: Optional[int] = Field(default=None, primary_key=True)
 
+    # Maintained alongside every transaction change (see miapeer.adapter.account_balance)
+    current_balance: int = 0
+    cleared_balance: int = 0
+
     # portfolio: Portfolio = Relationship(back_populates="accounts")
 
     # transactions: List["Transaction"] = Relationship(back_populates="account")
@@ -1,10 +1,11 @@
 from typing import Optional
 
+from sqlalchemy import String
 from sqlmodel import Field, SQLModel
 
 
 class CategoryBase(SQLModel):
-    name: str
+    name: str = Field(max_length=255, sa_type=String(255))
     parent_category_id: Optional[int] = Field(default=None, foreign_key="quantum_category.category_id")
     portfolio_id: int = Field(foreign_key="quantum_portfolio.portfolio_id")
 
@@ -32,5 +33,5 @@ class CategoryRead(CategoryBase):
 
 
 class CategoryUpdate(SQLModel):
-    name: Optional[str] = None
+    name: Optional[str] = Field(default=None, max_length=255)
     parent_category_id: Optional[int] = None
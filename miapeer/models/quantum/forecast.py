@@ -0,0 +1,24 @@
+from datetime import date
+from typing import Literal
+
+from sqlmodel import SQLModel
+
+ForecastInterval = Literal["daily", "weekly"]
+
+
+class BalanceForecastRead(SQLModel):
+    balances: list[int]  # One per date in the portfolio forecast
+    lowest_balance: int  # Lowest daily balance over the whole forecast
+    lowest_balance_date: date
+
+
+class AccountForecastRead(BalanceForecastRead):
+    account_id: int
+
+
+class PortfolioForecastRead(SQLModel):
+    portfolio_id: int
+    interval: ForecastInterval
+    dates: list[date]
+    accounts: list[AccountForecastRead]
+    total: BalanceForecastRead
@@ -1,10 +1,11 @@
 from typing import Optional
 
+from sqlalchemy import String
 from sqlmodel import Field, SQLModel
 
 
 class PayeeBase(SQLModel):
-    name: str
+    name: str = Field(max_length=255, sa_type=String(255))
     portfolio_id: int = Field(foreign_key="quantum_portfolio.portfolio_id")
 
 
@@ -29,4 +30,4 @@ class PayeeRead(PayeeBase):
 
 
 class PayeeUpdate(SQLModel):
-    name: Optional[str]
+    name: Optional[str] = Field(max_length=255)
@@ -45,6 +45,11 @@ class TransactionRead(TransactionBase):
     forecast_from_scheduled_transaction_id: Optional[int] = None
 
 
+class TransactionPage(SQLModel):
+    transactions: list[TransactionRead]
+    next_cursor: Optional[str] = None
+
+
 class TransactionUpdate(SQLModel):
     transaction_type_id: Optional[int] = None
     transaction_type_name: Optional[str] = None
@@ -1,19 +1,41 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
-from typing import Optional
+from os import environ as env
+from typing import Callable, Optional, TypeVar
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from passlib.context import CryptContext
-from sqlmodel import Session, select
-
-from miapeer.auth.jwt import encode_jwt
-from miapeer.dependencies import get_db, get_jwk
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from miapeer.auth.jwt import TokenData, encode_jwt
+from miapeer.dependencies import (
+    add_authorization_claims,
+    get_db,
+    get_jwk,
+    invalidate_user_cache,
+    use_token_claims,
+)
 from miapeer.models.miapeer import Token, User
 
 DEFAULT_JWT_ALGORITHM = "HS256"
+DEFAULT_BCRYPT_ROUNDS = 12
+DEFAULT_PASSWORD_HASH_WORKERS = 2
+
+T = TypeVar("T")
 
 # TODO: Need salt?   https://auth0.com/blog/hashing-in-action-understanding-bcrypt/
-_pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashes made with a different number of rounds are flagged by passlib and upgraded on the next login
+_pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=int(env.get("BCRYPT_ROUNDS", DEFAULT_BCRYPT_ROUNDS)))
+
+# bcrypt releases the GIL, so a small dedicated pool keeps hashing off the event loop without
+# starving the default executor that FastAPI uses for sync dependencies
+_password_executor = ThreadPoolExecutor(
+    max_workers=int(env.get("PASSWORD_HASH_WORKERS", DEFAULT_PASSWORD_HASH_WORKERS)),
+    thread_name_prefix="password-hash",
+)
 
 router = APIRouter(
     prefix="/miapeer/v1/auth",
@@ -22,31 +44,38 @@ router = APIRouter(
 )
 
 
-def _verify_password(plain_password: str, hashed_password: str) -> bool:
-    pw_verified = _pwd_context.verify(
-        plain_password,
-        hashed_password,
-    )
+async def _run_in_password_pool(func: Callable[..., T], *args: str) -> T:
+    return await asyncio.get_running_loop().run_in_executor(_password_executor, func, *args)
+
 
-    # if not pw_verified:
-    #     print(f"\n{get_password_hash(plain_password) = }\n")
+async def _verify_password(plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    """Returns whether the password matched and, if the stored hash is outdated, a replacement hash"""
 
-    return pw_verified
+    return await _run_in_password_pool(_pwd_context.verify_and_update, plain_password, hashed_password)
 
 
-def get_password_hash(password: str) -> str:
-    return _pwd_context.hash(password)  # pragma: no cover
+async def get_password_hash(password: str) -> str:
+    return await _run_in_password_pool(_pwd_context.hash, password)
 
 
-def _authenticate_user(db: Session, username: str, password: str) -> Optional[User]:
-    user = db.exec(select(User).where(User.email == username)).one_or_none()
+async def _authenticate_user(db: AsyncSession, username: str, password: str) -> Optional[User]:
+    user = (await db.exec(select(User).where(User.email == username))).one_or_none()
 
     if user is None:
         return None
 
-    if not _verify_password(password, user.password):
+    pw_verified, new_hash = await _verify_password(password, user.password)
+
+    if not pw_verified:
         return None
 
+    if new_hash:
+        user.password = new_hash
+        db.add(user)
+        await db.commit()
+        await db.refresh(user)
+        invalidate_user_cache(user.email)
+
     return user
 
 
@@ -54,9 +83,9 @@ def _authenticate_user(db: Session, username: str, password: str) -> Optional[Us
 # TODO: If something does need to be changed, difference between SSL and TLS?
 @router.post("/token")
 async def login_for_access_token(
-    form_data: OAuth2PasswordRequestForm = Depends(), jwk: str = Depends(get_jwk), db: Session = Depends(get_db)
+    form_data: OAuth2PasswordRequestForm = Depends(), jwk: str = Depends(get_jwk), db: AsyncSession = Depends(get_db)
 ) -> Token:
-    user = _authenticate_user(db, form_data.username, form_data.password)
+    user = await _authenticate_user(db, form_data.username, form_data.password)
 
     if not user:
         raise HTTPException(
@@ -69,6 +98,11 @@ async def login_for_access_token(
 
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
 
-    access_token = encode_jwt(jwt_key=jwk, data={"sub": user.email, "exp": 0}, expires_delta=access_token_expires)
+    token_data: TokenData = {"sub": user.email, "exp": 0}
+
+    if use_token_claims():
+        await add_authorization_claims(db=db, user=user, token_data=token_data)
+
+    access_token = encode_jwt(jwt_key=jwk, data=token_data, expires_delta=access_token_expires)
 
     return Token(access_token=access_token, token_type="bearer")
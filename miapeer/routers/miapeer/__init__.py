@@ -3,6 +3,7 @@ from fastapi import APIRouter
 from miapeer.routers.miapeer import (
     application,
     application_role,
+    database,
     permission,
     role,
     user,
@@ -18,3 +19,4 @@ router.include_router(role.router)
 router.include_router(application_role.router)
 router.include_router(user.router)
 router.include_router(permission.router)
+router.include_router(database.router)
@@ -1,7 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import asc, select
 
-from miapeer.dependencies import DbSession, is_miapeer_super_user
+from miapeer.dependencies import (
+    DbSession,
+    advance_permissions_version,
+    invalidate_permission_cache,
+    is_miapeer_super_user,
+)
 from miapeer.models.miapeer import (
     Application,
     ApplicationCreate,
@@ -20,7 +25,7 @@ router = APIRouter(
 async def get_all_applications(
     db: DbSession,
 ) -> list[ApplicationRead]:
-    applications = db.exec(select(Application).order_by(asc(Application.name))).all()
+    applications = (await db.exec(select(Application).order_by(asc(Application.name)))).all()
     return [ApplicationRead.model_validate(application) for application in applications]
 
 
@@ -35,14 +40,16 @@ async def create_application(
     db_application = Application.model_validate(application)
     db.add(db_application)
     # TODO: Add application roles
-    db.commit()
-    db.refresh(db_application)
+    await advance_permissions_version(db)
+    await db.commit()
+    invalidate_permission_cache()
+    await db.refresh(db_application)
     return ApplicationRead.model_validate(db_application)
 
 
 @router.get("/{application_id}")
 async def get_application(db: DbSession, application_id: int) -> ApplicationRead:
-    application = db.get(Application, application_id)
+    application = await db.get(Application, application_id)
     if not application:
         raise HTTPException(status_code=404, detail="Application not found")
     return ApplicationRead.model_validate(application)
@@ -50,11 +57,13 @@ async def get_application(db: DbSession, application_id: int) -> ApplicationRead
 
 @router.delete("/{application_id}", dependencies=[Depends(is_miapeer_super_user)])
 async def delete_application(db: DbSession, application_id: int) -> dict[str, bool]:
-    application = db.get(Application, application_id)
+    application = await db.get(Application, application_id)
     if not application:
         raise HTTPException(status_code=404, detail="Application not found")
-    db.delete(application)
-    db.commit()
+    await db.delete(application)
+    await advance_permissions_version(db)
+    await db.commit()
+    invalidate_permission_cache()
     return {"ok": True}
 
 
@@ -67,7 +76,7 @@ async def update_application(
     application_id: int,
     application: ApplicationUpdate,
 ) -> ApplicationRead:
-    db_application = db.get(Application, application_id)
+    db_application = await db.get(Application, application_id)
 
     if not db_application:
         raise HTTPException(status_code=404, detail="Application not found")
@@ -75,7 +84,9 @@ async def update_application(
     updated_application = Application.model_validate(db_application.model_dump(), update=application.model_dump())
 
     db.add(updated_application)
-    db.commit()
-    db.refresh(updated_application)
+    await advance_permissions_version(db)
+    await db.commit()
+    invalidate_permission_cache()
+    await db.refresh(updated_application)
 
     return ApplicationRead.model_validate(updated_application)
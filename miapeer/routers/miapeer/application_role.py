@@ -1,7 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import select
 
-from miapeer.dependencies import DbSession, is_miapeer_super_user
+from miapeer.dependencies import (
+    DbSession,
+    advance_permissions_version,
+    invalidate_permission_cache,
+    is_miapeer_super_user,
+)
 from miapeer.models.miapeer import (
     ApplicationRole,
     ApplicationRoleCreate,
@@ -21,7 +26,7 @@ router = APIRouter(
 async def get_all_application_roles(
     db: DbSession,
 ) -> list[ApplicationRoleRead]:
-    application_roles = db.exec(select(ApplicationRole)).all()
+    application_roles = (await db.exec(select(ApplicationRole))).all()
     return [ApplicationRoleRead.model_validate(application_role) for application_role in application_roles]
 
 
@@ -34,15 +39,17 @@ async def create_application_role(
     db_application_role = ApplicationRole.model_validate(application_role)
 
     db.add(db_application_role)
-    db.commit()
-    db.refresh(db_application_role)
+    await advance_permissions_version(db)
+    await db.commit()
+    invalidate_permission_cache()
+    await db.refresh(db_application_role)
 
     return ApplicationRoleRead.model_validate(db_application_role)
 
 
 @router.get("/{application_role_id}")
 async def get_application_role(db: DbSession, application_role_id: int) -> ApplicationRoleRead:
-    application_role = db.get(ApplicationRole, application_role_id)
+    application_role = await db.get(ApplicationRole, application_role_id)
     if not application_role:
         raise HTTPException(status_code=404, detail="Application Role not found")
     return ApplicationRoleRead.model_validate(application_role)
@@ -51,11 +58,13 @@ async def get_application_role(db: DbSession, application_role_id: int) -> Appli
 # TODO: Should this even be exposed?
 @router.delete("/{application_role_id}")
 async def delete_application_role(db: DbSession, application_role_id: int) -> dict[str, bool]:
-    application_role = db.get(ApplicationRole, application_role_id)
+    application_role = await db.get(ApplicationRole, application_role_id)
     if not application_role:
         raise HTTPException(status_code=404, detail="Application Role not found")
-    db.delete(application_role)
-    db.commit()
+    await db.delete(application_role)
+    await advance_permissions_version(db)
+    await db.commit()
+    invalidate_permission_cache()
     return {"ok": True}
 
 
@@ -67,7 +76,7 @@ async def update_application_role(
     application_role_id: int,
     application_role: ApplicationRoleUpdate,
 ) -> ApplicationRoleRead:
-    db_application_role = db.get(ApplicationRole, application_role_id)
+    db_application_role = await db.get(ApplicationRole, application_role_id)
 
     if not db_application_role:
         raise HTTPException(status_code=404, detail="Application Role not found")
@@ -76,7 +85,9 @@ async def update_application_role(
         db_application_role.description = application_role.description
 
     db.add(db_application_role)
-    db.commit()
-    db.refresh(db_application_role)
+    await advance_permissions_version(db)
+    await db.commit()
+    invalidate_permission_cache()
+    await db.refresh(db_application_role)
 
     return ApplicationRoleRead.model_validate(db_application_role)
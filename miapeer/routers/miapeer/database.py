@@ -0,0 +1,27 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends
+
+from miapeer.adapter.database import PoolMetrics, async_engine, get_pool_status
+from miapeer.dependencies import is_miapeer_admin
+from miapeer.models.miapeer import DatabasePoolStatus
+
+router = APIRouter(
+    prefix="/database",
+    tags=["Miapeer: Database"],
+    dependencies=[Depends(is_miapeer_admin)],
+    responses={404: {"description": "Not found"}},
+)
+
+
+@router.get("/pool")
+async def get_database_pool_status(reset_metrics: bool = False) -> DatabasePoolStatus:
+    pool = async_engine.pool
+    status = get_pool_status(pool)
+
+    # Lets the wait times be sampled over a window, e.g. while load testing a particular worker count
+    metrics: Optional[PoolMetrics] = getattr(pool, "metrics", None)
+    if reset_metrics and metrics is not None:
+        metrics.reset()
+
+    return status
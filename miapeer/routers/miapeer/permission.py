@@ -1,7 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import select
 
-from miapeer.dependencies import DbSession, is_miapeer_admin
+from miapeer.dependencies import (
+    DbSession,
+    advance_permissions_version,
+    invalidate_permission_cache,
+    is_miapeer_admin,
+)
 from miapeer.models.miapeer import Permission, PermissionCreate, PermissionRead
 
 router = APIRouter(
@@ -16,7 +21,7 @@ router = APIRouter(
 async def get_all_permissions(
     db: DbSession,
 ) -> list[PermissionRead]:
-    permissions = db.exec(select(Permission)).all()
+    permissions = (await db.exec(select(Permission))).all()
     return [PermissionRead.model_validate(permission) for permission in permissions]
 
 
@@ -28,14 +33,16 @@ async def create_permission(
 ) -> PermissionRead:
     db_permission = Permission.model_validate(permission)
     db.add(db_permission)
-    db.commit()
-    db.refresh(db_permission)
+    await advance_permissions_version(db, permission.user_id)
+    await db.commit()
+    invalidate_permission_cache(permission.user_id)
+    await db.refresh(db_permission)
     return PermissionRead.model_validate(db_permission)
 
 
 @router.get("/{permission_id}")
 async def get_permission(db: DbSession, permission_id: int) -> PermissionRead:
-    permission = db.get(Permission, permission_id)
+    permission = await db.get(Permission, permission_id)
     if not permission:
         raise HTTPException(status_code=404, detail="Permission not found")
     return PermissionRead.model_validate(permission)
@@ -43,9 +50,12 @@ async def get_permission(db: DbSession, permission_id: int) -> PermissionRead:
 
 @router.delete("/{permission_id}")
 async def delete_permission(db: DbSession, permission_id: int) -> dict[str, bool]:
-    permission = db.get(Permission, permission_id)
+    permission = await db.get(Permission, permission_id)
     if not permission:
         raise HTTPException(status_code=404, detail="Permission not found")
-    db.delete(permission)
-    db.commit()
+    user_id = permission.user_id
+    await db.delete(permission)
+    await advance_permissions_version(db, user_id)
+    await db.commit()
+    invalidate_permission_cache(user_id)
     return {"ok": True}
@@ -3,6 +3,8 @@ from sqlmodel import select
 
 from miapeer.dependencies import (
     DbSession,
+    advance_permissions_version,
+    invalidate_permission_cache,
     is_miapeer_admin,
     is_miapeer_super_user,
 )
@@ -22,7 +24,7 @@ router = APIRouter(
 async def get_all_roles(
     db: DbSession,
 ) -> list[RoleRead]:
-    roles = db.exec(select(Role)).all()
+    roles = (await db.exec(select(Role))).all()
     return [RoleRead.model_validate(role) for role in roles]
 
 
@@ -36,8 +38,10 @@ async def create_role(
 ) -> RoleRead:
     db_role = Role.model_validate(role)
     db.add(db_role)
-    db.commit()
-    db.refresh(db_role)
+    await advance_permissions_version(db)
+    await db.commit()
+    invalidate_permission_cache()
+    await db.refresh(db_role)
     return RoleRead.model_validate(db_role)
 
 
@@ -46,7 +50,7 @@ async def create_role(
     dependencies=[Depends(is_miapeer_admin)],
 )
 async def get_role(db: DbSession, role_id: int) -> RoleRead:
-    role = db.get(Role, role_id)
+    role = await db.get(Role, role_id)
     if not role:
         raise HTTPException(status_code=404, detail="Role not found")
     return RoleRead.model_validate(role)
@@ -54,11 +58,13 @@ async def get_role(db: DbSession, role_id: int) -> RoleRead:
 
 @router.delete("/{role_id}", dependencies=[Depends(is_miapeer_super_user)])
 async def delete_role(db: DbSession, role_id: int) -> dict[str, bool]:
-    role = db.get(Role, role_id)
+    role = await db.get(Role, role_id)
     if not role:
         raise HTTPException(status_code=404, detail="Role not found")
-    db.delete(role)
-    db.commit()
+    await db.delete(role)
+    await advance_permissions_version(db)
+    await db.commit()
+    invalidate_permission_cache()
     return {"ok": True}
 
 
@@ -71,13 +77,15 @@ async def update_role(
     role_id: int,
     role: RoleUpdate,
 ) -> RoleRead:
-    db_role = db.get(Role, role_id)
+    db_role = await db.get(Role, role_id)
     if not db_role:
         raise HTTPException(status_code=404, detail="Role not found")
 
     updated_role = Role.model_validate(db_role.model_dump(), update=role.model_dump())
 
     db.add(updated_role)
-    db.commit()
-    db.refresh(updated_role)
+    await advance_permissions_version(db)
+    await db.commit()
+    invalidate_permission_cache()
+    await db.refresh(updated_role)
     return RoleRead.model_validate(updated_role)
@@ -4,6 +4,9 @@ from sqlmodel import select
 from miapeer.dependencies import (
     CurrentUser,
     DbSession,
+    advance_permissions_version,
+    invalidate_permission_cache,
+    invalidate_user_cache,
     is_miapeer_admin,
     is_miapeer_super_user,
 )
@@ -27,8 +30,8 @@ router = APIRouter(
 
 
 @router.get("/me")
-async def who_am_i(current_user: CurrentUser) -> User:
-    return current_user
+async def who_am_i(current_user: CurrentUser) -> UserRead:
+    return UserRead.model_validate(current_user)
 
 
 @router.get(
@@ -38,7 +41,7 @@ async def who_am_i(current_user: CurrentUser) -> User:
 async def get_all_users(
     db: DbSession,
 ) -> list[UserRead]:
-    users = db.exec(select(User)).all()
+    users = (await db.exec(select(User))).all()
     return [UserRead.model_validate(user) for user in users]
 
 
@@ -47,25 +50,28 @@ async def create_user(
     db: DbSession,
     user: UserCreate,
 ) -> UserRead:
-    # Create the user
-    db_user = User.model_validate(user.model_dump(), update={"password": get_password_hash(user.password)})
-
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-
-    # Add Quantum as initial permissions
     application_role_sql = select(ApplicationRole).join(Application).join(Role).where(Application.name == "Quantum").where(Role.name == "User")
-    application_role_found = db.exec(application_role_sql).first()
+    application_role_found = (await db.exec(application_role_sql)).first()
     if not application_role_found:
         raise HTTPException(status_code=404, detail="ApplicationRole not found")
 
+    # Create the user
+    db_user = User.model_validate(user.model_dump(), update={"password": await get_password_hash(user.password)})
+
+    db.add(db_user)
+    await db.flush()  # Need to flush early in order to get the new user's ID
+
     if not db_user.user_id or not application_role_found.application_role_id:
         raise HTTPException(status_code=500, detail="Database inconsistent")
 
+    # Add Quantum as initial permissions
     quantum_permission = Permission(user_id=db_user.user_id, application_role_id=application_role_found.application_role_id)
     db.add(quantum_permission)
-    db.commit()
+
+    # Commit once so that the user is never saved without its permission
+    await db.commit()
+    await db.refresh(db_user)
+    invalidate_permission_cache(db_user.user_id)
 
     return UserRead.model_validate(db_user)
 
@@ -75,7 +81,7 @@ async def create_user(
     dependencies=[Depends(is_miapeer_admin)],
 )
 async def get_user(db: DbSession, user_id: int) -> UserRead:
-    user = db.get(User, user_id)
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return UserRead.model_validate(user)
@@ -83,11 +89,14 @@ async def get_user(db: DbSession, user_id: int) -> UserRead:
 
 @router.delete("/{user_id}", dependencies=[Depends(is_miapeer_super_user)])
 async def delete_user(db: DbSession, user_id: int) -> dict[str, bool]:
-    user = db.get(User, user_id)
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    db.delete(user)
-    db.commit()
+    email = user.email
+    await db.delete(user)
+    await db.commit()
+    invalidate_permission_cache(user_id)
+    invalidate_user_cache(email)
     return {"ok": True}
 
 
@@ -100,15 +109,19 @@ async def update_user(
     user_id: int,
     user: UserUpdate,
 ) -> UserRead:
-    db_user = db.get(User, user_id)
+    db_user = await db.get(User, user_id)
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    password = {"password": get_password_hash(user.password) if user.password else db_user.password}
+    previous_email = db_user.email
+    password = {"password": await get_password_hash(user.password) if user.password else db_user.password}
     updated_user = User.model_validate(db_user.model_dump(), update={**user.model_dump(), **password})
 
     db.add(updated_user)
-    db.commit()
-    db.refresh(updated_user)
+    await advance_permissions_version(db, user_id)
+    await db.commit()
+    invalidate_permission_cache(user_id)
+    invalidate_user_cache(previous_email)
+    await db.refresh(updated_user)
 
     return UserRead.model_validate(updated_user)
@@ -3,18 +3,20 @@ from typing import Optional
 
 from dateutil.relativedelta import relativedelta
 from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import select
+from sqlmodel import col, select
 
 from miapeer.adapter.sql import budget as budget_sql
-from miapeer.dependencies import CurrentActiveUser, DbSession, is_quantum_user
+from miapeer.dependencies import (
+    CurrentPortfolioAccess,
+    DbSession,
+    is_quantum_user,
+)
 from miapeer.models.quantum.budget import (
     Budget,
     BudgetCreate,
     BudgetRead,
     BudgetUpdate,
 )
-from miapeer.models.quantum.portfolio import Portfolio
-from miapeer.models.quantum.portfolio_user import PortfolioUser
 from miapeer.routers.quantum.category import update_category_id_ref
 
 router = APIRouter(
@@ -25,26 +27,30 @@ router = APIRouter(
 )
 
 
-def get_budget_balances(db: DbSession, current_user: CurrentActiveUser, budget: Optional[Budget] = None) -> int:
+async def get_budget_balances(db: DbSession, portfolio_access: CurrentPortfolioAccess, budget: Optional[Budget] = None) -> int:
     limit_date = date(year=date.today().year, month=date.today().month, day=1)
     limit_date -= relativedelta(years=1)
 
     if budget is None:
-        data = db.exec(
-            budget_sql.GET_ALL,  # type: ignore
-            params={
-                "user_id": current_user.user_id,
-                "limit_date": limit_date,
-            },
+        data = (
+            await db.exec(
+                budget_sql.GET_ALL,  # type: ignore
+                params={
+                    "account_ids": portfolio_access.account_ids,
+                    "limit_date": limit_date,
+                },
+            )
         ).all()
     else:
-        data = db.exec(
-            budget_sql.GET_ONE,  # type: ignore
-            params={
-                "budget_id": budget.budget_id,
-                "user_id": current_user.user_id,
-                "limit_date": limit_date,
-            },
+        data = (
+            await db.exec(
+                budget_sql.GET_ONE,  # type: ignore
+                params={
+                    "budget_id": budget.budget_id,
+                    "account_ids": portfolio_access.account_ids,
+                    "limit_date": limit_date,
+                },
+            )
         ).all()
 
     return data
@@ -53,52 +59,50 @@ def get_budget_balances(db: DbSession, current_user: CurrentActiveUser, budget:
 @router.get("")
 async def get_all_budgets(
     db: DbSession,
-    current_user: CurrentActiveUser,
+    portfolio_access: CurrentPortfolioAccess,
 ) -> list[BudgetRead]:
-    sql = select(Budget).join(Portfolio).join(PortfolioUser).where(PortfolioUser.user_id == current_user.user_id)
-    budgets = db.exec(sql).all()
+    sql = select(Budget).where(col(Budget.portfolio_id).in_(portfolio_access.portfolio_ids))
+    budgets = (await db.exec(sql)).all()
 
-    return [BudgetRead.model_validate(budget.model_dump(), update={"data": get_budget_balances(db, current_user, budget)}) for budget in budgets]
+    return [
+        BudgetRead.model_validate(budget.model_dump(), update={"data": await get_budget_balances(db, portfolio_access, budget)}) for budget in budgets
+    ]
 
 
 @router.post("")
 async def create_budget(
     db: DbSession,
-    current_user: CurrentActiveUser,
+    portfolio_access: CurrentPortfolioAccess,
     budget: BudgetCreate,
 ) -> BudgetRead:
 
-    # Get the user's portfolio
-    sql = select(Portfolio).join(PortfolioUser).where(PortfolioUser.user_id == current_user.user_id)
-    portfolio = db.exec(sql).first()
-
-    if not portfolio:
+    if not portfolio_access.has_portfolio(budget.portfolio_id):
         raise HTTPException(status_code=404, detail="Portfolio not found")
 
     # Create the budget
     db_budget = Budget.model_validate(budget)
     db.add(db_budget)
-    db.commit()
-    db.refresh(db_budget)
+    await db.commit()
+    await db.refresh(db_budget)
 
-    budget_balance = get_budget_balances(db, current_user, db_budget)
+    budget_balance = await get_budget_balances(db, portfolio_access, db_budget)
     return BudgetRead.model_validate(db_budget.model_dump(), update={"data": budget_balance})
 
 
 @router.get("/{budget_id}")
 async def get_budget(
     db: DbSession,
-    current_user: CurrentActiveUser,
+    portfolio_access: CurrentPortfolioAccess,
     budget_id: int,
 ) -> BudgetRead:
 
-    sql = select(Budget).join(Portfolio).join(PortfolioUser).where(Budget.budget_id == budget_id).where(PortfolioUser.user_id == current_user.user_id)
-    budget = db.exec(sql).one_or_none()
+    sql = select(Budget).where(Budget.budget_id == budget_id).where(col(Budget.portfolio_id).in_(portfolio_access.portfolio_ids))
+    budget = (await db.exec(sql)).one_or_none()
 
     if not budget:
         raise HTTPException(status_code=404, detail="Budget not found")
 
-    budget_balance = get_budget_balances(db, current_user, budget)
+    budget_balance = await get_budget_balances(db, portfolio_access, budget)
 
     return BudgetRead.model_validate(budget.model_dump(), update={"data": budget_balance})
 
@@ -106,18 +110,18 @@ async def get_budget(
 @router.delete("/{budget_id}")
 async def delete_budget(
     db: DbSession,
-    current_user: CurrentActiveUser,
+    portfolio_access: CurrentPortfolioAccess,
     budget_id: int,
 ) -> dict[str, bool]:
 
-    sql = select(Budget).join(Portfolio).join(PortfolioUser).where(Budget.budget_id == budget_id).where(PortfolioUser.user_id == current_user.user_id)
-    budget = db.exec(sql).one_or_none()
+    sql = select(Budget).where(Budget.budget_id == budget_id).where(col(Budget.portfolio_id).in_(portfolio_access.portfolio_ids))
+    budget = (await db.exec(sql)).one_or_none()
 
     if not budget:
         raise HTTPException(status_code=404, detail="Budget not found")
 
-    db.delete(budget)
-    db.commit()
+    await db.delete(budget)
+    await db.commit()
 
     return {"ok": True}
 
@@ -125,20 +129,20 @@ async def delete_budget(
 @router.patch("/{budget_id}")
 async def update_budget(
     db: DbSession,
-    current_user: CurrentActiveUser,
+    portfolio_access: CurrentPortfolioAccess,
     budget_id: int,
     budget: BudgetUpdate,
 ) -> BudgetRead:
 
-    sql = select(Budget).join(Portfolio).join(PortfolioUser).where(Budget.budget_id == budget_id).where(PortfolioUser.user_id == current_user.user_id)
-    db_budget = db.exec(sql).one_or_none()
+    sql = select(Budget).where(Budget.budget_id == budget_id).where(col(Budget.portfolio_id).in_(portfolio_access.portfolio_ids))
+    db_budget = (await db.exec(sql)).one_or_none()
 
     if not db_budget:
         raise HTTPException(status_code=404, detail="Budget not found")
 
     await update_category_id_ref(
         db=db,
-        current_user=current_user,
+        portfolio_access=portfolio_access,
         object_to_update=db_budget,
         portfolio_id=db_budget.portfolio_id,
         category_id=budget.category_id,
@@ -152,8 +156,8 @@ async def update_budget(
         db_budget.amount = budget.amount
 
     db.add(db_budget)
-    db.commit()
-    db.refresh(db_budget)
+    await db.commit()
+    await db.refresh(db_budget)
 
-    budget_balance = get_budget_balances(db, current_user, db_budget)
+    budget_balance = await get_budget_balances(db, portfolio_access, db_budget)
     return BudgetRead.model_validate(db_budget.model_dump(), update={"data": budget_balance})
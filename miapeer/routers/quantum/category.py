@@ -1,17 +1,19 @@
 from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import select
+from sqlmodel import col, select
 
-from miapeer.dependencies import CurrentActiveUser, DbSession, is_quantum_user
+from miapeer.dependencies import (
+    CurrentPortfolioAccess,
+    DbSession,
+    is_quantum_user,
+)
 from miapeer.models.quantum.category import (
     Category,
     CategoryCreate,
     CategoryRead,
     CategoryUpdate,
 )
-from miapeer.models.quantum.portfolio import Portfolio
-from miapeer.models.quantum.portfolio_user import PortfolioUser
 
 router = APIRouter(
     prefix="/categories",
@@ -21,24 +23,38 @@ router = APIRouter(
 )
 
 
+async def _add_category(db: DbSession, portfolio_access: CurrentPortfolioAccess, category: CategoryCreate) -> Category:
+    if not portfolio_access.has_portfolio(category.portfolio_id):
+        raise HTTPException(status_code=404, detail="Portfolio not found")
+
+    db_category = Category.model_validate(category)
+    db.add(db_category)
+    await db.flush()  # Need to flush early in order to get the new category's ID
+
+    return db_category
+
+
 async def update_category_id_ref(
-    db: DbSession, current_user: CurrentActiveUser, object_to_update, portfolio_id: int, category_id: Optional[int], category_name: Optional[str]
+    db: DbSession,
+    portfolio_access: CurrentPortfolioAccess,
+    object_to_update,
+    portfolio_id: int,
+    category_id: Optional[int],
+    category_name: Optional[str],
 ):
     if category_id is not None:
         category_sql = (
-            select(Category)
-            .join(Portfolio)
-            .join(PortfolioUser)
-            .where(Category.category_id == category_id)
-            .where(PortfolioUser.user_id == current_user.user_id)
+            select(Category).where(Category.category_id == category_id).where(col(Category.portfolio_id).in_(portfolio_access.portfolio_ids))
         )
-        category_found = db.exec(category_sql).first()
+        category_found = (await db.exec(category_sql)).first()
         if category_found:
             object_to_update.category_id = category_found.category_id
         else:
             raise HTTPException(status_code=404, detail="Category not found")
     elif category_name:
-        new_category = await create_category(db=db, current_user=current_user, category=CategoryCreate(portfolio_id=portfolio_id, name=category_name))
+        new_category = await _add_category(
+            db=db, portfolio_access=portfolio_access, category=CategoryCreate(portfolio_id=portfolio_id, name=category_name)
+        )
         if new_category:
             object_to_update.category_id = new_category.category_id
         else:
@@ -50,32 +66,23 @@ async def update_category_id_ref(
 @router.get("")
 async def get_all_categories(
     db: DbSession,
-    current_user: CurrentActiveUser,
+    portfolio_access: CurrentPortfolioAccess,
 ) -> list[CategoryRead]:
-    sql = select(Category).join(Portfolio).join(PortfolioUser).where(PortfolioUser.user_id == current_user.user_id).order_by(Category.name)
-    categories = db.exec(sql).all()
+    sql = select(Category).where(col(Category.portfolio_id).in_(portfolio_access.portfolio_ids)).order_by(Category.name)
+    categories = (await db.exec(sql)).all()
     return [CategoryRead.model_validate(category) for category in categories]
 
 
 @router.post("")
 async def create_category(
     db: DbSession,
-    current_user: CurrentActiveUser,
+    portfolio_access: CurrentPortfolioAccess,
     category: CategoryCreate,
 ) -> CategoryRead:
 
-    # Get the user's portfolio
-    sql = select(Portfolio).join(PortfolioUser).where(PortfolioUser.user_id == current_user.user_id)
-    portfolio = db.exec(sql).first()
-
-    if not portfolio:
-        raise HTTPException(status_code=404, detail="Portfolio not found")
-
-    # Create the category
-    db_category = Category.model_validate(category)
-    db.add(db_category)
-    db.commit()
-    db.refresh(db_category)
+    db_category = await _add_category(db=db, portfolio_access=portfolio_access, category=category)
+    await db.commit()
+    await db.refresh(db_category)
 
     return CategoryRead.model_validate(db_category)
 
@@ -83,18 +90,12 @@ async def create_category(
 @router.get("/{category_id}")
 async def get_category(
     db: DbSession,
-    current_user: CurrentActiveUser,
+    portfolio_access: CurrentPortfolioAccess,
     category_id: int,
 ) -> CategoryRead:
 
-    sql = (
-        select(Category)
-        .join(Portfolio)
-        .join(PortfolioUser)
-        .where(Category.category_id == category_id)
-        .where(PortfolioUser.user_id == current_user.user_id)
-    )
-    category = db.exec(sql).one_or_none()
+    sql = select(Category).where(Category.category_id == category_id).where(col(Category.portfolio_id).in_(portfolio_access.portfolio_ids))
+    category = (await db.exec(sql)).one_or_none()
 
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
@@ -105,24 +106,18 @@ async def get_category(
 @router.delete("/{category_id}")
 async def delete_category(
     db: DbSession,
-    current_user: CurrentActiveUser,
+    portfolio_access: CurrentPortfolioAccess,
     category_id: int,
 ) -> dict[str, bool]:
 
-    sql = (
-        select(Category)
-        .join(Portfolio)
-        .join(PortfolioUser)
-        .where(Category.category_id == category_id)
-        .where(PortfolioUser.user_id == current_user.user_id)
-    )
-    category = db.exec(sql).one_or_none()
+    sql = select(Category).where(Category.category_id == category_id).where(col(Category.portfolio_id).in_(portfolio_access.portfolio_ids))
+    category = (await db.exec(sql)).one_or_none()
 
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
 
-    db.delete(category)
-    db.commit()
+    await db.delete(category)
+    await db.commit()
 
     return {"ok": True}
 
@@ -130,19 +125,13 @@ async def delete_category(
 @router.patch("/{category_id}")
 async def update_category(
     db: DbSession,
-    current_user: CurrentActiveUser,
+    portfolio_access: CurrentPortfolioAccess,
     category_id: int,
     category: CategoryUpdate,
 ) -> CategoryRead:
 
-    sql = (
-        select(Category)
-        .join(Portfolio)
-        .join(PortfolioUser)
-        .where(Category.category_id == category_id)
-        .where(PortfolioUser.user_id == current_user.user_id)
-    )
-    db_category = db.exec(sql).one_or_none()
+    sql = select(Category).where(Category.category_id == category_id).where(col(Category.portfolio_id).in_(portfolio_access.portfolio_ids))
+    db_category = (await db.exec(sql)).one_or_none()
 
     if not db_category:
         raise HTTPException(status_code=404, detail="Category not found")
@@ -153,7 +142,7 @@ async def update_category(
     db_category.parent_category_id = category.parent_category_id
 
     db.add(db_category)
-    db.commit()
-    db.refresh(db_category)
+    await db.commit()
+    await db.refresh(db_category)
 
     return CategoryRead.model_validate(db_category)
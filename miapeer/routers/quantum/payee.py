@@ -1,17 +1,19 @@
 from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import select
+from sqlmodel import col, select
 
-from miapeer.dependencies import CurrentActiveUser, DbSession, is_quantum_user
+from miapeer.dependencies import (
+    CurrentPortfolioAccess,
+    DbSession,
+    is_quantum_user,
+)
 from miapeer.models.quantum.payee import (
     Payee,
     PayeeCreate,
     PayeeRead,
     PayeeUpdate,
 )
-from miapeer.models.quantum.portfolio import Portfolio
-from miapeer.models.quantum.portfolio_user import PortfolioUser
 
 router = APIRouter(
     prefix="/payees",
@@ -21,20 +23,29 @@ router = APIRouter(
 )
 
 
+async def _add_payee(db: DbSession, portfolio_access: CurrentPortfolioAccess, payee: PayeeCreate) -> Payee:
+    if not portfolio_access.has_portfolio(payee.portfolio_id):
+        raise HTTPException(status_code=404, detail="Portfolio not found")
+
+    db_payee = Payee.model_validate(payee)
+    db.add(db_payee)
+    await db.flush()  # Need to flush early in order to get the new payee's ID
+
+    return db_payee
+
+
 async def update_payee_id_ref(
-    db: DbSession, current_user: CurrentActiveUser, object_to_update, portfolio_id: int, payee_id: Optional[int], payee_name: Optional[str]
+    db: DbSession, portfolio_access: CurrentPortfolioAccess, object_to_update, portfolio_id: int, payee_id: Optional[int], payee_name: Optional[str]
 ):
     if payee_id is not None:
-        payee_sql = (
-            select(Payee).join(Portfolio).join(PortfolioUser).where(Payee.payee_id == payee_id).where(PortfolioUser.user_id == current_user.user_id)
-        )
-        payee_found = db.exec(payee_sql).first()
+        payee_sql = select(Payee).where(Payee.payee_id == payee_id).where(col(Payee.portfolio_id).in_(portfolio_access.portfolio_ids))
+        payee_found = (await db.exec(payee_sql)).first()
         if payee_found:
             object_to_update.payee_id = payee_found.payee_id
         else:
             raise HTTPException(status_code=404, detail="Payee not found")
     elif payee_name:
-        new_payee = await create_payee(db=db, current_user=current_user, payee=PayeeCreate(portfolio_id=portfolio_id, name=payee_name))
+        new_payee = await _add_payee(db=db, portfolio_access=portfolio_access, payee=PayeeCreate(portfolio_id=portfolio_id, name=payee_name))
         if new_payee:
             object_to_update.payee_id = new_payee.payee_id
         else:
@@ -46,32 +57,23 @@ async def update_payee_id_ref(
 @router.get("")
 async def get_all_payees(
     db: DbSession,
-    current_user: CurrentActiveUser,
+    portfolio_access: CurrentPortfolioAccess,
 ) -> list[PayeeRead]:
-    sql = select(Payee).join(Portfolio).join(PortfolioUser).where(PortfolioUser.user_id == current_user.user_id).order_by(Payee.name)
-    payees = db.exec(sql).all()
+    sql = select(Payee).where(col(Payee.portfolio_id).in_(portfolio_access.portfolio_ids)).order_by(Payee.name)
+    payees = (await db.exec(sql)).all()
     return [PayeeRead.model_validate(payee) for payee in payees]
 
 
 @router.post("")
 async def create_payee(
     db: DbSession,
-    current_user: CurrentActiveUser,
+    portfolio_access: CurrentPortfolioAccess,
     payee: PayeeCreate,
 ) -> PayeeRead:
 
-    # Get the user's portfolio
-    sql = select(Portfolio).join(PortfolioUser).where(PortfolioUser.user_id == current_user.user_id)
-    portfolio = db.exec(sql).first()
-
-    if not portfolio:
-        raise HTTPException(status_code=404, detail="Portfolio not found")
-
-    # Create the payee
-    db_payee = Payee.model_validate(payee)
-    db.add(db_payee)
-    db.commit()
-    db.refresh(db_payee)
+    db_payee = await _add_payee(db=db, portfolio_access=portfolio_access, payee=payee)
+    await db.commit()
+    await db.refresh(db_payee)
 
     return PayeeRead.model_validate(db_payee)
 
@@ -79,12 +81,12 @@ async def create_payee(
 @router.get("/{payee_id}")
 async def get_payee(
     db: DbSession,
-    current_user: CurrentActiveUser,
+    portfolio_access: CurrentPortfolioAccess,
     payee_id: int,
 ) -> PayeeRead:
 
-    sql = select(Payee).join(Portfolio).join(PortfolioUser).where(Payee.payee_id == payee_id).where(PortfolioUser.user_id == current_user.user_id)
-    payee = db.exec(sql).one_or_none()
+    sql = select(Payee).where(Payee.payee_id == payee_id).where(col(Payee.portfolio_id).in_(portfolio_access.portfolio_ids))
+    payee = (await db.exec(sql)).one_or_none()
 
     if not payee:
         raise HTTPException(status_code=404, detail="Payee not found")
@@ -95,18 +97,18 @@ async def get_payee(
 @router.delete("/{payee_id}")
 async def delete_payee(
     db: DbSession,
-    current_user: CurrentActiveUser,
+    portfolio_access: CurrentPortfolioAccess,
     payee_id: int,
 ) -> dict[str, bool]:
 
-    sql = select(Payee).join(Portfolio).join(PortfolioUser).where(Payee.payee_id == payee_id).where(PortfolioUser.user_id == current_user.user_id)
-    payee = db.exec(sql).one_or_none()
+    sql = select(Payee).where(Payee.payee_id == payee_id).where(col(Payee.portfolio_id).in_(portfolio_access.portfolio_ids))
+    payee = (await db.exec(sql)).one_or_none()
 
     if not payee:
         raise HTTPException(status_code=404, detail="Payee not found")
 
-    db.delete(payee)
-    db.commit()
+    await db.delete(payee)
+    await db.commit()
 
     return {"ok": True}
 
@@ -114,13 +116,13 @@ async def delete_payee(
 @router.patch("/{payee_id}")
 async def update_payee(
     db: DbSession,
-    current_user: CurrentActiveUser,
+    portfolio_access: CurrentPortfolioAccess,
     payee_id: int,
     payee: PayeeUpdate,
 ) -> PayeeRead:
 
-    sql = select(Payee).join(Portfolio).join(PortfolioUser).where(Payee.payee_id == payee_id).where(PortfolioUser.user_id == current_user.user_id)
-    db_payee = db.exec(sql).one_or_none()
+    sql = select(Payee).where(Payee.payee_id == payee_id).where(col(Payee.portfolio_id).in_(portfolio_access.portfolio_ids))
+    db_payee = (await db.exec(sql)).one_or_none()
 
     if not db_payee:
         raise HTTPException(status_code=404, detail="Payee not found")
@@ -129,7 +131,7 @@ async def update_payee(
         db_payee.name = payee.name
 
     db.add(db_payee)
-    db.commit()
-    db.refresh(db_payee)
+    await db.commit()
+    await db.refresh(db_payee)
 
     return PayeeRead.model_validate(db_payee)
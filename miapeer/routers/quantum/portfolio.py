@@ -1,18 +1,38 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import select
+from datetime import date
+from typing import Annotated, Iterator
 
+from dateutil.relativedelta import relativedelta
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlmodel import col, func, select
+
+from miapeer.adapter.balance_forecast import (
+    BalanceEntry,
+    project_daily_balances,
+    sample_balances,
+)
 from miapeer.dependencies import (
     CurrentActiveUser,
+    CurrentPortfolioAccess,
     DbSession,
     is_quantum_super_user,
     is_quantum_user,
 )
+from miapeer.models.quantum.account import Account
+from miapeer.models.quantum.forecast import (
+    AccountForecastRead,
+    BalanceForecastRead,
+    ForecastInterval,
+    PortfolioForecastRead,
+)
 from miapeer.models.quantum.portfolio import (
     Portfolio,
     PortfolioCreate,
     PortfolioRead,
 )
 from miapeer.models.quantum.portfolio_user import PortfolioUser
+from miapeer.models.quantum.scheduled_transaction import ScheduledTransaction
+from miapeer.models.quantum.transaction import Transaction
+from miapeer.routers.quantum import scheduled_transaction
 
 router = APIRouter(
     prefix="/portfolios",
@@ -20,14 +40,18 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+DEFAULT_FORECAST_HORIZON_MONTHS = 24
+MAX_FORECAST_HORIZON_MONTHS = 120
+FORECAST_INTERVAL_DAYS: dict[ForecastInterval, int] = {"daily": 1, "weekly": 7}
+
 
 @router.get("", dependencies=[Depends(is_quantum_user)])
 async def get_all_portfolios(
     db: DbSession,
-    current_user: CurrentActiveUser,
+    portfolio_access: CurrentPortfolioAccess,
 ) -> list[PortfolioRead]:
-    sql = select(Portfolio).join(PortfolioUser).where(PortfolioUser.user_id == current_user.user_id)
-    portfolios = db.exec(sql).all()
+    sql = select(Portfolio).where(col(Portfolio.portfolio_id).in_(portfolio_access.portfolio_ids))
+    portfolios = (await db.exec(sql)).all()
     return [PortfolioRead.model_validate(portfolio) for portfolio in portfolios]
 
 
@@ -41,8 +65,7 @@ async def create_portfolio(
     # Create the portfolio
     db_portfolio = Portfolio.model_validate(portfolio)
     db.add(db_portfolio)
-    db.commit()
-    db.refresh(db_portfolio)
+    await db.flush()  # Need to flush early in order to get the new portfolio's ID
 
     if not db_portfolio.portfolio_id:
         raise HTTPException(status_code=404, detail="Invalid portfolio ID")
@@ -53,7 +76,10 @@ async def create_portfolio(
     # Assign the current user to the portfolio
     new_portfolio_user = PortfolioUser(portfolio_id=db_portfolio.portfolio_id, user_id=current_user.user_id)
     db.add(new_portfolio_user)
-    db.commit()
+
+    # Commit once so that the portfolio is never saved without its user
+    await db.commit()
+    await db.refresh(db_portfolio)
 
     return PortfolioRead.model_validate(db_portfolio)
 
@@ -61,12 +87,11 @@ async def create_portfolio(
 @router.get("/{portfolio_id}", dependencies=[Depends(is_quantum_user)])
 async def get_portfolio(
     db: DbSession,
-    current_user: CurrentActiveUser,
+    portfolio_access: CurrentPortfolioAccess,
     portfolio_id: int,
 ) -> PortfolioRead:
 
-    sql = select(Portfolio).join(PortfolioUser).where(Portfolio.portfolio_id == portfolio_id).where(PortfolioUser.user_id == current_user.user_id)
-    portfolio = db.exec(sql).one_or_none()
+    portfolio = await db.get(Portfolio, portfolio_id) if portfolio_access.has_portfolio(portfolio_id) else None
 
     if not portfolio:
         raise HTTPException(status_code=404, detail="Portfolio not found")
@@ -76,18 +101,97 @@ async def get_portfolio(
 
 @router.delete("/{portfolio_id}", dependencies=[Depends(is_quantum_super_user)])
 async def delete_portfolio(db: DbSession, portfolio_id: int) -> dict[str, bool]:
-    portfolio = db.get(Portfolio, portfolio_id)
+    portfolio = await db.get(Portfolio, portfolio_id)
 
     sql = select(PortfolioUser).where(PortfolioUser.portfolio_id == portfolio_id)
-    portfolio_users = db.exec(sql).all()
+    portfolio_users = (await db.exec(sql)).all()
 
     if not portfolio:
         raise HTTPException(status_code=404, detail="Portfolio not found")
 
-    db.delete(portfolio)
+    await db.delete(portfolio)
     for portfolio_user in portfolio_users:
-        db.delete(portfolio_user)
+        await db.delete(portfolio_user)
 
-    db.commit()
+    await db.commit()
 
     return {"ok": True}
+
+
+@router.get("/{portfolio_id}/forecast", dependencies=[Depends(is_quantum_user)])
+async def get_portfolio_forecast(
+    db: DbSession,
+    portfolio_access: CurrentPortfolioAccess,
+    portfolio_id: int,
+    horizon_months: Annotated[int, Query(ge=1, le=MAX_FORECAST_HORIZON_MONTHS)] = DEFAULT_FORECAST_HORIZON_MONTHS,
+    interval: ForecastInterval = "daily",
+) -> PortfolioForecastRead:
+    """Every account's projected balance from today to the end of the horizon, along with the portfolio's total.
+
+    The projection includes the transactions already entered for future dates and every scheduled transaction's forecast.
+    """
+
+    if not portfolio_access.has_portfolio(portfolio_id):
+        raise HTTPException(status_code=404, detail="Portfolio not found")
+
+    start_date = date.today()
+    end_date = start_date + relativedelta(months=horizon_months)
+
+    sql = select(Account).where(Account.portfolio_id == portfolio_id).order_by(Account.account_id)  # type: ignore
+    accounts = (await db.exec(sql)).all()
+    account_indices = {account.account_id: index for index, account in enumerate(accounts)}
+
+    # The current balance already includes transactions entered for future dates, so those come back out of the opening
+    # balance and go in again on their own dates
+    future_sql = (
+        select(Transaction.account_id, Transaction.transaction_date, func.sum(Transaction.amount))
+        .where(col(Transaction.account_id).in_(list(account_indices)))
+        .where(Transaction.transaction_date > start_date)
+        .group_by(Transaction.account_id, Transaction.transaction_date)
+    )
+    future_transactions = [
+        BalanceEntry(account_indices[account_id], transaction_date, amount)
+        for account_id, transaction_date, amount in (await db.exec(future_sql)).all()  # type: ignore
+    ]
+
+    opening_balances = [account.current_balance for account in accounts]
+    for future_transaction in future_transactions:
+        opening_balances[future_transaction.account_index] -= future_transaction.amount
+
+    sql = select(ScheduledTransaction).where(col(ScheduledTransaction.account_id).in_(list(account_indices)))
+    scheduled_transactions = (await db.exec(sql)).all()
+    next_iterations = await scheduled_transaction.iterate_next_iterations_for_all(
+        db=db, scheduled_transactions=scheduled_transactions, override_end_date=end_date
+    )
+
+    def forecast_entries() -> Iterator[BalanceEntry]:
+        yield from future_transactions
+
+        for occurrences in next_iterations.values():
+            for occurrence in occurrences:
+                yield BalanceEntry(account_indices[occurrence.schedule.account_id], occurrence.transaction_date, occurrence.amount)
+
+    daily_balances = project_daily_balances(opening_balances=opening_balances, start=start_date, end=end_date, entries=forecast_entries())
+
+    series = sample_balances(daily_balances, start=start_date, interval_days=FORECAST_INTERVAL_DAYS[interval])
+    total = sample_balances(daily_balances.sum(axis=0, keepdims=True), start=start_date, interval_days=FORECAST_INTERVAL_DAYS[interval])
+
+    return PortfolioForecastRead(
+        portfolio_id=portfolio_id,
+        interval=interval,
+        dates=series.dates,
+        accounts=[
+            AccountForecastRead(
+                account_id=account.account_id or 0,
+                balances=series.balances[index].tolist(),
+                lowest_balance=int(series.lowest_balances[index]),
+                lowest_balance_date=series.lowest_balance_dates[index],
+            )
+            for index, account in enumerate(accounts)
+        ],
+        total=BalanceForecastRead(
+            balances=total.balances[0].tolist(),
+            lowest_balance=int(total.lowest_balances[0]),
+            lowest_balance_date=total.lowest_balance_dates[0],
+        ),
+    )
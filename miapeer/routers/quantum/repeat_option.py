@@ -1,25 +1,67 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import asc, select
+from os import environ as env
+from typing import Annotated, Optional
 
-from miapeer.dependencies import DbSession, is_quantum_user
-from miapeer.models.quantum.repeat_option import RepeatOption, RepeatOptionRead
-from miapeer.models.quantum.repeat_unit import RepeatUnit, RepeatUnitRead
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+
+from miapeer.adapter.repeat_option_registry import (
+    RepeatOptionRegistry,
+    get_repeat_option_registry,
+    load_repeat_option_registry,
+)
+from miapeer.dependencies import (
+    DbSession,
+    is_quantum_super_user,
+    is_quantum_user,
+)
+from miapeer.models.quantum.repeat_option import RepeatOptionRead
+from miapeer.models.quantum.repeat_unit import RepeatUnitRead
+
+DEFAULT_REPEAT_OPTIONS_MAX_AGE_SECONDS = 86400
+
+# The options only change on a refresh, and the ETag lets clients revalidate cheaply once max-age has passed
+REPEAT_OPTIONS_CACHE_CONTROL = f"private, max-age={int(env.get('REPEAT_OPTIONS_MAX_AGE_SECONDS', DEFAULT_REPEAT_OPTIONS_MAX_AGE_SECONDS))}"
 
 router = APIRouter(
     prefix="/repeat-options",
     tags=["Quantum: Repeat Options"],
-    dependencies=[Depends(is_quantum_user)],
     responses={404: {"description": "Not found"}},
 )
 
 
-@router.get("")
+def _set_cache_headers(response: Response, registry: RepeatOptionRegistry) -> None:
+    response.headers["Cache-Control"] = REPEAT_OPTIONS_CACHE_CONTROL
+    response.headers["ETag"] = registry.etag
+
+
+@router.get("", response_model=list[RepeatOptionRead], dependencies=[Depends(is_quantum_user)])
 async def get_all_repeat_options(
     db: DbSession,
+    response: Response,
+    if_none_match: Annotated[Optional[str], Header()] = None,
+) -> Response | list[RepeatOptionRead]:
+    registry = await get_repeat_option_registry(db)
+
+    if if_none_match == registry.etag:
+        not_modified = Response(status_code=status.HTTP_304_NOT_MODIFIED)
+        _set_cache_headers(not_modified, registry)
+        return not_modified
+
+    _set_cache_headers(response, registry)
+    return list(registry.repeat_options)
+
+
+@router.post("/refresh", dependencies=[Depends(is_quantum_super_user)])
+async def refresh_repeat_options(
+    db: DbSession,
 ) -> list[RepeatOptionRead]:
-    sql = select(RepeatOption).order_by(asc(RepeatOption.order_index))
-    repeat_options = db.exec(sql).all()
-    return [RepeatOptionRead.model_validate(repeat_option) for repeat_option in repeat_options]
+    """Reloads the repeat options in the process handling the request.
+
+    Every other process keeps serving its own copy, along with that copy's ETag, until it reloads on its own within
+    REPEAT_OPTION_REGISTRY_TTL_SECONDS.
+    """
+
+    registry = await load_repeat_option_registry(db)
+    return list(registry.repeat_options)
 
 
 async def get_repeat_option(
@@ -27,13 +69,12 @@ async def get_repeat_option(
     repeat_option_id: int,
 ) -> RepeatOptionRead:
 
-    sql = select(RepeatOption).where(RepeatOption.repeat_option_id == repeat_option_id)
-    repeat_option = db.exec(sql).one_or_none()
+    repeat_option = (await get_repeat_option_registry(db)).get_repeat_option(repeat_option_id)
 
     if not repeat_option:
         raise HTTPException(status_code=404, detail="Repeat Option not found")
 
-    return RepeatOptionRead.model_validate(repeat_option)
+    return repeat_option
 
 
 async def get_repeat_unit(
@@ -41,10 +82,9 @@ async def get_repeat_unit(
     repeat_unit_id: int,
 ) -> RepeatUnitRead:
 
-    sql = select(RepeatUnit).where(RepeatUnit.repeat_unit_id == repeat_unit_id)
-    repeat_unit = db.exec(sql).one_or_none()
+    repeat_unit = (await get_repeat_option_registry(db)).get_repeat_unit(repeat_unit_id)
 
     if not repeat_unit:
         raise HTTPException(status_code=404, detail="Repeat Unit not found")
 
-    return RepeatUnitRead.model_validate(repeat_unit)
+    return repeat_unit
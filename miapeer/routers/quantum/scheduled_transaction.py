@@ -1,17 +1,21 @@
+from collections import defaultdict
 from datetime import date
 from enum import Enum
-from typing import Optional
+from itertools import islice
+from typing import Iterator, Optional, Sequence
 
-from dateutil.relativedelta import relativedelta
 from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import select
-
-from miapeer.dependencies import CurrentActiveUser, DbSession, is_quantum_user
-from miapeer.models.quantum.account import Account
-from miapeer.models.quantum.portfolio import Portfolio
-from miapeer.models.quantum.portfolio_user import PortfolioUser
-from miapeer.models.quantum.repeat_option import RepeatOptionRead
-from miapeer.models.quantum.repeat_unit import RepeatUnitRead
+from sqlmodel import col, func, or_, select
+
+from miapeer.adapter.account_balance import adjust_account_balances
+from miapeer.adapter.forecast import ForecastOccurrence
+from miapeer.adapter.recurrence import Recurrence, compile_recurrence
+from miapeer.adapter.transaction_summary import adjust_transaction_summaries
+from miapeer.dependencies import (
+    CurrentPortfolioAccess,
+    DbSession,
+    is_quantum_user,
+)
 from miapeer.models.quantum.scheduled_transaction import (
     ScheduledTransaction,
     ScheduledTransactionCreate,
@@ -40,6 +44,7 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+# Only bounds a schedule with neither an end date nor a limit of its own
 MAX_LIMIT = 100
 MAX_END_DATE = date(year=9999, month=1, day=1)
 
@@ -50,34 +55,30 @@ class AmountTrend(Enum):
     AVERAGE = 2
 
 
-async def _get_next_transaction(db: DbSession, scheduled_transaction: ScheduledTransaction) -> Optional[TransactionRead]:
-    next_transactions = await get_next_iterations(db=db, scheduled_transaction=scheduled_transaction, override_limit=1)
+def _as_next_transaction(next_iterations: list[ForecastOccurrence]) -> Optional[TransactionRead]:
+    return next_iterations[0].to_transaction_read(linked_to_schedule=False) if next_iterations else None
 
-    next_transaction = None
-    if next_transactions:
-        next_transaction = TransactionRead.model_validate(next_transactions[0].model_dump(), update={"transaction_id": 0})
 
-    return next_transaction
+async def _get_next_transaction(db: DbSession, scheduled_transaction: ScheduledTransaction) -> Optional[TransactionRead]:
+    return _as_next_transaction(await get_next_iterations(db=db, scheduled_transaction=scheduled_transaction, override_limit=1))
 
 
 @router.get("")
 async def get_all_scheduled_transactions(
     db: DbSession,
-    current_user: CurrentActiveUser,
+    portfolio_access: CurrentPortfolioAccess,
     account_id: int,
 ) -> list[ScheduledTransactionRead]:
-    sql = (
-        select(ScheduledTransaction)
-        .join(Account, Account.account_id == ScheduledTransaction.account_id)  # type: ignore
-        .join(Portfolio)
-        .join(PortfolioUser)
-        .where(ScheduledTransaction.account_id == account_id)
-        .where(PortfolioUser.user_id == current_user.user_id)
-    )
-    scheduled_transactions = db.exec(sql).all()
+    if not portfolio_access.has_account(account_id):
+        return []
+
+    sql = select(ScheduledTransaction).where(ScheduledTransaction.account_id == account_id)
+    scheduled_transactions = (await db.exec(sql)).all()
+    next_iterations = await get_next_iterations_for_all(db=db, scheduled_transactions=scheduled_transactions, override_limit=1)
     return [
         ScheduledTransactionRead.model_validate(
-            scheduled_transaction.model_dump(), update={"next_transaction": await _get_next_transaction(db, scheduled_transaction)}
+            scheduled_transaction.model_dump(),
+            update={"next_transaction": _as_next_transaction(next_iterations[scheduled_transaction.scheduled_transaction_id or 0])},
         )
         for scheduled_transaction in scheduled_transactions
     ]
@@ -86,46 +87,38 @@ async def get_all_scheduled_transactions(
 @router.post("")
 async def create_scheduled_transaction(
     db: DbSession,
-    current_user: CurrentActiveUser,
+    portfolio_access: CurrentPortfolioAccess,
     account_id: int,
     scheduled_transaction: ScheduledTransactionCreate,
 ) -> ScheduledTransactionRead:
 
-    # Get the user's data to verify access
-    account_sql = (
-        select(Account)
-        .join(Portfolio)
-        .join(PortfolioUser)
-        .where(Account.account_id == account_id)
-        .where(PortfolioUser.user_id == current_user.user_id)
-    )
-    account_found = db.exec(account_sql).first()
-    if not account_found:
+    portfolio_id = portfolio_access.portfolio_of(account_id)
+    if portfolio_id is None:
         raise HTTPException(status_code=404, detail="Account not found")
 
     await update_transaction_type_id_ref(
         db=db,
-        current_user=current_user,
+        portfolio_access=portfolio_access,
         object_to_update=scheduled_transaction,
-        portfolio_id=account_found.portfolio_id,
+        portfolio_id=portfolio_id,
         transaction_type_id=scheduled_transaction.transaction_type_id,
         transaction_type_name=scheduled_transaction.transaction_type_name,
     )
 
     await update_payee_id_ref(
         db=db,
-        current_user=current_user,
+        portfolio_access=portfolio_access,
         object_to_update=scheduled_transaction,
-        portfolio_id=account_found.portfolio_id,
+        portfolio_id=portfolio_id,
         payee_id=scheduled_transaction.payee_id,
         payee_name=scheduled_transaction.payee_name,
     )
 
     await update_category_id_ref(
         db=db,
-        current_user=current_user,
+        portfolio_access=portfolio_access,
         object_to_update=scheduled_transaction,
-        portfolio_id=account_found.portfolio_id,
+        portfolio_id=portfolio_id,
         category_id=scheduled_transaction.category_id,
         category_name=scheduled_transaction.category_name,
     )
@@ -133,36 +126,37 @@ async def create_scheduled_transaction(
     # Create the scheduled transaction
     db_scheduled_transaction = ScheduledTransaction.model_validate(scheduled_transaction.model_dump(), update={"account_id": account_id})
     db.add(db_scheduled_transaction)
-    db.commit()
-    db.refresh(db_scheduled_transaction)
+    await db.commit()
+    await db.refresh(db_scheduled_transaction)
 
     return ScheduledTransactionRead.model_validate(db_scheduled_transaction)
 
 
-async def _get_scheduled_transaction(db: DbSession, account_id: int, scheduled_transaction_id: int, user_id: int) -> Optional[ScheduledTransaction]:
+async def _get_scheduled_transaction(
+    db: DbSession, portfolio_access: CurrentPortfolioAccess, account_id: int, scheduled_transaction_id: int
+) -> Optional[ScheduledTransaction]:
+    if not portfolio_access.has_account(account_id):
+        return None
+
     sql = (
         select(ScheduledTransaction)
-        .join(Account, Account.account_id == ScheduledTransaction.account_id)  # type: ignore
-        .join(Portfolio)
-        .join(PortfolioUser)
-        .where(Account.account_id == account_id)
+        .where(ScheduledTransaction.account_id == account_id)
         .where(ScheduledTransaction.scheduled_transaction_id == scheduled_transaction_id)
-        .where(PortfolioUser.user_id == user_id)
     )
 
-    return db.exec(sql).one_or_none()
+    return (await db.exec(sql)).one_or_none()
 
 
 @router.get("/{scheduled_transaction_id}")
 async def get_scheduled_transaction(
     db: DbSession,
-    current_user: CurrentActiveUser,
+    portfolio_access: CurrentPortfolioAccess,
     account_id: int,
     scheduled_transaction_id: int,
 ) -> ScheduledTransactionRead:
 
     scheduled_transaction = await _get_scheduled_transaction(
-        db=db, account_id=account_id, scheduled_transaction_id=scheduled_transaction_id, user_id=current_user.user_id if current_user.user_id else 0
+        db=db, portfolio_access=portfolio_access, account_id=account_id, scheduled_transaction_id=scheduled_transaction_id
     )
 
     if not scheduled_transaction:
@@ -176,27 +170,20 @@ async def get_scheduled_transaction(
 @router.delete("/{scheduled_transaction_id}")
 async def delete_scheduled_transaction(
     db: DbSession,
-    current_user: CurrentActiveUser,
+    portfolio_access: CurrentPortfolioAccess,
     account_id: int,
     scheduled_transaction_id: int,
 ) -> dict[str, bool]:
 
-    sql = (
-        select(ScheduledTransaction)
-        .join(Account, Account.account_id == ScheduledTransaction.account_id)  # type: ignore
-        .join(Portfolio)
-        .join(PortfolioUser)
-        .where(Account.account_id == account_id)
-        .where(ScheduledTransaction.scheduled_transaction_id == scheduled_transaction_id)
-        .where(PortfolioUser.user_id == current_user.user_id)
+    scheduled_transaction = await _get_scheduled_transaction(
+        db=db, portfolio_access=portfolio_access, account_id=account_id, scheduled_transaction_id=scheduled_transaction_id
     )
-    scheduled_transaction = db.exec(sql).one_or_none()
 
     if not scheduled_transaction:
         raise HTTPException(status_code=404, detail="Scheduled transaction not found")
 
-    db.delete(scheduled_transaction)
-    db.commit()
+    await db.delete(scheduled_transaction)
+    await db.commit()
 
     return {"ok": True}
 
@@ -204,60 +191,45 @@ async def delete_scheduled_transaction(
 @router.patch("/{scheduled_transaction_id}")
 async def update_scheduled_transaction(
     db: DbSession,
-    current_user: CurrentActiveUser,
+    portfolio_access: CurrentPortfolioAccess,
     account_id: int,
     scheduled_transaction_id: int,
     scheduled_transaction: ScheduledTransactionUpdate,
 ) -> ScheduledTransactionRead:
 
-    scheduled_transaction_sql = (
-        select(ScheduledTransaction)
-        .join(Account, Account.account_id == ScheduledTransaction.account_id)  # type: ignore
-        .join(Portfolio)
-        .join(PortfolioUser)
-        .where(Account.account_id == account_id)
-        .where(ScheduledTransaction.scheduled_transaction_id == scheduled_transaction_id)
-        .where(PortfolioUser.user_id == current_user.user_id)
-    )
-    db_scheduled_transaction = db.exec(scheduled_transaction_sql).one_or_none()
-    if not db_scheduled_transaction:
+    portfolio_id = portfolio_access.portfolio_of(account_id)
+    if portfolio_id is None:
         raise HTTPException(status_code=404, detail="Scheduled transaction not found")
 
-    # Get the user's data to verify access
-    account_sql = (
-        select(Account)
-        .join(Portfolio)
-        .join(PortfolioUser)
-        .where(Account.account_id == account_id)
-        .where(PortfolioUser.user_id == current_user.user_id)
+    db_scheduled_transaction = await _get_scheduled_transaction(
+        db=db, portfolio_access=portfolio_access, account_id=account_id, scheduled_transaction_id=scheduled_transaction_id
     )
-    account_found = db.exec(account_sql).first()
-    if not account_found:
-        raise HTTPException(status_code=404, detail="Account not found")
+    if not db_scheduled_transaction:
+        raise HTTPException(status_code=404, detail="Scheduled transaction not found")
 
     await update_transaction_type_id_ref(
         db=db,
-        current_user=current_user,
+        portfolio_access=portfolio_access,
         object_to_update=db_scheduled_transaction,
-        portfolio_id=account_found.portfolio_id,
+        portfolio_id=portfolio_id,
         transaction_type_id=scheduled_transaction.transaction_type_id,
         transaction_type_name=scheduled_transaction.transaction_type_name,
     )
 
     await update_payee_id_ref(
         db=db,
-        current_user=current_user,
+        portfolio_access=portfolio_access,
         object_to_update=db_scheduled_transaction,
-        portfolio_id=account_found.portfolio_id,
+        portfolio_id=portfolio_id,
         payee_id=scheduled_transaction.payee_id,
         payee_name=scheduled_transaction.payee_name,
     )
 
     await update_category_id_ref(
         db=db,
-        current_user=current_user,
+        portfolio_access=portfolio_access,
         object_to_update=db_scheduled_transaction,
-        portfolio_id=account_found.portfolio_id,
+        portfolio_id=portfolio_id,
         category_id=scheduled_transaction.category_id,
         category_name=scheduled_transaction.category_name,
     )
@@ -273,12 +245,12 @@ async def update_scheduled_transaction(
     db_scheduled_transaction.on_autopay = scheduled_transaction.on_autopay
 
     db.add(db_scheduled_transaction)
-    db.commit()
-
-    # Do this rather than a `db_refresh` in order to get the next_transaction as well
-    updated_scheduled_transaction = await get_scheduled_transaction(db, current_user, account_id, scheduled_transaction_id)
+    await db.commit()
 
-    return updated_scheduled_transaction
+    # The session still holds the updated row, so only the next transaction needs to be worked out
+    return ScheduledTransactionRead.model_validate(
+        db_scheduled_transaction.model_dump(), update={"next_transaction": await _get_next_transaction(db, db_scheduled_transaction)}
+    )
 
 
 def _get_next_iterations_amount_modifier(
@@ -319,13 +291,11 @@ async def get_next_iterations(
     db: DbSession,
     scheduled_transaction: ScheduledTransaction | ScheduledTransactionRead,
     override_end_date: Optional[date] = None,
-    override_limit: int = MAX_LIMIT,
-) -> list[Transaction]:
+    override_limit: Optional[int] = None,
+) -> list[ForecastOccurrence]:
 
     if scheduled_transaction.fixed_amount:
         previous_transactions = []
-        amount_trend = AmountTrend.FIXED
-        amount_modifier = scheduled_transaction.fixed_amount
     else:
         sql = (
             select(Transaction)
@@ -334,132 +304,227 @@ async def get_next_iterations(
             .order_by(ScheduledTransactionHistory.scheduled_transaction_history_id)  # type: ignore
             .limit(scheduled_transaction.estimate_occurrences)
         )
-        previous_transactions = list(db.exec(sql).all())
-        amount_trend, amount_modifier = _get_next_iterations_amount_modifier(previous_transactions)
+        previous_transactions = list((await db.exec(sql)).all())
+
+    return list(
+        _project_iterations(
+            scheduled_transaction=scheduled_transaction,
+            previous_transactions=previous_transactions,
+            recurrence=await _get_recurrence(db=db, repeat_option_id=scheduled_transaction.repeat_option_id),
+            override_end_date=override_end_date,
+            override_limit=override_limit,
+        )
+    )
 
-    limit = MAX_LIMIT
-    if override_limit and scheduled_transaction.limit_occurrences:
-        limit = min(override_limit, scheduled_transaction.limit_occurrences)
-    elif override_limit:
-        limit = override_limit
-    elif scheduled_transaction.limit_occurrences:
-        limit = scheduled_transaction.limit_occurrences
-
-    end_date: date = MAX_END_DATE
-    if override_end_date and scheduled_transaction.end_date:
-        end_date = min(override_end_date, scheduled_transaction.end_date)
-    elif override_end_date:
-        end_date = override_end_date
-    elif scheduled_transaction.end_date:
-        end_date = scheduled_transaction.end_date
-
-    # TODO: Use sqlalchemy relationships/backpopulates
-    rpt_option: Optional[RepeatOptionRead] = None
-    rpt_unit: Optional[RepeatUnitRead] = None
-
-    if scheduled_transaction.repeat_option_id:
-        rpt_option = await repeat_option.get_repeat_option(db=db, repeat_option_id=scheduled_transaction.repeat_option_id)
-
-    if rpt_option and rpt_option.repeat_unit_id:
-        rpt_unit = await repeat_option.get_repeat_unit(db=db, repeat_unit_id=rpt_option.repeat_unit_id)
-
-    transactions: list[Transaction] = []
-    active_date = scheduled_transaction.start_date
-    active_amount = previous_transactions[-1].amount if previous_transactions else 0
 
-    if rpt_option and rpt_unit:
-        while (len(transactions) < limit) and (active_date <= end_date):
-            next_amount = _get_next_amount(previous_amount=active_amount, amount_trend=amount_trend, amount_modifier=amount_modifier)
-            active_amount = next_amount
-
-            # Special handling for invalid start_dates. Don't add a transaction unless valid.
-            if rpt_unit.name != "Semi-Month" or (active_date.day == 1 or active_date.day == 16):
-                transactions.append(
-                    Transaction.model_validate(
-                        scheduled_transaction.model_dump(),
-                        update={
-                            "transaction_date": active_date,
-                            "amount": next_amount,
-                        },
-                    )
-                )
-
-            if rpt_unit.name == "Day":
-                active_date += relativedelta(days=rpt_option.quantity)
-            elif rpt_unit.name == "Semi-Month":
-                if active_date.day < 16:
-                    active_date = date(year=active_date.year, month=active_date.month, day=16)
-                else:
-                    active_date += relativedelta(months=1)
-                    active_date = date(year=active_date.year, month=active_date.month, day=1)
-            elif rpt_unit.name == "Month":
-                active_date += relativedelta(months=rpt_option.quantity)
-            elif rpt_unit.name == "Year":
-                active_date += relativedelta(years=rpt_option.quantity)
-    else:
-        transactions.append(
-            Transaction.model_validate(
-                scheduled_transaction.model_dump(),
-                update={"transaction_date": active_date, "amount": scheduled_transaction.fixed_amount if scheduled_transaction.fixed_amount else 0},
+async def get_next_iterations_for_all(
+    db: DbSession,
+    scheduled_transactions: Sequence[ScheduledTransaction | ScheduledTransactionRead],
+    override_end_date: Optional[date] = None,
+    override_limit: Optional[int] = None,
+) -> dict[int, list[ForecastOccurrence]]:
+    """get_next_iterations for many scheduled transactions at once, keyed by scheduled_transaction_id.
+
+    However many there are, this takes one query for the transaction histories. The repeat options come from the registry.
+    """
+
+    next_iterations = await iterate_next_iterations_for_all(
+        db=db, scheduled_transactions=scheduled_transactions, override_end_date=override_end_date, override_limit=override_limit
+    )
+    return {scheduled_transaction_id: list(occurrences) for scheduled_transaction_id, occurrences in next_iterations.items()}
+
+
+async def iterate_next_iterations_for_all(
+    db: DbSession,
+    scheduled_transactions: Sequence[ScheduledTransaction | ScheduledTransactionRead],
+    override_end_date: Optional[date] = None,
+    override_limit: Optional[int] = None,
+) -> dict[int, Iterator[ForecastOccurrence]]:
+    """Same as get_next_iterations_for_all, but each schedule's occurrences are generated as they're consumed.
+
+    Everything that needs the database is read up front, so the iterators can outlive the session.
+    """
+
+    previous_transactions = await _get_previous_transactions_for_all(
+        db=db, scheduled_transactions=[st for st in scheduled_transactions if not st.fixed_amount]
+    )
+
+    next_iterations: dict[int, Iterator[ForecastOccurrence]] = {}
+    for st in scheduled_transactions:
+        next_iterations[st.scheduled_transaction_id or 0] = _project_iterations(
+            scheduled_transaction=st,
+            previous_transactions=previous_transactions.get(st.scheduled_transaction_id or 0, []),
+            recurrence=await _get_recurrence(db=db, repeat_option_id=st.repeat_option_id),
+            override_end_date=override_end_date,
+            override_limit=override_limit,
+        )
+
+    return next_iterations
+
+
+async def _get_previous_transactions_for_all(
+    db: DbSession, scheduled_transactions: Sequence[ScheduledTransaction | ScheduledTransactionRead]
+) -> dict[int, list[Transaction]]:
+    if not scheduled_transactions:
+        return {}
+
+    # Number each schedule's history the same way get_next_iterations orders it, then keep its first estimate_occurrences
+    history = (
+        select(
+            ScheduledTransactionHistory.scheduled_transaction_id,
+            ScheduledTransactionHistory.transaction_id,
+            func.row_number()
+            .over(
+                partition_by=ScheduledTransactionHistory.scheduled_transaction_id,
+                order_by=ScheduledTransactionHistory.scheduled_transaction_history_id,
+            )
+            .label("occurrence"),
+        )
+        .where(col(ScheduledTransactionHistory.scheduled_transaction_id).in_([st.scheduled_transaction_id for st in scheduled_transactions]))
+        .subquery()
+    )
+    sql = (
+        select(history.c.scheduled_transaction_id, Transaction)
+        .join(history, history.c.transaction_id == Transaction.transaction_id)
+        .join(ScheduledTransaction, col(ScheduledTransaction.scheduled_transaction_id) == history.c.scheduled_transaction_id)
+        .where(
+            or_(
+                col(ScheduledTransaction.estimate_occurrences).is_(None),
+                history.c.occurrence <= ScheduledTransaction.estimate_occurrences,
             )
         )
+        .order_by(history.c.scheduled_transaction_id, history.c.occurrence)
+    )
+
+    previous_transactions: dict[int, list[Transaction]] = defaultdict(list)
+    for scheduled_transaction_id, transaction in (await db.exec(sql)).all():
+        previous_transactions[scheduled_transaction_id].append(transaction)
+
+    return previous_transactions
 
-    return transactions
+
+async def _get_recurrence(db: DbSession, repeat_option_id: Optional[int]) -> Optional[Recurrence]:
+    if not repeat_option_id:
+        return None
+
+    rpt_option = await repeat_option.get_repeat_option(db=db, repeat_option_id=repeat_option_id)
+    if not rpt_option.repeat_unit_id:
+        return None
+
+    rpt_unit = await repeat_option.get_repeat_unit(db=db, repeat_unit_id=rpt_option.repeat_unit_id)
+
+    return compile_recurrence(rpt_unit.name, rpt_option.quantity)
+
+
+def _project_iterations(
+    scheduled_transaction: ScheduledTransaction | ScheduledTransactionRead,
+    previous_transactions: list[Transaction],
+    recurrence: Optional[Recurrence],
+    override_end_date: Optional[date],
+    override_limit: Optional[int],
+) -> Iterator[ForecastOccurrence]:
+    """The schedule's occurrences in date order, generated as they're consumed."""
+
+    if scheduled_transaction.fixed_amount:
+        amount_trend = AmountTrend.FIXED
+        amount_modifier = scheduled_transaction.fixed_amount
+    else:
+        amount_trend, amount_modifier = _get_next_iterations_amount_modifier(previous_transactions)
+
+    limits = [limit for limit in (override_limit, scheduled_transaction.limit_occurrences) if limit]
+    end_dates = [end_date for end_date in (override_end_date, scheduled_transaction.end_date) if end_date]
+
+    # A window of dates can be walked to its end, but a schedule that never ends still needs a cut-off
+    limit = min(limits) if limits else (None if end_dates else MAX_LIMIT)
+    end_date = min(end_dates) if end_dates else MAX_END_DATE
+
+    if not recurrence:
+        yield ForecastOccurrence(
+            scheduled_transaction.start_date,
+            scheduled_transaction.fixed_amount if scheduled_transaction.fixed_amount else 0,
+            scheduled_transaction.scheduled_transaction_id,
+            scheduled_transaction,
+        )
+        return
+
+    active_amount = previous_transactions[-1].amount if previous_transactions else 0
+    for occurrence_date in islice(recurrence.occurrences(scheduled_transaction.start_date, until=end_date), limit):
+        active_amount = _get_next_amount(previous_amount=active_amount, amount_trend=amount_trend, amount_modifier=amount_modifier)
+        yield ForecastOccurrence(occurrence_date, active_amount, scheduled_transaction.scheduled_transaction_id, scheduled_transaction)
 
 
 @router.post("/{scheduled_transaction_id}/create-transaction")
 async def create_transaction(
     db: DbSession,
-    current_user: CurrentActiveUser,
+    portfolio_access: CurrentPortfolioAccess,
     account_id: int,
     scheduled_transaction_id: int,
     override_transaction_data: Optional[TransactionCreate],
 ) -> TransactionRead:
 
-    scheduled_transaction = await get_scheduled_transaction(
-        db=db, current_user=current_user, account_id=account_id, scheduled_transaction_id=scheduled_transaction_id
+    scheduled_transaction = await _get_scheduled_transaction(
+        db=db, portfolio_access=portfolio_access, account_id=account_id, scheduled_transaction_id=scheduled_transaction_id
     )
 
-    if not scheduled_transaction.next_transaction and not override_transaction_data:
+    if not scheduled_transaction:
+        raise HTTPException(status_code=404, detail="Scheduled transaction not found")
+
+    # The current iteration is the transaction being created and the one after it becomes the new start date
+    next_iterations = await get_next_iterations(db=db, scheduled_transaction=scheduled_transaction, override_limit=2)
+
+    if not next_iterations and not override_transaction_data:
         raise HTTPException(status_code=404, detail="No data provided")
 
     override_data = override_transaction_data.model_dump(exclude_unset=True) if override_transaction_data else {}
     override_data["transaction_id"] = None
-    transaction_data = scheduled_transaction.next_transaction.model_dump() if scheduled_transaction.next_transaction else {}
+    transaction_data = next_iterations[0].to_transaction().model_dump() if next_iterations else {}
+    target_date = scheduled_transaction.start_date
 
-    # Create the transaction
-    transaction = Transaction.model_validate(transaction_data, update=override_data)
+    # Create the transaction. It always goes in the path's account, which is also the one whose balances move below, even
+    # when the schedule has no occurrences left and only the override data is given.
+    transaction = Transaction.model_validate(transaction_data, update={**override_data, "account_id": account_id})
     db.add(transaction)
-    db.commit()  # Need to commit early in order to get the new transaction's ID
-    db.refresh(transaction)
+    await db.flush()  # Need to flush early in order to get the new transaction's ID
 
     # Link the transaction and scheduled transaction
     link = ScheduledTransactionHistory.model_validate(
         {
-            "target_date": scheduled_transaction.start_date,
+            "target_date": target_date,
             "post_date": date.today(),
             "scheduled_transaction_id": scheduled_transaction_id,
             "transaction_id": transaction.transaction_id,
         }
     )
     db.add(link)
-    db.commit()
 
-    await progress_iteration(db=db, current_user=current_user, account_id=account_id, scheduled_transaction_id=scheduled_transaction_id)
+    await adjust_transaction_summaries(db, account_id, [(transaction.clear_date, transaction.amount)])
+    await adjust_account_balances(db, account_id, [(transaction.clear_date, transaction.amount)])
+
+    _advance_start_date(scheduled_transaction, next_iterations)
+    db.add(scheduled_transaction)
+
+    # Commit once so that the transaction, its link and the new start date are saved together (or not at all)
+    await db.commit()
+    await db.refresh(transaction)
 
     return TransactionRead.model_validate(transaction)
 
 
+def _advance_start_date(scheduled_transaction: ScheduledTransaction, next_iterations: list[ForecastOccurrence]) -> None:
+    # `next_iterations` holds the actual current iteration followed by the actual next one (if there is one)
+    scheduled_transaction.start_date = next_iterations[1].transaction_date if len(next_iterations) == 2 else MAX_END_DATE
+
+
 @router.post("/{scheduled_transaction_id}/skip-iteration")
 async def progress_iteration(
     db: DbSession,
-    current_user: CurrentActiveUser,
+    portfolio_access: CurrentPortfolioAccess,
     account_id: int,
     scheduled_transaction_id: int,
 ) -> None:
 
     scheduled_transaction = await _get_scheduled_transaction(
-        db=db, user_id=current_user.user_id if current_user.user_id else 0, account_id=account_id, scheduled_transaction_id=scheduled_transaction_id
+        db=db, portfolio_access=portfolio_access, account_id=account_id, scheduled_transaction_id=scheduled_transaction_id
     )
 
     if not scheduled_transaction:
@@ -468,6 +533,6 @@ async def progress_iteration(
     # Update scheduled transaction's next iteration date by getting the next two iterations (actual current, actual next)
     next_iterations = await get_next_iterations(db=db, scheduled_transaction=scheduled_transaction, override_limit=2)
 
-    scheduled_transaction.start_date = next_iterations[1].transaction_date if len(next_iterations) == 2 else MAX_END_DATE
+    _advance_start_date(scheduled_transaction, next_iterations)
     db.add(scheduled_transaction)
-    db.commit()
+    await db.commit()
@@ -1,20 +1,48 @@
+import base64
+import binascii
 from datetime import date
+from typing import (
+    Annotated,
+    Any,
+    AsyncIterator,
+    Callable,
+    Iterable,
+    Iterator,
+    Literal,
+    Optional,
+)
 
 from dateutil.relativedelta import relativedelta
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import select
-
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy import ColumnElement
+from sqlmodel import and_, col, or_, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from miapeer.adapter.account_balance import adjust_account_balances
+from miapeer.adapter.forecast import (
+    ForecastLedger,
+    ForecastOccurrence,
+    merge_forecasts,
+)
 from miapeer.adapter.sql import transaction as transaction_sql
-from miapeer.dependencies import CurrentActiveUser, DbSession, is_quantum_user
+from miapeer.adapter.transaction_summary import adjust_transaction_summaries
+from miapeer.dependencies import (
+    CurrentPortfolioAccess,
+    DbSession,
+    DbSessionFactory,
+    is_quantum_user,
+)
 from miapeer.models.quantum.account import Account
-from miapeer.models.quantum.portfolio import Portfolio
-from miapeer.models.quantum.portfolio_user import PortfolioUser
+from miapeer.models.quantum.scheduled_transaction import ScheduledTransaction
 from miapeer.models.quantum.scheduled_transaction_history import (
     ScheduledTransactionHistory,
 )
 from miapeer.models.quantum.transaction import (
     Transaction,
     TransactionCreate,
+    TransactionPage,
     TransactionRead,
     TransactionUpdate,
 )
@@ -32,159 +60,310 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+CLEARED_PAGE_ORDER = [col(Transaction.clear_date), col(Transaction.transaction_date), col(Transaction.transaction_id)]
+UNCLEARED_PAGE_ORDER = [col(Transaction.transaction_date), col(Transaction.transaction_id)]
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+STREAM_BATCH_SIZE = 500
+
+
+class _LedgerCursor(BaseModel):
+    """Position of the last transaction on a ledger page along with the running balance after it."""
+
+    clear_date: Optional[date]
+    transaction_date: date
+    transaction_id: int
+    balance: int
+
+
+def _encode_cursor(cursor: _LedgerCursor) -> str:
+    return base64.urlsafe_b64encode(cursor.model_dump_json().encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> _LedgerCursor:
+    try:
+        return _LedgerCursor.model_validate_json(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _sorts_after(columns: list[Any], values: list[Any]) -> ColumnElement[bool]:
+    """`(columns) > (values)`, expanded because not every supported dialect accepts a row-value comparison.
+
+    The first column is also bounded on its own so that the comparison is a range over an index that starts with it.
+    """
+
+    if len(columns) == 1:
+        return columns[0] > values[0]
+
+    return and_(columns[0] >= values[0], or_(columns[0] > values[0], _sorts_after(columns[1:], values[1:])))
+
 
 async def _get_forecasted_transactions(
     db: DbSession,
-    current_user: CurrentActiveUser,
+    portfolio_access: CurrentPortfolioAccess,
     account_id: int,
     limit_forecast_date: date,
-) -> list[TransactionRead]:
-    scheduled_transactions = await scheduled_transaction.get_all_scheduled_transactions(db=db, current_user=current_user, account_id=account_id)
-
-    forecasted_transactions: list[TransactionRead] = []
-    for st in scheduled_transactions:
-        fts = await scheduled_transaction.get_next_iterations(db=db, scheduled_transaction=st, override_end_date=limit_forecast_date)
-
-        for ft in fts:
-            forecasted_transactions.append(
-                TransactionRead.model_validate(
-                    ft.model_dump(),
-                    update={
-                        "transaction_id": 0,
-                        "forecast_from_scheduled_transaction_id": st.scheduled_transaction_id,
-                    },
-                )
-            )
+) -> Iterator[ForecastOccurrence]:
+    if not portfolio_access.has_account(account_id):
+        return iter([])
+
+    sql = select(ScheduledTransaction).where(ScheduledTransaction.account_id == account_id)
+    scheduled_transactions = (await db.exec(sql)).all()
+    next_iterations = await scheduled_transaction.iterate_next_iterations_for_all(
+        db=db, scheduled_transactions=scheduled_transactions, override_end_date=limit_forecast_date
+    )
 
-    return forecasted_transactions
+    return merge_forecasts(next_iterations.values())
 
 
-def _merge_transactions_with_forecast(transactions: list[TransactionRead], forecasted_transactions: list[TransactionRead]):
-    if not forecasted_transactions:
-        # Shortcut if there's nothing to merge
-        return transactions
+async def _record_transaction_changes(db: DbSession, account_id: int, changes: list[tuple[Optional[date], int]]) -> None:
+    # Everything derived from the account's transactions has to change in the same unit of work as the transactions themselves
+    await adjust_transaction_summaries(db, account_id, changes)
+    await adjust_account_balances(db, account_id, changes)
 
-    if not transactions:
-        # Shortcut if there's nothing to merge
-        return forecasted_transactions
 
-    merged_transactions: list[TransactionRead] = []
+def _get_ledger_window(limit_months: int, limit_forecast_months: int) -> tuple[date, date]:
+    limit_months = max(limit_months, 0)
+    limit_date = date(year=date.today().year, month=date.today().month, day=1)
+    limit_date -= relativedelta(months=limit_months)
+
+    limit_forecast_months = max(limit_forecast_months, 0)
+    limit_forecast_date = date.today()
+    limit_forecast_date += relativedelta(months=limit_forecast_months)
 
-    forecasted_transactions.sort(key=lambda x: x.transaction_date)
+    return limit_date, limit_forecast_date
 
-    transaction_index = 0
-    forecast_index = 0
-    while transaction_index < len(transactions) and forecast_index < len(forecasted_transactions):
-        if (
-            transactions[transaction_index].clear_date
-            or transactions[transaction_index].transaction_date <= forecasted_transactions[forecast_index].transaction_date
-        ):
-            merged_transactions.append(transactions[transaction_index])
-            transaction_index += 1
-        else:
-            merged_transactions.append(forecasted_transactions[forecast_index])
-            forecast_index += 1
 
-    if transaction_index < len(transactions):
-        merged_transactions.extend(transactions[transaction_index:])
+async def _get_opening_balance(db: AsyncSession, account_id: int, limit_date: date) -> int:
+    row = (
+        await db.exec(
+            transaction_sql.GET_OPENING_BALANCE,  # type: ignore
+            params={
+                "account_id": account_id,
+                "limit_date": limit_date,
+            },
+        )
+    ).one_or_none()
 
-    if forecast_index < len(forecasted_transactions):
-        merged_transactions.extend(forecasted_transactions[forecast_index:])
+    return row.opening_balance if row else 0
 
-    return merged_transactions
+
+async def _stream_ledger(
+    session_factory: Callable[[], AsyncSession],
+    account_id: int,
+    limit_date: date,
+    forecasted_transactions: Iterable[ForecastOccurrence],
+) -> AsyncIterator[TransactionRead]:
+    async with session_factory() as db:
+        opening_balance = await _get_opening_balance(db=db, account_id=account_id, limit_date=limit_date)
+        ledger = ForecastLedger(opening_balance=opening_balance, forecasts=forecasted_transactions)
+
+        for sql in transaction_sql.GET_ALL:
+            rows = await db.stream(
+                sql,
+                params={"account_id": account_id, "limit_date": limit_date},
+                execution_options={"yield_per": STREAM_BATCH_SIZE},
+            )
+
+            async for row in rows:
+                for t in ledger.add(TransactionRead.model_validate(row)):
+                    yield t
+
+    for t in ledger.finish():
+        yield t
+
+
+async def _to_ndjson(transactions: AsyncIterator[TransactionRead]) -> AsyncIterator[str]:
+    async for t in transactions:
+        yield t.model_dump_json() + "\n"
+
+
+async def _to_json_array(transactions: AsyncIterator[TransactionRead]) -> AsyncIterator[str]:
+    separator = "["
+    async for t in transactions:
+        yield separator + t.model_dump_json()
+        separator = ","
+
+    yield "[]" if separator == "[" else "]"
 
 
 @router.get("")
 async def get_all_transactions(
     db: DbSession,
-    current_user: CurrentActiveUser,
+    portfolio_access: CurrentPortfolioAccess,
     account_id: int,
     limit_months: int = 3,
     limit_forecast_months: int = 1,
 ) -> list[TransactionRead]:
-    limit_months = max(limit_months, 0)
-    limit_date = date(year=date.today().year, month=date.today().month, day=1)
-    limit_date -= relativedelta(months=limit_months)
+    if not portfolio_access.has_account(account_id):
+        raise HTTPException(status_code=404, detail="Account not found")
 
-    limit_forecast_months = max(limit_forecast_months, 0)
-    limit_forecast_date = date.today()
-    limit_forecast_date += relativedelta(months=limit_forecast_months)
+    limit_date, limit_forecast_date = _get_ledger_window(limit_months=limit_months, limit_forecast_months=limit_forecast_months)
+
+    opening_balance = await _get_opening_balance(db=db, account_id=account_id, limit_date=limit_date)
+
+    transactions = [
+        row
+        for sql in transaction_sql.GET_ALL
+        for row in (
+            await db.exec(
+                sql,  # type: ignore
+                params={
+                    "account_id": account_id,
+                    "limit_date": limit_date,
+                },
+            )
+        ).all()
+    ]
+
+    forecasted_transactions = await _get_forecasted_transactions(
+        db=db,
+        portfolio_access=portfolio_access,
+        account_id=account_id,
+        limit_forecast_date=limit_forecast_date,
+    )
 
-    transactions = db.exec(
-        transaction_sql.GET_ALL,  # type: ignore
-        params={
-            "account_id": account_id,
-            "user_id": current_user.user_id,
-            "limit_date": limit_date,
-        },
-    ).all()
+    ledger = ForecastLedger(opening_balance=opening_balance, forecasts=forecasted_transactions)
 
-    # TODO: Currently operating off of "magic" transactions. The SQL produces order_index=-2 as the starting balance of the account and
-    #           order_index=-1 as all transactions before the reporting period. This should be reviewed again later.
+    merged_transactions = [t for row in transactions for t in ledger.add(TransactionRead.model_validate(row))]
+    merged_transactions.extend(ledger.finish())
+
+    return merged_transactions
 
-    running_balance: int = sum([t.amount for t in transactions if t.order_index <= 0])
 
-    actual_transactions = [TransactionRead.model_validate(t) for t in transactions if t.order_index > 0]
+@router.get("/stream", response_class=StreamingResponse)
+async def stream_transactions(
+    db: DbSession,
+    session_factory: DbSessionFactory,
+    portfolio_access: CurrentPortfolioAccess,
+    account_id: int,
+    limit_months: int = 3,
+    limit_forecast_months: int = 1,
+    output_format: Annotated[Literal["ndjson", "json"], Query(alias="format")] = "ndjson",
+) -> StreamingResponse:
+    """Same ledger as get_all_transactions, sent row by row as NDJSON or as a chunked JSON array."""
+
+    if not portfolio_access.has_account(account_id):
+        raise HTTPException(status_code=404, detail="Account not found")
+
+    limit_date, limit_forecast_date = _get_ledger_window(limit_months=limit_months, limit_forecast_months=limit_forecast_months)
+
+    # Everything the forecast needs from the database is read now, while the request's session is still open. The
+    # occurrences themselves are generated as the ledger streams.
     forecasted_transactions = await _get_forecasted_transactions(
         db=db,
-        current_user=current_user,
+        portfolio_access=portfolio_access,
         account_id=account_id,
         limit_forecast_date=limit_forecast_date,
     )
-    merged_transactions = _merge_transactions_with_forecast(
-        transactions=actual_transactions,
+
+    transactions = _stream_ledger(
+        session_factory=session_factory,
+        account_id=account_id,
+        limit_date=limit_date,
         forecasted_transactions=forecasted_transactions,
     )
 
-    for t in merged_transactions:
-        running_balance += t.amount
-        t.balance = running_balance
+    if output_format == "json":
+        return StreamingResponse(_to_json_array(transactions), media_type="application/json")
+
+    return StreamingResponse(_to_ndjson(transactions), media_type="application/x-ndjson")
 
-    return merged_transactions
+
+@router.get("/page")
+async def get_transaction_page(
+    db: DbSession,
+    portfolio_access: CurrentPortfolioAccess,
+    account_id: int,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+) -> TransactionPage:
+    if not portfolio_access.has_account(account_id):
+        raise HTTPException(status_code=404, detail="Account not found")
+
+    limit = min(max(limit, 1), MAX_PAGE_SIZE)
+
+    after: Optional[_LedgerCursor] = None
+    if cursor:
+        after = _decode_cursor(cursor)
+        running_balance = after.balance
+    else:
+        account = await db.get(Account, account_id)
+        running_balance = account.starting_balance if account else 0
+
+    # Pages sort the same way as GET_ALL: cleared transactions by clear date, then the uncleared ones. Each phase is a
+    #   separate query that walks the (account_id, clear_date, transaction_date, transaction_id) index in order, so a page
+    #   costs the same however long the account's history is. One extra row is fetched to find out whether there is
+    #   another page without a separate count.
+    rows: list[Transaction] = []
+
+    if after is None or after.clear_date is not None:
+        sql = select(Transaction).where(Transaction.account_id == account_id).where(col(Transaction.clear_date).is_not(None))
+        if after:
+            sql = sql.where(_sorts_after(CLEARED_PAGE_ORDER, [after.clear_date, after.transaction_date, after.transaction_id]))
+        rows.extend((await db.exec(sql.order_by(*CLEARED_PAGE_ORDER).limit(limit + 1))).all())
+
+    if len(rows) <= limit:
+        sql = select(Transaction).where(Transaction.account_id == account_id).where(col(Transaction.clear_date).is_(None))
+        if after and after.clear_date is None:
+            sql = sql.where(_sorts_after(UNCLEARED_PAGE_ORDER, [after.transaction_date, after.transaction_id]))
+        rows.extend((await db.exec(sql.order_by(*UNCLEARED_PAGE_ORDER).limit(limit + 1 - len(rows)))).all())
+
+    transactions: list[TransactionRead] = []
+    for row in rows[:limit]:
+        running_balance += row.amount
+        transactions.append(TransactionRead.model_validate(row.model_dump(), update={"balance": running_balance}))
+
+    next_cursor = None
+    if len(rows) > limit:
+        last = transactions[-1]
+        next_cursor = _encode_cursor(
+            _LedgerCursor(
+                clear_date=last.clear_date,
+                transaction_date=last.transaction_date,
+                transaction_id=last.transaction_id,
+                balance=running_balance,
+            )
+        )
+
+    return TransactionPage(transactions=transactions, next_cursor=next_cursor)
 
 
 @router.post("")
 async def create_transaction(
     db: DbSession,
-    current_user: CurrentActiveUser,
+    portfolio_access: CurrentPortfolioAccess,
     account_id: int,
     transaction: TransactionCreate,
 ) -> TransactionRead:
-    # Get the user's data to verify access
-    account_sql = (
-        select(Account)
-        .join(Portfolio)
-        .join(PortfolioUser)
-        .where(Account.account_id == account_id)
-        .where(PortfolioUser.user_id == current_user.user_id)
-    )
-    account_found = db.exec(account_sql).first()
-    if not account_found:
+    portfolio_id = portfolio_access.portfolio_of(account_id)
+    if portfolio_id is None:
         raise HTTPException(status_code=404, detail="Account not found")
 
     await update_transaction_type_id_ref(
         db=db,
-        current_user=current_user,
+        portfolio_access=portfolio_access,
         object_to_update=transaction,
-        portfolio_id=account_found.portfolio_id,
+        portfolio_id=portfolio_id,
         transaction_type_id=transaction.transaction_type_id,
         transaction_type_name=transaction.transaction_type_name,
     )
 
     await update_payee_id_ref(
         db=db,
-        current_user=current_user,
+        portfolio_access=portfolio_access,
         object_to_update=transaction,
-        portfolio_id=account_found.portfolio_id,
+        portfolio_id=portfolio_id,
         payee_id=transaction.payee_id,
         payee_name=transaction.payee_name,
     )
 
     await update_category_id_ref(
         db=db,
-        current_user=current_user,
+        portfolio_access=portfolio_access,
         object_to_update=transaction,
-        portfolio_id=account_found.portfolio_id,
+        portfolio_id=portfolio_id,
         category_id=transaction.category_id,
         category_name=transaction.category_name,
     )
@@ -192,8 +371,9 @@ async def create_transaction(
     # Create the transaction
     db_transaction = Transaction.model_validate(transaction.model_dump(), update={"account_id": account_id})
     db.add(db_transaction)
-    db.commit()
-    db.refresh(db_transaction)
+    await _record_transaction_changes(db, account_id, [(db_transaction.clear_date, db_transaction.amount)])
+    await db.commit()
+    await db.refresh(db_transaction)
 
     return TransactionRead.model_validate(db_transaction)
 
@@ -201,20 +381,12 @@ async def create_transaction(
 @router.get("/{transaction_id}")
 async def get_transaction(
     db: DbSession,
-    current_user: CurrentActiveUser,
+    portfolio_access: CurrentPortfolioAccess,
     account_id: int,
     transaction_id: int,
 ) -> TransactionRead:
-    sql = (
-        select(Transaction)
-        .join(Account)
-        .join(Portfolio)
-        .join(PortfolioUser)
-        .where(Account.account_id == account_id)
-        .where(Transaction.transaction_id == transaction_id)
-        .where(PortfolioUser.user_id == current_user.user_id)
-    )
-    transaction = db.exec(sql).one_or_none()
+    sql = select(Transaction).where(Transaction.account_id == account_id).where(Transaction.transaction_id == transaction_id)
+    transaction = (await db.exec(sql)).one_or_none() if portfolio_access.has_account(account_id) else None
 
     if not transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
@@ -225,32 +397,25 @@ async def get_transaction(
 @router.delete("/{transaction_id}")
 async def delete_transaction(
     db: DbSession,
-    current_user: CurrentActiveUser,
+    portfolio_access: CurrentPortfolioAccess,
     account_id: int,
     transaction_id: int,
 ) -> dict[str, bool]:
-    sql = (
-        select(Transaction)
-        .join(Account)
-        .join(Portfolio)
-        .join(PortfolioUser)
-        .where(Account.account_id == account_id)
-        .where(Transaction.transaction_id == transaction_id)
-        .where(PortfolioUser.user_id == current_user.user_id)
-    )
-    transaction = db.exec(sql).one_or_none()
+    sql = select(Transaction).where(Transaction.account_id == account_id).where(Transaction.transaction_id == transaction_id)
+    transaction = (await db.exec(sql)).one_or_none() if portfolio_access.has_account(account_id) else None
 
     if not transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
 
     sql = select(ScheduledTransactionHistory).where(ScheduledTransactionHistory.transaction_id == transaction_id)
-    scheduled_transaction_history = db.exec(sql).one_or_none()
+    scheduled_transaction_history = (await db.exec(sql)).one_or_none()
 
     if scheduled_transaction_history:
-        db.delete(scheduled_transaction_history)
+        await db.delete(scheduled_transaction_history)
 
-    db.delete(transaction)
-    db.commit()
+    await db.delete(transaction)
+    await _record_transaction_changes(db, account_id, [(transaction.clear_date, -transaction.amount)])
+    await db.commit()
 
     return {"ok": True}
 
@@ -258,63 +423,49 @@ async def delete_transaction(
 @router.patch("/{transaction_id}")
 async def update_transaction(
     db: DbSession,
-    current_user: CurrentActiveUser,
+    portfolio_access: CurrentPortfolioAccess,
     account_id: int,
     transaction_id: int,
     transaction: TransactionUpdate,
 ) -> TransactionRead:
-    transaction_sql = (
-        select(Transaction)
-        .join(Account)
-        .join(Portfolio)
-        .join(PortfolioUser)
-        .where(Account.account_id == account_id)
-        .where(Transaction.transaction_id == transaction_id)
-        .where(PortfolioUser.user_id == current_user.user_id)
-    )
-    db_transaction = db.exec(transaction_sql).one_or_none()
-    if not db_transaction:
+    portfolio_id = portfolio_access.portfolio_of(account_id)
+    if portfolio_id is None:
         raise HTTPException(status_code=404, detail="Transaction not found")
 
-    # Get the user's data to verify access
-    account_sql = (
-        select(Account)
-        .join(Portfolio)
-        .join(PortfolioUser)
-        .where(Account.account_id == account_id)
-        .where(PortfolioUser.user_id == current_user.user_id)
-    )
-    account_found = db.exec(account_sql).first()
-    if not account_found:
-        raise HTTPException(status_code=404, detail="Account not found")
+    transaction_sql = select(Transaction).where(Transaction.account_id == account_id).where(Transaction.transaction_id == transaction_id)
+    db_transaction = (await db.exec(transaction_sql)).one_or_none()
+    if not db_transaction:
+        raise HTTPException(status_code=404, detail="Transaction not found")
 
     await update_transaction_type_id_ref(
         db=db,
-        current_user=current_user,
+        portfolio_access=portfolio_access,
         object_to_update=db_transaction,
-        portfolio_id=account_found.portfolio_id,
+        portfolio_id=portfolio_id,
         transaction_type_id=transaction.transaction_type_id,
         transaction_type_name=transaction.transaction_type_name,
     )
 
     await update_payee_id_ref(
         db=db,
-        current_user=current_user,
+        portfolio_access=portfolio_access,
         object_to_update=db_transaction,
-        portfolio_id=account_found.portfolio_id,
+        portfolio_id=portfolio_id,
         payee_id=transaction.payee_id,
         payee_name=transaction.payee_name,
     )
 
     await update_category_id_ref(
         db=db,
-        current_user=current_user,
+        portfolio_access=portfolio_access,
         object_to_update=db_transaction,
-        portfolio_id=account_found.portfolio_id,
+        portfolio_id=portfolio_id,
         category_id=transaction.category_id,
         category_name=transaction.category_name,
     )
 
+    previous_clear_date, previous_amount = db_transaction.clear_date, db_transaction.amount
+
     db_transaction.amount = transaction.amount
     db_transaction.transaction_date = transaction.transaction_date
     db_transaction.clear_date = transaction.clear_date
@@ -323,7 +474,12 @@ async def update_transaction(
     db_transaction.notes = transaction.notes
 
     db.add(db_transaction)
-    db.commit()
-    db.refresh(db_transaction)
+    await _record_transaction_changes(
+        db,
+        account_id,
+        [(previous_clear_date, -previous_amount), (db_transaction.clear_date, db_transaction.amount)],
+    )
+    await db.commit()
+    await db.refresh(db_transaction)
 
     return TransactionRead.model_validate(db_transaction)
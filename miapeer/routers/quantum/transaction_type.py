@@ -1,11 +1,13 @@
 from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import select
+from sqlmodel import col, select
 
-from miapeer.dependencies import CurrentActiveUser, DbSession, is_quantum_user
-from miapeer.models.quantum.portfolio import Portfolio
-from miapeer.models.quantum.portfolio_user import PortfolioUser
+from miapeer.dependencies import (
+    CurrentPortfolioAccess,
+    DbSession,
+    is_quantum_user,
+)
 from miapeer.models.quantum.transaction_type import (
     TransactionType,
     TransactionTypeCreate,
@@ -21,9 +23,20 @@ router = APIRouter(
 )
 
 
+async def _add_transaction_type(db: DbSession, portfolio_access: CurrentPortfolioAccess, transaction_type: TransactionTypeCreate) -> TransactionType:
+    if not portfolio_access.has_portfolio(transaction_type.portfolio_id):
+        raise HTTPException(status_code=404, detail="Portfolio not found")
+
+    db_transaction_type = TransactionType.model_validate(transaction_type)
+    db.add(db_transaction_type)
+    await db.flush()  # Need to flush early in order to get the new transaction type's ID
+
+    return db_transaction_type
+
+
 async def update_transaction_type_id_ref(
     db: DbSession,
-    current_user: CurrentActiveUser,
+    portfolio_access: CurrentPortfolioAccess,
     object_to_update,
     portfolio_id: int,
     transaction_type_id: Optional[int],
@@ -32,21 +45,17 @@ async def update_transaction_type_id_ref(
     if transaction_type_id is not None:
         transaction_type_sql = (
             select(TransactionType)
-            .join(Portfolio)
-            .join(PortfolioUser)
             .where(TransactionType.transaction_type_id == transaction_type_id)
-            .where(PortfolioUser.user_id == current_user.user_id)
+            .where(col(TransactionType.portfolio_id).in_(portfolio_access.portfolio_ids))
         )
-        transaction_type_found = db.exec(transaction_type_sql).first()
+        transaction_type_found = (await db.exec(transaction_type_sql)).first()
         if transaction_type_found:
             object_to_update.transaction_type_id = transaction_type_found.transaction_type_id
         else:
             raise HTTPException(status_code=404, detail="Transaction type not found")
     elif transaction_type_name:
-        new_transaction_type = await create_transaction_type(
-            db=db,
-            current_user=current_user,
-            transaction_type=TransactionTypeCreate(portfolio_id=portfolio_id, name=transaction_type_name),
+        new_transaction_type = await _add_transaction_type(
+            db=db, portfolio_access=portfolio_access, transaction_type=TransactionTypeCreate(portfolio_id=portfolio_id, name=transaction_type_name)
         )
         if new_transaction_type:
             object_to_update.transaction_type_id = new_transaction_type.transaction_type_id
@@ -59,39 +68,23 @@ async def update_transaction_type_id_ref(
 @router.get("")
 async def get_all_transaction_types(
     db: DbSession,
-    current_user: CurrentActiveUser,
+    portfolio_access: CurrentPortfolioAccess,
 ) -> list[TransactionTypeRead]:
-    sql = (
-        select(TransactionType)
-        .join(Portfolio)
-        .join(PortfolioUser)
-        .where(PortfolioUser.user_id == current_user.user_id)
-        .order_by(TransactionType.name)
-    )
-    transaction_types = db.exec(sql).all()
+    sql = select(TransactionType).where(col(TransactionType.portfolio_id).in_(portfolio_access.portfolio_ids)).order_by(TransactionType.name)
+    transaction_types = (await db.exec(sql)).all()
     return [TransactionTypeRead.model_validate(transaction_type) for transaction_type in transaction_types]
 
 
 @router.post("")
 async def create_transaction_type(
     db: DbSession,
-    current_user: CurrentActiveUser,
+    portfolio_access: CurrentPortfolioAccess,
     transaction_type: TransactionTypeCreate,
 ) -> TransactionTypeRead:
 
-    # Get the user's portfolio
-    sql = select(Portfolio).join(PortfolioUser).where(PortfolioUser.user_id == current_user.user_id)
-    portfolio = db.exec(sql).first()
-
-    if not portfolio:
-        raise HTTPException(status_code=404, detail="Portfolio not found")
-
-    # Create the transaction type
-    db_transaction_type = TransactionType.model_validate(transaction_type)
-
-    db.add(db_transaction_type)
-    db.commit()
-    db.refresh(db_transaction_type)
+    db_transaction_type = await _add_transaction_type(db=db, portfolio_access=portfolio_access, transaction_type=transaction_type)
+    await db.commit()
+    await db.refresh(db_transaction_type)
 
     return TransactionTypeRead.model_validate(db_transaction_type)
 
@@ -99,18 +92,16 @@ async def create_transaction_type(
 @router.get("/{transaction_type_id}")
 async def get_transaction_type(
     db: DbSession,
-    current_user: CurrentActiveUser,
+    portfolio_access: CurrentPortfolioAccess,
     transaction_type_id: int,
 ) -> TransactionTypeRead:
 
     sql = (
         select(TransactionType)
-        .join(Portfolio)
-        .join(PortfolioUser)
         .where(TransactionType.transaction_type_id == transaction_type_id)
-        .where(PortfolioUser.user_id == current_user.user_id)
+        .where(col(TransactionType.portfolio_id).in_(portfolio_access.portfolio_ids))
     )
-    transaction_type = db.exec(sql).one_or_none()
+    transaction_type = (await db.exec(sql)).one_or_none()
 
     if not transaction_type:
         raise HTTPException(status_code=404, detail="Transaction type not found")
@@ -121,24 +112,22 @@ async def get_transaction_type(
 @router.delete("/{transaction_type_id}")
 async def delete_transaction_type(
     db: DbSession,
-    current_user: CurrentActiveUser,
+    portfolio_access: CurrentPortfolioAccess,
     transaction_type_id: int,
 ) -> dict[str, bool]:
 
     sql = (
         select(TransactionType)
-        .join(Portfolio)
-        .join(PortfolioUser)
         .where(TransactionType.transaction_type_id == transaction_type_id)
-        .where(PortfolioUser.user_id == current_user.user_id)
+        .where(col(TransactionType.portfolio_id).in_(portfolio_access.portfolio_ids))
     )
-    transaction_type = db.exec(sql).one_or_none()
+    transaction_type = (await db.exec(sql)).one_or_none()
 
     if not transaction_type:
         raise HTTPException(status_code=404, detail="Transaction type not found")
 
-    db.delete(transaction_type)
-    db.commit()
+    await db.delete(transaction_type)
+    await db.commit()
 
     return {"ok": True}
 
@@ -146,19 +135,17 @@ async def delete_transaction_type(
 @router.patch("/{transaction_type_id}")
 async def update_transaction_type(
     db: DbSession,
-    current_user: CurrentActiveUser,
+    portfolio_access: CurrentPortfolioAccess,
     transaction_type_id: int,
     transaction_type: TransactionTypeUpdate,
 ) -> TransactionTypeRead:
 
     sql = (
         select(TransactionType)
-        .join(Portfolio)
-        .join(PortfolioUser)
         .where(TransactionType.transaction_type_id == transaction_type_id)
-        .where(PortfolioUser.user_id == current_user.user_id)
+        .where(col(TransactionType.portfolio_id).in_(portfolio_access.portfolio_ids))
     )
-    db_transaction_type = db.exec(sql).one_or_none()
+    db_transaction_type = (await db.exec(sql)).one_or_none()
 
     if not db_transaction_type:
         raise HTTPException(status_code=404, detail="Transaction type not found")
@@ -167,7 +154,7 @@ async def update_transaction_type(
         db_transaction_type.name = transaction_type.name
 
     db.add(db_transaction_type)
-    db.commit()
-    db.refresh(db_transaction_type)
+    await db.commit()
+    await db.refresh(db_transaction_type)
 
     return TransactionTypeRead.model_validate(db_transaction_type)
@@ -397,6 +397,13 @@ def create_complete_portfolio(
         ]
     )
 
+    # Accounts carry maintained balances, so start them off in line with the transactions added below
+    transactions = [my_minimal_transaction, my_debit_transaction, my_credit_transaction, not_my_debit_transaction, not_my_credit_transaction]
+    for account in [my_account_1, my_account_2, not_my_account_1, not_my_account_2]:
+        account_transactions = [t for t in transactions if t.account_id == account.account_id]
+        account.current_balance = account.starting_balance + sum(t.amount for t in account_transactions)
+        account.cleared_balance = account.starting_balance + sum(t.amount for t in account_transactions if t.clear_date is not None)
+
     mock_db_session.add_all(
         [
             my_account_1,
@@ -155,3 +155,23 @@ class TestDelete:
 
         assert response.status_code == 404
         assert response.json() == {"detail": "Account not found"}
+
+
+@pytest.mark.usefixtures("create_complete_portfolio")
+class TestMaintainedBalance:
+    def test_balance_follows_transaction_changes(self, client: TestClient, my_account_1: Account) -> None:
+        account_route = f"/quantum/v1/accounts/{my_account_1.account_id}"
+        starting_balance = client.get(account_route).json()["balance"]
+
+        response = client.post(f"{account_route}/transactions", json={"amount": 500, "transaction_date": "2024-01-01"})
+        transaction_id = response.json()["transaction_id"]
+        assert client.get(account_route).json()["balance"] == starting_balance + 500
+
+        client.patch(
+            f"{account_route}/transactions/{transaction_id}",
+            json={"amount": 200, "transaction_date": "2024-01-01", "clear_date": "2024-01-02", "exclude_from_forecast": False},
+        )
+        assert client.get(account_route).json()["balance"] == starting_balance + 200
+
+        client.delete(f"{account_route}/transactions/{transaction_id}")
+        assert client.get(account_route).json()["balance"] == starting_balance
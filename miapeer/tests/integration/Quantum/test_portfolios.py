@@ -1,4 +1,7 @@
+from datetime import date, timedelta
+
 import pytest
+from dateutil.relativedelta import relativedelta
 from fastapi.testclient import TestClient
 
 from miapeer.models.quantum.portfolio import Portfolio
@@ -57,6 +60,64 @@ class TestGetOne:
         assert response.json() == {"detail": "Portfolio not found"}
 
 
+@pytest.mark.usefixtures("create_complete_portfolio")
+class TestGetForecast:
+    def test_get_forecast_succeeds(self, client: TestClient, my_portfolio: Portfolio) -> None:
+        response = client.get(f"/quantum/v1/portfolios/{my_portfolio.portfolio_id}/forecast", params={"horizon_months": 1, "interval": "weekly"})
+
+        days = (date.today() + relativedelta(months=1) - date.today()).days + 1
+        closing_days = list(range(6, days, 7))
+        if closing_days[-1] != days - 1:
+            closing_days.append(days - 1)
+        expected_dates = [date.today() + timedelta(days=day) for day in closing_days]
+
+        # Account 1's balance plus both of its scheduled transactions, which are due today
+        account_1_balance = 101 - 0 - 13 + 864 + 2349 - 849
+
+        assert response.status_code == 200
+        assert response.json() == {
+            "portfolio_id": my_portfolio.portfolio_id,
+            "interval": "weekly",
+            "dates": [str(d) for d in expected_dates],
+            "accounts": [
+                {
+                    "account_id": 11,
+                    "balances": [account_1_balance] * len(expected_dates),
+                    "lowest_balance": account_1_balance,
+                    "lowest_balance_date": str(date.today()),
+                },
+                {"account_id": 12, "balances": [102] * len(expected_dates), "lowest_balance": 102, "lowest_balance_date": str(date.today())},
+            ],
+            "total": {
+                "balances": [account_1_balance + 102] * len(expected_dates),
+                "lowest_balance": account_1_balance + 102,
+                "lowest_balance_date": str(date.today()),
+            },
+        }
+
+    def test_get_forecast_daily_covers_the_horizon(self, client: TestClient, my_portfolio: Portfolio) -> None:
+        response = client.get(f"/quantum/v1/portfolios/{my_portfolio.portfolio_id}/forecast")
+
+        days = (date.today() + relativedelta(months=24) - date.today()).days + 1
+
+        assert response.status_code == 200
+        assert response.json()["dates"][0] == str(date.today())
+        assert len(response.json()["dates"]) == days
+        assert len(response.json()["total"]["balances"]) == days
+
+    def test_get_forecast_of_a_portfolio_that_is_not_mine_fails(self, client: TestClient, not_my_portfolio: Portfolio) -> None:
+        response = client.get(f"/quantum/v1/portfolios/{not_my_portfolio.portfolio_id}/forecast")
+
+        assert response.status_code == 404
+        assert response.json() == {"detail": "Portfolio not found"}
+
+    @pytest.mark.parametrize("horizon_months", [0, 121])
+    def test_get_forecast_with_invalid_horizon_fails(self, client: TestClient, my_portfolio: Portfolio, horizon_months: int) -> None:
+        response = client.get(f"/quantum/v1/portfolios/{my_portfolio.portfolio_id}/forecast", params={"horizon_months": horizon_months})
+
+        assert response.status_code == 422
+
+
 @pytest.mark.usefixtures("create_complete_portfolio")
 class TestDelete:
     # This is the only test case since only a Quantum Super User can delete a portfolio. The owner cannot perform this action.
@@ -0,0 +1,298 @@
+import re
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Iterator
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import Engine, create_engine, event, insert
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from miapeer.adapter.migrations import upgrade
+from miapeer.adapter.sql import transaction as transaction_sql
+from miapeer.models.quantum.account import Account
+from miapeer.models.quantum.budget import Budget
+from miapeer.models.quantum.category import Category
+from miapeer.models.quantum.payee import Payee
+from miapeer.models.quantum.portfolio import Portfolio
+from miapeer.models.quantum.portfolio_user import PortfolioUser
+from miapeer.models.quantum.repeat_option import RepeatOption
+from miapeer.models.quantum.repeat_unit import RepeatUnit
+from miapeer.models.quantum.scheduled_transaction import ScheduledTransaction
+from miapeer.models.quantum.scheduled_transaction_history import (
+    ScheduledTransactionHistory,
+)
+from miapeer.models.quantum.transaction import Transaction
+from miapeer.models.quantum.transaction_type import TransactionType
+
+# Queries on these tables have to seek through an index; a full scan grows with every user's data
+WATCHED_TABLES = {
+    "quantum_transaction",
+    "quantum_account",
+    "quantum_portfolio",
+    "quantum_portfolio_user",
+    "quantum_scheduled_transaction",
+    "quantum_scheduled_transaction_history",
+    "quantum_transaction_summary",
+    "miapeer_permission",
+}
+
+USER_COUNT = 50
+ACCOUNTS_PER_PORTFOLIO = 4
+TRANSACTIONS_PER_ACCOUNT = 250
+NAMES_PER_PORTFOLIO = 20
+SCHEDULED_TRANSACTIONS_PER_ACCOUNT = 3
+HISTORY_PER_SCHEDULED_TRANSACTION = 12
+
+MY_USER_ID = 91
+MY_PORTFOLIO_ID = 1
+MY_ACCOUNT_ID = 1
+MY_BUDGET_ID = 1
+
+
+def _seed(engine: Engine) -> None:
+    today = date.today()
+
+    portfolios, portfolio_users, accounts, transactions = [], [], [], []
+    payees, categories, transaction_types, budgets = [], [], [], []
+    scheduled_transactions, history = [], []
+
+    for portfolio_id in range(1, USER_COUNT + 1):
+        portfolios.append({"portfolio_id": portfolio_id})
+        portfolio_users.append({"portfolio_id": portfolio_id, "user_id": MY_USER_ID if portfolio_id == MY_PORTFOLIO_ID else 1000 + portfolio_id})
+
+        first_name_id = (portfolio_id - 1) * NAMES_PER_PORTFOLIO + 1
+        for name_id in range(first_name_id, first_name_id + NAMES_PER_PORTFOLIO):
+            payees.append({"payee_id": name_id, "portfolio_id": portfolio_id, "name": f"payee {name_id}"})
+            categories.append({"category_id": name_id, "portfolio_id": portfolio_id, "name": f"category {name_id}"})
+            transaction_types.append({"transaction_type_id": name_id, "portfolio_id": portfolio_id, "name": f"type {name_id}"})
+        for name_id in range(first_name_id, first_name_id + NAMES_PER_PORTFOLIO, 2):
+            budgets.append(
+                {"budget_id": len(budgets) + 1, "portfolio_id": portfolio_id, "category_id": name_id, "name": f"budget {name_id}", "amount": 100}
+            )
+
+        for _ in range(ACCOUNTS_PER_PORTFOLIO):
+            account_id = len(accounts) + 1
+            accounts.append({"account_id": account_id, "portfolio_id": portfolio_id, "name": f"account {account_id}", "starting_balance": 1000})
+
+            for i in range(TRANSACTIONS_PER_ACCOUNT):
+                transaction_date = today - timedelta(days=(TRANSACTIONS_PER_ACCOUNT - i) * 4)
+                transactions.append(
+                    {
+                        "transaction_id": len(transactions) + 1,
+                        "account_id": account_id,
+                        "transaction_type_id": first_name_id + i % NAMES_PER_PORTFOLIO,
+                        "payee_id": first_name_id + i % NAMES_PER_PORTFOLIO,
+                        "category_id": first_name_id + i % NAMES_PER_PORTFOLIO,
+                        "amount": -(i % 50) - 1,
+                        "transaction_date": transaction_date,
+                        # The most recent few haven't cleared yet
+                        "clear_date": transaction_date + timedelta(days=2) if i < TRANSACTIONS_PER_ACCOUNT - 5 else None,
+                        "exclude_from_forecast": False,
+                    }
+                )
+
+            for _ in range(SCHEDULED_TRANSACTIONS_PER_ACCOUNT):
+                scheduled_transaction_id = len(scheduled_transactions) + 1
+                scheduled_transactions.append(
+                    {
+                        "scheduled_transaction_id": scheduled_transaction_id,
+                        "account_id": account_id,
+                        "payee_id": first_name_id,
+                        "category_id": first_name_id,
+                        "estimate_occurrences": HISTORY_PER_SCHEDULED_TRANSACTION,
+                        "start_date": today,
+                        "repeat_option_id": 1,
+                        "on_autopay": False,
+                    }
+                )
+                for transaction in transactions[-HISTORY_PER_SCHEDULED_TRANSACTION:]:
+                    history.append(
+                        {
+                            "scheduled_transaction_history_id": len(history) + 1,
+                            "scheduled_transaction_id": scheduled_transaction_id,
+                            "transaction_id": transaction["transaction_id"],
+                            "target_date": transaction["transaction_date"],
+                            "post_date": transaction["transaction_date"],
+                        }
+                    )
+
+    with engine.begin() as connection:
+        connection.execute(insert(RepeatUnit), [{"repeat_unit_id": 1, "name": "Month"}])
+        connection.execute(insert(RepeatOption), [{"repeat_option_id": 1, "name": "Monthly", "repeat_unit_id": 1, "quantity": 1, "order_index": 0}])
+        for model, rows in (
+            (Portfolio, portfolios),
+            (PortfolioUser, portfolio_users),
+            (Account, accounts),
+            (Payee, payees),
+            (Category, categories),
+            (TransactionType, transaction_types),
+            (Budget, budgets),
+            (Transaction, transactions),
+            (ScheduledTransaction, scheduled_transactions),
+            (ScheduledTransactionHistory, history),
+        ):
+            connection.execute(insert(model), rows)
+
+        # Give the planner the statistics it would have on a real database
+        connection.exec_driver_sql("ANALYZE")
+
+
+@pytest.fixture(scope="module")
+def db_path(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    db_path = tmp_path_factory.mktemp("query_plans") / "miapeer.db"
+
+    engine = create_engine(f"sqlite:///{db_path}")
+    upgrade(engine)
+    _seed(engine)
+    engine.dispose()
+
+    return db_path
+
+
+@pytest.fixture
+def explain_engine(db_path: Path) -> Iterator[Engine]:
+    engine = create_engine(f"sqlite:///{db_path}")
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def executed_statements(mock_async_db_engine: AsyncEngine) -> Iterator[list[tuple[str, Any]]]:
+    statements: list[tuple[str, Any]] = []
+
+    def record(conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool) -> None:
+        if not executemany and statement.lstrip().lower().startswith(("select", "with", "update", "delete")):
+            statements.append((statement, parameters))
+
+    event.listen(mock_async_db_engine.sync_engine, "before_cursor_execute", record)
+    yield statements
+    event.remove(mock_async_db_engine.sync_engine, "before_cursor_execute", record)
+
+
+def _table_aliases(statement: str) -> dict[str, str]:
+    aliases = {table: table for table in WATCHED_TABLES}
+
+    for table, alias in re.findall(r"\b(?:from|join)\s+(\w+)(?:\s+as)?\s+(\w+)", statement, flags=re.IGNORECASE):
+        if table in WATCHED_TABLES:
+            aliases[alias] = table
+
+    return aliases
+
+
+def _query_plan(engine: Engine, statement: str, parameters: Any) -> list[str]:
+    with engine.connect() as connection:
+        return [detail for *_, detail in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()]
+
+
+def full_scans(engine: Engine, statement: str, parameters: Any) -> list[str]:
+    """Every step of the statement's plan that reads a whole watched table (or all of one of its indexes)."""
+
+    aliases = _table_aliases(statement)
+
+    scans: list[str] = []
+    for detail in _query_plan(engine, statement, parameters):
+        match = re.match(r"SCAN (\w+)", detail)
+        if match and match.group(1) in aliases:
+            scans.append(detail)
+
+    return scans
+
+
+def sorts(engine: Engine, statement: str, parameters: Any) -> list[str]:
+    """Every step of the statement's plan that sorts rows after reading them, rather than reading them in index order."""
+
+    return [detail for detail in _query_plan(engine, statement, parameters) if detail.startswith("USE TEMP B-TREE FOR")]
+
+
+def test_full_scans_are_detected(explain_engine: Engine) -> None:
+    assert full_scans(explain_engine, "select * from quantum_transaction t where t.amount = ?", (1,)) == ["SCAN t"]
+    assert full_scans(explain_engine, "select * from quantum_transaction t where t.account_id = ?", (1,)) == []
+
+
+def test_sorts_are_detected(explain_engine: Engine) -> None:
+    assert sorts(explain_engine, "select * from quantum_transaction t where t.account_id = ? order by t.amount", (1,)) == [
+        "USE TEMP B-TREE FOR ORDER BY"
+    ]
+    assert sorts(explain_engine, "select * from quantum_transaction t where t.account_id = ? order by t.clear_date", (1,)) == []
+
+
+@pytest.mark.parametrize(
+    "method, path, json",
+    [
+        ("GET", "/quantum/v1/portfolios", None),
+        ("GET", f"/quantum/v1/portfolios/{MY_PORTFOLIO_ID}", None),
+        ("GET", "/quantum/v1/accounts", None),
+        ("GET", f"/quantum/v1/accounts/{MY_ACCOUNT_ID}", None),
+        ("GET", f"/quantum/v1/accounts/{MY_ACCOUNT_ID}/transactions", None),
+        ("GET", f"/quantum/v1/accounts/{MY_ACCOUNT_ID}/transactions?limit_months=24", None),
+        ("GET", f"/quantum/v1/accounts/{MY_ACCOUNT_ID}/transactions/page", None),
+        ("GET", f"/quantum/v1/accounts/{MY_ACCOUNT_ID}/transactions/stream", None),
+        ("GET", f"/quantum/v1/accounts/{MY_ACCOUNT_ID}/transactions/1", None),
+        ("GET", f"/quantum/v1/accounts/{MY_ACCOUNT_ID}/scheduled-transactions", None),
+        ("GET", f"/quantum/v1/accounts/{MY_ACCOUNT_ID}/scheduled-transactions/1", None),
+        ("GET", "/quantum/v1/budgets", None),
+        ("GET", f"/quantum/v1/budgets/{MY_BUDGET_ID}", None),
+        ("GET", "/quantum/v1/payees", None),
+        ("GET", "/quantum/v1/categories", None),
+        ("GET", "/quantum/v1/transaction-types", None),
+        (
+            "POST",
+            f"/quantum/v1/accounts/{MY_ACCOUNT_ID}/transactions",
+            {
+                "transaction_date": str(date.today()),
+                "clear_date": str(date.today() - timedelta(days=400)),
+                "amount": -5,
+                "exclude_from_forecast": False,
+                "payee_name": "payee 3",
+                "category_name": "category 3",
+                "transaction_type_name": "type 3",
+            },
+        ),
+    ],
+)
+def test_hot_queries_use_indexes(
+    client: TestClient,
+    explain_engine: Engine,
+    executed_statements: list[tuple[str, Any]],
+    method: str,
+    path: str,
+    json: Any,
+) -> None:
+    response = client.request(method, path, json=json)
+
+    assert response.status_code == 200
+    assert executed_statements
+
+    for statement, parameters in executed_statements:
+        assert full_scans(explain_engine, statement, parameters) == [], statement
+
+
+@pytest.mark.parametrize("sql", transaction_sql.GET_ALL)
+def test_ledger_reads_in_index_order(explain_engine: Engine, sql: Any) -> None:
+    compiled = sql.compile(explain_engine)
+    parameters = compiled.construct_params({"account_id": MY_ACCOUNT_ID, "limit_date": date.today() - timedelta(days=90)})
+
+    assert sorts(explain_engine, str(compiled), tuple(parameters[name] for name in compiled.positiontup)) == []
+
+
+def _ledger_pages(client: TestClient) -> Iterator[Any]:
+    route = f"/quantum/v1/accounts/{MY_ACCOUNT_ID}/transactions/page"
+
+    page = client.get(route, params={"limit": 100}).json()
+    yield page
+
+    # Page on until the cleared transactions run out part way through a page and the uncleared ones carry on after them
+    while page["next_cursor"]:
+        page = client.get(route, params={"limit": 100, "cursor": page["next_cursor"]}).json()
+        yield page
+
+
+def test_pages_read_in_index_order(client: TestClient, explain_engine: Engine, executed_statements: list[tuple[str, Any]]) -> None:
+    pages = list(_ledger_pages(client))
+
+    assert len(pages) > 1
+    assert pages[-1]["transactions"][-1]["clear_date"] is None
+
+    for statement, parameters in executed_statements:
+        assert sorts(explain_engine, statement, parameters) == [], statement
@@ -64,10 +64,14 @@ authorized_tests = [
     ParamTestCase(method="GET", route="/miapeer/v1/permissions/{permission_id}", miapeer_admin=True),
     ParamTestCase(method="DELETE", route="/miapeer/v1/permissions/{permission_id}", miapeer_admin=True),
 
+    # Miapeer: Database
+    ParamTestCase(method="GET", route="/miapeer/v1/database/pool", miapeer_admin=True),
+
     # Quantum: Portfolios
     ParamTestCase(method="GET", route="/quantum/v1/portfolios", quantum_user=True),
     ParamTestCase(method="POST", route="/quantum/v1/portfolios", quantum_user=True),
     ParamTestCase(method="GET", route="/quantum/v1/portfolios/{portfolio_id}", quantum_user=True),
+    ParamTestCase(method="GET", route="/quantum/v1/portfolios/{portfolio_id}/forecast", quantum_user=True),
     ParamTestCase(method="DELETE", route="/quantum/v1/portfolios/{portfolio_id}", quantum_super_user=True),
 
     # Quantum: Accounts
@@ -100,6 +104,8 @@ authorized_tests = [
 
     # Quantum: Transactions
     ParamTestCase(method="GET", route="/quantum/v1/accounts/{account_id}/transactions", quantum_user=True),
+    ParamTestCase(method="GET", route="/quantum/v1/accounts/{account_id}/transactions/page", quantum_user=True),
+    ParamTestCase(method="GET", route="/quantum/v1/accounts/{account_id}/transactions/stream", quantum_user=True),
     ParamTestCase(method="POST", route="/quantum/v1/accounts/{account_id}/transactions", quantum_user=True),
     ParamTestCase(method="GET", route="/quantum/v1/accounts/{account_id}/transactions/{transaction_id}", quantum_user=True),
     ParamTestCase(method="DELETE", route="/quantum/v1/accounts/{account_id}/transactions/{transaction_id}", quantum_user=True),
@@ -116,6 +122,7 @@ authorized_tests = [
 
     # Quantum: RepeatOptions
     ParamTestCase(method="GET", route="/quantum/v1/repeat-options", quantum_user=True),
+    ParamTestCase(method="POST", route="/quantum/v1/repeat-options/refresh", quantum_super_user=True),
 
     # Quantum: Budgets
     ParamTestCase(method="GET", route="/quantum/v1/budgets", quantum_user=True),
@@ -171,10 +178,14 @@ unauthorized_tests = [
     ParamTestCase(method="GET", route="/miapeer/v1/permissions/{permission_id}", miapeer_user=True, miapeer_super_user=True, quantum_user=True, quantum_admin=True, quantum_super_user=True),
     ParamTestCase(method="DELETE", route="/miapeer/v1/permissions/{permission_id}", miapeer_user=True, miapeer_super_user=True, quantum_user=True, quantum_admin=True, quantum_super_user=True),
 
+    # Miapeer: Database
+    ParamTestCase(method="GET", route="/miapeer/v1/database/pool", miapeer_user=True, miapeer_super_user=True, quantum_user=True, quantum_admin=True, quantum_super_user=True),
+
     # Quantum: Portfolios
     ParamTestCase(method="GET", route="/quantum/v1/portfolios", miapeer_user=True, miapeer_admin=True, miapeer_super_user=True, quantum_admin=True, quantum_super_user=True),
     ParamTestCase(method="POST", route="/quantum/v1/portfolios", miapeer_user=True, miapeer_admin=True, miapeer_super_user=True, quantum_admin=True, quantum_super_user=True),
     ParamTestCase(method="GET", route="/quantum/v1/portfolios/{portfolio_id}", miapeer_user=True, miapeer_admin=True, miapeer_super_user=True, quantum_admin=True, quantum_super_user=True),
+    ParamTestCase(method="GET", route="/quantum/v1/portfolios/{portfolio_id}/forecast", miapeer_user=True, miapeer_admin=True, miapeer_super_user=True, quantum_admin=True, quantum_super_user=True),
     ParamTestCase(method="DELETE", route="/quantum/v1/portfolios/{portfolio_id}", miapeer_user=True, miapeer_admin=True, miapeer_super_user=True, quantum_user=True, quantum_admin=True),
 
     # Quantum: Accounts
@@ -207,6 +218,8 @@ unauthorized_tests = [
 
     # Quantum: Transactions
     ParamTestCase(method="GET", route="/quantum/v1/accounts/{account_id}/transactions", miapeer_user=True, miapeer_admin=True, miapeer_super_user=True, quantum_admin=True, quantum_super_user=True),
+    ParamTestCase(method="GET", route="/quantum/v1/accounts/{account_id}/transactions/page", miapeer_user=True, miapeer_admin=True, miapeer_super_user=True, quantum_admin=True, quantum_super_user=True),
+    ParamTestCase(method="GET", route="/quantum/v1/accounts/{account_id}/transactions/stream", miapeer_user=True, miapeer_admin=True, miapeer_super_user=True, quantum_admin=True, quantum_super_user=True),
     ParamTestCase(method="POST", route="/quantum/v1/accounts/{account_id}/transactions", miapeer_user=True, miapeer_admin=True, miapeer_super_user=True, quantum_admin=True, quantum_super_user=True),
     ParamTestCase(method="GET", route="/quantum/v1/accounts/{account_id}/transactions/{transaction_id}", miapeer_user=True, miapeer_admin=True, miapeer_super_user=True, quantum_admin=True, quantum_super_user=True),
     ParamTestCase(method="DELETE", route="/quantum/v1/accounts/{account_id}/transactions/{transaction_id}", miapeer_user=True, miapeer_admin=True, miapeer_super_user=True, quantum_admin=True, quantum_super_user=True),
@@ -223,6 +236,7 @@ unauthorized_tests = [
 
     # Quantum: RepeatOptions
     ParamTestCase(method="GET", route="/quantum/v1/repeat-options", miapeer_user=True, miapeer_admin=True, miapeer_super_user=True, quantum_admin=True, quantum_super_user=True),
+    ParamTestCase(method="POST", route="/quantum/v1/repeat-options/refresh", miapeer_user=True, miapeer_admin=True, miapeer_super_user=True, quantum_user=True, quantum_admin=True),
 
     # Quantum: Budgets
     ParamTestCase(method="GET", route="/quantum/v1/budgets", miapeer_user=True, miapeer_admin=True, miapeer_super_user=True, quantum_admin=True, quantum_super_user=True),
@@ -488,7 +488,7 @@ class TestUpdate:
             # Trying to change the account_id isn't allowed
             "account_id": scheduled_transaction.account_id,
             "scheduled_transaction_id": scheduled_transaction.scheduled_transaction_id,
-            "transaction_type_id": getattr(scheduled_transaction, "transaction_type_id", None),
+            "transaction_type_id": getattr(transaction_type, "transaction_type_id", None),
             "payee_id": getattr(payee, "payee_id", None),
             "category_id": getattr(category, "category_id", None),
             "fixed_amount": fixed_amount,
@@ -501,7 +501,7 @@ class TestUpdate:
             "notes": notes,
             "on_autopay": on_autopay,
             "next_transaction": {
-                "transaction_type_id": getattr(scheduled_transaction, "transaction_type_id", None),
+                "transaction_type_id": getattr(transaction_type, "transaction_type_id", None),
                 "payee_id": getattr(payee, "payee_id", None),
                 "category_id": getattr(category, "category_id", None),
                 "amount": fixed_amount,
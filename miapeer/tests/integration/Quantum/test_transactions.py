@@ -1,3 +1,4 @@
+import json
 from datetime import date
 from typing import Optional
 
@@ -127,6 +128,82 @@ class TestGetAll:
         assert actual_response == expected_response
 
 
+@pytest.mark.usefixtures("create_complete_portfolio")
+class TestStream:
+    def test_ndjson_matches_the_ledger(self, client: TestClient, my_account_1: Account) -> None:
+        expected_response = client.get(f"/quantum/v1/accounts/{my_account_1.account_id}/transactions").json()
+
+        response = client.get(f"/quantum/v1/accounts/{my_account_1.account_id}/transactions/stream")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        assert [json.loads(line) for line in response.text.splitlines()] == expected_response
+
+    def test_json_array_matches_the_ledger(self, client: TestClient, my_account_1: Account) -> None:
+        expected_response = client.get(f"/quantum/v1/accounts/{my_account_1.account_id}/transactions").json()
+
+        response = client.get(f"/quantum/v1/accounts/{my_account_1.account_id}/transactions/stream", params={"format": "json"})
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/json"
+        assert response.json() == expected_response
+
+    def test_empty_json_array(self, client: TestClient, my_account_2: Account) -> None:
+        response = client.get(f"/quantum/v1/accounts/{my_account_2.account_id}/transactions/stream", params={"format": "json"})
+
+        assert response.status_code == 200
+        assert response.json() == []
+
+    def test_stream_in_wrong_portfolio_fails(self, client: TestClient, not_my_account_1: Account) -> None:
+        response = client.get(f"/quantum/v1/accounts/{not_my_account_1.account_id}/transactions/stream")
+
+        assert response.status_code == 404
+        assert response.json() == {"detail": "Account not found"}
+
+
+@pytest.mark.usefixtures("create_complete_portfolio")
+class TestGetPage:
+    def test_pages_carry_the_running_balance(
+        self,
+        client: TestClient,
+        my_account_1: Account,
+        my_minimal_transaction: Transaction,
+        my_debit_transaction: Transaction,
+        my_credit_transaction: Transaction,
+    ) -> None:
+        route = f"/quantum/v1/accounts/{my_account_1.account_id}/transactions/page"
+
+        first_page = client.get(route, params={"limit": 2})
+
+        assert first_page.status_code == 200
+        assert [t["transaction_id"] for t in first_page.json()["transactions"]] == [
+            my_debit_transaction.transaction_id,
+            my_minimal_transaction.transaction_id,
+        ]
+        assert first_page.json()["next_cursor"] is not None
+
+        second_page = client.get(route, params={"limit": 2, "cursor": first_page.json()["next_cursor"]})
+
+        assert second_page.status_code == 200
+        assert [t["transaction_id"] for t in second_page.json()["transactions"]] == [my_credit_transaction.transaction_id]
+        assert second_page.json()["transactions"][0]["balance"] == (
+            my_account_1.starting_balance + my_debit_transaction.amount + my_minimal_transaction.amount + my_credit_transaction.amount
+        )
+        assert second_page.json()["next_cursor"] is None
+
+    def test_page_in_wrong_portfolio_fails(self, client: TestClient, not_my_account_1: Account) -> None:
+        response = client.get(f"/quantum/v1/accounts/{not_my_account_1.account_id}/transactions/page")
+
+        assert response.status_code == 404
+        assert response.json() == {"detail": "Account not found"}
+
+    def test_page_with_invalid_cursor_fails(self, client: TestClient, my_account_1: Account) -> None:
+        response = client.get(f"/quantum/v1/accounts/{my_account_1.account_id}/transactions/page", params={"cursor": "garbage"})
+
+        assert response.status_code == 400
+        assert response.json() == {"detail": "Invalid cursor"}
+
+
 @pytest.mark.usefixtures("create_complete_portfolio")
 class TestCreate:
     @pytest.mark.parametrize(
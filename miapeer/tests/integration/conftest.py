@@ -1,17 +1,21 @@
-from typing import Iterator
+from pathlib import Path
+from typing import AsyncIterator, Callable, Iterator
 
 import pytest
 from fastapi import HTTPException
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import NullPool
 from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 
+from miapeer.adapter.repeat_option_registry import clear_repeat_option_registry
 from miapeer.app import app
 from miapeer.dependencies import (
     get_current_active_user,
     get_current_user,
     get_db,
+    get_db_session_factory,
     get_jwk,
     is_miapeer_admin,
     is_miapeer_super_user,
@@ -34,19 +38,28 @@ def not_me() -> User:
 
 
 @pytest.fixture
-def mock_db_session() -> Iterator[Session]:
-    engine = create_engine(
-        "sqlite://",
-        connect_args={"check_same_thread": False},
-        echo=False,
-        poolclass=StaticPool,
-    )
+def db_path(tmp_path: Path) -> Path:
+    # A file rather than an in-memory DB so the sync fixture session and the app's async engine see the same data
+    return tmp_path / "miapeer.db"
+
+
+@pytest.fixture
+def mock_db_session(db_path: Path) -> Iterator[Session]:
+    engine = create_engine(f"sqlite:///{db_path}", echo=False)
 
     SQLModel.metadata.create_all(engine)
 
     with Session(engine) as session:
         yield session
 
+    engine.dispose()
+
+
+@pytest.fixture
+def mock_async_db_engine(db_path: Path) -> AsyncEngine:
+    # TestClient may run each request on its own event loop, so connections must not outlive a request
+    return create_async_engine(f"sqlite+aiosqlite:///{db_path}", echo=False, poolclass=NullPool)
+
 
 @pytest.fixture
 def miapeer_user() -> bool:
@@ -86,6 +99,7 @@ def returned_current_user(me: User) -> User:
 @pytest.fixture(name="client")
 def client_fixture(
     mock_db_session: Session,
+    mock_async_db_engine: AsyncEngine,
     returned_current_user: User,
     miapeer_user: bool,
     miapeer_admin: bool,
@@ -97,8 +111,12 @@ def client_fixture(
     def get_jwk_override() -> str:
         return "super secret key"
 
-    def override_get_db() -> Session:
-        return mock_db_session
+    async def override_get_db() -> AsyncIterator[AsyncSession]:
+        async with AsyncSession(mock_async_db_engine, expire_on_commit=False) as session:
+            yield session
+
+    def override_get_db_session_factory() -> Callable[[], AsyncSession]:
+        return lambda: AsyncSession(mock_async_db_engine, expire_on_commit=False)
 
     def override_is_miapeer_user() -> None:
         if not miapeer_user:
@@ -142,6 +160,7 @@ def client_fixture(
 
     app.dependency_overrides[get_jwk] = get_jwk_override
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_db_session_factory] = override_get_db_session_factory
     app.dependency_overrides[get_current_user] = override_get_current_user
     app.dependency_overrides[get_current_active_user] = override_get_current_active_user
     app.dependency_overrides[is_miapeer_user] = override_is_miapeer_user
@@ -151,8 +170,12 @@ def client_fixture(
     app.dependency_overrides[is_quantum_admin] = override_is_quantum_admin
     app.dependency_overrides[is_quantum_super_user] = override_is_quantum_super_user
 
+    # Every test has its own database, so the repeat options are read from it on first use
+    clear_repeat_option_registry()
+
     client = TestClient(app)
 
     yield client
 
     app.dependency_overrides.clear()
+    clear_repeat_option_registry()
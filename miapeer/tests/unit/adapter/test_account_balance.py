@@ -0,0 +1,112 @@
+from datetime import date
+from typing import AsyncIterator
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from miapeer.adapter.account_balance import (
+    AccountBalanceDrift,
+    AccountBalances,
+    adjust_account_balances,
+    compute_account_balances,
+    verify_account_balances,
+)
+from miapeer.adapter.transaction_summary import roll_up_closed_months
+from miapeer.models.quantum.account import Account
+from miapeer.models.quantum.transaction import Transaction
+from miapeer.routers import quantum  # noqa: F401 - registers every table
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest_asyncio.fixture
+async def db() -> AsyncIterator[AsyncSession]:
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as connection:
+        await connection.run_sync(SQLModel.metadata.create_all)
+
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        session.add(Account(account_id=1, portfolio_id=1, name="checking", starting_balance=1000, current_balance=1286, cleared_balance=1266))
+        session.add(Account(account_id=2, portfolio_id=1, name="savings", starting_balance=0, current_balance=0, cleared_balance=0))
+        session.add_all(
+            [
+                Transaction(account_id=1, transaction_id=1, amount=-30, transaction_date=date(2024, 2, 1), clear_date=date(2024, 2, 3)),
+                Transaction(account_id=1, transaction_id=2, amount=300, transaction_date=date(2024, 4, 1), clear_date=date(2024, 4, 2)),
+                Transaction(account_id=1, transaction_id=3, amount=-4, transaction_date=date(2024, 5, 1), clear_date=date(2024, 5, 2)),
+                Transaction(account_id=1, transaction_id=4, amount=20, transaction_date=date(2024, 5, 9), clear_date=None),
+                Transaction(account_id=2, transaction_id=5, amount=60, transaction_date=date(2024, 3, 1), clear_date=date(2024, 3, 1)),
+            ]
+        )
+        await session.commit()
+
+        yield session
+
+    await engine.dispose()
+
+
+async def stored_balances(db: AsyncSession, account_id: int) -> AccountBalances:
+    account = await db.get(Account, account_id, populate_existing=True)
+    assert account is not None
+    return AccountBalances(current=account.current_balance, cleared=account.cleared_balance)
+
+
+class TestAdjustAccountBalances:
+    async def test_uncleared_change(self, db: AsyncSession) -> None:
+        await adjust_account_balances(db, 1, [(None, 15)])
+        await db.commit()
+
+        assert await stored_balances(db, 1) == AccountBalances(current=1301, cleared=1266)
+
+    async def test_clearing_a_transaction(self, db: AsyncSession) -> None:
+        await adjust_account_balances(db, 1, [(None, -20), (date(2024, 5, 10), 20)])
+        await db.commit()
+
+        assert await stored_balances(db, 1) == AccountBalances(current=1286, cleared=1286)
+
+    async def test_starting_balance_change(self, db: AsyncSession) -> None:
+        await adjust_account_balances(db, 1, [], starting_balance_delta=-1000)
+        await db.commit()
+
+        assert await stored_balances(db, 1) == AccountBalances(current=286, cleared=266)
+        assert await stored_balances(db, 2) == AccountBalances(current=0, cleared=0)
+
+
+class TestComputeAccountBalances:
+    @pytest.mark.parametrize("summarized", [False, True])
+    async def test_with_and_without_summaries(self, db: AsyncSession, summarized: bool) -> None:
+        if summarized:
+            await roll_up_closed_months(db, today=date(2024, 5, 20))
+            await db.commit()
+
+        accounts = [await db.get(Account, 2), await db.get(Account, 1)]
+
+        balances = await compute_account_balances(db, accounts)  # type: ignore
+
+        assert balances == [AccountBalances(current=60, cleared=60), AccountBalances(current=1286, cleared=1266)]
+
+    async def test_without_accounts(self, db: AsyncSession) -> None:
+        assert await compute_account_balances(db, []) == []
+
+
+class TestVerifyAccountBalances:
+    async def test_reports_drift(self, db: AsyncSession) -> None:
+        drifts = await verify_account_balances(db)
+
+        assert drifts == [
+            AccountBalanceDrift(account_id=2, stored=AccountBalances(current=0, cleared=0), expected=AccountBalances(current=60, cleared=60))
+        ]
+        assert await stored_balances(db, 2) == AccountBalances(current=0, cleared=0)
+
+    async def test_limited_to_accounts(self, db: AsyncSession) -> None:
+        assert await verify_account_balances(db, account_ids=[1]) == []
+
+    async def test_repair(self, db: AsyncSession) -> None:
+        await verify_account_balances(db, repair=True)
+        await db.commit()
+
+        assert await stored_balances(db, 2) == AccountBalances(current=60, cleared=60)
+        assert await verify_account_balances(db) == []
@@ -0,0 +1,66 @@
+from datetime import date
+
+import numpy as np
+
+from miapeer.adapter.balance_forecast import (
+    BalanceEntry,
+    project_daily_balances,
+    sample_balances,
+)
+
+START_DATE = date(2024, 1, 1)
+
+
+class TestProjectDailyBalances:
+    def test_adds_every_entry_on_its_day(self) -> None:
+        entries = [
+            BalanceEntry(1, date(2024, 1, 3), -7),
+            BalanceEntry(1, date(2024, 1, 3), -1),
+            BalanceEntry(0, date(2024, 1, 5), 20),
+        ]
+
+        balances = project_daily_balances(opening_balances=[100, 0], start=START_DATE, end=date(2024, 1, 5), entries=entries)
+
+        assert balances.tolist() == [[100, 100, 100, 100, 120], [0, 0, -8, -8, -8]]
+
+    def test_entries_outside_the_horizon(self) -> None:
+        entries = [BalanceEntry(0, date(2023, 12, 1), 5), BalanceEntry(0, date(2024, 2, 1), 9)]
+
+        balances = project_daily_balances(opening_balances=[100], start=START_DATE, end=date(2024, 1, 3), entries=entries)
+
+        # Overdue entries land on the first day and those past the end are left out
+        assert balances.tolist() == [[105, 105, 105]]
+
+    def test_no_accounts(self) -> None:
+        balances = project_daily_balances(opening_balances=[], start=START_DATE, end=date(2024, 1, 3), entries=[])
+
+        assert balances.shape == (0, 3)
+
+
+class TestSampleBalances:
+    def test_daily(self) -> None:
+        daily_balances = np.array([[5, 3, 4], [1, 1, 0]], dtype=np.int64)
+
+        series = sample_balances(daily_balances, start=START_DATE, interval_days=1)
+
+        assert series.dates == [date(2024, 1, 1), date(2024, 1, 2), date(2024, 1, 3)]
+        assert series.balances.tolist() == [[5, 3, 4], [1, 1, 0]]
+        assert series.lowest_balances.tolist() == [3, 0]
+        assert series.lowest_balance_dates == [date(2024, 1, 2), date(2024, 1, 3)]
+
+    def test_weekly_closes_each_week_and_the_last_day(self) -> None:
+        daily_balances = np.arange(10, dtype=np.int64)[np.newaxis, :] * -1
+
+        series = sample_balances(daily_balances, start=START_DATE, interval_days=7)
+
+        assert series.dates == [date(2024, 1, 7), date(2024, 1, 10)]
+        assert series.balances.tolist() == [[-6, -9]]
+
+    def test_weekly_keeps_the_lowest_day_between_samples(self) -> None:
+        daily_balances = np.array([[10, 10, -50, 10, 10, 10, 10]], dtype=np.int64)
+
+        series = sample_balances(daily_balances, start=START_DATE, interval_days=7)
+
+        assert series.balances.tolist() == [[10]]
+        assert series.lowest_balances.tolist() == [-50]
+        assert series.lowest_balance_dates == [date(2024, 1, 3)]
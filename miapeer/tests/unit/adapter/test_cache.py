@@ -0,0 +1,67 @@
+from miapeer.adapter.cache import TtlCache
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestTtlCache:
+    def test_get_missing_key(self) -> None:
+        cache: TtlCache[str, int] = TtlCache(max_size=2, ttl_seconds=10)
+        assert cache.get("missing") is None
+
+    def test_set_and_get(self) -> None:
+        cache: TtlCache[str, bool] = TtlCache(max_size=2, ttl_seconds=10)
+        cache.set("a", False)
+        assert cache.get("a") is False
+
+    def test_entries_expire(self) -> None:
+        clock = FakeClock()
+        cache: TtlCache[str, int] = TtlCache(max_size=2, ttl_seconds=10, clock=clock)
+        cache.set("a", 1)
+
+        clock.now += 9.9
+        assert cache.get("a") == 1
+
+        clock.now += 0.1
+        assert cache.get("a") is None
+        assert len(cache) == 0
+
+    def test_entry_ttl_cannot_exceed_cache_ttl(self) -> None:
+        clock = FakeClock()
+        cache: TtlCache[str, int] = TtlCache(max_size=2, ttl_seconds=10, clock=clock)
+        cache.set("short", 1, ttl_seconds=5)
+        cache.set("long", 2, ttl_seconds=50)
+
+        clock.now += 5
+        assert cache.get("short") is None
+        assert cache.get("long") == 2
+
+        clock.now += 5
+        assert cache.get("long") is None
+
+    def test_least_recently_used_entry_is_evicted(self) -> None:
+        cache: TtlCache[str, int] = TtlCache(max_size=2, ttl_seconds=10)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.get("c") == 3
+
+    def test_disabled_cache_stores_nothing(self) -> None:
+        cache: TtlCache[str, int] = TtlCache(max_size=0, ttl_seconds=10)
+        cache.set("a", 1)
+        assert cache.get("a") is None
+
+    def test_clear(self) -> None:
+        cache: TtlCache[str, int] = TtlCache(max_size=2, ttl_seconds=10)
+        cache.set("a", 1)
+        cache.clear()
+        assert cache.get("a") is None
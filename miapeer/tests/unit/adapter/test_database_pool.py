@@ -0,0 +1,126 @@
+from typing import Iterator
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine.base import Engine
+from sqlalchemy.pool import StaticPool
+
+from miapeer.adapter import database
+from miapeer.adapter.database import (
+    PoolMetrics,
+    TimedAsyncAdaptedQueuePool,
+    TimedQueuePool,
+    engine_options,
+    get_pool_status,
+    pool_options,
+)
+
+mssql_uri = "mssql+pyodbc:///?odbc_connect=DRIVER%3D%7BODBC+Driver+18+for+SQL+Server%7D"
+
+
+class TestPoolOptions:
+    def test_mssql_defaults(self) -> None:
+        options = pool_options(mssql_uri)
+
+        assert options == {
+            "pool_size": 5,
+            "max_overflow": 10,
+            "pool_timeout": 30,
+            "pool_pre_ping": True,
+            "pool_recycle": 1200,
+            "poolclass": TimedQueuePool,
+        }
+
+    def test_sqlite_defaults(self) -> None:
+        options = pool_options("sqlite:///./miapeer.db")
+
+        assert options["pool_pre_ping"] is False
+        assert options["pool_recycle"] == -1
+
+    @pytest.mark.parametrize("uri", ["mssql+aioodbc:///?odbc_connect=x", "sqlite+aiosqlite:///./miapeer.db"])
+    def test_async_drivers_get_an_async_pool(self, uri: str) -> None:
+        assert pool_options(uri)["poolclass"] == TimedAsyncAdaptedQueuePool
+
+    @pytest.mark.parametrize("uri", ["sqlite://", "sqlite:///:memory:", "sqlite+aiosqlite://"])
+    def test_in_memory_sqlite_is_not_pooled(self, uri: str) -> None:
+        assert pool_options(uri) == {"poolclass": StaticPool}
+
+    def test_environment_overrides(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setenv("MIAPEER_DB_POOL_SIZE", "20")
+        monkeypatch.setenv("MIAPEER_DB_MAX_OVERFLOW", "0")
+        monkeypatch.setenv("MIAPEER_DB_POOL_PRE_PING", "false")
+        monkeypatch.setenv("MIAPEER_DB_POOL_RECYCLE", "300")
+
+        options = pool_options(mssql_uri)
+
+        assert options["pool_size"] == 20
+        assert options["max_overflow"] == 0
+        assert options["pool_pre_ping"] is False
+        assert options["pool_recycle"] == 300
+
+
+class TestEngineOptions:
+    def test_check_same_thread_only_for_pysqlite(self) -> None:
+        assert engine_options("sqlite:///./miapeer.db")["connect_args"] == {"check_same_thread": False}
+        assert "connect_args" not in engine_options("sqlite+aiosqlite:///./miapeer.db")
+        assert "connect_args" not in engine_options(mssql_uri)
+
+
+class TestPoolMetrics:
+    def test_records_checkouts(self) -> None:
+        metrics = PoolMetrics()
+        metrics.record_checkout(0.5)
+        metrics.record_checkout(0.25)
+
+        assert metrics.checkouts == 2
+        assert metrics.total_wait_seconds == 0.75
+        assert metrics.max_wait_seconds == 0.5
+
+    def test_reset(self) -> None:
+        metrics = PoolMetrics()
+        metrics.record_checkout(0.5)
+        metrics.reset()
+
+        assert metrics.checkouts == 0
+        assert metrics.total_wait_seconds == 0
+        assert metrics.max_wait_seconds == 0
+
+
+class TestGetPoolStatus:
+    @pytest.fixture
+    def pooled_engine(self, tmp_path) -> Iterator[Engine]:
+        engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", **engine_options(f"sqlite:///{tmp_path / 'pool.db'}"))
+        yield engine
+        engine.dispose()
+
+    def test_reports_checked_out_and_idle_connections(self, pooled_engine: Engine) -> None:
+        with pooled_engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+
+            status = get_pool_status(pooled_engine.pool)
+            assert status.pool_class == "TimedQueuePool"
+            assert status.size == 5
+            assert status.max_overflow == 10
+            assert status.checked_out == 1
+            assert status.idle == 0
+            assert status.overflow == 0
+
+        status = get_pool_status(pooled_engine.pool)
+        assert status.checked_out == 0
+        assert status.idle == 1
+        assert status.checkouts == 1
+        assert status.average_wait_ms is not None and status.average_wait_ms > 0
+        assert status.max_wait_ms == status.average_wait_ms
+
+    def test_unpooled_engine(self) -> None:
+        engine = create_engine("sqlite://", **engine_options("sqlite://"))
+
+        status = get_pool_status(engine.pool)
+
+        assert status.pool_class == "StaticPool"
+        assert status.checked_out is None
+        assert status.checkouts is None
+
+    def test_app_engines_are_instrumented(self) -> None:
+        assert isinstance(database.async_engine.pool, TimedAsyncAdaptedQueuePool)
+        assert isinstance(database.engine.pool, TimedQueuePool)
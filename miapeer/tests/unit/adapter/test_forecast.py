@@ -0,0 +1,136 @@
+from datetime import date, timedelta
+from itertools import count, islice
+from typing import Iterator, Optional
+
+import pytest
+
+from miapeer.adapter.forecast import (
+    ForecastLedger,
+    ForecastOccurrence,
+    merge_forecasts,
+)
+from miapeer.models.quantum.scheduled_transaction import ScheduledTransaction
+from miapeer.models.quantum.transaction import Transaction, TransactionRead
+
+
+@pytest.fixture
+def schedule() -> ScheduledTransaction:
+    return ScheduledTransaction(
+        scheduled_transaction_id=4,
+        account_id=2,
+        transaction_type_id=5,
+        payee_id=6,
+        category_id=7,
+        fixed_amount=-1200,
+        start_date=date(2024, 1, 1),
+        repeat_option_id=1,
+        notes="rent",
+        on_autopay=True,
+    )
+
+
+@pytest.fixture
+def occurrence(schedule: ScheduledTransaction) -> ForecastOccurrence:
+    return ForecastOccurrence(date(2024, 3, 1), -1250, schedule.scheduled_transaction_id, schedule)
+
+
+class TestForecastOccurrence:
+    def test_matches_the_schedule_as_a_transaction(self, schedule: ScheduledTransaction, occurrence: ForecastOccurrence) -> None:
+        expected = Transaction.model_validate(schedule.model_dump(), update={"transaction_date": date(2024, 3, 1), "amount": -1250})
+
+        assert occurrence.to_transaction().model_dump() == expected.model_dump()
+
+    def test_to_transaction_read(self, schedule: ScheduledTransaction, occurrence: ForecastOccurrence) -> None:
+        expected = TransactionRead.model_validate(
+            schedule.model_dump(),
+            update={
+                "transaction_id": 0,
+                "transaction_date": date(2024, 3, 1),
+                "amount": -1250,
+                "balance": 50,
+                "forecast_from_scheduled_transaction_id": 4,
+            },
+        )
+
+        assert occurrence.to_transaction_read(balance=50) == expected
+        assert occurrence.to_transaction_read(linked_to_schedule=False).forecast_from_scheduled_transaction_id is None
+
+    def test_shares_the_schedule(self, schedule: ScheduledTransaction, occurrence: ForecastOccurrence) -> None:
+        later = occurrence._replace(transaction_date=date(2024, 4, 1))
+
+        assert later.schedule is occurrence.schedule is schedule
+        assert not hasattr(occurrence, "__dict__")
+
+
+def _every(days: int, schedule: ScheduledTransaction, amount: int = 1) -> Iterator[ForecastOccurrence]:
+    # Never ends, so anything consuming it eagerly would hang
+    for n in count():
+        yield ForecastOccurrence(date(2024, 1, 1) + timedelta(days=n * days), amount, schedule.scheduled_transaction_id, schedule)
+
+
+def _actual(transaction_date: date, amount: int, clear_date: Optional[date] = None) -> TransactionRead:
+    return TransactionRead(
+        transaction_id=1,
+        transaction_type_id=1,
+        payee_id=1,
+        category_id=1,
+        amount=amount,
+        transaction_date=transaction_date,
+        clear_date=clear_date,
+        account_id=2,
+    )
+
+
+class TestMergeForecasts:
+    def test_merges_in_date_order(self, schedule: ScheduledTransaction) -> None:
+        merged = list(islice(merge_forecasts([_every(3, schedule), _every(2, schedule)]), 6))
+
+        assert [m.transaction_date.day for m in merged] == [1, 1, 3, 4, 5, 7]
+
+    def test_same_date_keeps_schedule_order(self, schedule: ScheduledTransaction) -> None:
+        other = schedule.model_copy(update={"scheduled_transaction_id": 9})
+
+        merged = list(islice(merge_forecasts([_every(1, other), _every(1, schedule)]), 4))
+
+        assert [m.scheduled_transaction_id for m in merged] == [9, 4, 9, 4]
+
+    def test_nothing_to_merge(self) -> None:
+        assert list(merge_forecasts([])) == []
+
+
+class TestForecastLedger:
+    def test_interleaves_forecasts_with_uncleared_transactions(self, schedule: ScheduledTransaction) -> None:
+        ledger = ForecastLedger(opening_balance=100, forecasts=islice(_every(7, schedule, amount=-10), 3))
+
+        rows = [
+            *ledger.add(_actual(date(2024, 1, 20), 5, clear_date=date(2024, 1, 20))),
+            *ledger.add(_actual(date(2024, 1, 10), 1)),
+            *ledger.add(_actual(date(2024, 1, 15), 2)),
+            *ledger.finish(),
+        ]
+
+        assert [(r.transaction_date.day, r.forecast_from_scheduled_transaction_id) for r in rows] == [
+            (20, None),
+            (1, 4),
+            (8, 4),
+            (10, None),
+            (15, None),
+            (15, 4),
+        ]
+        assert [r.balance for r in rows] == [105, 95, 85, 86, 88, 78]
+        assert ledger.balance == 78
+
+    def test_forecast_on_the_same_day_goes_after(self, schedule: ScheduledTransaction) -> None:
+        ledger = ForecastLedger(opening_balance=0, forecasts=islice(_every(7, schedule), 1))
+
+        rows = [*ledger.add(_actual(date(2024, 1, 1), 5)), *ledger.finish()]
+
+        assert [r.forecast_from_scheduled_transaction_id for r in rows] == [None, 4]
+
+    def test_only_reads_the_forecasts_it_needs(self, schedule: ScheduledTransaction) -> None:
+        ledger = ForecastLedger(opening_balance=0, forecasts=merge_forecasts([_every(1, schedule), _every(2, schedule)]))
+
+        rows = list(ledger.add(_actual(date(2024, 1, 3), 5)))
+
+        assert len(rows) == 4
+        assert rows[-1].balance == 8
@@ -0,0 +1,131 @@
+from datetime import date, timedelta
+from itertools import islice
+
+import pytest
+from dateutil.relativedelta import relativedelta
+
+from miapeer.adapter.recurrence import (
+    DailyRecurrence,
+    MonthlyRecurrence,
+    Recurrence,
+    SemiMonthlyRecurrence,
+    compile_recurrence,
+)
+
+
+def step_by_step(step: relativedelta, start: date, count: int) -> list[date]:
+    # How forecasting used to walk a schedule, and how progressing it moves its start date
+    occurrences = [start]
+    while len(occurrences) < count:
+        occurrences.append(occurrences[-1] + step)
+
+    return occurrences
+
+
+class TestCompileRecurrence:
+    @pytest.mark.parametrize(
+        "repeat_unit_name, quantity, expected",
+        [
+            ("Day", 7, DailyRecurrence(days=7)),
+            ("Semi-Month", 0, SemiMonthlyRecurrence()),
+            ("Month", 3, MonthlyRecurrence(months=3)),
+            ("Year", 2, MonthlyRecurrence(months=24)),
+            ("Day", 0, None),
+            ("Fortnight", 1, None),
+        ],
+    )
+    def test_compile_recurrence(self, repeat_unit_name: str, quantity: int, expected: Recurrence) -> None:
+        assert compile_recurrence(repeat_unit_name, quantity) == expected
+
+    def test_compiles_once(self) -> None:
+        assert compile_recurrence("Month", 1) is compile_recurrence("Month", 1)
+
+
+class TestDailyRecurrence:
+    def test_nth(self) -> None:
+        assert DailyRecurrence(days=14).nth(date(2024, 1, 1), 10) == date(2024, 5, 20)
+
+    @pytest.mark.parametrize(
+        "on_or_after, expected",
+        [(date(2023, 12, 1), 0), (date(2024, 1, 1), 0), (date(2024, 1, 2), 1), (date(2024, 1, 8), 1), (date(2024, 1, 9), 2)],
+    )
+    def test_index_on_or_after(self, on_or_after: date, expected: int) -> None:
+        assert DailyRecurrence(days=7).index_on_or_after(date(2024, 1, 1), on_or_after) == expected
+
+
+class TestMonthlyRecurrence:
+    @pytest.mark.parametrize("months", [1, 2, 3, 6, 12, 48])
+    @pytest.mark.parametrize("start", [date(1999, 12, 31), date(2000, 2, 29), date(2001, 1, 30), date(2001, 3, 31), date(2024, 5, 15)])
+    def test_matches_stepping_one_occurrence_at_a_time(self, months: int, start: date) -> None:
+        expected = step_by_step(relativedelta(months=months), start, 60)
+
+        assert [MonthlyRecurrence(months=months).nth(start, n) for n in range(60)] == expected
+
+    def test_end_of_month_stays_clamped(self) -> None:
+        recurrence = MonthlyRecurrence(months=1)
+
+        assert recurrence.nth(date(2000, 1, 31), 1) == date(2000, 2, 29)
+        assert recurrence.nth(date(2000, 1, 31), 2) == date(2000, 3, 29)
+        assert recurrence.nth(date(2000, 1, 31), 2400) == date(2200, 1, 28)
+
+    def test_leap_day_every_four_years(self) -> None:
+        recurrence = MonthlyRecurrence(months=48)
+
+        # 2100 isn't a leap year, and the day never grows back
+        assert recurrence.nth(date(2096, 2, 29), 0) == date(2096, 2, 29)
+        assert recurrence.nth(date(2096, 2, 29), 1) == date(2100, 2, 28)
+        assert recurrence.nth(date(2096, 2, 29), 2) == date(2104, 2, 28)
+        assert recurrence.nth(date(2000, 2, 29), 24) == date(2096, 2, 29)
+
+    @pytest.mark.parametrize("start", [date(2000, 1, 31), date(2024, 5, 15)])
+    def test_index_on_or_after(self, start: date) -> None:
+        recurrence = MonthlyRecurrence(months=1)
+        occurrences = [recurrence.nth(start, n) for n in range(30)]
+
+        for on_or_after in (start + timedelta(days=days) for days in range(0, 800, 3)):
+            expected = next(n for n, occurrence in enumerate(occurrences) if occurrence >= on_or_after)
+            assert recurrence.index_on_or_after(start, on_or_after) == expected
+
+
+class TestSemiMonthlyRecurrence:
+    @pytest.mark.parametrize(
+        "start, expected",
+        [
+            (date(2024, 1, 1), [date(2024, 1, 1), date(2024, 1, 16), date(2024, 2, 1), date(2024, 2, 16)]),
+            (date(2024, 1, 5), [date(2024, 1, 16), date(2024, 2, 1), date(2024, 2, 16), date(2024, 3, 1)]),
+            (date(2024, 12, 20), [date(2025, 1, 1), date(2025, 1, 16), date(2025, 2, 1), date(2025, 2, 16)]),
+        ],
+    )
+    def test_nth(self, start: date, expected: list[date]) -> None:
+        assert [SemiMonthlyRecurrence().nth(start, n) for n in range(4)] == expected
+
+    def test_index_on_or_after(self) -> None:
+        recurrence = SemiMonthlyRecurrence()
+
+        assert recurrence.index_on_or_after(date(2024, 1, 5), date(2023, 1, 1)) == 0
+        assert recurrence.index_on_or_after(date(2024, 1, 5), date(2024, 3, 1)) == 3
+        assert recurrence.index_on_or_after(date(2024, 1, 5), date(2024, 3, 2)) == 4
+
+
+class TestOccurrences:
+    def test_window(self) -> None:
+        recurrence = MonthlyRecurrence(months=1)
+
+        occurrences = recurrence.occurrences(date(2024, 1, 15), on_or_after=date(2024, 3, 1), until=date(2024, 6, 15))
+
+        assert list(occurrences) == [date(2024, 3, 15), date(2024, 4, 15), date(2024, 5, 15), date(2024, 6, 15)]
+
+    def test_first_on_or_after(self) -> None:
+        assert DailyRecurrence(days=7).first_on_or_after(date(2024, 1, 1), date(2030, 1, 1)) == date(2030, 1, 7)
+
+    def test_has_no_cap(self) -> None:
+        occurrences = list(DailyRecurrence(days=7).occurrences(date(2024, 1, 1), until=date(2027, 12, 31)))
+
+        assert len(occurrences) == 209
+        assert occurrences[-1] == date(2027, 12, 27)
+
+    def test_is_lazy(self) -> None:
+        assert list(islice(DailyRecurrence(days=1).occurrences(date(2024, 1, 1)), 3)) == [date(2024, 1, 1), date(2024, 1, 2), date(2024, 1, 3)]
+
+    def test_stops_at_the_last_representable_date(self) -> None:
+        assert list(MonthlyRecurrence(months=120).occurrences(date(9985, 6, 1))) == [date(9985, 6, 1), date(9995, 6, 1)]
@@ -0,0 +1,128 @@
+from typing import AsyncIterator, Iterator
+from unittest.mock import patch
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from miapeer.adapter import repeat_option_registry
+from miapeer.adapter.repeat_option_registry import (
+    RepeatOptionRegistry,
+    clear_repeat_option_registry,
+    get_repeat_option_registry,
+    load_repeat_option_registry,
+)
+from miapeer.models.quantum.repeat_option import RepeatOption
+from miapeer.models.quantum.repeat_unit import RepeatUnit
+from miapeer.routers import quantum  # noqa: F401 - registers every table
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture(autouse=True)
+def empty_registry() -> Iterator[None]:
+    clear_repeat_option_registry()
+    yield
+    clear_repeat_option_registry()
+
+
+@pytest_asyncio.fixture
+async def db() -> AsyncIterator[AsyncSession]:
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as connection:
+        await connection.run_sync(SQLModel.metadata.create_all)
+
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        session.add_all(
+            [
+                RepeatUnit(repeat_unit_id=1, name="Month"),
+                RepeatUnit(repeat_unit_id=2, name="Year"),
+                RepeatOption(repeat_option_id=1, name="Annually", repeat_unit_id=2, quantity=1, order_index=1),
+                RepeatOption(repeat_option_id=2, name="Monthly", repeat_unit_id=1, quantity=1, order_index=0),
+            ]
+        )
+        await session.commit()
+
+        yield session
+
+    await engine.dispose()
+
+
+class TestRepeatOptionRegistry:
+    @pytest.fixture
+    def registry(self) -> RepeatOptionRegistry:
+        return RepeatOptionRegistry.build(
+            [RepeatOption(repeat_option_id=1, name="Monthly", repeat_unit_id=1, quantity=1, order_index=0)],
+            [RepeatUnit(repeat_unit_id=1, name="Month")],
+        )
+
+    async def test_lookups(self, registry: RepeatOptionRegistry) -> None:
+        repeat_option = registry.get_repeat_option(1)
+
+        assert repeat_option is not None
+        assert repeat_option.name == "Monthly"
+        assert registry.get_repeat_unit(repeat_option.repeat_unit_id) == registry.repeat_units[0]
+        assert registry.get_repeat_option(2) is None
+        assert registry.get_repeat_unit(2) is None
+
+    async def test_is_immutable(self, registry: RepeatOptionRegistry) -> None:
+        with pytest.raises(AttributeError):
+            registry.etag = '"changed"'  # type: ignore
+
+        with pytest.raises(TypeError):
+            registry.options_by_id[2] = registry.repeat_options[0]  # type: ignore
+
+    async def test_etag_follows_content(self, registry: RepeatOptionRegistry) -> None:
+        same = RepeatOptionRegistry.build(registry.repeat_options, registry.repeat_units)
+        renamed = RepeatOptionRegistry.build(
+            [RepeatOption(repeat_option_id=1, name="Every month", repeat_unit_id=1, quantity=1, order_index=0)], registry.repeat_units
+        )
+
+        assert same.etag == registry.etag
+        assert renamed.etag != registry.etag
+
+
+class TestLoad:
+    async def test_loads_in_display_order(self, db: AsyncSession) -> None:
+        registry = await load_repeat_option_registry(db)
+
+        assert [repeat_option.name for repeat_option in registry.repeat_options] == ["Monthly", "Annually"]
+        assert [repeat_unit.name for repeat_unit in registry.repeat_units] == ["Month", "Year"]
+
+    async def test_get_loads_once(self, db: AsyncSession) -> None:
+        registry = await get_repeat_option_registry(db)
+
+        db.add(RepeatOption(repeat_option_id=3, name="Daily", repeat_unit_id=1, quantity=1, order_index=2))
+        await db.commit()
+
+        assert await get_repeat_option_registry(db) is registry
+        assert registry.get_repeat_option(3) is None
+
+    async def test_get_reloads_once_expired(self, db: AsyncSession) -> None:
+        with patch(f"{repeat_option_registry.__name__}.monotonic", return_value=1000):
+            registry = await get_repeat_option_registry(db)
+
+        db.add(RepeatOption(repeat_option_id=3, name="Daily", repeat_unit_id=1, quantity=1, order_index=2))
+        await db.commit()
+
+        with patch(f"{repeat_option_registry.__name__}.monotonic", return_value=1000 + repeat_option_registry.REPEAT_OPTION_REGISTRY_TTL_SECONDS):
+            reloaded = await get_repeat_option_registry(db)
+
+        assert reloaded is not registry
+        assert reloaded.get_repeat_option(3) is not None
+
+    async def test_refresh_swaps_in_a_new_registry(self, db: AsyncSession) -> None:
+        registry = await get_repeat_option_registry(db)
+
+        db.add(RepeatOption(repeat_option_id=3, name="Daily", repeat_unit_id=1, quantity=1, order_index=2))
+        await db.commit()
+
+        refreshed = await load_repeat_option_registry(db)
+
+        assert await get_repeat_option_registry(db) is refreshed
+        assert refreshed.get_repeat_option(3) is not None
+        assert refreshed.etag != registry.etag
+        assert len(registry.repeat_options) == 2
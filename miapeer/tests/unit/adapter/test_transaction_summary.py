@@ -0,0 +1,145 @@
+from datetime import date
+from typing import AsyncIterator, Optional
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from miapeer.adapter.account_balance import compute_account_balances
+from miapeer.adapter.transaction_summary import (
+    adjust_transaction_summaries,
+    roll_up_closed_months,
+)
+from miapeer.models.quantum.account import Account
+from miapeer.models.quantum.transaction import Transaction
+from miapeer.models.quantum.transaction_summary import TransactionSummary
+from miapeer.routers import quantum  # noqa: F401 - registers every table
+
+pytestmark = pytest.mark.asyncio
+
+today = date(2024, 5, 20)
+
+
+@pytest_asyncio.fixture
+async def db() -> AsyncIterator[AsyncSession]:
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as connection:
+        await connection.run_sync(SQLModel.metadata.create_all)
+
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        session.add(Account(account_id=1, portfolio_id=1, name="checking", starting_balance=1000))
+        session.add(Account(account_id=2, portfolio_id=1, name="savings", starting_balance=0))
+        session.add_all(
+            [
+                Transaction(account_id=1, transaction_id=1, amount=-10, transaction_date=date(2024, 2, 1), clear_date=date(2024, 2, 3)),
+                Transaction(account_id=1, transaction_id=2, amount=-20, transaction_date=date(2024, 2, 9), clear_date=date(2024, 2, 28)),
+                Transaction(account_id=1, transaction_id=3, amount=300, transaction_date=date(2024, 4, 1), clear_date=date(2024, 4, 2)),
+                Transaction(account_id=1, transaction_id=4, amount=-4, transaction_date=date(2024, 5, 1), clear_date=date(2024, 5, 2)),
+                Transaction(account_id=1, transaction_id=5, amount=-5, transaction_date=date(2024, 1, 1), clear_date=None),
+                Transaction(account_id=2, transaction_id=6, amount=60, transaction_date=date(2024, 3, 1), clear_date=date(2024, 3, 1)),
+            ]
+        )
+        await session.commit()
+
+        yield session
+
+    await engine.dispose()
+
+
+async def summaries(db: AsyncSession, account_id: int) -> dict[tuple[int, int], int]:
+    sql = select(TransactionSummary).where(TransactionSummary.account_id == account_id)
+    return {(s.year, s.month): s.balance for s in (await db.exec(sql)).all()}
+
+
+async def full_balance(db: AsyncSession, account_id: int) -> int:
+    account: Optional[Account] = await db.get(Account, account_id)
+    assert account is not None
+    transaction_sum = (await db.exec(select(func.sum(Transaction.amount)).where(Transaction.account_id == account_id))).one()
+    return account.starting_balance + (transaction_sum or 0)
+
+
+class TestRollUpClosedMonths:
+    async def test_summarizes_closed_months_only(self, db: AsyncSession) -> None:
+        added = await roll_up_closed_months(db, today=today)
+        await db.commit()
+
+        assert added == 3
+        assert await summaries(db, 1) == {(2024, 2): -30, (2024, 4): 300}
+        assert await summaries(db, 2) == {(2024, 3): 60}
+
+    async def test_balance_is_unchanged(self, db: AsyncSession) -> None:
+        account = await db.get(Account, 1)
+        assert account is not None
+
+        await roll_up_closed_months(db, today=today)
+        await db.commit()
+
+        assert (await compute_account_balances(db, [account]))[0].current == await full_balance(db, 1)
+
+    async def test_only_adds_months_after_the_latest_summary(self, db: AsyncSession) -> None:
+        await roll_up_closed_months(db, today=date(2024, 3, 1))
+        await db.commit()
+
+        added = await roll_up_closed_months(db, today=today)
+        await db.commit()
+
+        assert added == 2
+        assert await summaries(db, 1) == {(2024, 2): -30, (2024, 4): 300}
+        assert await summaries(db, 2) == {(2024, 3): 60}
+
+    async def test_rebuild_for_one_account(self, db: AsyncSession) -> None:
+        await roll_up_closed_months(db, today=today)
+        db.add(TransactionSummary(account_id=1, year=2024, month=1, balance=999))
+        await db.commit()
+
+        added = await roll_up_closed_months(db, account_ids=[1], rebuild=True, today=today)
+        await db.commit()
+
+        assert added == 2
+        assert await summaries(db, 1) == {(2024, 2): -30, (2024, 4): 300}
+        assert await summaries(db, 2) == {(2024, 3): 60}
+
+
+class TestAdjustTransactionSummaries:
+    async def test_without_summaries(self, db: AsyncSession) -> None:
+        await adjust_transaction_summaries(db, 1, [(date(2024, 2, 1), 50)])
+        await db.commit()
+
+        assert await summaries(db, 1) == {}
+
+    async def test_adjusts_summarized_months(self, db: AsyncSession) -> None:
+        await roll_up_closed_months(db, today=today)
+        await db.commit()
+
+        # Move a transaction from February to March, and clear another one in the (still open) current month
+        await adjust_transaction_summaries(db, 1, [(date(2024, 2, 3), 10), (date(2024, 3, 3), -10), (date(2024, 5, 3), 7), (None, 8)])
+        await db.commit()
+
+        assert await summaries(db, 1) == {(2024, 2): -20, (2024, 3): -10, (2024, 4): 300}
+
+    async def test_balance_follows_a_change_in_a_closed_month(self, db: AsyncSession) -> None:
+        account = await db.get(Account, 1)
+        assert account is not None
+
+        await roll_up_closed_months(db, today=today)
+        await db.commit()
+
+        transaction = await db.get(Transaction, 1)
+        assert transaction is not None
+        await adjust_transaction_summaries(db, 1, [(transaction.clear_date, -transaction.amount), (transaction.clear_date, 25)])
+        transaction.amount = 25
+        db.add(transaction)
+        await db.commit()
+
+        assert (await compute_account_balances(db, [account]))[0].current == await full_balance(db, 1)
+
+    async def test_net_zero_change_skips_the_database(self, db: AsyncSession) -> None:
+        await roll_up_closed_months(db, today=today)
+        await db.commit()
+
+        await adjust_transaction_summaries(db, 1, [(date(2024, 2, 3), -10), (date(2024, 2, 5), 10)])
+
+        assert not db.new and not db.dirty
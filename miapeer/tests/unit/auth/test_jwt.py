@@ -45,6 +45,10 @@ class TestEncodeJwt:
 
 
 class TestDecodeJwt:
+    @pytest.fixture(autouse=True)
+    def empty_token_cache(self) -> None:
+        jwt.token_cache.clear()
+
     def test_decodes_token(self, valid_jwt: str, jwk: str, valid_jwt_data: jwt.TokenData) -> None:
         token_data = jwt.decode_jwt(
             token=valid_jwt,
@@ -52,6 +56,13 @@ class TestDecodeJwt:
         )
         assert token_data == valid_jwt_data
 
+    def test_decodes_authorization_claims(self, jwk: str, valid_jwt_data: jwt.TokenData) -> None:
+        token_data: jwt.TokenData = valid_jwt_data | {"uid": 1, "disabled": False, "perms": [["Quantum", "User"]], "pv": 0}  # type: ignore
+
+        returned_token_data = jwt.decode_jwt(token=jwt.encode_jwt(jwt_key=jwk, data=token_data), jwt_key=jwk)
+
+        assert returned_token_data == token_data
+
     def test_missing_jwk_raises_exception(self) -> None:
         with pytest.raises(jwt.JwtException) as exc_info:
             jwt.decode_jwt(jwt_key="", token="")
@@ -77,3 +88,32 @@ class TestDecodeJwt:
             jwt.decode_jwt(token=token, jwt_key=jwk)
 
         assert str(exc_info.value) == exception_value
+
+    def test_decoded_token_is_cached(self, valid_jwt: str, jwk: str, valid_jwt_data: jwt.TokenData) -> None:
+        with patch(f"{jwt.__name__}.jwt.decode", wraps=jwt.jwt.decode) as patched_decode:
+            for _ in range(3):
+                assert jwt.decode_jwt(token=valid_jwt, jwt_key=jwk) == valid_jwt_data
+
+        patched_decode.assert_called_once()
+
+    def test_cache_is_keyed_on_jwk(self, valid_jwt: str, jwk: str) -> None:
+        jwt.decode_jwt(token=valid_jwt, jwt_key=jwk)
+
+        with pytest.raises(jwt.JwtException):
+            jwt.decode_jwt(token=valid_jwt, jwt_key="some other key")
+
+    def test_cached_payload_cannot_be_modified(self, valid_jwt: str, jwk: str, valid_jwt_data: jwt.TokenData) -> None:
+        jwt.decode_jwt(token=valid_jwt, jwt_key=jwk)["sub"] = "someone else"
+
+        assert jwt.decode_jwt(token=valid_jwt, jwt_key=jwk) == valid_jwt_data
+
+    @patch(f"{jwt.__name__}.time")
+    def test_cache_entry_expires_with_token(self, patched_time: Mock, valid_jwt: str, jwk: str, valid_jwt_data: jwt.TokenData) -> None:
+        token_exp = valid_jwt_data["exp"]
+        assert token_exp is not None
+        patched_time.return_value = token_exp - 5
+
+        with patch.object(jwt.token_cache, "set", wraps=jwt.token_cache.set) as patched_set:
+            jwt.decode_jwt(token=valid_jwt, jwt_key=jwk)
+
+        assert patched_set.call_args.kwargs["ttl_seconds"] == 5
@@ -1,9 +1,10 @@
 from typing import Any
-from unittest.mock import Mock
+from unittest.mock import AsyncMock, Mock
 
 import pytest
 
 from miapeer.auth.jwt import TokenData
+from miapeer.dependencies import PortfolioAccess
 from miapeer.models.miapeer import User
 
 UNSET = "fixture not set"
@@ -76,6 +77,14 @@ def mock_db(
     mock_db = Mock()
     db_methods = Mock()
 
+    # Mirror AsyncSession: everything that talks to the database is awaited, `add` is not
+    mock_db.exec = AsyncMock()
+    mock_db.get = AsyncMock()
+    mock_db.commit = AsyncMock()
+    mock_db.refresh = AsyncMock()
+    mock_db.delete = AsyncMock()
+    mock_db.flush = AsyncMock()
+
     db_methods.all.return_value = None if db_all_return_val == UNSET else db_all_return_val
 
     db_methods.first.return_value = None if db_first_return_val == UNSET else db_first_return_val
@@ -114,3 +123,23 @@ def user(user_id: int, user_hashed_password: str) -> User:
 @pytest.fixture
 def inactive_user(user_id: int, user_hashed_password: str) -> User:
     return User(user_id=user_id, password=user_hashed_password, email="", disabled=True)
+
+
+@pytest.fixture
+def portfolio_id() -> int:
+    return 321
+
+
+@pytest.fixture
+def account_id() -> int:
+    return 345
+
+
+@pytest.fixture
+def portfolio_access(portfolio_id: int, account_id: int) -> PortfolioAccess:
+    return PortfolioAccess(portfolio_ids=[portfolio_id], account_portfolios={account_id: portfolio_id})
+
+
+@pytest.fixture
+def no_portfolio_access() -> PortfolioAccess:
+    return PortfolioAccess(portfolio_ids=[], account_portfolios={})
@@ -1,9 +1,11 @@
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
 import pytest
 from fastapi import HTTPException
 from fastapi.security import OAuth2PasswordRequestForm
+from passlib.context import CryptContext
 
+from miapeer.auth.jwt import decode_jwt
 from miapeer.models.miapeer import User
 from miapeer.routers import auth
 
@@ -29,6 +31,51 @@ async def test_access_token(form_data: OAuth2PasswordRequestForm, mock_db: Mock)
     assert len(response.access_token) > 0
 
 
+@pytest.fixture
+def user_with_outdated_hash(user: User, user_password: str) -> User:
+    user.password = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash(user_password)
+    return user
+
+
+@pytest.mark.parametrize("db_one_or_none_return_val", [pytest.lazy_fixture("user")])
+async def test_access_token_keeps_current_hash(form_data: OAuth2PasswordRequestForm, mock_db: Mock, user_hashed_password: str, user: User) -> None:
+    await auth.login_for_access_token(form_data=form_data, jwk="My secret key", db=mock_db)
+
+    mock_db.commit.assert_not_called()
+    assert user.password == user_hashed_password
+
+
+@pytest.mark.parametrize("db_one_or_none_return_val", [pytest.lazy_fixture("user_with_outdated_hash")])
+async def test_access_token_rehashes_outdated_hash(form_data: OAuth2PasswordRequestForm, mock_db: Mock, user_password: str, user: User) -> None:
+    await auth.login_for_access_token(form_data=form_data, jwk="My secret key", db=mock_db)
+
+    mock_db.add.assert_called_once_with(user)
+    mock_db.commit.assert_called_once()
+    assert user.password.startswith("$2b$12$")
+    assert CryptContext(schemes=["bcrypt"]).verify(user_password, user.password)
+
+
+@pytest.mark.parametrize("db_one_or_none_return_val", [pytest.lazy_fixture("user")])
+async def test_access_token_without_claims(form_data: OAuth2PasswordRequestForm, mock_db: Mock) -> None:
+    response = await auth.login_for_access_token(form_data=form_data, jwk="My secret key", db=mock_db)
+
+    payload = decode_jwt(jwt_key="My secret key", token=response.access_token)
+    assert set(payload.keys()) == {"sub", "exp"}
+
+
+@pytest.mark.parametrize("db_one_or_none_return_val", [pytest.lazy_fixture("user")])
+@patch(f"{auth.__name__}.add_authorization_claims")
+async def test_access_token_with_claims(
+    patched_add_authorization_claims: Mock, monkeypatch: pytest.MonkeyPatch, form_data: OAuth2PasswordRequestForm, mock_db: Mock, user: User
+) -> None:
+    monkeypatch.setenv("JWT_AUTHORIZATION_CLAIMS", "true")
+
+    await auth.login_for_access_token(form_data=form_data, jwk="My secret key", db=mock_db)
+
+    patched_add_authorization_claims.assert_called_once()
+    assert patched_add_authorization_claims.call_args.kwargs["user"] == user
+
+
 @pytest.mark.parametrize("db_one_or_none_return_val", [None])
 async def test_access_token_when_user_not_found(form_data: OAuth2PasswordRequestForm, mock_db: Mock) -> None:
     with pytest.raises(HTTPException):
@@ -0,0 +1,49 @@
+from unittest.mock import Mock, patch
+
+import pytest
+from sqlalchemy.pool import NullPool
+
+from miapeer.adapter.database import PoolMetrics
+from miapeer.models.miapeer import DatabasePoolStatus
+from miapeer.routers.miapeer import database
+
+pytestmark = pytest.mark.asyncio
+
+
+class TestGetDatabasePoolStatus:
+    @pytest.fixture
+    def pool(self) -> Mock:
+        pool = Mock()
+        pool.metrics = PoolMetrics()
+        pool.metrics.record_checkout(0.002)
+        return pool
+
+    @patch(f"{database.__name__}.get_pool_status")
+    @patch(f"{database.__name__}.async_engine")
+    async def test_reports_the_app_pool(self, patched_engine: Mock, patched_get_pool_status: Mock, pool: Mock) -> None:
+        patched_engine.pool = pool
+        patched_get_pool_status.return_value = DatabasePoolStatus(pool_class="TimedAsyncAdaptedQueuePool", checkouts=1)
+
+        response = await database.get_database_pool_status()
+
+        patched_get_pool_status.assert_called_once_with(pool)
+        assert response == patched_get_pool_status.return_value
+        assert pool.metrics.checkouts == 1
+
+    @patch(f"{database.__name__}.async_engine")
+    async def test_reset_metrics(self, patched_engine: Mock, pool: Mock) -> None:
+        patched_engine.pool = pool
+
+        response = await database.get_database_pool_status(reset_metrics=True)
+
+        # The response still covers the window that was just closed
+        assert response.checkouts == 1
+        assert pool.metrics.checkouts == 0
+
+    @patch(f"{database.__name__}.async_engine")
+    async def test_reset_metrics_without_metrics(self, patched_engine: Mock) -> None:
+        patched_engine.pool = NullPool(creator=Mock())
+
+        response = await database.get_database_pool_status(reset_metrics=True)
+
+        assert response == DatabasePoolStatus(pool_class="NullPool")
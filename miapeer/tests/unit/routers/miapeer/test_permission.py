@@ -1,5 +1,5 @@
 from typing import Any
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
 import pytest
 from fastapi import HTTPException
@@ -71,9 +71,11 @@ class TestCreate:
     def permission_to_create(self, user_id: int, application_role_id: int) -> PermissionCreate:
         return PermissionCreate(user_id=user_id, application_role_id=application_role_id)
 
+    @patch(f"{permission.__name__}.advance_permissions_version")
     @pytest.mark.parametrize("db_first_return_val, db_refresh_patch_method", [("some data", db_refresh)])
     async def test_create(
         self,
+        patched_advance_permissions_version: Mock,
         permission_to_create: PermissionCreate,
         complete_permission: Permission,
         mock_db: Mock,
@@ -84,6 +86,7 @@ class TestCreate:
         add_call_param = mock_db.add.call_args[0][0]
         assert add_call_param.model_dump() == complete_permission.model_dump()
 
+        patched_advance_permissions_version.assert_called_once_with(mock_db, complete_permission.user_id)
         mock_db.commit.assert_called_once()
 
         assert mock_db.refresh.call_count == 1
@@ -111,11 +114,15 @@ class TestGet:
 
 
 class TestDelete:
-    @pytest.mark.parametrize("db_get_return_val", ["some data", 123])
-    async def test_delete_with_permission_found(self, permission_id: int, mock_db: Mock, db_get_return_val: Any) -> None:
+    @patch(f"{permission.__name__}.advance_permissions_version")
+    @pytest.mark.parametrize("db_get_return_val", [pytest.lazy_fixture("complete_permission")])
+    async def test_delete_with_permission_found(
+        self, patched_advance_permissions_version: Mock, permission_id: int, mock_db: Mock, db_get_return_val: Any
+    ) -> None:
         response = await permission.delete_permission(permission_id=permission_id, db=mock_db)
 
         mock_db.delete.assert_called_once_with(db_get_return_val)
+        patched_advance_permissions_version.assert_called_once_with(mock_db, db_get_return_val.user_id)
         mock_db.commit.assert_called_once()
         assert response == {"ok": True}
 
@@ -1,11 +1,12 @@
 from typing import Any
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
 import pytest
 from fastapi import HTTPException
 
 from miapeer.models.miapeer import (
     ApplicationRole,
+    AuthenticatedUser,
     Permission,
     User,
     UserCreate,
@@ -50,10 +51,12 @@ def user_permission() -> Permission:
 
 
 class TestWhoAmI:
-    @pytest.mark.parametrize("return_val", [[], "some data", 123])
-    async def test_return_val(self, return_val: Any) -> None:
-        response = await user.who_am_i(current_user=return_val)
-        assert response == return_val
+    async def test_return_val(self, complete_user: User) -> None:
+        current_user = AuthenticatedUser.model_validate(complete_user)
+
+        response = await user.who_am_i(current_user=current_user)
+
+        assert response == UserRead.model_validate(complete_user)
 
 
 class TestGetAll:
@@ -68,7 +71,7 @@ class TestGetAll:
 
     @pytest.fixture
     def expected_sql(self) -> str:
-        return f"SELECT miapeer_user.email, miapeer_user.disabled, miapeer_user.user_id, miapeer_user.password \nFROM miapeer_user"
+        return f"SELECT miapeer_user.email, miapeer_user.disabled, miapeer_user.user_id, miapeer_user.password, miapeer_user.permissions_version \nFROM miapeer_user"
 
     @pytest.mark.parametrize(
         "db_all_return_val, expected_response",
@@ -105,6 +108,11 @@ class TestCreate:
         user_permission: Permission,
         mock_db: Mock,
     ) -> None:
+        def db_flush() -> None:
+            mock_db.add.call_args.args[0].user_id = raw_user_id
+
+        mock_db.flush.side_effect = db_flush
+
         await user.create_user(user=user_to_create, db=mock_db)
 
         assert mock_db.add.call_count == 2
@@ -118,7 +126,9 @@ class TestCreate:
 
         assert second_add_obj.model_dump() == user_permission.model_dump()
 
-        assert mock_db.commit.call_count == 2
+        # The user and its permission are saved together
+        mock_db.flush.assert_called_once()
+        mock_db.commit.assert_called_once()
 
         assert mock_db.refresh.call_count == 1
         refresh_call_param = mock_db.refresh.call_args[0][0]
@@ -145,12 +155,16 @@ class TestGet:
 
 
 class TestDelete:
-    @pytest.mark.parametrize("db_get_return_val", ["some data", 123])
-    async def test_delete_with_user_found(self, user_id: int, mock_db: Mock, db_get_return_val: Any) -> None:
+    @pytest.mark.parametrize("db_get_return_val", [pytest.lazy_fixture("complete_user")])
+    @patch(f"{user.__name__}.invalidate_user_cache")
+    async def test_delete_with_user_found(
+        self, patched_invalidate_user_cache: Mock, user_id: int, user_email: str, mock_db: Mock, db_get_return_val: Any
+    ) -> None:
         response = await user.delete_user(user_id=user_id, db=mock_db)
 
         mock_db.delete.assert_called_once_with(db_get_return_val)
         mock_db.commit.assert_called_once()
+        patched_invalidate_user_cache.assert_called_once_with(user_email)
         assert response == {"ok": True}
 
     @pytest.mark.parametrize("db_get_return_val", [None, []])
@@ -176,9 +190,12 @@ class TestUpdate:
         return UserRead.model_validate(updated_user.model_dump())
 
     @pytest.mark.parametrize("db_get_return_val", [pytest.lazy_fixture("complete_user")])
+    @patch(f"{user.__name__}.invalidate_user_cache")
     async def test_update_with_user_found(
         self,
+        patched_invalidate_user_cache: Mock,
         user_id: int,
+        user_email: str,
         user_updates: UserUpdate,
         mock_db: Mock,
         updated_user: User,
@@ -195,6 +212,7 @@ class TestUpdate:
         assert add_call_param.model_dump() == updated_user.model_dump()
 
         mock_db.commit.assert_called_once()
+        patched_invalidate_user_cache.assert_called_once_with(user_email)
 
         assert mock_db.refresh.call_count == 1
         refresh_call_param = mock_db.refresh.call_args[0][0]
@@ -4,14 +4,13 @@ from unittest.mock import Mock, patch
 import pytest
 from fastapi import HTTPException
 
-from miapeer.models.miapeer import User
+from miapeer.dependencies import PortfolioAccess
 from miapeer.models.quantum.account import (
     Account,
     AccountCreate,
     AccountRead,
     AccountUpdate,
 )
-from miapeer.models.quantum.portfolio import Portfolio
 from miapeer.routers.quantum import account
 
 pytestmark = pytest.mark.asyncio
@@ -47,7 +46,15 @@ def basic_account(account_name: str, portfolio_id: int) -> Account:
 
 @pytest.fixture
 def complete_account(account_id: int, basic_account: Account, starting_balance: int) -> Account:
-    return Account.model_validate(basic_account.model_dump(), update={"account_id": account_id, "starting_balance": starting_balance})
+    return Account.model_validate(
+        basic_account.model_dump(),
+        update={
+            "account_id": account_id,
+            "starting_balance": starting_balance,
+            "current_balance": starting_balance,
+            "cleared_balance": starting_balance,
+        },
+    )
 
 
 class TestGetAll:
@@ -61,27 +68,24 @@ class TestGetAll:
         return [working_account, working_account]
 
     @pytest.fixture
-    def expected_sql(self, user_id: int) -> str:
-        return f"SELECT quantum_account.portfolio_id, quantum_account.name, quantum_account.starting_balance, quantum_account.account_id \nFROM quantum_account JOIN quantum_portfolio ON quantum_portfolio.portfolio_id = quantum_account.portfolio_id JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_portfolio_user.user_id = {user_id}"
+    def expected_sql(self, account_id: int) -> str:
+        return f"SELECT quantum_account.portfolio_id, quantum_account.name, quantum_account.starting_balance, quantum_account.account_id, quantum_account.current_balance, quantum_account.cleared_balance \nFROM quantum_account \nWHERE quantum_account.account_id IN ({account_id})"
 
     @pytest.mark.parametrize(
         "db_all_return_val, expected_response",
         [([], []), (pytest.lazy_fixture("multiple_accounts"), pytest.lazy_fixture("expected_multiple_accounts"))],
     )
-    @patch("miapeer.routers.quantum.account.get_account_balance")
     async def test_get_all(
         self,
-        patched_get_account_balance: Mock,
-        user: User,
+        portfolio_access: PortfolioAccess,
         mock_db: Mock,
         expected_sql: str,
         expected_response: list[AccountRead],
-        starting_balance: int,
     ) -> None:
-        patched_get_account_balance.return_value = starting_balance
-
-        response = await account.get_all_accounts(db=mock_db, current_user=user)
+        response = await account.get_all_accounts(db=mock_db, portfolio_access=portfolio_access)
 
+        # Balances are read off the accounts themselves, so listing is a single query
+        assert mock_db.exec.call_count == 1
         sql = mock_db.exec.call_args.args[0]
         sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
 
@@ -93,37 +97,20 @@ class TestCreate:
     def db_refresh(obj) -> None:  # type: ignore
         obj.account_id = raw_account_id
 
-    @pytest.fixture
-    def portfolio(self, portfolio_id: int) -> Portfolio:
-        return Portfolio(portfolio_id=portfolio_id)
-
     @pytest.fixture
     def account_to_create(self, account_name: str, portfolio_id: int, starting_balance: int) -> AccountCreate:
         return AccountCreate(name=account_name, portfolio_id=portfolio_id, starting_balance=starting_balance)
 
-    @pytest.fixture
-    def expected_sql(self, user_id: int) -> str:
-        return f"SELECT quantum_portfolio.portfolio_id \nFROM quantum_portfolio JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_portfolio_user.user_id = {user_id}"
-
-    @pytest.mark.parametrize("db_first_return_val, db_refresh_patch_method", [(pytest.lazy_fixture("portfolio"), db_refresh)])
-    @patch("miapeer.routers.quantum.account.get_account_balance")
+    @pytest.mark.parametrize("db_refresh_patch_method", [db_refresh])
     async def test_create_with_portfolio_found(
         self,
-        patched_get_account_balance: Mock,
-        user: User,
+        portfolio_access: PortfolioAccess,
         account_to_create: AccountCreate,
         complete_account: Account,
         mock_db: Mock,
-        expected_sql: str,
         starting_balance: int,
     ) -> None:
-        patched_get_account_balance.return_value = starting_balance
-
-        await account.create_account(account=account_to_create, db=mock_db, current_user=user)
-
-        sql = mock_db.exec.call_args.args[0]
-        sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
-        assert sql_str == expected_sql
+        response = await account.create_account(account=account_to_create, db=mock_db, portfolio_access=portfolio_access)
 
         expected_add_params = [complete_account.model_dump()]
         assert mock_db.add.call_count == 1
@@ -138,17 +125,17 @@ class TestCreate:
         refresh_call_param = mock_db.refresh.call_args[0][0]
         assert refresh_call_param.model_dump() == complete_account.model_dump()
 
-        # Don't need to test the response here because it's just the updated account_to_add
+        # A new account's balance is its starting balance, so there's nothing to query
+        mock_db.exec.assert_not_called()
+        assert response.balance == starting_balance
 
-    @pytest.mark.parametrize("db_first_return_val", [None, ""])
-    async def test_create_with_portfolio_not_found(self, user: User, account_to_create: AccountCreate, mock_db: Mock, expected_sql: str) -> None:
+    async def test_create_with_portfolio_not_found(
+        self, no_portfolio_access: PortfolioAccess, account_to_create: AccountCreate, mock_db: Mock
+    ) -> None:
         with pytest.raises(HTTPException):
-            await account.create_account(account=account_to_create, db=mock_db, current_user=user)
-
-        sql = mock_db.exec.call_args.args[0]
-        sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
+            await account.create_account(account=account_to_create, db=mock_db, portfolio_access=no_portfolio_access)
 
-        assert sql_str == expected_sql
+        mock_db.exec.assert_not_called()
         mock_db.add.assert_not_called()
         mock_db.commit.assert_not_called()
         mock_db.refresh.assert_not_called()
@@ -160,24 +147,20 @@ class TestGet:
         return AccountRead.model_validate(complete_account.model_dump(), update={"balance": starting_balance})
 
     @pytest.fixture
-    def expected_sql(self, user_id: int, account_id: int) -> str:
-        return f"SELECT quantum_account.portfolio_id, quantum_account.name, quantum_account.starting_balance, quantum_account.account_id \nFROM quantum_account JOIN quantum_portfolio ON quantum_portfolio.portfolio_id = quantum_account.portfolio_id JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_account.account_id = {account_id} AND quantum_portfolio_user.user_id = {user_id}"
+    def expected_sql(self, account_id: int) -> str:
+        return f"SELECT quantum_account.portfolio_id, quantum_account.name, quantum_account.starting_balance, quantum_account.account_id, quantum_account.current_balance, quantum_account.cleared_balance \nFROM quantum_account \nWHERE quantum_account.account_id = {account_id}"
 
     @pytest.mark.parametrize("db_one_or_none_return_val", [pytest.lazy_fixture("complete_account")])
-    @patch("miapeer.routers.quantum.account.get_account_balance")
     async def test_get_with_data(
         self,
-        patched_get_account_balance: Mock,
-        user: User,
+        portfolio_access: PortfolioAccess,
         account_id: int,
         mock_db: Mock,
         expected_sql: str,
         expected_response: AccountRead,
         starting_balance: int,
     ) -> None:
-        patched_get_account_balance.return_value = starting_balance
-
-        response = await account.get_account(account_id=account_id, db=mock_db, current_user=user)
+        response = await account.get_account(account_id=account_id, db=mock_db, portfolio_access=portfolio_access)
 
         sql = mock_db.exec.call_args.args[0]
         sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
@@ -186,26 +169,32 @@ class TestGet:
         assert response == expected_response
 
     @pytest.mark.parametrize("db_one_or_none_return_val", [None, []])
-    async def test_get_with_no_data(self, user: User, account_id: int, mock_db: Mock, expected_sql: str) -> None:
+    async def test_get_with_no_data(self, portfolio_access: PortfolioAccess, account_id: int, mock_db: Mock, expected_sql: str) -> None:
         with pytest.raises(HTTPException):
-            await account.get_account(account_id=account_id, db=mock_db, current_user=user)
+            await account.get_account(account_id=account_id, db=mock_db, portfolio_access=portfolio_access)
 
         sql = mock_db.exec.call_args.args[0]
         sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
 
         assert sql_str == expected_sql
 
+    async def test_get_without_access(self, no_portfolio_access: PortfolioAccess, account_id: int, mock_db: Mock) -> None:
+        with pytest.raises(HTTPException):
+            await account.get_account(account_id=account_id, db=mock_db, portfolio_access=no_portfolio_access)
+
+        mock_db.exec.assert_not_called()
+
 
 class TestDelete:
     @pytest.fixture
-    def expected_sql(self, user_id: int, account_id: int) -> str:
-        return f"SELECT quantum_account.portfolio_id, quantum_account.name, quantum_account.starting_balance, quantum_account.account_id \nFROM quantum_account JOIN quantum_portfolio ON quantum_portfolio.portfolio_id = quantum_account.portfolio_id JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_account.account_id = {account_id} AND quantum_portfolio_user.user_id = {user_id}"
+    def expected_sql(self, account_id: int) -> str:
+        return f"SELECT quantum_account.portfolio_id, quantum_account.name, quantum_account.starting_balance, quantum_account.account_id, quantum_account.current_balance, quantum_account.cleared_balance \nFROM quantum_account \nWHERE quantum_account.account_id = {account_id}"
 
     @pytest.mark.parametrize("db_one_or_none_return_val", ["some data", 123])
     async def test_delete_with_account_found(
-        self, user: User, account_id: int, mock_db: Mock, expected_sql: str, db_one_or_none_return_val: Any
+        self, portfolio_access: PortfolioAccess, account_id: int, mock_db: Mock, expected_sql: str, db_one_or_none_return_val: Any
     ) -> None:
-        response = await account.delete_account(account_id=account_id, db=mock_db, current_user=user)
+        response = await account.delete_account(account_id=account_id, db=mock_db, portfolio_access=portfolio_access)
 
         sql = mock_db.exec.call_args.args[0]
         sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
@@ -216,9 +205,9 @@ class TestDelete:
         assert response == {"ok": True}
 
     @pytest.mark.parametrize("db_one_or_none_return_val", [None, []])
-    async def test_delete_with_account_not_found(self, user: User, account_id: int, mock_db: Mock, expected_sql: str) -> None:
+    async def test_delete_with_account_not_found(self, portfolio_access: PortfolioAccess, account_id: int, mock_db: Mock, expected_sql: str) -> None:
         with pytest.raises(HTTPException):
-            await account.delete_account(account_id=account_id, db=mock_db, current_user=user)
+            await account.delete_account(account_id=account_id, db=mock_db, portfolio_access=portfolio_access)
 
         sql = mock_db.exec.call_args.args[0]
         sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
@@ -234,8 +223,8 @@ class TestUpdate:
         return AccountUpdate(name="some new name", starting_balance=starting_balance)
 
     @pytest.fixture
-    def expected_sql(self, user_id: int, account_id: int) -> str:
-        return f"SELECT quantum_account.portfolio_id, quantum_account.name, quantum_account.starting_balance, quantum_account.account_id \nFROM quantum_account JOIN quantum_portfolio ON quantum_portfolio.portfolio_id = quantum_account.portfolio_id JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_account.account_id = {account_id} AND quantum_portfolio_user.user_id = {user_id}"
+    def expected_sql(self, account_id: int) -> str:
+        return f"SELECT quantum_account.portfolio_id, quantum_account.name, quantum_account.starting_balance, quantum_account.account_id, quantum_account.current_balance, quantum_account.cleared_balance \nFROM quantum_account \nWHERE quantum_account.account_id = {account_id}"
 
     @pytest.fixture
     def updated_account(self, complete_account: Account) -> Account:
@@ -246,11 +235,11 @@ class TestUpdate:
         return AccountRead.model_validate(updated_account.model_dump(), update={"starting_balance": starting_balance, "balance": starting_balance})
 
     @pytest.mark.parametrize("db_one_or_none_return_val", [pytest.lazy_fixture("complete_account")])
-    @patch("miapeer.routers.quantum.account.get_account_balance")
+    @patch("miapeer.routers.quantum.account.adjust_account_balances")
     async def test_update_with_account_found(
         self,
-        patched_get_account_balance: Mock,
-        user: User,
+        patched_adjust_account_balances: Mock,
+        portfolio_access: PortfolioAccess,
         account_id: int,
         account_updates: AccountUpdate,
         mock_db: Mock,
@@ -259,13 +248,11 @@ class TestUpdate:
         expected_response: AccountRead,
         starting_balance: int,
     ) -> None:
-        patched_get_account_balance.return_value = starting_balance
-
         response = await account.update_account(
             account_id=account_id,
             account=account_updates,
             db=mock_db,
-            current_user=user,
+            portfolio_access=portfolio_access,
         )
 
         sql = mock_db.exec.call_args.args[0]
@@ -273,6 +260,8 @@ class TestUpdate:
 
         assert sql_str == expected_sql
 
+        patched_adjust_account_balances.assert_awaited_once_with(mock_db, account_id, [], starting_balance_delta=0)
+
         assert mock_db.add.call_count == 1
         add_call_param = mock_db.add.call_args[0][0]
         assert add_call_param.model_dump() == updated_account.model_dump()
@@ -288,7 +277,7 @@ class TestUpdate:
     @pytest.mark.parametrize("db_one_or_none_return_val", [None, []])
     async def test_update_with_account_not_found(
         self,
-        user: User,
+        portfolio_access: PortfolioAccess,
         account_id: int,
         account_updates: AccountUpdate,
         mock_db: Mock,
@@ -299,7 +288,7 @@ class TestUpdate:
                 account_id=account_id,
                 account=account_updates,
                 db=mock_db,
-                current_user=user,
+                portfolio_access=portfolio_access,
             )
 
         sql = mock_db.exec.call_args.args[0]
@@ -4,7 +4,7 @@ from unittest.mock import Mock
 import pytest
 from fastapi import HTTPException
 
-from miapeer.models.miapeer import User
+from miapeer.dependencies import PortfolioAccess
 from miapeer.models.quantum.category import (
     Category,
     CategoryCreate,
@@ -60,15 +60,15 @@ class TestGetAll:
         return [working_category, working_category]
 
     @pytest.fixture
-    def expected_sql(self, user_id: int) -> str:
-        return f"SELECT quantum_category.name, quantum_category.parent_category_id, quantum_category.portfolio_id, quantum_category.category_id \nFROM quantum_category JOIN quantum_portfolio ON quantum_portfolio.portfolio_id = quantum_category.portfolio_id JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_portfolio_user.user_id = {user_id} ORDER BY quantum_category.name"
+    def expected_sql(self, portfolio_id: int) -> str:
+        return f"SELECT quantum_category.name, quantum_category.parent_category_id, quantum_category.portfolio_id, quantum_category.category_id \nFROM quantum_category \nWHERE quantum_category.portfolio_id IN ({portfolio_id}) ORDER BY quantum_category.name"
 
     @pytest.mark.parametrize(
         "db_all_return_val, expected_response",
         [([], []), (pytest.lazy_fixture("multiple_categories"), pytest.lazy_fixture("expected_multiple_categories"))],
     )
-    async def test_get_all(self, user: User, mock_db: Mock, expected_sql: str, expected_response: list[CategoryRead]) -> None:
-        response = await category.get_all_categories(db=mock_db, current_user=user)
+    async def test_get_all(self, portfolio_access: PortfolioAccess, mock_db: Mock, expected_sql: str, expected_response: list[CategoryRead]) -> None:
+        response = await category.get_all_categories(db=mock_db, portfolio_access=portfolio_access)
 
         sql = mock_db.exec.call_args.args[0]
         sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
@@ -88,25 +88,17 @@ class TestCreate:
     def category_to_create(self, category_name: str, parent_category_id: int, portfolio_id: int) -> CategoryCreate:
         return CategoryCreate(name=category_name, parent_category_id=parent_category_id, portfolio_id=portfolio_id)
 
-    @pytest.fixture
-    def expected_sql(self, user_id: int) -> str:
-        return f"SELECT quantum_portfolio.portfolio_id \nFROM quantum_portfolio JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_portfolio_user.user_id = {user_id}"
-
-    @pytest.mark.parametrize("db_first_return_val, db_refresh_patch_method", [("some data", db_refresh)])
+    @pytest.mark.parametrize("db_refresh_patch_method", [db_refresh])
     async def test_create_with_portfolio_found(
         self,
-        user: User,
+        portfolio_access: PortfolioAccess,
         category_to_create: CategoryCreate,
         complete_category: Category,
         mock_db: Mock,
-        expected_sql: str,
     ) -> None:
-        await category.create_category(category=category_to_create, db=mock_db, current_user=user)
+        await category.create_category(category=category_to_create, db=mock_db, portfolio_access=portfolio_access)
 
-        sql = mock_db.exec.call_args.args[0]
-        sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
-
-        assert sql_str == expected_sql
+        mock_db.exec.assert_not_called()
 
         assert mock_db.add.call_count == 1
         add_call_param = mock_db.add.call_args[0][0]
@@ -120,15 +112,13 @@ class TestCreate:
 
         # Don't need to test the response here because it's just the updated category_to_add
 
-    @pytest.mark.parametrize("db_first_return_val", [None, ""])
-    async def test_create_with_portfolio_not_found(self, user: User, category_to_create: CategoryCreate, mock_db: Mock, expected_sql: str) -> None:
+    async def test_create_with_portfolio_not_found(
+        self, no_portfolio_access: PortfolioAccess, category_to_create: CategoryCreate, mock_db: Mock
+    ) -> None:
         with pytest.raises(HTTPException):
-            await category.create_category(category=category_to_create, db=mock_db, current_user=user)
-
-        sql = mock_db.exec.call_args.args[0]
-        sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
+            await category.create_category(category=category_to_create, db=mock_db, portfolio_access=no_portfolio_access)
 
-        assert sql_str == expected_sql
+        mock_db.exec.assert_not_called()
         mock_db.add.assert_not_called()
         mock_db.commit.assert_not_called()
         mock_db.refresh.assert_not_called()
@@ -140,12 +130,14 @@ class TestGet:
         return CategoryRead.model_validate(complete_category)
 
     @pytest.fixture
-    def expected_sql(self, user_id: int, category_id: int) -> str:
-        return f"SELECT quantum_category.name, quantum_category.parent_category_id, quantum_category.portfolio_id, quantum_category.category_id \nFROM quantum_category JOIN quantum_portfolio ON quantum_portfolio.portfolio_id = quantum_category.portfolio_id JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_category.category_id = {category_id} AND quantum_portfolio_user.user_id = {user_id}"
+    def expected_sql(self, portfolio_id: int, category_id: int) -> str:
+        return f"SELECT quantum_category.name, quantum_category.parent_category_id, quantum_category.portfolio_id, quantum_category.category_id \nFROM quantum_category \nWHERE quantum_category.category_id = {category_id} AND quantum_category.portfolio_id IN ({portfolio_id})"
 
     @pytest.mark.parametrize("db_one_or_none_return_val", [pytest.lazy_fixture("complete_category")])
-    async def test_get_with_data(self, user: User, category_id: int, mock_db: Mock, expected_sql: str, expected_response: CategoryRead) -> None:
-        response = await category.get_category(category_id=category_id, db=mock_db, current_user=user)
+    async def test_get_with_data(
+        self, portfolio_access: PortfolioAccess, category_id: int, mock_db: Mock, expected_sql: str, expected_response: CategoryRead
+    ) -> None:
+        response = await category.get_category(category_id=category_id, db=mock_db, portfolio_access=portfolio_access)
 
         sql = mock_db.exec.call_args.args[0]
         sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
@@ -154,9 +146,9 @@ class TestGet:
         assert response == expected_response
 
     @pytest.mark.parametrize("db_one_or_none_return_val", [None, []])
-    async def test_get_with_no_data(self, user: User, category_id: int, mock_db: Mock, expected_sql: str) -> None:
+    async def test_get_with_no_data(self, portfolio_access: PortfolioAccess, category_id: int, mock_db: Mock, expected_sql: str) -> None:
         with pytest.raises(HTTPException):
-            await category.get_category(category_id=category_id, db=mock_db, current_user=user)
+            await category.get_category(category_id=category_id, db=mock_db, portfolio_access=portfolio_access)
 
         sql = mock_db.exec.call_args.args[0]
         sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
@@ -166,14 +158,14 @@ class TestGet:
 
 class TestDelete:
     @pytest.fixture
-    def expected_sql(self, user_id: int, category_id: int) -> str:
-        return f"SELECT quantum_category.name, quantum_category.parent_category_id, quantum_category.portfolio_id, quantum_category.category_id \nFROM quantum_category JOIN quantum_portfolio ON quantum_portfolio.portfolio_id = quantum_category.portfolio_id JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_category.category_id = {category_id} AND quantum_portfolio_user.user_id = {user_id}"
+    def expected_sql(self, portfolio_id: int, category_id: int) -> str:
+        return f"SELECT quantum_category.name, quantum_category.parent_category_id, quantum_category.portfolio_id, quantum_category.category_id \nFROM quantum_category \nWHERE quantum_category.category_id = {category_id} AND quantum_category.portfolio_id IN ({portfolio_id})"
 
     @pytest.mark.parametrize("db_one_or_none_return_val", ["some data", 123])
     async def test_delete_with_category_found(
-        self, user: User, category_id: int, mock_db: Mock, expected_sql: str, db_one_or_none_return_val: Any
+        self, portfolio_access: PortfolioAccess, category_id: int, mock_db: Mock, expected_sql: str, db_one_or_none_return_val: Any
     ) -> None:
-        response = await category.delete_category(category_id=category_id, db=mock_db, current_user=user)
+        response = await category.delete_category(category_id=category_id, db=mock_db, portfolio_access=portfolio_access)
 
         sql = mock_db.exec.call_args.args[0]
         sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
@@ -184,9 +176,11 @@ class TestDelete:
         assert response == {"ok": True}
 
     @pytest.mark.parametrize("db_one_or_none_return_val", [None, []])
-    async def test_delete_with_category_not_found(self, user: User, category_id: int, mock_db: Mock, expected_sql: str) -> None:
+    async def test_delete_with_category_not_found(
+        self, portfolio_access: PortfolioAccess, category_id: int, mock_db: Mock, expected_sql: str
+    ) -> None:
         with pytest.raises(HTTPException):
-            await category.delete_category(category_id=category_id, db=mock_db, current_user=user)
+            await category.delete_category(category_id=category_id, db=mock_db, portfolio_access=portfolio_access)
 
         sql = mock_db.exec.call_args.args[0]
         sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
@@ -202,8 +196,8 @@ class TestUpdate:
         return CategoryUpdate(name="some new name", parent_category_id=parent_category_id)
 
     @pytest.fixture
-    def expected_sql(self, user_id: int, category_id: int) -> str:
-        return f"SELECT quantum_category.name, quantum_category.parent_category_id, quantum_category.portfolio_id, quantum_category.category_id \nFROM quantum_category JOIN quantum_portfolio ON quantum_portfolio.portfolio_id = quantum_category.portfolio_id JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_category.category_id = {category_id} AND quantum_portfolio_user.user_id = {user_id}"
+    def expected_sql(self, portfolio_id: int, category_id: int) -> str:
+        return f"SELECT quantum_category.name, quantum_category.parent_category_id, quantum_category.portfolio_id, quantum_category.category_id \nFROM quantum_category \nWHERE quantum_category.category_id = {category_id} AND quantum_category.portfolio_id IN ({portfolio_id})"
 
     @pytest.fixture
     def updated_category(self, complete_category: Category) -> Category:
@@ -216,7 +210,7 @@ class TestUpdate:
     @pytest.mark.parametrize("db_one_or_none_return_val", [pytest.lazy_fixture("complete_category")])
     async def test_update_with_category_found(
         self,
-        user: User,
+        portfolio_access: PortfolioAccess,
         category_id: int,
         category_updates: CategoryUpdate,
         mock_db: Mock,
@@ -228,7 +222,7 @@ class TestUpdate:
             category_id=category_id,
             category=category_updates,
             db=mock_db,
-            current_user=user,
+            portfolio_access=portfolio_access,
         )
 
         sql = mock_db.exec.call_args.args[0]
@@ -251,7 +245,7 @@ class TestUpdate:
     @pytest.mark.parametrize("db_one_or_none_return_val", [None, []])
     async def test_update_with_category_not_found(
         self,
-        user: User,
+        portfolio_access: PortfolioAccess,
         category_id: int,
         category_updates: CategoryUpdate,
         mock_db: Mock,
@@ -262,7 +256,7 @@ class TestUpdate:
                 category_id=category_id,
                 category=category_updates,
                 db=mock_db,
-                current_user=user,
+                portfolio_access=portfolio_access,
             )
 
         sql = mock_db.exec.call_args.args[0]
@@ -4,7 +4,7 @@ from unittest.mock import Mock
 import pytest
 from fastapi import HTTPException
 
-from miapeer.models.miapeer import User
+from miapeer.dependencies import PortfolioAccess
 from miapeer.models.quantum.payee import (
     Payee,
     PayeeCreate,
@@ -55,15 +55,15 @@ class TestGetAll:
         return [working_payee, working_payee]
 
     @pytest.fixture
-    def expected_sql(self, user_id: int) -> str:
-        return f"SELECT quantum_payee.name, quantum_payee.portfolio_id, quantum_payee.payee_id \nFROM quantum_payee JOIN quantum_portfolio ON quantum_portfolio.portfolio_id = quantum_payee.portfolio_id JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_portfolio_user.user_id = {user_id} ORDER BY quantum_payee.name"
+    def expected_sql(self, portfolio_id: int) -> str:
+        return f"SELECT quantum_payee.name, quantum_payee.portfolio_id, quantum_payee.payee_id \nFROM quantum_payee \nWHERE quantum_payee.portfolio_id IN ({portfolio_id}) ORDER BY quantum_payee.name"
 
     @pytest.mark.parametrize(
         "db_all_return_val, expected_response",
         [([], []), (pytest.lazy_fixture("multiple_payees"), pytest.lazy_fixture("expected_multiple_payees"))],
     )
-    async def test_get_all(self, user: User, mock_db: Mock, expected_sql: str, expected_response: list[PayeeRead]) -> None:
-        response = await payee.get_all_payees(db=mock_db, current_user=user)
+    async def test_get_all(self, portfolio_access: PortfolioAccess, mock_db: Mock, expected_sql: str, expected_response: list[PayeeRead]) -> None:
+        response = await payee.get_all_payees(db=mock_db, portfolio_access=portfolio_access)
 
         sql = mock_db.exec.call_args.args[0]
         sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
@@ -83,25 +83,17 @@ class TestCreate:
     def payee_to_create(self, payee_name: str, portfolio_id: int) -> PayeeCreate:
         return PayeeCreate(name=payee_name, portfolio_id=portfolio_id)
 
-    @pytest.fixture
-    def expected_sql(self, user_id: int) -> str:
-        return f"SELECT quantum_portfolio.portfolio_id \nFROM quantum_portfolio JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_portfolio_user.user_id = {user_id}"
-
-    @pytest.mark.parametrize("db_first_return_val, db_refresh_patch_method", [("some data", db_refresh)])
+    @pytest.mark.parametrize("db_refresh_patch_method", [db_refresh])
     async def test_create_with_portfolio_found(
         self,
-        user: User,
+        portfolio_access: PortfolioAccess,
         payee_to_create: PayeeCreate,
         complete_payee: Payee,
         mock_db: Mock,
-        expected_sql: str,
     ) -> None:
-        await payee.create_payee(payee=payee_to_create, db=mock_db, current_user=user)
-
-        sql = mock_db.exec.call_args.args[0]
-        sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
+        await payee.create_payee(payee=payee_to_create, db=mock_db, portfolio_access=portfolio_access)
 
-        assert sql_str == expected_sql
+        mock_db.exec.assert_not_called()
 
         assert mock_db.add.call_count == 1
         add_call_param = mock_db.add.call_args[0][0]
@@ -115,15 +107,11 @@ class TestCreate:
 
         # Don't need to test the response here because it's just the updated payee_to_add
 
-    @pytest.mark.parametrize("db_first_return_val", [None, ""])
-    async def test_create_with_portfolio_not_found(self, user: User, payee_to_create: PayeeCreate, mock_db: Mock, expected_sql: str) -> None:
+    async def test_create_with_portfolio_not_found(self, no_portfolio_access: PortfolioAccess, payee_to_create: PayeeCreate, mock_db: Mock) -> None:
         with pytest.raises(HTTPException):
-            await payee.create_payee(payee=payee_to_create, db=mock_db, current_user=user)
-
-        sql = mock_db.exec.call_args.args[0]
-        sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
+            await payee.create_payee(payee=payee_to_create, db=mock_db, portfolio_access=no_portfolio_access)
 
-        assert sql_str == expected_sql
+        mock_db.exec.assert_not_called()
         mock_db.add.assert_not_called()
         mock_db.commit.assert_not_called()
         mock_db.refresh.assert_not_called()
@@ -135,12 +123,14 @@ class TestGet:
         return PayeeRead.model_validate(complete_payee)
 
     @pytest.fixture
-    def expected_sql(self, user_id: int, payee_id: int) -> str:
-        return f"SELECT quantum_payee.name, quantum_payee.portfolio_id, quantum_payee.payee_id \nFROM quantum_payee JOIN quantum_portfolio ON quantum_portfolio.portfolio_id = quantum_payee.portfolio_id JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_payee.payee_id = {payee_id} AND quantum_portfolio_user.user_id = {user_id}"
+    def expected_sql(self, portfolio_id: int, payee_id: int) -> str:
+        return f"SELECT quantum_payee.name, quantum_payee.portfolio_id, quantum_payee.payee_id \nFROM quantum_payee \nWHERE quantum_payee.payee_id = {payee_id} AND quantum_payee.portfolio_id IN ({portfolio_id})"
 
     @pytest.mark.parametrize("db_one_or_none_return_val", [pytest.lazy_fixture("complete_payee")])
-    async def test_get_with_data(self, user: User, payee_id: int, mock_db: Mock, expected_sql: str, expected_response: PayeeRead) -> None:
-        response = await payee.get_payee(payee_id=payee_id, db=mock_db, current_user=user)
+    async def test_get_with_data(
+        self, portfolio_access: PortfolioAccess, payee_id: int, mock_db: Mock, expected_sql: str, expected_response: PayeeRead
+    ) -> None:
+        response = await payee.get_payee(payee_id=payee_id, db=mock_db, portfolio_access=portfolio_access)
 
         sql = mock_db.exec.call_args.args[0]
         sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
@@ -149,9 +139,9 @@ class TestGet:
         assert response == expected_response
 
     @pytest.mark.parametrize("db_one_or_none_return_val", [None, []])
-    async def test_get_with_no_data(self, user: User, payee_id: int, mock_db: Mock, expected_sql: str) -> None:
+    async def test_get_with_no_data(self, portfolio_access: PortfolioAccess, payee_id: int, mock_db: Mock, expected_sql: str) -> None:
         with pytest.raises(HTTPException):
-            await payee.get_payee(payee_id=payee_id, db=mock_db, current_user=user)
+            await payee.get_payee(payee_id=payee_id, db=mock_db, portfolio_access=portfolio_access)
 
         sql = mock_db.exec.call_args.args[0]
         sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
@@ -161,12 +151,14 @@ class TestGet:
 
 class TestDelete:
     @pytest.fixture
-    def expected_sql(self, user_id: int, payee_id: int) -> str:
-        return f"SELECT quantum_payee.name, quantum_payee.portfolio_id, quantum_payee.payee_id \nFROM quantum_payee JOIN quantum_portfolio ON quantum_portfolio.portfolio_id = quantum_payee.portfolio_id JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_payee.payee_id = {payee_id} AND quantum_portfolio_user.user_id = {user_id}"
+    def expected_sql(self, portfolio_id: int, payee_id: int) -> str:
+        return f"SELECT quantum_payee.name, quantum_payee.portfolio_id, quantum_payee.payee_id \nFROM quantum_payee \nWHERE quantum_payee.payee_id = {payee_id} AND quantum_payee.portfolio_id IN ({portfolio_id})"
 
     @pytest.mark.parametrize("db_one_or_none_return_val", ["some data", 123])
-    async def test_delete_with_payee_found(self, user: User, payee_id: int, mock_db: Mock, expected_sql: str, db_one_or_none_return_val: Any) -> None:
-        response = await payee.delete_payee(payee_id=payee_id, db=mock_db, current_user=user)
+    async def test_delete_with_payee_found(
+        self, portfolio_access: PortfolioAccess, payee_id: int, mock_db: Mock, expected_sql: str, db_one_or_none_return_val: Any
+    ) -> None:
+        response = await payee.delete_payee(payee_id=payee_id, db=mock_db, portfolio_access=portfolio_access)
 
         sql = mock_db.exec.call_args.args[0]
         sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
@@ -177,9 +169,9 @@ class TestDelete:
         assert response == {"ok": True}
 
     @pytest.mark.parametrize("db_one_or_none_return_val", [None, []])
-    async def test_delete_with_payee_not_found(self, user: User, payee_id: int, mock_db: Mock, expected_sql: str) -> None:
+    async def test_delete_with_payee_not_found(self, portfolio_access: PortfolioAccess, payee_id: int, mock_db: Mock, expected_sql: str) -> None:
         with pytest.raises(HTTPException):
-            await payee.delete_payee(payee_id=payee_id, db=mock_db, current_user=user)
+            await payee.delete_payee(payee_id=payee_id, db=mock_db, portfolio_access=portfolio_access)
 
         sql = mock_db.exec.call_args.args[0]
         sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
@@ -195,8 +187,8 @@ class TestUpdate:
         return PayeeUpdate(name="some new name")
 
     @pytest.fixture
-    def expected_sql(self, user_id: int, payee_id: int) -> str:
-        return f"SELECT quantum_payee.name, quantum_payee.portfolio_id, quantum_payee.payee_id \nFROM quantum_payee JOIN quantum_portfolio ON quantum_portfolio.portfolio_id = quantum_payee.portfolio_id JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_payee.payee_id = {payee_id} AND quantum_portfolio_user.user_id = {user_id}"
+    def expected_sql(self, portfolio_id: int, payee_id: int) -> str:
+        return f"SELECT quantum_payee.name, quantum_payee.portfolio_id, quantum_payee.payee_id \nFROM quantum_payee \nWHERE quantum_payee.payee_id = {payee_id} AND quantum_payee.portfolio_id IN ({portfolio_id})"
 
     @pytest.fixture
     def updated_payee(self, complete_payee: Payee) -> Payee:
@@ -209,7 +201,7 @@ class TestUpdate:
     @pytest.mark.parametrize("db_one_or_none_return_val", [pytest.lazy_fixture("complete_payee")])
     async def test_update_with_payee_found(
         self,
-        user: User,
+        portfolio_access: PortfolioAccess,
         payee_id: int,
         payee_updates: PayeeUpdate,
         mock_db: Mock,
@@ -221,7 +213,7 @@ class TestUpdate:
             payee_id=payee_id,
             payee=payee_updates,
             db=mock_db,
-            current_user=user,
+            portfolio_access=portfolio_access,
         )
 
         sql = mock_db.exec.call_args.args[0]
@@ -244,7 +236,7 @@ class TestUpdate:
     @pytest.mark.parametrize("db_one_or_none_return_val", [None, []])
     async def test_update_with_payee_not_found(
         self,
-        user: User,
+        portfolio_access: PortfolioAccess,
         payee_id: int,
         payee_updates: PayeeUpdate,
         mock_db: Mock,
@@ -255,7 +247,7 @@ class TestUpdate:
                 payee_id=payee_id,
                 payee=payee_updates,
                 db=mock_db,
-                current_user=user,
+                portfolio_access=portfolio_access,
             )
 
         sql = mock_db.exec.call_args.args[0]
@@ -265,3 +257,28 @@ class TestUpdate:
         mock_db.add.assert_not_called()
         mock_db.commit.assert_not_called()
         mock_db.refresh.assert_not_called()
+
+
+class TestUpdatePayeeIdRef:
+    async def test_new_payee_is_flushed_not_committed(
+        self, portfolio_access: PortfolioAccess, portfolio_id: int, payee_name: str, mock_db: Mock
+    ) -> None:
+        def db_flush() -> None:
+            mock_db.add.call_args.args[0].payee_id = raw_payee_id
+
+        mock_db.flush.side_effect = db_flush
+        object_to_update = Mock()
+
+        await payee.update_payee_id_ref(
+            db=mock_db,
+            portfolio_access=portfolio_access,
+            object_to_update=object_to_update,
+            portfolio_id=portfolio_id,
+            payee_id=None,
+            payee_name=payee_name,
+        )
+
+        assert object_to_update.payee_id == raw_payee_id
+        mock_db.flush.assert_called_once()
+        mock_db.commit.assert_not_called()
+        mock_db.refresh.assert_not_called()
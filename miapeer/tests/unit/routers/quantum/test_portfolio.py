@@ -4,6 +4,7 @@ from unittest.mock import Mock, call
 import pytest
 from fastapi import HTTPException
 
+from miapeer.dependencies import PortfolioAccess
 from miapeer.models.miapeer import User
 from miapeer.models.quantum.portfolio import (
     Portfolio,
@@ -45,15 +46,15 @@ class TestGetAll:
         return [working_portfolio, working_portfolio]
 
     @pytest.fixture
-    def expected_sql(self, user_id: int) -> str:
-        return f"SELECT quantum_portfolio.portfolio_id \nFROM quantum_portfolio JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_portfolio_user.user_id = {user_id}"
+    def expected_sql(self, portfolio_id: int) -> str:
+        return f"SELECT quantum_portfolio.portfolio_id \nFROM quantum_portfolio \nWHERE quantum_portfolio.portfolio_id IN ({portfolio_id})"
 
     @pytest.mark.parametrize(
         "db_all_return_val, expected_response",
         [([], []), (pytest.lazy_fixture("multiple_portfolios"), pytest.lazy_fixture("expected_multiple_portfolios"))],
     )
-    async def test_get_all(self, user: User, mock_db: Mock, expected_sql: str, expected_response: list[PortfolioRead]) -> None:
-        response = await portfolio.get_all_portfolios(db=mock_db, current_user=user)
+    async def test_get_all(self, portfolio_access: PortfolioAccess, mock_db: Mock, expected_sql: str, expected_response: list[PortfolioRead]) -> None:
+        response = await portfolio.get_all_portfolios(db=mock_db, portfolio_access=portfolio_access)
 
         sql = mock_db.exec.call_args.args[0]
         sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
@@ -91,6 +92,11 @@ class TestCreate:
         portfolio_user_to_add: PortfolioUser,
         mock_db: Mock,
     ) -> None:
+        def db_flush() -> None:
+            mock_db.add.call_args.args[0].portfolio_id = raw_portfolio_id
+
+        mock_db.flush.side_effect = db_flush
+
         await portfolio.create_portfolio(portfolio=portfolio_to_create, db=mock_db, current_user=user)
 
         expected_add_params = [
@@ -102,7 +108,9 @@ class TestCreate:
         actual_add_call_params = [mock_call.args[0].model_dump() for mock_call in mock_db.add.mock_calls]
         assert actual_add_call_params == expected_add_params
 
-        assert mock_db.commit.call_count == 2
+        # The portfolio and its user are saved together
+        mock_db.flush.assert_called_once()
+        mock_db.commit.assert_called_once()
 
         assert mock_db.refresh.call_count == 1
         refresh_call_param = mock_db.refresh.call_args[0][0]
@@ -116,29 +124,33 @@ class TestGet:
     def expected_response(self, complete_portfolio: Portfolio) -> PortfolioRead:
         return PortfolioRead.model_validate(complete_portfolio)
 
-    @pytest.fixture
-    def expected_sql(self, user_id: int, portfolio_id: int) -> str:
-        return f"SELECT quantum_portfolio.portfolio_id \nFROM quantum_portfolio JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_portfolio.portfolio_id = {portfolio_id} AND quantum_portfolio_user.user_id = {user_id}"
+    @pytest.mark.parametrize("db_get_return_val", [pytest.lazy_fixture("complete_portfolio")])
+    async def test_get_with_data(self, portfolio_access: PortfolioAccess, portfolio_id: int, mock_db: Mock, expected_response: PortfolioRead) -> None:
+        response = await portfolio.get_portfolio(portfolio_id=portfolio_id, db=mock_db, portfolio_access=portfolio_access)
 
-    @pytest.mark.parametrize("db_one_or_none_return_val", [pytest.lazy_fixture("complete_portfolio")])
-    async def test_get_with_data(self, user: User, portfolio_id: int, mock_db: Mock, expected_sql: str, expected_response: PortfolioRead) -> None:
-        response = await portfolio.get_portfolio(portfolio_id=portfolio_id, db=mock_db, current_user=user)
+        mock_db.get.assert_called_once_with(Portfolio, portfolio_id)
+        assert response == expected_response
 
-        sql = mock_db.exec.call_args.args[0]
-        sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
+    @pytest.mark.parametrize("db_get_return_val", [None])
+    async def test_get_with_no_data(self, portfolio_access: PortfolioAccess, portfolio_id: int, mock_db: Mock) -> None:
+        with pytest.raises(HTTPException):
+            await portfolio.get_portfolio(portfolio_id=portfolio_id, db=mock_db, portfolio_access=portfolio_access)
 
-        assert sql_str == expected_sql
-        assert response == expected_response
+        mock_db.get.assert_called_once_with(Portfolio, portfolio_id)
 
-    @pytest.mark.parametrize("db_one_or_none_return_val", [None, []])
-    async def test_get_with_no_data(self, user: User, portfolio_id: int, mock_db: Mock, expected_sql: str) -> None:
+    async def test_get_without_access(self, no_portfolio_access: PortfolioAccess, portfolio_id: int, mock_db: Mock) -> None:
         with pytest.raises(HTTPException):
-            await portfolio.get_portfolio(portfolio_id=portfolio_id, db=mock_db, current_user=user)
+            await portfolio.get_portfolio(portfolio_id=portfolio_id, db=mock_db, portfolio_access=no_portfolio_access)
 
-        sql = mock_db.exec.call_args.args[0]
-        sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
+        mock_db.get.assert_not_called()
 
-        assert sql_str == expected_sql
+
+class TestGetForecast:
+    async def test_get_forecast_without_access(self, no_portfolio_access: PortfolioAccess, portfolio_id: int, mock_db: Mock) -> None:
+        with pytest.raises(HTTPException):
+            await portfolio.get_portfolio_forecast(portfolio_id=portfolio_id, db=mock_db, portfolio_access=no_portfolio_access)
+
+        mock_db.exec.assert_not_called()
 
 
 class TestDelete:
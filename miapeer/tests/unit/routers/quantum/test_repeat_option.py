@@ -0,0 +1,84 @@
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+from fastapi import HTTPException, Response
+
+from miapeer.adapter.repeat_option_registry import RepeatOptionRegistry
+from miapeer.models.quantum.repeat_option import RepeatOption, RepeatOptionRead
+from miapeer.models.quantum.repeat_unit import RepeatUnit, RepeatUnitRead
+from miapeer.routers.quantum import repeat_option
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+def registry() -> RepeatOptionRegistry:
+    return RepeatOptionRegistry.build(
+        [
+            RepeatOption(repeat_option_id=2, name="Monthly", repeat_unit_id=1, quantity=1, order_index=0),
+            RepeatOption(repeat_option_id=1, name="Annually", repeat_unit_id=2, quantity=1, order_index=1),
+        ],
+        [RepeatUnit(repeat_unit_id=1, name="Month"), RepeatUnit(repeat_unit_id=2, name="Year")],
+    )
+
+
+class TestGetAll:
+    @patch(f"{repeat_option.__name__}.get_repeat_option_registry")
+    async def test_get_all(self, patched_get_registry: AsyncMock, mock_db: Mock, registry: RepeatOptionRegistry) -> None:
+        patched_get_registry.return_value = registry
+        response = Response()
+
+        repeat_options = await repeat_option.get_all_repeat_options(db=mock_db, response=response)
+
+        assert repeat_options == list(registry.repeat_options)
+        assert response.headers["Cache-Control"] == repeat_option.REPEAT_OPTIONS_CACHE_CONTROL
+        assert response.headers["ETag"] == registry.etag
+        mock_db.exec.assert_not_called()
+
+    @patch(f"{repeat_option.__name__}.get_repeat_option_registry")
+    async def test_not_modified(self, patched_get_registry: AsyncMock, mock_db: Mock, registry: RepeatOptionRegistry) -> None:
+        patched_get_registry.return_value = registry
+
+        response = await repeat_option.get_all_repeat_options(db=mock_db, response=Response(), if_none_match=registry.etag)
+
+        assert isinstance(response, Response)
+        assert response.status_code == 304
+        assert response.body == b""
+        assert response.headers["ETag"] == registry.etag
+
+
+class TestRefresh:
+    @patch(f"{repeat_option.__name__}.load_repeat_option_registry")
+    async def test_refresh(self, patched_load_registry: AsyncMock, mock_db: Mock, registry: RepeatOptionRegistry) -> None:
+        patched_load_registry.return_value = registry
+
+        repeat_options = await repeat_option.refresh_repeat_options(db=mock_db)
+
+        patched_load_registry.assert_awaited_once_with(mock_db)
+        assert repeat_options == list(registry.repeat_options)
+
+
+class TestLookups:
+    @patch(f"{repeat_option.__name__}.get_repeat_option_registry")
+    async def test_get_repeat_option(self, patched_get_registry: AsyncMock, mock_db: Mock, registry: RepeatOptionRegistry) -> None:
+        patched_get_registry.return_value = registry
+
+        assert await repeat_option.get_repeat_option(db=mock_db, repeat_option_id=1) == RepeatOptionRead(
+            repeat_option_id=1, name="Annually", repeat_unit_id=2, quantity=1, order_index=1
+        )
+
+        with pytest.raises(HTTPException) as exc_info:
+            await repeat_option.get_repeat_option(db=mock_db, repeat_option_id=99)
+
+        assert exc_info.value.detail == "Repeat Option not found"
+
+    @patch(f"{repeat_option.__name__}.get_repeat_option_registry")
+    async def test_get_repeat_unit(self, patched_get_registry: AsyncMock, mock_db: Mock, registry: RepeatOptionRegistry) -> None:
+        patched_get_registry.return_value = registry
+
+        assert await repeat_option.get_repeat_unit(db=mock_db, repeat_unit_id=2) == RepeatUnitRead(repeat_unit_id=2, name="Year")
+
+        with pytest.raises(HTTPException) as exc_info:
+            await repeat_option.get_repeat_unit(db=mock_db, repeat_unit_id=99)
+
+        assert exc_info.value.detail == "Repeat Unit not found"
@@ -1,16 +1,27 @@
 from datetime import date
-from typing import Any
+from typing import Any, AsyncIterator, Iterator
 from unittest.mock import AsyncMock, Mock, patch
 
 import pytest
+import pytest_asyncio
 from fastapi import HTTPException
-
-from miapeer.models.miapeer import User
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from miapeer.adapter.repeat_option_registry import (
+    clear_repeat_option_registry,
+    load_repeat_option_registry,
+)
+from miapeer.adapter.forecast import ForecastOccurrence
+from miapeer.dependencies import PortfolioAccess
 from miapeer.models.quantum.account import Account
 from miapeer.models.quantum.category import Category
 from miapeer.models.quantum.payee import Payee
-from miapeer.models.quantum.repeat_option import RepeatOption
-from miapeer.models.quantum.repeat_unit import RepeatUnit
+from miapeer.models.quantum.repeat_option import RepeatOption, RepeatOptionRead
+from miapeer.models.quantum.repeat_unit import RepeatUnit, RepeatUnitRead
 from miapeer.models.quantum.scheduled_transaction import (
     ScheduledTransaction,
     ScheduledTransactionCreate,
@@ -188,8 +199,8 @@ class TestGetAll:
         return [working_scheduled_transaction, working_scheduled_transaction]
 
     @pytest.fixture
-    def expected_sql(self, user_id: int, account_id: int) -> str:
-        return f"SELECT quantum_scheduled_transaction.transaction_type_id, quantum_scheduled_transaction.payee_id, quantum_scheduled_transaction.category_id, quantum_scheduled_transaction.fixed_amount, quantum_scheduled_transaction.estimate_occurrences, quantum_scheduled_transaction.prompt_days, quantum_scheduled_transaction.start_date, quantum_scheduled_transaction.end_date, quantum_scheduled_transaction.limit_occurrences, quantum_scheduled_transaction.repeat_option_id, quantum_scheduled_transaction.notes, quantum_scheduled_transaction.on_autopay, quantum_scheduled_transaction.scheduled_transaction_id, quantum_scheduled_transaction.account_id \nFROM quantum_scheduled_transaction JOIN quantum_account ON quantum_account.account_id = quantum_scheduled_transaction.account_id JOIN quantum_portfolio ON quantum_portfolio.portfolio_id = quantum_account.portfolio_id JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_scheduled_transaction.account_id = {account_id} AND quantum_portfolio_user.user_id = {user_id}"
+    def expected_sql(self, account_id: int) -> str:
+        return f"SELECT quantum_scheduled_transaction.transaction_type_id, quantum_scheduled_transaction.payee_id, quantum_scheduled_transaction.category_id, quantum_scheduled_transaction.fixed_amount, quantum_scheduled_transaction.estimate_occurrences, quantum_scheduled_transaction.prompt_days, quantum_scheduled_transaction.start_date, quantum_scheduled_transaction.end_date, quantum_scheduled_transaction.limit_occurrences, quantum_scheduled_transaction.repeat_option_id, quantum_scheduled_transaction.notes, quantum_scheduled_transaction.on_autopay, quantum_scheduled_transaction.scheduled_transaction_id, quantum_scheduled_transaction.account_id \nFROM quantum_scheduled_transaction \nWHERE quantum_scheduled_transaction.account_id = {account_id}"
 
     @pytest.mark.parametrize(
         "db_all_return_val, expected_response",
@@ -207,16 +218,19 @@ class TestGetAll:
         self,
         patched_get_repeat_option: AsyncMock,
         patched_get_repeat_unit: AsyncMock,
-        user: User,
+        portfolio_access: PortfolioAccess,
         account_id: int,
+        repeat_option_id: int,
         mock_db: Mock,
         expected_sql: str,
         expected_response: list[ScheduledTransactionRead],
     ) -> None:
-        patched_get_repeat_option.return_value = RepeatOption(name="Anually", quantity=10, repeat_unit_id=1, order_index=0)
-        patched_get_repeat_unit.return_value = RepeatUnit(name="Year")
+        patched_get_repeat_option.return_value = RepeatOptionRead(
+            repeat_option_id=repeat_option_id, name="Anually", quantity=10, repeat_unit_id=1, order_index=0
+        )
+        patched_get_repeat_unit.return_value = RepeatUnitRead(repeat_unit_id=1, name="Year")
 
-        response = await scheduled_transaction.get_all_scheduled_transactions(account_id=account_id, db=mock_db, current_user=user)
+        response = await scheduled_transaction.get_all_scheduled_transactions(account_id=account_id, db=mock_db, portfolio_access=portfolio_access)
 
         sql = mock_db.exec.call_args.args[0]
         sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
@@ -261,25 +275,20 @@ class TestCreate:
         )
 
     @pytest.fixture
-    def expected_scheduled_transaction_sql(self, account_id: int, user_id: int) -> str:
-        return f"SELECT quantum_account.portfolio_id, quantum_account.name, quantum_account.starting_balance, quantum_account.account_id \nFROM quantum_account JOIN quantum_portfolio ON quantum_portfolio.portfolio_id = quantum_account.portfolio_id JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_account.account_id = {account_id} AND quantum_portfolio_user.user_id = {user_id}"
-
-    @pytest.fixture
-    def expected_transaction_type_sql(self, user_id: int, transaction_type_id: int) -> str:
-        return f"SELECT quantum_transaction_type.name, quantum_transaction_type.portfolio_id, quantum_transaction_type.transaction_type_id \nFROM quantum_transaction_type JOIN quantum_portfolio ON quantum_portfolio.portfolio_id = quantum_transaction_type.portfolio_id JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_transaction_type.transaction_type_id = {transaction_type_id} AND quantum_portfolio_user.user_id = {user_id}"
+    def expected_transaction_type_sql(self, portfolio_id: int, transaction_type_id: int) -> str:
+        return f"SELECT quantum_transaction_type.name, quantum_transaction_type.portfolio_id, quantum_transaction_type.transaction_type_id \nFROM quantum_transaction_type \nWHERE quantum_transaction_type.transaction_type_id = {transaction_type_id} AND quantum_transaction_type.portfolio_id IN ({portfolio_id})"
 
     @pytest.fixture
-    def expected_payee_sql(self, user_id: int, payee_id: int) -> str:
-        return f"SELECT quantum_payee.name, quantum_payee.portfolio_id, quantum_payee.payee_id \nFROM quantum_payee JOIN quantum_portfolio ON quantum_portfolio.portfolio_id = quantum_payee.portfolio_id JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_payee.payee_id = {payee_id} AND quantum_portfolio_user.user_id = {user_id}"
+    def expected_payee_sql(self, portfolio_id: int, payee_id: int) -> str:
+        return f"SELECT quantum_payee.name, quantum_payee.portfolio_id, quantum_payee.payee_id \nFROM quantum_payee \nWHERE quantum_payee.payee_id = {payee_id} AND quantum_payee.portfolio_id IN ({portfolio_id})"
 
     @pytest.fixture
-    def expected_category_sql(self, user_id: int, category_id: int) -> str:
-        return f"SELECT quantum_category.name, quantum_category.parent_category_id, quantum_category.portfolio_id, quantum_category.category_id \nFROM quantum_category JOIN quantum_portfolio ON quantum_portfolio.portfolio_id = quantum_category.portfolio_id JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_category.category_id = {category_id} AND quantum_portfolio_user.user_id = {user_id}"
+    def expected_category_sql(self, portfolio_id: int, category_id: int) -> str:
+        return f"SELECT quantum_category.name, quantum_category.parent_category_id, quantum_category.portfolio_id, quantum_category.category_id \nFROM quantum_category \nWHERE quantum_category.category_id = {category_id} AND quantum_category.portfolio_id IN ({portfolio_id})"
 
     @pytest.fixture
-    def db_first_return_values(self, basic_account, scheduled_transaction_to_create) -> list:
+    def db_first_return_values(self, scheduled_transaction_to_create) -> list:
         return [
-            basic_account,
             TransactionType(transaction_type_id=scheduled_transaction_to_create.transaction_type_id, name="", portfolio_id=1),
             Payee(payee_id=scheduled_transaction_to_create.payee_id, name="", portfolio_id=1),
             Category(category_id=scheduled_transaction_to_create.category_id, name="", portfolio_id=1),
@@ -288,33 +297,28 @@ class TestCreate:
     @pytest.mark.parametrize("db_first_side_effect_val, db_refresh_patch_method", [(pytest.lazy_fixture("db_first_return_values"), db_refresh)])
     async def test_create(
         self,
-        user: User,
+        portfolio_access: PortfolioAccess,
         account_id: int,
         scheduled_transaction_to_create: ScheduledTransactionCreate,
         complete_scheduled_transaction: ScheduledTransaction,
         mock_db: Mock,
-        expected_scheduled_transaction_sql: str,
         expected_transaction_type_sql: str,
         expected_payee_sql: str,
         expected_category_sql: str,
     ) -> None:
         await scheduled_transaction.create_scheduled_transaction(
-            account_id=account_id, scheduled_transaction=scheduled_transaction_to_create, db=mock_db, current_user=user
+            account_id=account_id, scheduled_transaction=scheduled_transaction_to_create, db=mock_db, portfolio_access=portfolio_access
         )
 
         sql = mock_db.exec.call_args_list[0].args[0]
         sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
-        assert sql_str == expected_scheduled_transaction_sql
-
-        sql = mock_db.exec.call_args_list[1].args[0]
-        sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
         assert sql_str == expected_transaction_type_sql
 
-        sql = mock_db.exec.call_args_list[2].args[0]
+        sql = mock_db.exec.call_args_list[1].args[0]
         sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
         assert sql_str == expected_payee_sql
 
-        sql = mock_db.exec.call_args_list[3].args[0]
+        sql = mock_db.exec.call_args_list[2].args[0]
         sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
         assert sql_str == expected_category_sql
 
@@ -330,27 +334,22 @@ class TestCreate:
 
         # Don't need to test the response here because it's just the updated scheduled_transaction_to_add
 
-    @pytest.mark.parametrize("db_first_return_val", [None, ""])
     async def test_create_with_portfolio_not_found(
         self,
-        user: User,
+        no_portfolio_access: PortfolioAccess,
         account_id: int,
         scheduled_transaction_to_create: ScheduledTransactionCreate,
         mock_db: Mock,
-        expected_scheduled_transaction_sql: str,
     ) -> None:
         with pytest.raises(HTTPException):
             await scheduled_transaction.create_scheduled_transaction(
                 account_id=account_id,
                 scheduled_transaction=scheduled_transaction_to_create,
                 db=mock_db,
-                current_user=user,
+                portfolio_access=no_portfolio_access,
             )
 
-        sql = mock_db.exec.call_args.args[0]
-        sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
-
-        assert sql_str == expected_scheduled_transaction_sql
+        mock_db.exec.assert_not_called()
         mock_db.add.assert_not_called()
         mock_db.commit.assert_not_called()
         mock_db.refresh.assert_not_called()
@@ -376,8 +375,8 @@ class TestGet:
         return ScheduledTransactionRead.model_validate(complete_scheduled_transaction.model_dump(), update={"next_transaction": transaction})
 
     @pytest.fixture
-    def expected_sql(self, user_id: int, account_id: int, scheduled_transaction_id: int) -> str:
-        return f"SELECT quantum_scheduled_transaction.transaction_type_id, quantum_scheduled_transaction.payee_id, quantum_scheduled_transaction.category_id, quantum_scheduled_transaction.fixed_amount, quantum_scheduled_transaction.estimate_occurrences, quantum_scheduled_transaction.prompt_days, quantum_scheduled_transaction.start_date, quantum_scheduled_transaction.end_date, quantum_scheduled_transaction.limit_occurrences, quantum_scheduled_transaction.repeat_option_id, quantum_scheduled_transaction.notes, quantum_scheduled_transaction.on_autopay, quantum_scheduled_transaction.scheduled_transaction_id, quantum_scheduled_transaction.account_id \nFROM quantum_scheduled_transaction JOIN quantum_account ON quantum_account.account_id = quantum_scheduled_transaction.account_id JOIN quantum_portfolio ON quantum_portfolio.portfolio_id = quantum_account.portfolio_id JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_account.account_id = {account_id} AND quantum_scheduled_transaction.scheduled_transaction_id = {scheduled_transaction_id} AND quantum_portfolio_user.user_id = {user_id}"
+    def expected_sql(self, account_id: int, scheduled_transaction_id: int) -> str:
+        return f"SELECT quantum_scheduled_transaction.transaction_type_id, quantum_scheduled_transaction.payee_id, quantum_scheduled_transaction.category_id, quantum_scheduled_transaction.fixed_amount, quantum_scheduled_transaction.estimate_occurrences, quantum_scheduled_transaction.prompt_days, quantum_scheduled_transaction.start_date, quantum_scheduled_transaction.end_date, quantum_scheduled_transaction.limit_occurrences, quantum_scheduled_transaction.repeat_option_id, quantum_scheduled_transaction.notes, quantum_scheduled_transaction.on_autopay, quantum_scheduled_transaction.scheduled_transaction_id, quantum_scheduled_transaction.account_id \nFROM quantum_scheduled_transaction \nWHERE quantum_scheduled_transaction.account_id = {account_id} AND quantum_scheduled_transaction.scheduled_transaction_id = {scheduled_transaction_id}"
 
     @pytest.mark.parametrize("db_one_or_none_return_val", [pytest.lazy_fixture("complete_scheduled_transaction")])
     @patch("miapeer.routers.quantum.repeat_option.get_repeat_unit")
@@ -386,7 +385,7 @@ class TestGet:
         self,
         patched_get_repeat_option: AsyncMock,
         patched_get_repeat_unit: AsyncMock,
-        user: User,
+        portfolio_access: PortfolioAccess,
         account_id: int,
         scheduled_transaction_id: int,
         mock_db: Mock,
@@ -397,7 +396,7 @@ class TestGet:
         patched_get_repeat_unit.return_value = RepeatUnit(name="Year")
 
         response = await scheduled_transaction.get_scheduled_transaction(
-            account_id=account_id, scheduled_transaction_id=scheduled_transaction_id, db=mock_db, current_user=user
+            account_id=account_id, scheduled_transaction_id=scheduled_transaction_id, db=mock_db, portfolio_access=portfolio_access
         )
 
         sql = mock_db.exec.call_args.args[0]
@@ -407,10 +406,12 @@ class TestGet:
         assert response == expected_response
 
     @pytest.mark.parametrize("db_one_or_none_return_val", [None, []])
-    async def test_get_no_data(self, user: User, account_id: int, scheduled_transaction_id: int, mock_db: Mock, expected_sql: str) -> None:
+    async def test_get_no_data(
+        self, portfolio_access: PortfolioAccess, account_id: int, scheduled_transaction_id: int, mock_db: Mock, expected_sql: str
+    ) -> None:
         with pytest.raises(HTTPException):
             await scheduled_transaction.get_scheduled_transaction(
-                account_id=account_id, scheduled_transaction_id=scheduled_transaction_id, db=mock_db, current_user=user
+                account_id=account_id, scheduled_transaction_id=scheduled_transaction_id, db=mock_db, portfolio_access=portfolio_access
             )
 
         sql = mock_db.exec.call_args.args[0]
@@ -421,13 +422,13 @@ class TestGet:
 
 class TestDelete:
     @pytest.fixture
-    def expected_sql(self, user_id: int, account_id: int, scheduled_transaction_id: int) -> str:
-        return f"SELECT quantum_scheduled_transaction.transaction_type_id, quantum_scheduled_transaction.payee_id, quantum_scheduled_transaction.category_id, quantum_scheduled_transaction.fixed_amount, quantum_scheduled_transaction.estimate_occurrences, quantum_scheduled_transaction.prompt_days, quantum_scheduled_transaction.start_date, quantum_scheduled_transaction.end_date, quantum_scheduled_transaction.limit_occurrences, quantum_scheduled_transaction.repeat_option_id, quantum_scheduled_transaction.notes, quantum_scheduled_transaction.on_autopay, quantum_scheduled_transaction.scheduled_transaction_id, quantum_scheduled_transaction.account_id \nFROM quantum_scheduled_transaction JOIN quantum_account ON quantum_account.account_id = quantum_scheduled_transaction.account_id JOIN quantum_portfolio ON quantum_portfolio.portfolio_id = quantum_account.portfolio_id JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_account.account_id = {account_id} AND quantum_scheduled_transaction.scheduled_transaction_id = {scheduled_transaction_id} AND quantum_portfolio_user.user_id = {user_id}"
+    def expected_sql(self, account_id: int, scheduled_transaction_id: int) -> str:
+        return f"SELECT quantum_scheduled_transaction.transaction_type_id, quantum_scheduled_transaction.payee_id, quantum_scheduled_transaction.category_id, quantum_scheduled_transaction.fixed_amount, quantum_scheduled_transaction.estimate_occurrences, quantum_scheduled_transaction.prompt_days, quantum_scheduled_transaction.start_date, quantum_scheduled_transaction.end_date, quantum_scheduled_transaction.limit_occurrences, quantum_scheduled_transaction.repeat_option_id, quantum_scheduled_transaction.notes, quantum_scheduled_transaction.on_autopay, quantum_scheduled_transaction.scheduled_transaction_id, quantum_scheduled_transaction.account_id \nFROM quantum_scheduled_transaction \nWHERE quantum_scheduled_transaction.account_id = {account_id} AND quantum_scheduled_transaction.scheduled_transaction_id = {scheduled_transaction_id}"
 
     @pytest.mark.parametrize("db_one_or_none_return_val", ["some data", 123])
     async def test_delete_with_scheduled_transaction_found(
         self,
-        user: User,
+        portfolio_access: PortfolioAccess,
         account_id: int,
         scheduled_transaction_id: int,
         mock_db: Mock,
@@ -435,7 +436,7 @@ class TestDelete:
         db_one_or_none_return_val: Any,
     ) -> None:
         response = await scheduled_transaction.delete_scheduled_transaction(
-            account_id=account_id, scheduled_transaction_id=scheduled_transaction_id, db=mock_db, current_user=user
+            account_id=account_id, scheduled_transaction_id=scheduled_transaction_id, db=mock_db, portfolio_access=portfolio_access
         )
 
         sql = mock_db.exec.call_args.args[0]
@@ -448,11 +449,11 @@ class TestDelete:
 
     @pytest.mark.parametrize("db_one_or_none_return_val", [None, []])
     async def test_delete_with_scheduled_transaction_not_found(
-        self, user: User, account_id: int, scheduled_transaction_id: int, mock_db: Mock, expected_sql: str
+        self, portfolio_access: PortfolioAccess, account_id: int, scheduled_transaction_id: int, mock_db: Mock, expected_sql: str
     ) -> None:
         with pytest.raises(HTTPException):
             await scheduled_transaction.delete_scheduled_transaction(
-                account_id=account_id, scheduled_transaction_id=scheduled_transaction_id, db=mock_db, current_user=user
+                account_id=account_id, scheduled_transaction_id=scheduled_transaction_id, db=mock_db, portfolio_access=portfolio_access
             )
 
         sql = mock_db.exec.call_args.args[0]
@@ -482,24 +483,20 @@ class TestUpdate:
         )
 
     @pytest.fixture
-    def expected_scheduled_transaction_sql(self, user_id: int, account_id: int, scheduled_transaction_id: int) -> str:
-        return f"SELECT quantum_scheduled_transaction.transaction_type_id, quantum_scheduled_transaction.payee_id, quantum_scheduled_transaction.category_id, quantum_scheduled_transaction.fixed_amount, quantum_scheduled_transaction.estimate_occurrences, quantum_scheduled_transaction.prompt_days, quantum_scheduled_transaction.start_date, quantum_scheduled_transaction.end_date, quantum_scheduled_transaction.limit_occurrences, quantum_scheduled_transaction.repeat_option_id, quantum_scheduled_transaction.notes, quantum_scheduled_transaction.on_autopay, quantum_scheduled_transaction.scheduled_transaction_id, quantum_scheduled_transaction.account_id \nFROM quantum_scheduled_transaction JOIN quantum_account ON quantum_account.account_id = quantum_scheduled_transaction.account_id JOIN quantum_portfolio ON quantum_portfolio.portfolio_id = quantum_account.portfolio_id JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_account.account_id = {account_id} AND quantum_scheduled_transaction.scheduled_transaction_id = {scheduled_transaction_id} AND quantum_portfolio_user.user_id = {user_id}"
-
-    @pytest.fixture
-    def expected_transaction_type_sql(self, user_id: int, scheduled_transaction_updates: ScheduledTransactionUpdate) -> str:
-        return f"SELECT quantum_transaction_type.name, quantum_transaction_type.portfolio_id, quantum_transaction_type.transaction_type_id \nFROM quantum_transaction_type JOIN quantum_portfolio ON quantum_portfolio.portfolio_id = quantum_transaction_type.portfolio_id JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_transaction_type.transaction_type_id = {scheduled_transaction_updates.transaction_type_id} AND quantum_portfolio_user.user_id = {user_id}"
+    def expected_scheduled_transaction_sql(self, account_id: int, scheduled_transaction_id: int) -> str:
+        return f"SELECT quantum_scheduled_transaction.transaction_type_id, quantum_scheduled_transaction.payee_id, quantum_scheduled_transaction.category_id, quantum_scheduled_transaction.fixed_amount, quantum_scheduled_transaction.estimate_occurrences, quantum_scheduled_transaction.prompt_days, quantum_scheduled_transaction.start_date, quantum_scheduled_transaction.end_date, quantum_scheduled_transaction.limit_occurrences, quantum_scheduled_transaction.repeat_option_id, quantum_scheduled_transaction.notes, quantum_scheduled_transaction.on_autopay, quantum_scheduled_transaction.scheduled_transaction_id, quantum_scheduled_transaction.account_id \nFROM quantum_scheduled_transaction \nWHERE quantum_scheduled_transaction.account_id = {account_id} AND quantum_scheduled_transaction.scheduled_transaction_id = {scheduled_transaction_id}"
 
     @pytest.fixture
-    def expected_account_sql(self, user_id: int, account_id: int) -> str:
-        return f"SELECT quantum_account.portfolio_id, quantum_account.name, quantum_account.starting_balance, quantum_account.account_id \nFROM quantum_account JOIN quantum_portfolio ON quantum_portfolio.portfolio_id = quantum_account.portfolio_id JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_account.account_id = {account_id} AND quantum_portfolio_user.user_id = {user_id}"
+    def expected_transaction_type_sql(self, portfolio_id: int, scheduled_transaction_updates: ScheduledTransactionUpdate) -> str:
+        return f"SELECT quantum_transaction_type.name, quantum_transaction_type.portfolio_id, quantum_transaction_type.transaction_type_id \nFROM quantum_transaction_type \nWHERE quantum_transaction_type.transaction_type_id = {scheduled_transaction_updates.transaction_type_id} AND quantum_transaction_type.portfolio_id IN ({portfolio_id})"
 
     @pytest.fixture
-    def expected_payee_sql(self, user_id: int, scheduled_transaction_updates: ScheduledTransactionUpdate) -> str:
-        return f"SELECT quantum_payee.name, quantum_payee.portfolio_id, quantum_payee.payee_id \nFROM quantum_payee JOIN quantum_portfolio ON quantum_portfolio.portfolio_id = quantum_payee.portfolio_id JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_payee.payee_id = {scheduled_transaction_updates.payee_id} AND quantum_portfolio_user.user_id = {user_id}"
+    def expected_payee_sql(self, portfolio_id: int, scheduled_transaction_updates: ScheduledTransactionUpdate) -> str:
+        return f"SELECT quantum_payee.name, quantum_payee.portfolio_id, quantum_payee.payee_id \nFROM quantum_payee \nWHERE quantum_payee.payee_id = {scheduled_transaction_updates.payee_id} AND quantum_payee.portfolio_id IN ({portfolio_id})"
 
     @pytest.fixture
-    def expected_category_sql(self, user_id: int, scheduled_transaction_updates: ScheduledTransactionUpdate) -> str:
-        return f"SELECT quantum_category.name, quantum_category.parent_category_id, quantum_category.portfolio_id, quantum_category.category_id \nFROM quantum_category JOIN quantum_portfolio ON quantum_portfolio.portfolio_id = quantum_category.portfolio_id JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_category.category_id = {scheduled_transaction_updates.category_id} AND quantum_portfolio_user.user_id = {user_id}"
+    def expected_category_sql(self, portfolio_id: int, scheduled_transaction_updates: ScheduledTransactionUpdate) -> str:
+        return f"SELECT quantum_category.name, quantum_category.parent_category_id, quantum_category.portfolio_id, quantum_category.category_id \nFROM quantum_category \nWHERE quantum_category.category_id = {scheduled_transaction_updates.category_id} AND quantum_category.portfolio_id IN ({portfolio_id})"
 
     @pytest.fixture
     def updated_scheduled_transaction(self, complete_scheduled_transaction: ScheduledTransaction) -> ScheduledTransaction:
@@ -540,9 +537,8 @@ class TestUpdate:
         return ScheduledTransactionRead.model_validate(updated_scheduled_transaction.model_dump(), update={"next_transaction": next_transaction})
 
     @pytest.fixture
-    def db_first_return_values(self, basic_account, updated_scheduled_transaction) -> list:
+    def db_first_return_values(self, updated_scheduled_transaction) -> list:
         return [
-            basic_account,
             TransactionType(transaction_type_id=updated_scheduled_transaction.transaction_type_id, name="", portfolio_id=1),
             Payee(payee_id=updated_scheduled_transaction.payee_id, name="", portfolio_id=1),
             Category(category_id=updated_scheduled_transaction.category_id, name="", portfolio_id=1),
@@ -558,13 +554,12 @@ class TestUpdate:
         self,
         patched_get_repeat_option: AsyncMock,
         patched_get_repeat_unit: AsyncMock,
-        user: User,
+        portfolio_access: PortfolioAccess,
         account_id: int,
         scheduled_transaction_id: int,
         scheduled_transaction_updates: ScheduledTransactionUpdate,
         mock_db: Mock,
         expected_scheduled_transaction_sql: str,
-        expected_account_sql: str,
         expected_payee_sql: str,
         expected_transaction_type_sql: str,
         expected_category_sql: str,
@@ -579,7 +574,7 @@ class TestUpdate:
             scheduled_transaction_id=scheduled_transaction_id,
             scheduled_transaction=scheduled_transaction_updates,
             db=mock_db,
-            current_user=user,
+            portfolio_access=portfolio_access,
         )
 
         sql = mock_db.exec.call_args_list[0].args[0]
@@ -588,17 +583,13 @@ class TestUpdate:
 
         sql = mock_db.exec.call_args_list[1].args[0]
         sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
-        assert sql_str == expected_account_sql
-
-        sql = mock_db.exec.call_args_list[2].args[0]
-        sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
         assert sql_str == expected_transaction_type_sql
 
-        sql = mock_db.exec.call_args_list[3].args[0]
+        sql = mock_db.exec.call_args_list[2].args[0]
         sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
         assert sql_str == expected_payee_sql
 
-        sql = mock_db.exec.call_args_list[4].args[0]
+        sql = mock_db.exec.call_args_list[3].args[0]
         sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
         assert sql_str == expected_category_sql
 
@@ -615,7 +606,7 @@ class TestUpdate:
     @pytest.mark.parametrize("db_one_or_none_return_val", [None, []])
     async def test_update_with_scheduled_transaction_not_found(
         self,
-        user: User,
+        portfolio_access: PortfolioAccess,
         account_id: int,
         scheduled_transaction_id: int,
         scheduled_transaction_updates: ScheduledTransactionUpdate,
@@ -628,7 +619,7 @@ class TestUpdate:
                 scheduled_transaction_id=scheduled_transaction_id,
                 scheduled_transaction=scheduled_transaction_updates,
                 db=mock_db,
-                current_user=user,
+                portfolio_access=portfolio_access,
             )
 
         sql = mock_db.exec.call_args.args[0]
@@ -787,6 +778,50 @@ class TestNextIteration:
 
         assert len(results) == set_limit
 
+    @patch("miapeer.routers.quantum.repeat_option.get_repeat_unit")
+    @patch("miapeer.routers.quantum.repeat_option.get_repeat_option")
+    async def test_next_iterations_within_a_window_are_not_capped(
+        self,
+        patched_get_repeat_option: AsyncMock,
+        patched_get_repeat_unit: AsyncMock,
+        mock_db: Mock,
+        complete_scheduled_transaction: ScheduledTransaction,
+    ) -> None:
+        patched_get_repeat_option.return_value = RepeatOption(name="Weekly", quantity=7, repeat_unit_id=1, order_index=0)
+        patched_get_repeat_unit.return_value = RepeatUnit(name="Day")
+
+        results = await scheduled_transaction.get_next_iterations(
+            db=mock_db,
+            scheduled_transaction=ScheduledTransaction.model_validate(
+                complete_scheduled_transaction.model_dump(), update={"start_date": date(year=2024, month=1, day=1), "end_date": None}
+            ),
+            override_end_date=date(year=2027, month=12, day=31),
+        )
+
+        assert len(results) == 209
+        assert results[-1].transaction_date == date(year=2027, month=12, day=27)
+
+    @patch("miapeer.routers.quantum.repeat_option.get_repeat_unit")
+    @patch("miapeer.routers.quantum.repeat_option.get_repeat_option")
+    async def test_next_iterations_without_an_end(
+        self,
+        patched_get_repeat_option: AsyncMock,
+        patched_get_repeat_unit: AsyncMock,
+        mock_db: Mock,
+        complete_scheduled_transaction: ScheduledTransaction,
+    ) -> None:
+        patched_get_repeat_option.return_value = RepeatOption(name="Weekly", quantity=7, repeat_unit_id=1, order_index=0)
+        patched_get_repeat_unit.return_value = RepeatUnit(name="Day")
+
+        results = await scheduled_transaction.get_next_iterations(
+            db=mock_db,
+            scheduled_transaction=ScheduledTransaction.model_validate(
+                complete_scheduled_transaction.model_dump(), update={"end_date": None, "limit_occurrences": None}
+            ),
+        )
+
+        assert len(results) == scheduled_transaction.MAX_LIMIT
+
     async def test_next_iterations_with_no_repeat(
         self,
         mock_db: Mock,
@@ -814,7 +849,7 @@ class TestNextIteration:
         )
 
         assert len(results) == 1
-        assert results[0].model_dump() == expected.model_dump()
+        assert results[0].to_transaction().model_dump() == expected.model_dump()
 
 
 class TestCreateTransaction:
@@ -822,32 +857,16 @@ class TestCreateTransaction:
         obj.transaction_id = 0
 
     @pytest.fixture
-    def scheduled_transaction_with_no_next(self, complete_scheduled_transaction: ScheduledTransaction) -> ScheduledTransactionRead:
-        return ScheduledTransactionRead.model_validate(complete_scheduled_transaction)
-
-    @pytest.fixture
-    def scheduled_transaction_with_next(self, complete_scheduled_transaction: ScheduledTransaction) -> ScheduledTransactionRead:
-        next_transaction = TransactionRead(
-            transaction_type_id=complete_scheduled_transaction.transaction_type_id,
-            payee_id=complete_scheduled_transaction.payee_id,
-            category_id=complete_scheduled_transaction.category_id,
-            amount=complete_scheduled_transaction.fixed_amount if complete_scheduled_transaction.fixed_amount else 0,
-            transaction_date=complete_scheduled_transaction.start_date,
-            clear_date=None,
-            check_number=None,
-            exclude_from_forecast=False,
-            notes=complete_scheduled_transaction.notes,
-            transaction_id=0,
-            account_id=complete_scheduled_transaction.account_id,
-            balance=None,
-        )
-
-        return ScheduledTransactionRead.model_validate(
-            complete_scheduled_transaction.model_dump(),
-            update={
-                "next_transaction": next_transaction,
-            },
-        )
+    def next_iterations(self, complete_scheduled_transaction: ScheduledTransaction) -> list[ForecastOccurrence]:
+        return [
+            ForecastOccurrence(
+                transaction_date,
+                complete_scheduled_transaction.fixed_amount or 0,
+                complete_scheduled_transaction.scheduled_transaction_id,
+                complete_scheduled_transaction,
+            )
+            for transaction_date in [complete_scheduled_transaction.start_date, date(year=2099, month=1, day=1)]
+        ]
 
     @pytest.fixture
     def base_transaction_to_create(self, complete_scheduled_transaction: ScheduledTransaction) -> Transaction:
@@ -985,22 +1004,25 @@ class TestCreateTransaction:
             scheduled_transaction_history_id=None,
         )
 
-    @patch("miapeer.routers.quantum.scheduled_transaction.get_scheduled_transaction")
+    @patch("miapeer.routers.quantum.scheduled_transaction._get_scheduled_transaction")
+    @patch("miapeer.routers.quantum.scheduled_transaction.get_next_iterations")
     async def test_create_transaction_fails(
         self,
+        patched_get_next_iterations: AsyncMock,
         patched_get_scheduled_transaction: AsyncMock,
         mock_db: Mock,
-        user: User,
+        portfolio_access: PortfolioAccess,
         account_id: int,
         scheduled_transaction_id: int,
-        scheduled_transaction_with_no_next: ScheduledTransactionRead,
+        complete_scheduled_transaction: ScheduledTransaction,
     ) -> None:
-        patched_get_scheduled_transaction.return_value = scheduled_transaction_with_no_next
+        patched_get_scheduled_transaction.return_value = complete_scheduled_transaction
+        patched_get_next_iterations.return_value = []
 
         with pytest.raises(HTTPException):
             await scheduled_transaction.create_transaction(
                 db=mock_db,
-                current_user=user,
+                portfolio_access=portfolio_access,
                 account_id=account_id,
                 scheduled_transaction_id=scheduled_transaction_id,
                 override_transaction_data=None,
@@ -1033,34 +1055,45 @@ class TestCreateTransaction:
             ),
         ],
     )
-    @patch("miapeer.routers.quantum.scheduled_transaction.get_scheduled_transaction")
-    @patch("miapeer.routers.quantum.scheduled_transaction.progress_iteration")
+    @patch("miapeer.routers.quantum.scheduled_transaction._get_scheduled_transaction")
+    @patch("miapeer.routers.quantum.scheduled_transaction.get_next_iterations")
+    @patch("miapeer.routers.quantum.scheduled_transaction.adjust_account_balances")
+    @patch("miapeer.routers.quantum.scheduled_transaction.adjust_transaction_summaries")
     async def test_create_transaction_succeeds(
         self,
-        patched_progress_iteration: AsyncMock,
+        patched_adjust_transaction_summaries: AsyncMock,
+        patched_adjust_account_balances: AsyncMock,
+        patched_get_next_iterations: AsyncMock,
         patched_get_scheduled_transaction: AsyncMock,
         mock_db: Mock,
-        user: User,
+        portfolio_access: PortfolioAccess,
         account_id: int,
         scheduled_transaction_id: int,
-        scheduled_transaction_with_next: ScheduledTransactionRead,
+        complete_scheduled_transaction: ScheduledTransaction,
+        next_iterations: list[ForecastOccurrence],
         override_transaction_data: TransactionCreate,
         transaction_to_create: Transaction,
         scheduled_transaction_history_record: ScheduledTransactionHistory,
         expected_response: TransactionRead,
     ) -> None:
-        patched_get_scheduled_transaction.return_value = scheduled_transaction_with_next
+        patched_get_scheduled_transaction.return_value = complete_scheduled_transaction
+        patched_get_next_iterations.return_value = next_iterations
+
+        def db_flush() -> None:
+            mock_db.add.call_args.args[0].transaction_id = 0
+
+        mock_db.flush.side_effect = db_flush
 
         response = await scheduled_transaction.create_transaction(
             db=mock_db,
-            current_user=user,
+            portfolio_access=portfolio_access,
             account_id=account_id,
             scheduled_transaction_id=scheduled_transaction_id,
             override_transaction_data=override_transaction_data,
         )
         assert response == expected_response
 
-        assert mock_db.add.call_count == 2
+        assert mock_db.add.call_count == 3
 
         add_call_param = mock_db.add.call_args_list[0].args[0]
         assert add_call_param.model_dump() == transaction_to_create.model_dump()
@@ -1068,14 +1101,67 @@ class TestCreateTransaction:
         add_call_param = mock_db.add.call_args_list[1].args[0]
         assert add_call_param.model_dump() == scheduled_transaction_history_record.model_dump()
 
-        assert mock_db.commit.call_count == 2
+        # The scheduled transaction moves on to its next iteration as part of the same unit of work
+        add_call_param = mock_db.add.call_args_list[2].args[0]
+        assert add_call_param is complete_scheduled_transaction
+        assert add_call_param.start_date == next_iterations[1].transaction_date
+
+        # The account's balances (and any summary) move along with the new transaction
+        expected_changes = [(transaction_to_create.clear_date, transaction_to_create.amount)]
+        patched_adjust_transaction_summaries.assert_awaited_once_with(mock_db, account_id, expected_changes)
+        patched_adjust_account_balances.assert_awaited_once_with(mock_db, account_id, expected_changes)
+
+        mock_db.flush.assert_called_once()
+        mock_db.commit.assert_called_once()
 
         assert mock_db.refresh.call_count == 1
 
         refresh_call_param = mock_db.refresh.call_args_list[0].args[0]
         assert refresh_call_param.model_dump() == transaction_to_create.model_dump()
 
-        patched_progress_iteration.assert_called_once()
+    @patch("miapeer.routers.quantum.scheduled_transaction._get_scheduled_transaction")
+    @patch("miapeer.routers.quantum.scheduled_transaction.get_next_iterations")
+    @patch("miapeer.routers.quantum.scheduled_transaction.adjust_account_balances")
+    @patch("miapeer.routers.quantum.scheduled_transaction.adjust_transaction_summaries")
+    async def test_create_transaction_with_only_overrides(
+        self,
+        patched_adjust_transaction_summaries: AsyncMock,
+        patched_adjust_account_balances: AsyncMock,
+        patched_get_next_iterations: AsyncMock,
+        patched_get_scheduled_transaction: AsyncMock,
+        mock_db: Mock,
+        portfolio_access: PortfolioAccess,
+        account_id: int,
+        scheduled_transaction_id: int,
+        complete_scheduled_transaction: ScheduledTransaction,
+        transaction_overrides_2: TransactionCreate,
+    ) -> None:
+        # A schedule past its end date has no occurrences left, so the new transaction comes from the overrides alone
+        patched_get_scheduled_transaction.return_value = complete_scheduled_transaction
+        patched_get_next_iterations.return_value = []
+
+        def db_flush() -> None:
+            mock_db.add.call_args.args[0].transaction_id = 0
+
+        mock_db.flush.side_effect = db_flush
+
+        await scheduled_transaction.create_transaction(
+            db=mock_db,
+            portfolio_access=portfolio_access,
+            account_id=account_id,
+            scheduled_transaction_id=scheduled_transaction_id,
+            override_transaction_data=transaction_overrides_2,
+        )
+
+        added_transaction = mock_db.add.call_args_list[0].args[0]
+        assert added_transaction.account_id == account_id
+        assert added_transaction.amount == transaction_overrides_2.amount
+
+        expected_changes = [(transaction_overrides_2.clear_date, transaction_overrides_2.amount)]
+        patched_adjust_account_balances.assert_awaited_once_with(mock_db, account_id, expected_changes)
+        patched_adjust_transaction_summaries.assert_awaited_once_with(mock_db, account_id, expected_changes)
+
+        mock_db.commit.assert_called_once()
 
 
 class TestProgressIteration:
@@ -1119,7 +1205,7 @@ class TestProgressIteration:
         patched_get_next_iterations: AsyncMock,
         patched_get_scheduled_transaction: AsyncMock,
         mock_db: Mock,
-        user: User,
+        portfolio_access: PortfolioAccess,
         account_id: int,
         scheduled_transaction_id: int,
         complete_scheduled_transaction: ScheduledTransactionRead,
@@ -1131,7 +1217,7 @@ class TestProgressIteration:
 
         await scheduled_transaction.progress_iteration(
             db=mock_db,
-            current_user=user,
+            portfolio_access=portfolio_access,
             account_id=account_id,
             scheduled_transaction_id=scheduled_transaction_id,
         )
@@ -1142,3 +1228,107 @@ class TestProgressIteration:
         assert add_call_param.model_dump() == updated_scheduled_transaction.model_dump()
 
         mock_db.commit.assert_called_once()
+
+
+class TestNextIterationsForAll:
+    @pytest.fixture(autouse=True)
+    def empty_repeat_option_registry(self) -> Iterator[None]:
+        clear_repeat_option_registry()
+        yield
+        clear_repeat_option_registry()
+
+    @pytest_asyncio.fixture
+    async def db_engine(self) -> AsyncIterator[AsyncEngine]:
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with engine.begin() as connection:
+            await connection.run_sync(SQLModel.metadata.create_all)
+
+        yield engine
+
+        await engine.dispose()
+
+    @pytest_asyncio.fixture
+    async def db(self, db_engine: AsyncEngine) -> AsyncIterator[AsyncSession]:
+        async with AsyncSession(db_engine, expire_on_commit=False) as session:
+            session.add_all(
+                [
+                    RepeatUnit(repeat_unit_id=1, name="Month"),
+                    RepeatUnit(repeat_unit_id=2, name="Day"),
+                    RepeatOption(repeat_option_id=1, name="Monthly", quantity=1, repeat_unit_id=1, order_index=0),
+                    RepeatOption(repeat_option_id=2, name="Weekly", quantity=7, repeat_unit_id=2, order_index=1),
+                ]
+            )
+
+            # Fixed amount, estimated from the first 3 of 4 previous amounts, estimated from all of them, and no repeat at all
+            schedules = [(1, 500, None, 1), (2, None, 3, 2), (3, None, None, 1), (4, None, 2, None)]
+            for scheduled_transaction_id, fixed_amount, estimate_occurrences, repeat_option_id in schedules:
+                session.add(
+                    ScheduledTransaction(
+                        scheduled_transaction_id=scheduled_transaction_id,
+                        account_id=1,
+                        fixed_amount=fixed_amount,
+                        estimate_occurrences=estimate_occurrences,
+                        start_date=date(2024, 1, 1),
+                        end_date=date(2024, 3, 31),
+                        repeat_option_id=repeat_option_id,
+                        on_autopay=False,
+                    )
+                )
+
+            for transaction_id, amount in enumerate([10, 30, 20, 40], start=1):
+                for scheduled_transaction_id in (2, 3):
+                    session.add(
+                        Transaction(
+                            transaction_id=scheduled_transaction_id * 10 + transaction_id,
+                            account_id=1,
+                            amount=amount,
+                            transaction_date=date(2023, transaction_id, 1),
+                        )
+                    )
+                    session.add(
+                        ScheduledTransactionHistory(
+                            scheduled_transaction_id=scheduled_transaction_id,
+                            transaction_id=scheduled_transaction_id * 10 + transaction_id,
+                            target_date=date(2023, transaction_id, 1),
+                            post_date=date(2023, transaction_id, 1),
+                        )
+                    )
+
+            await session.commit()
+
+            yield session
+
+    async def test_matches_get_next_iterations(self, db: AsyncSession) -> None:
+        scheduled_transactions = list((await db.exec(select(ScheduledTransaction))).all())
+
+        results = await scheduled_transaction.get_next_iterations_for_all(db=db, scheduled_transactions=scheduled_transactions)
+
+        for st in scheduled_transactions:
+            expected = await scheduled_transaction.get_next_iterations(db=db, scheduled_transaction=st)
+            assert results[st.scheduled_transaction_id or 0] == expected
+
+        # Weekly from the average of the first three, monthly from the average of all four
+        assert [t.amount for t in results[2]] == [20] * 13
+        assert [t.amount for t in results[3]] == [25] * 3
+
+    async def test_takes_a_constant_number_of_queries(self, db: AsyncSession, db_engine: AsyncEngine) -> None:
+        scheduled_transactions = list((await db.exec(select(ScheduledTransaction))).all())
+        await load_repeat_option_registry(db)
+        statements: list[str] = []
+
+        def record(conn: Any, cursor: Any, statement: str, *args: Any) -> None:
+            statements.append(statement)
+
+        event.listen(db_engine.sync_engine, "before_cursor_execute", record)
+        try:
+            await scheduled_transaction.get_next_iterations_for_all(db=db, scheduled_transactions=scheduled_transactions)
+        finally:
+            event.remove(db_engine.sync_engine, "before_cursor_execute", record)
+
+        assert len(statements) == 1
+
+    async def test_missing_repeat_option(self, db: AsyncSession) -> None:
+        st = ScheduledTransaction(scheduled_transaction_id=9, account_id=1, fixed_amount=1, repeat_option_id=99, on_autopay=False)
+
+        with pytest.raises(HTTPException):
+            await scheduled_transaction.get_next_iterations_for_all(db=db, scheduled_transactions=[st])
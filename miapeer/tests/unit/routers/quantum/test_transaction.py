@@ -1,21 +1,24 @@
 import random
 from dataclasses import dataclass
 from datetime import date
-from typing import Any, Optional
+from typing import Any, AsyncIterator, Optional
 from unittest.mock import AsyncMock, Mock, call, patch
 
 import pytest
 from dateutil.relativedelta import relativedelta
 from fastapi import HTTPException
 
+from miapeer.adapter.forecast import ForecastOccurrence
 from miapeer.adapter.sql import transaction as transaction_sql
-from miapeer.models.miapeer import User
+from miapeer.dependencies import PortfolioAccess
 from miapeer.models.quantum.account import Account
 from miapeer.models.quantum.category import Category
 from miapeer.models.quantum.payee import Payee
+from miapeer.models.quantum.scheduled_transaction import ScheduledTransaction
 from miapeer.models.quantum.transaction import (
     Transaction,
     TransactionCreate,
+    TransactionPage,
     TransactionRead,
     TransactionUpdate,
 )
@@ -143,11 +146,15 @@ class DbTransaction:
     notes: Optional[str]
     account_id: Optional[int]
     transaction_id: Optional[int]
-    order_index: int
 
 
-def create_db_transaction(base_transaction: Transaction, override_amount: Optional[int] = None, order_index: int = 1) -> DbTransaction:
-    transaction = DbTransaction(**base_transaction.model_dump(), order_index=order_index)
+@dataclass
+class DbOpeningBalance:
+    opening_balance: int
+
+
+def create_db_transaction(base_transaction: Transaction, override_amount: Optional[int] = None) -> DbTransaction:
+    transaction = DbTransaction(**base_transaction.model_dump())
     if override_amount is not None:
         transaction.amount = override_amount
     return transaction
@@ -182,7 +189,7 @@ class TestGetAll:
         self,
         get_account_patch: AsyncMock,
         get_forcasted_transactions_patch: AsyncMock,
-        user: User,
+        portfolio_access: PortfolioAccess,
         account_id: int,
         mock_db: Mock,
         expected_sql_date: date,
@@ -191,13 +198,255 @@ class TestGetAll:
         get_account_patch.return_value = Account(portfolio_id=0, name="", starting_balance=0)
         get_forcasted_transactions_patch.return_value = []
 
-        response = await transaction.get_all_transactions(account_id=account_id, db=mock_db, current_user=user)
+        response = await transaction.get_all_transactions(account_id=account_id, db=mock_db, portfolio_access=portfolio_access)
 
-        mock_db.exec.assert_called_with(
-            transaction_sql.GET_ALL, params={"account_id": account_id, "user_id": user.user_id, "limit_date": expected_sql_date}
+        mock_db.exec.assert_has_calls(
+            [
+                call(transaction_sql.GET_OPENING_BALANCE, params={"account_id": account_id, "limit_date": expected_sql_date}),
+                call(transaction_sql.GET_ALL_CLEARED, params={"account_id": account_id, "limit_date": expected_sql_date}),
+                call(transaction_sql.GET_ALL_UNCLEARED, params={"account_id": account_id, "limit_date": expected_sql_date}),
+            ],
+            any_order=True,
         )
         assert response == expected_response
 
+    async def test_get_all_without_access(self, no_portfolio_access: PortfolioAccess, account_id: int, mock_db: Mock) -> None:
+        with pytest.raises(HTTPException):
+            await transaction.get_all_transactions(account_id=account_id, db=mock_db, portfolio_access=no_portfolio_access)
+
+        mock_db.exec.assert_not_called()
+
+
+class TestStream:
+    @pytest.fixture
+    def rows(self, complete_transaction: Transaction) -> list[DbTransaction]:
+        cleared = create_db_transaction(base_transaction=complete_transaction, override_amount=5)
+        uncleared = create_db_transaction(base_transaction=complete_transaction, override_amount=7)
+        uncleared.clear_date = None
+        uncleared.transaction_date = date(2001, 2, 10)
+
+        return [cleared, uncleared]
+
+    @pytest.fixture
+    def opening_balance(self) -> int:
+        return 120
+
+    @pytest.fixture
+    def forecast(self, complete_transaction: Transaction) -> ForecastOccurrence:
+        schedule = ScheduledTransaction.model_validate(
+            complete_transaction.model_dump(), update={"scheduled_transaction_id": 4, "fixed_amount": 3, "on_autopay": False}
+        )
+        return ForecastOccurrence(date(2001, 2, 5), 3, schedule.scheduled_transaction_id, schedule)
+
+    @pytest.fixture
+    def forecast_read(self, forecast: ForecastOccurrence) -> TransactionRead:
+        return forecast.to_transaction_read()
+
+    @pytest.fixture
+    def session_factory(self, rows: list[DbTransaction], opening_balance: int) -> Mock:
+        async def stream_rows(rows: list[DbTransaction]) -> AsyncIterator[DbTransaction]:
+            for row in rows:
+                yield row
+
+        session = AsyncMock()
+        session.exec.return_value = Mock(one_or_none=Mock(return_value=DbOpeningBalance(opening_balance=opening_balance)))
+        session.stream.side_effect = [
+            stream_rows([row for row in rows if row.clear_date is not None]),
+            stream_rows([row for row in rows if row.clear_date is None]),
+        ]
+
+        session_factory = Mock()
+        session_factory.return_value.__aenter__ = AsyncMock(return_value=session)
+        session_factory.return_value.__aexit__ = AsyncMock(return_value=None)
+        return session_factory
+
+    async def test_merges_forecast_with_running_balance(self, session_factory: Mock, account_id: int, forecast: ForecastOccurrence) -> None:
+        limit_date = date(2001, 1, 1)
+
+        transactions = [
+            t
+            async for t in transaction._stream_ledger(
+                session_factory=session_factory, account_id=account_id, limit_date=limit_date, forecasted_transactions=[forecast]
+            )
+        ]
+
+        session = session_factory.return_value.__aenter__.return_value
+        session.exec.assert_awaited_once_with(transaction_sql.GET_OPENING_BALANCE, params={"account_id": account_id, "limit_date": limit_date})
+        session.stream.assert_has_awaits(
+            [
+                call(sql, params={"account_id": account_id, "limit_date": limit_date}, execution_options={"yield_per": transaction.STREAM_BATCH_SIZE})
+                for sql in (transaction_sql.GET_ALL_CLEARED, transaction_sql.GET_ALL_UNCLEARED)
+            ]
+        )
+        assert [(t.amount, t.balance) for t in transactions] == [(5, 125), (3, 128), (7, 135)]
+        assert [t.forecast_from_scheduled_transaction_id for t in transactions] == [None, 4, None]
+
+    @pytest.mark.parametrize("rows, opening_balance", [([], 0)])
+    async def test_forecast_only(self, session_factory: Mock, account_id: int, forecast: ForecastOccurrence) -> None:
+        transactions = [
+            t
+            async for t in transaction._stream_ledger(
+                session_factory=session_factory, account_id=account_id, limit_date=date(2001, 1, 1), forecasted_transactions=[forecast]
+            )
+        ]
+
+        assert [(t.amount, t.balance) for t in transactions] == [(3, 3)]
+
+    @pytest.mark.parametrize("transaction_count, expected_chunks", [(0, ["[]"]), (2, ["[{}", ",{}", "]"])])
+    async def test_json_array(self, forecast_read: TransactionRead, transaction_count: int, expected_chunks: list[str]) -> None:
+        async def transactions() -> AsyncIterator[TransactionRead]:
+            for _ in range(transaction_count):
+                yield forecast_read
+
+        chunks = [chunk async for chunk in transaction._to_json_array(transactions())]
+
+        assert chunks == [chunk.replace("{}", forecast_read.model_dump_json()) for chunk in expected_chunks]
+
+    async def test_ndjson(self, forecast_read: TransactionRead) -> None:
+        async def transactions() -> AsyncIterator[TransactionRead]:
+            yield forecast_read
+            yield forecast_read
+
+        chunks = [chunk async for chunk in transaction._to_ndjson(transactions())]
+
+        assert chunks == [forecast_read.model_dump_json() + "\n"] * 2
+
+    async def test_stream_without_access(self, no_portfolio_access: PortfolioAccess, account_id: int, mock_db: Mock) -> None:
+        with pytest.raises(HTTPException):
+            await transaction.stream_transactions(account_id=account_id, db=mock_db, session_factory=Mock(), portfolio_access=no_portfolio_access)
+
+        mock_db.exec.assert_not_called()
+
+
+class TestGetPage:
+    @pytest.fixture
+    def page_transactions(self, complete_transaction: Transaction) -> list[Transaction]:
+        return [
+            Transaction.model_validate(complete_transaction.model_dump(), update={"transaction_id": transaction_id, "amount": amount})
+            for transaction_id, amount in [(1, 10), (2, -3), (3, 7)]
+        ]
+
+    @pytest.fixture
+    def cursor(self, transaction_date: date) -> str:
+        return transaction._encode_cursor(transaction._LedgerCursor(clear_date=None, transaction_date=transaction_date, transaction_id=7, balance=50))
+
+    @pytest.fixture
+    def cleared_cursor(self, transaction_date: date) -> str:
+        return transaction._encode_cursor(
+            transaction._LedgerCursor(clear_date=date(2001, 2, 4), transaction_date=transaction_date, transaction_id=7, balance=50)
+        )
+
+    @pytest.fixture
+    def expected_first_page_sql(self, account_id: int) -> str:
+        return f"SELECT quantum_transaction.transaction_type_id, quantum_transaction.payee_id, quantum_transaction.category_id, quantum_transaction.amount, quantum_transaction.transaction_date, quantum_transaction.clear_date, quantum_transaction.check_number, quantum_transaction.exclude_from_forecast, quantum_transaction.notes, quantum_transaction.account_id, quantum_transaction.transaction_id \nFROM quantum_transaction \nWHERE quantum_transaction.account_id = {account_id} AND quantum_transaction.clear_date IS NOT NULL ORDER BY quantum_transaction.clear_date, quantum_transaction.transaction_date, quantum_transaction.transaction_id\n LIMIT 3"
+
+    @pytest.fixture
+    def expected_next_page_sql(self, account_id: int) -> str:
+        return f"SELECT quantum_transaction.transaction_type_id, quantum_transaction.payee_id, quantum_transaction.category_id, quantum_transaction.amount, quantum_transaction.transaction_date, quantum_transaction.clear_date, quantum_transaction.check_number, quantum_transaction.exclude_from_forecast, quantum_transaction.notes, quantum_transaction.account_id, quantum_transaction.transaction_id \nFROM quantum_transaction \nWHERE quantum_transaction.account_id = {account_id} AND quantum_transaction.clear_date IS NULL AND quantum_transaction.transaction_date >= '2001-02-03' AND (quantum_transaction.transaction_date > '2001-02-03' OR quantum_transaction.transaction_id > 7) ORDER BY quantum_transaction.transaction_date, quantum_transaction.transaction_id\n LIMIT 3"
+
+    @pytest.fixture
+    def expected_next_cleared_sql(self, account_id: int) -> str:
+        return f"SELECT quantum_transaction.transaction_type_id, quantum_transaction.payee_id, quantum_transaction.category_id, quantum_transaction.amount, quantum_transaction.transaction_date, quantum_transaction.clear_date, quantum_transaction.check_number, quantum_transaction.exclude_from_forecast, quantum_transaction.notes, quantum_transaction.account_id, quantum_transaction.transaction_id \nFROM quantum_transaction \nWHERE quantum_transaction.account_id = {account_id} AND quantum_transaction.clear_date IS NOT NULL AND quantum_transaction.clear_date >= '2001-02-04' AND (quantum_transaction.clear_date > '2001-02-04' OR quantum_transaction.transaction_date >= '2001-02-03' AND (quantum_transaction.transaction_date > '2001-02-03' OR quantum_transaction.transaction_id > 7)) ORDER BY quantum_transaction.clear_date, quantum_transaction.transaction_date, quantum_transaction.transaction_id\n LIMIT 3"
+
+    @pytest.fixture
+    def expected_first_uncleared_sql(self, account_id: int) -> str:
+        return f"SELECT quantum_transaction.transaction_type_id, quantum_transaction.payee_id, quantum_transaction.category_id, quantum_transaction.amount, quantum_transaction.transaction_date, quantum_transaction.clear_date, quantum_transaction.check_number, quantum_transaction.exclude_from_forecast, quantum_transaction.notes, quantum_transaction.account_id, quantum_transaction.transaction_id \nFROM quantum_transaction \nWHERE quantum_transaction.account_id = {account_id} AND quantum_transaction.clear_date IS NULL ORDER BY quantum_transaction.transaction_date, quantum_transaction.transaction_id\n LIMIT 2"
+
+    @pytest.mark.parametrize("db_all_return_val", [pytest.lazy_fixture("page_transactions")])
+    @pytest.mark.parametrize("db_get_return_val", [pytest.lazy_fixture("basic_account")])
+    async def test_first_page_starts_from_the_starting_balance(
+        self,
+        portfolio_access: PortfolioAccess,
+        account_id: int,
+        basic_account: Account,
+        mock_db: Mock,
+        expected_first_page_sql: str,
+    ) -> None:
+        basic_account.starting_balance = 100
+
+        response = await transaction.get_transaction_page(account_id=account_id, limit=2, db=mock_db, portfolio_access=portfolio_access)
+
+        sql = mock_db.exec.call_args.args[0]
+        sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
+
+        # A full page of cleared transactions, so the uncleared ones aren't looked at
+        mock_db.exec.assert_called_once()
+        assert sql_str == expected_first_page_sql
+        mock_db.get.assert_awaited_once_with(Account, account_id)
+        assert [t.transaction_id for t in response.transactions] == [1, 2]
+        assert [t.balance for t in response.transactions] == [110, 107]
+
+        assert response.next_cursor is not None
+        next_cursor = transaction._decode_cursor(response.next_cursor)
+        assert next_cursor.transaction_id == 2
+        assert next_cursor.balance == 107
+
+    @pytest.mark.parametrize("db_all_return_val", [pytest.lazy_fixture("page_transactions")])
+    async def test_next_page_continues_from_the_cursor_balance(
+        self,
+        portfolio_access: PortfolioAccess,
+        account_id: int,
+        mock_db: Mock,
+        cursor: str,
+        expected_next_page_sql: str,
+    ) -> None:
+        mock_db.exec.return_value.all.return_value = mock_db.exec.return_value.all.return_value[:2]
+
+        response = await transaction.get_transaction_page(
+            account_id=account_id, cursor=cursor, limit=2, db=mock_db, portfolio_access=portfolio_access
+        )
+
+        sql = mock_db.exec.call_args.args[0]
+        sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
+
+        assert sql_str == expected_next_page_sql
+        mock_db.get.assert_not_called()
+        assert [t.balance for t in response.transactions] == [60, 57]
+        assert response.next_cursor is None
+
+    async def test_cleared_page_continues_into_the_uncleared_transactions(
+        self,
+        portfolio_access: PortfolioAccess,
+        account_id: int,
+        mock_db: Mock,
+        cleared_cursor: str,
+        page_transactions: list[Transaction],
+        expected_next_cleared_sql: str,
+        expected_first_uncleared_sql: str,
+    ) -> None:
+        mock_db.exec.return_value.all.side_effect = [page_transactions[:1], page_transactions[1:]]
+
+        response = await transaction.get_transaction_page(
+            account_id=account_id, cursor=cleared_cursor, limit=2, db=mock_db, portfolio_access=portfolio_access
+        )
+
+        sql_strs = [str(call.args[0].compile(compile_kwargs={"literal_binds": True})) for call in mock_db.exec.call_args_list]
+
+        assert sql_strs == [expected_next_cleared_sql, expected_first_uncleared_sql]
+        assert [t.transaction_id for t in response.transactions] == [1, 2]
+        assert [t.balance for t in response.transactions] == [60, 57]
+        assert response.next_cursor is not None
+
+    @pytest.mark.parametrize("db_all_return_val", [[]])
+    async def test_empty_page(self, portfolio_access: PortfolioAccess, account_id: int, mock_db: Mock) -> None:
+        response = await transaction.get_transaction_page(account_id=account_id, db=mock_db, portfolio_access=portfolio_access)
+
+        assert response == TransactionPage(transactions=[], next_cursor=None)
+
+    @pytest.mark.parametrize("cursor", ["not a cursor", "e30="])
+    async def test_invalid_cursor(self, portfolio_access: PortfolioAccess, account_id: int, mock_db: Mock, cursor: str) -> None:
+        with pytest.raises(HTTPException) as exc_info:
+            await transaction.get_transaction_page(account_id=account_id, cursor=cursor, db=mock_db, portfolio_access=portfolio_access)
+
+        assert exc_info.value.status_code == 400
+        mock_db.exec.assert_not_called()
+
+    async def test_get_page_without_access(self, no_portfolio_access: PortfolioAccess, account_id: int, mock_db: Mock) -> None:
+        with pytest.raises(HTTPException):
+            await transaction.get_transaction_page(account_id=account_id, db=mock_db, portfolio_access=no_portfolio_access)
+
+        mock_db.exec.assert_not_called()
+
 
 class TestCreate:
     def db_refresh(obj) -> None:  # type: ignore
@@ -229,25 +478,20 @@ class TestCreate:
         )
 
     @pytest.fixture
-    def expected_transaction_sql(self, user_id: int, account_id: int) -> str:
-        return f"SELECT quantum_account.portfolio_id, quantum_account.name, quantum_account.starting_balance, quantum_account.account_id \nFROM quantum_account JOIN quantum_portfolio ON quantum_portfolio.portfolio_id = quantum_account.portfolio_id JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_account.account_id = {account_id} AND quantum_portfolio_user.user_id = {user_id}"
+    def expected_transaction_type_sql(self, portfolio_id: int, transaction_type_id: int) -> str:
+        return f"SELECT quantum_transaction_type.name, quantum_transaction_type.portfolio_id, quantum_transaction_type.transaction_type_id \nFROM quantum_transaction_type \nWHERE quantum_transaction_type.transaction_type_id = {transaction_type_id} AND quantum_transaction_type.portfolio_id IN ({portfolio_id})"
 
     @pytest.fixture
-    def expected_transaction_type_sql(self, user_id: int, transaction_type_id: int) -> str:
-        return f"SELECT quantum_transaction_type.name, quantum_transaction_type.portfolio_id, quantum_transaction_type.transaction_type_id \nFROM quantum_transaction_type JOIN quantum_portfolio ON quantum_portfolio.portfolio_id = quantum_transaction_type.portfolio_id JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_transaction_type.transaction_type_id = {transaction_type_id} AND quantum_portfolio_user.user_id = {user_id}"
+    def expected_payee_sql(self, portfolio_id: int, payee_id: int) -> str:
+        return f"SELECT quantum_payee.name, quantum_payee.portfolio_id, quantum_payee.payee_id \nFROM quantum_payee \nWHERE quantum_payee.payee_id = {payee_id} AND quantum_payee.portfolio_id IN ({portfolio_id})"
 
     @pytest.fixture
-    def expected_payee_sql(self, user_id: int, payee_id: int) -> str:
-        return f"SELECT quantum_payee.name, quantum_payee.portfolio_id, quantum_payee.payee_id \nFROM quantum_payee JOIN quantum_portfolio ON quantum_portfolio.portfolio_id = quantum_payee.portfolio_id JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_payee.payee_id = {payee_id} AND quantum_portfolio_user.user_id = {user_id}"
+    def expected_category_sql(self, portfolio_id: int, category_id: int) -> str:
+        return f"SELECT quantum_category.name, quantum_category.parent_category_id, quantum_category.portfolio_id, quantum_category.category_id \nFROM quantum_category \nWHERE quantum_category.category_id = {category_id} AND quantum_category.portfolio_id IN ({portfolio_id})"
 
     @pytest.fixture
-    def expected_category_sql(self, user_id: int, category_id: int) -> str:
-        return f"SELECT quantum_category.name, quantum_category.parent_category_id, quantum_category.portfolio_id, quantum_category.category_id \nFROM quantum_category JOIN quantum_portfolio ON quantum_portfolio.portfolio_id = quantum_category.portfolio_id JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_category.category_id = {category_id} AND quantum_portfolio_user.user_id = {user_id}"
-
-    @pytest.fixture
-    def db_first_return_values(self, basic_account, transaction_type_id, payee_id, category_id) -> list:
+    def db_first_return_values(self, transaction_type_id, payee_id, category_id) -> list:
         return [
-            basic_account,
             Transaction(transaction_type_id=transaction_type_id),
             Payee(payee_id=payee_id),
             Category(category_id=category_id),
@@ -255,33 +499,30 @@ class TestCreate:
         ]
 
     @pytest.mark.parametrize("db_first_side_effect_val, db_refresh_patch_method", [(pytest.lazy_fixture("db_first_return_values"), db_refresh)])
+    @patch("miapeer.routers.quantum.transaction._record_transaction_changes")
     async def test_create(
         self,
-        user: User,
+        record_transaction_changes_patch: AsyncMock,
+        portfolio_access: PortfolioAccess,
         account_id: int,
         transaction_to_create: TransactionCreate,
         complete_transaction: Transaction,
         mock_db: Mock,
-        expected_transaction_sql: str,
         expected_transaction_type_sql: str,
         expected_payee_sql: str,
         expected_category_sql: str,
     ) -> None:
-        await transaction.create_transaction(account_id=account_id, transaction=transaction_to_create, db=mock_db, current_user=user)
+        await transaction.create_transaction(account_id=account_id, transaction=transaction_to_create, db=mock_db, portfolio_access=portfolio_access)
 
         sql = mock_db.exec.call_args_list[0].args[0]
         sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
-        assert sql_str == expected_transaction_sql
-
-        sql = mock_db.exec.call_args_list[1].args[0]
-        sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
         assert sql_str == expected_transaction_type_sql
 
-        sql = mock_db.exec.call_args_list[2].args[0]
+        sql = mock_db.exec.call_args_list[1].args[0]
         sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
         assert sql_str == expected_payee_sql
 
-        sql = mock_db.exec.call_args_list[3].args[0]
+        sql = mock_db.exec.call_args_list[2].args[0]
         sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
         assert sql_str == expected_category_sql
 
@@ -289,6 +530,9 @@ class TestCreate:
         add_call_param = mock_db.add.call_args[0][0]
         assert add_call_param.model_dump() == complete_transaction.model_dump()
 
+        record_transaction_changes_patch.assert_awaited_once_with(
+            mock_db, account_id, [(complete_transaction.clear_date, complete_transaction.amount)]
+        )
         mock_db.commit.assert_called_once()
 
         assert mock_db.refresh.call_count == 1
@@ -297,22 +541,19 @@ class TestCreate:
 
         # Don't need to test the response here because it's just the updated transaction_to_add
 
-    @pytest.mark.parametrize("db_first_return_val", [None, ""])
     async def test_create_with_portfolio_not_found(
         self,
-        user: User,
+        no_portfolio_access: PortfolioAccess,
         account_id: int,
         transaction_to_create: TransactionCreate,
         mock_db: Mock,
-        expected_transaction_sql: str,
     ) -> None:
         with pytest.raises(HTTPException):
-            await transaction.create_transaction(account_id=account_id, transaction=transaction_to_create, db=mock_db, current_user=user)
-
-        sql = mock_db.exec.call_args.args[0]
-        sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
+            await transaction.create_transaction(
+                account_id=account_id, transaction=transaction_to_create, db=mock_db, portfolio_access=no_portfolio_access
+            )
 
-        assert sql_str == expected_transaction_sql
+        mock_db.exec.assert_not_called()
         mock_db.add.assert_not_called()
         mock_db.commit.assert_not_called()
         mock_db.refresh.assert_not_called()
@@ -324,20 +565,22 @@ class TestGet:
         return TransactionRead.model_validate(complete_transaction)
 
     @pytest.fixture
-    def expected_sql(self, user_id: int, account_id: int, transaction_id: int) -> str:
-        return f"SELECT quantum_transaction.transaction_type_id, quantum_transaction.payee_id, quantum_transaction.category_id, quantum_transaction.amount, quantum_transaction.transaction_date, quantum_transaction.clear_date, quantum_transaction.check_number, quantum_transaction.exclude_from_forecast, quantum_transaction.notes, quantum_transaction.account_id, quantum_transaction.transaction_id \nFROM quantum_transaction JOIN quantum_account ON quantum_account.account_id = quantum_transaction.account_id JOIN quantum_portfolio ON quantum_portfolio.portfolio_id = quantum_account.portfolio_id JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_account.account_id = {account_id} AND quantum_transaction.transaction_id = {transaction_id} AND quantum_portfolio_user.user_id = {user_id}"
+    def expected_sql(self, account_id: int, transaction_id: int) -> str:
+        return f"SELECT quantum_transaction.transaction_type_id, quantum_transaction.payee_id, quantum_transaction.category_id, quantum_transaction.amount, quantum_transaction.transaction_date, quantum_transaction.clear_date, quantum_transaction.check_number, quantum_transaction.exclude_from_forecast, quantum_transaction.notes, quantum_transaction.account_id, quantum_transaction.transaction_id \nFROM quantum_transaction \nWHERE quantum_transaction.account_id = {account_id} AND quantum_transaction.transaction_id = {transaction_id}"
 
     @pytest.mark.parametrize("db_one_or_none_return_val", [pytest.lazy_fixture("complete_transaction")])
     async def test_get_with_data(
         self,
-        user: User,
+        portfolio_access: PortfolioAccess,
         account_id: int,
         transaction_id: int,
         mock_db: Mock,
         expected_sql: str,
         expected_response: TransactionRead,
     ) -> None:
-        response = await transaction.get_transaction(account_id=account_id, transaction_id=transaction_id, db=mock_db, current_user=user)
+        response = await transaction.get_transaction(
+            account_id=account_id, transaction_id=transaction_id, db=mock_db, portfolio_access=portfolio_access
+        )
 
         sql = mock_db.exec.call_args.args[0]
         sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
@@ -346,9 +589,11 @@ class TestGet:
         assert response == expected_response
 
     @pytest.mark.parametrize("db_one_or_none_return_val", [None, []])
-    async def test_get_no_data(self, user: User, account_id: int, transaction_id: int, mock_db: Mock, expected_sql: str) -> None:
+    async def test_get_no_data(
+        self, portfolio_access: PortfolioAccess, account_id: int, transaction_id: int, mock_db: Mock, expected_sql: str
+    ) -> None:
         with pytest.raises(HTTPException):
-            await transaction.get_transaction(account_id=account_id, transaction_id=transaction_id, db=mock_db, current_user=user)
+            await transaction.get_transaction(account_id=account_id, transaction_id=transaction_id, db=mock_db, portfolio_access=portfolio_access)
 
         sql = mock_db.exec.call_args.args[0]
         sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
@@ -358,17 +603,19 @@ class TestGet:
 
 class TestDelete:
     @pytest.fixture
-    def expected_transaction_sql(self, user_id: int, account_id: int, transaction_id: int) -> str:
-        return f"SELECT quantum_transaction.transaction_type_id, quantum_transaction.payee_id, quantum_transaction.category_id, quantum_transaction.amount, quantum_transaction.transaction_date, quantum_transaction.clear_date, quantum_transaction.check_number, quantum_transaction.exclude_from_forecast, quantum_transaction.notes, quantum_transaction.account_id, quantum_transaction.transaction_id \nFROM quantum_transaction JOIN quantum_account ON quantum_account.account_id = quantum_transaction.account_id JOIN quantum_portfolio ON quantum_portfolio.portfolio_id = quantum_account.portfolio_id JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_account.account_id = {account_id} AND quantum_transaction.transaction_id = {transaction_id} AND quantum_portfolio_user.user_id = {user_id}"
+    def expected_transaction_sql(self, account_id: int, transaction_id: int) -> str:
+        return f"SELECT quantum_transaction.transaction_type_id, quantum_transaction.payee_id, quantum_transaction.category_id, quantum_transaction.amount, quantum_transaction.transaction_date, quantum_transaction.clear_date, quantum_transaction.check_number, quantum_transaction.exclude_from_forecast, quantum_transaction.notes, quantum_transaction.account_id, quantum_transaction.transaction_id \nFROM quantum_transaction \nWHERE quantum_transaction.account_id = {account_id} AND quantum_transaction.transaction_id = {transaction_id}"
 
     @pytest.fixture
     def expected_scheduled_transaction_history_sql(self, transaction_id: int) -> str:
         return f"SELECT quantum_scheduled_transaction_history.target_date, quantum_scheduled_transaction_history.post_date, quantum_scheduled_transaction_history.scheduled_transaction_id, quantum_scheduled_transaction_history.transaction_id, quantum_scheduled_transaction_history.scheduled_transaction_history_id \nFROM quantum_scheduled_transaction_history \nWHERE quantum_scheduled_transaction_history.transaction_id = {transaction_id}"
 
-    @pytest.mark.parametrize("db_one_or_none_return_val", ["some data", 123])
+    @pytest.mark.parametrize("db_one_or_none_return_val", [pytest.lazy_fixture("complete_transaction")])
+    @patch("miapeer.routers.quantum.transaction._record_transaction_changes")
     async def test_delete_with_transaction_found(
         self,
-        user: User,
+        record_transaction_changes_patch: AsyncMock,
+        portfolio_access: PortfolioAccess,
         account_id: int,
         transaction_id: int,
         mock_db: Mock,
@@ -376,7 +623,9 @@ class TestDelete:
         expected_scheduled_transaction_history_sql: str,
         db_one_or_none_return_val: Any,
     ) -> None:
-        response = await transaction.delete_transaction(account_id=account_id, transaction_id=transaction_id, db=mock_db, current_user=user)
+        response = await transaction.delete_transaction(
+            account_id=account_id, transaction_id=transaction_id, db=mock_db, portfolio_access=portfolio_access
+        )
 
         sql = mock_db.exec.call_args_list[0].args[0]
         sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
@@ -390,15 +639,18 @@ class TestDelete:
         expected_delete_calls = [call(db_one_or_none_return_val)] + [call(db_one_or_none_return_val)]
         assert mock_db.delete.mock_calls == expected_delete_calls
 
+        record_transaction_changes_patch.assert_awaited_once_with(
+            mock_db, account_id, [(db_one_or_none_return_val.clear_date, -db_one_or_none_return_val.amount)]
+        )
         mock_db.commit.assert_called_once()
         assert response == {"ok": True}
 
     @pytest.mark.parametrize("db_one_or_none_return_val", [None, []])
     async def test_delete_with_transaction_not_found(
-        self, user: User, account_id: int, transaction_id: int, mock_db: Mock, expected_transaction_sql: str
+        self, portfolio_access: PortfolioAccess, account_id: int, transaction_id: int, mock_db: Mock, expected_transaction_sql: str
     ) -> None:
         with pytest.raises(HTTPException):
-            await transaction.delete_transaction(account_id=account_id, transaction_id=transaction_id, db=mock_db, current_user=user)
+            await transaction.delete_transaction(account_id=account_id, transaction_id=transaction_id, db=mock_db, portfolio_access=portfolio_access)
 
         sql = mock_db.exec.call_args.args[0]
         sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
@@ -424,24 +676,20 @@ class TestUpdate:
         )
 
     @pytest.fixture
-    def expected_transaction_sql(self, user_id: int, account_id: int, transaction_id: int) -> str:
-        return f"SELECT quantum_transaction.transaction_type_id, quantum_transaction.payee_id, quantum_transaction.category_id, quantum_transaction.amount, quantum_transaction.transaction_date, quantum_transaction.clear_date, quantum_transaction.check_number, quantum_transaction.exclude_from_forecast, quantum_transaction.notes, quantum_transaction.account_id, quantum_transaction.transaction_id \nFROM quantum_transaction JOIN quantum_account ON quantum_account.account_id = quantum_transaction.account_id JOIN quantum_portfolio ON quantum_portfolio.portfolio_id = quantum_account.portfolio_id JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_account.account_id = {account_id} AND quantum_transaction.transaction_id = {transaction_id} AND quantum_portfolio_user.user_id = {user_id}"
-
-    @pytest.fixture
-    def expected_account_sql(self, user_id: int, account_id: int, transaction_id: int) -> str:
-        return f"SELECT quantum_account.portfolio_id, quantum_account.name, quantum_account.starting_balance, quantum_account.account_id \nFROM quantum_account JOIN quantum_portfolio ON quantum_portfolio.portfolio_id = quantum_account.portfolio_id JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_account.account_id = {account_id} AND quantum_portfolio_user.user_id = {user_id}"
+    def expected_transaction_sql(self, account_id: int, transaction_id: int) -> str:
+        return f"SELECT quantum_transaction.transaction_type_id, quantum_transaction.payee_id, quantum_transaction.category_id, quantum_transaction.amount, quantum_transaction.transaction_date, quantum_transaction.clear_date, quantum_transaction.check_number, quantum_transaction.exclude_from_forecast, quantum_transaction.notes, quantum_transaction.account_id, quantum_transaction.transaction_id \nFROM quantum_transaction \nWHERE quantum_transaction.account_id = {account_id} AND quantum_transaction.transaction_id = {transaction_id}"
 
     @pytest.fixture
-    def expected_transaction_type_sql(self, user_id: int, transaction_updates: TransactionUpdate) -> str:
-        return f"SELECT quantum_transaction_type.name, quantum_transaction_type.portfolio_id, quantum_transaction_type.transaction_type_id \nFROM quantum_transaction_type JOIN quantum_portfolio ON quantum_portfolio.portfolio_id = quantum_transaction_type.portfolio_id JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_transaction_type.transaction_type_id = {transaction_updates.transaction_type_id} AND quantum_portfolio_user.user_id = {user_id}"
+    def expected_transaction_type_sql(self, portfolio_id: int, transaction_updates: TransactionUpdate) -> str:
+        return f"SELECT quantum_transaction_type.name, quantum_transaction_type.portfolio_id, quantum_transaction_type.transaction_type_id \nFROM quantum_transaction_type \nWHERE quantum_transaction_type.transaction_type_id = {transaction_updates.transaction_type_id} AND quantum_transaction_type.portfolio_id IN ({portfolio_id})"
 
     @pytest.fixture
-    def expected_payee_sql(self, user_id: int, transaction_updates: TransactionUpdate) -> str:
-        return f"SELECT quantum_payee.name, quantum_payee.portfolio_id, quantum_payee.payee_id \nFROM quantum_payee JOIN quantum_portfolio ON quantum_portfolio.portfolio_id = quantum_payee.portfolio_id JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_payee.payee_id = {transaction_updates.payee_id} AND quantum_portfolio_user.user_id = {user_id}"
+    def expected_payee_sql(self, portfolio_id: int, transaction_updates: TransactionUpdate) -> str:
+        return f"SELECT quantum_payee.name, quantum_payee.portfolio_id, quantum_payee.payee_id \nFROM quantum_payee \nWHERE quantum_payee.payee_id = {transaction_updates.payee_id} AND quantum_payee.portfolio_id IN ({portfolio_id})"
 
     @pytest.fixture
-    def expected_category_sql(self, user_id: int, transaction_updates: TransactionUpdate) -> str:
-        return f"SELECT quantum_category.name, quantum_category.parent_category_id, quantum_category.portfolio_id, quantum_category.category_id \nFROM quantum_category JOIN quantum_portfolio ON quantum_portfolio.portfolio_id = quantum_category.portfolio_id JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_category.category_id = {transaction_updates.category_id} AND quantum_portfolio_user.user_id = {user_id}"
+    def expected_category_sql(self, portfolio_id: int, transaction_updates: TransactionUpdate) -> str:
+        return f"SELECT quantum_category.name, quantum_category.parent_category_id, quantum_category.portfolio_id, quantum_category.category_id \nFROM quantum_category \nWHERE quantum_category.category_id = {transaction_updates.category_id} AND quantum_category.portfolio_id IN ({portfolio_id})"
 
     @pytest.fixture
     def updated_transaction(self, complete_transaction: Transaction) -> Transaction:
@@ -465,9 +713,8 @@ class TestUpdate:
         return TransactionRead.model_validate(updated_transaction.model_dump())
 
     @pytest.fixture
-    def db_first_return_values(self, basic_account, updated_transaction) -> list:
+    def db_first_return_values(self, updated_transaction) -> list:
         return [
-            basic_account,
             TransactionType(transaction_type_id=updated_transaction.transaction_type_id),
             Payee(payee_id=updated_transaction.payee_id),
             Category(category_id=updated_transaction.category_id),
@@ -477,15 +724,18 @@ class TestUpdate:
         "db_one_or_none_return_val, db_first_side_effect_val",
         [(pytest.lazy_fixture("complete_transaction"), pytest.lazy_fixture("db_first_return_values"))],
     )
+    @patch("miapeer.routers.quantum.transaction._record_transaction_changes")
     async def test_update_with_transaction_found(
         self,
-        user: User,
+        record_transaction_changes_patch: AsyncMock,
+        portfolio_access: PortfolioAccess,
         account_id: int,
+        clear_date: date,
+        amount: int,
         transaction_id: int,
         transaction_updates: TransactionUpdate,
         mock_db: Mock,
         expected_transaction_sql: str,
-        expected_account_sql: str,
         expected_transaction_type_sql: str,
         expected_payee_sql: str,
         expected_category_sql: str,
@@ -497,7 +747,7 @@ class TestUpdate:
             transaction_id=transaction_id,
             transaction=transaction_updates,
             db=mock_db,
-            current_user=user,
+            portfolio_access=portfolio_access,
         )
 
         sql = mock_db.exec.call_args_list[0].args[0]
@@ -506,17 +756,13 @@ class TestUpdate:
 
         sql = mock_db.exec.call_args_list[1].args[0]
         sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
-        assert sql_str == expected_account_sql
-
-        sql = mock_db.exec.call_args_list[2].args[0]
-        sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
         assert sql_str == expected_transaction_type_sql
 
-        sql = mock_db.exec.call_args_list[3].args[0]
+        sql = mock_db.exec.call_args_list[2].args[0]
         sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
         assert sql_str == expected_payee_sql
 
-        sql = mock_db.exec.call_args_list[4].args[0]
+        sql = mock_db.exec.call_args_list[3].args[0]
         sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
         assert sql_str == expected_category_sql
 
@@ -524,6 +770,11 @@ class TestUpdate:
         add_call_param = mock_db.add.call_args[0][0]
         assert add_call_param.model_dump() == updated_transaction.model_dump()
 
+        record_transaction_changes_patch.assert_awaited_once_with(
+            mock_db,
+            account_id,
+            [(clear_date, -amount), (updated_transaction.clear_date, updated_transaction.amount)],
+        )
         mock_db.commit.assert_called_once()
 
         assert mock_db.refresh.call_count == 1
@@ -535,7 +786,7 @@ class TestUpdate:
     @pytest.mark.parametrize("db_one_or_none_return_val", [None, []])
     async def test_update_with_transaction_not_found(
         self,
-        user: User,
+        portfolio_access: PortfolioAccess,
         account_id: int,
         transaction_id: int,
         transaction_updates: TransactionUpdate,
@@ -548,7 +799,7 @@ class TestUpdate:
                 transaction_id=transaction_id,
                 transaction=transaction_updates,
                 db=mock_db,
-                current_user=user,
+                portfolio_access=portfolio_access,
             )
 
         sql = mock_db.exec.call_args.args[0]
@@ -570,11 +821,12 @@ class TestRunningBalance:
         return [random.randint(-9999, 9999) for _ in range(10)]
 
     @pytest.fixture
-    def db_all_return_val(self, transaction_amounts: list[int], complete_transaction: Transaction, starting_balance: int) -> list[DbTransaction]:
-        starting_balance_transaction = create_db_transaction(base_transaction=complete_transaction, override_amount=starting_balance, order_index=-2)
-        return [starting_balance_transaction] + [
-            create_db_transaction(base_transaction=complete_transaction, override_amount=amount) for amount in transaction_amounts
-        ]
+    def db_all_return_val(self, transaction_amounts: list[int], complete_transaction: Transaction) -> list[DbTransaction]:
+        return [create_db_transaction(base_transaction=complete_transaction, override_amount=amount) for amount in transaction_amounts]
+
+    @pytest.fixture
+    def db_one_or_none_return_val(self, starting_balance: int) -> DbOpeningBalance:
+        return DbOpeningBalance(opening_balance=starting_balance)
 
     @pytest.fixture
     def expected_transactions(
@@ -600,12 +852,14 @@ class TestRunningBalance:
         self,
         get_forcasted_transactions_patch: AsyncMock,
         starting_balance: int,
-        user: User,
+        portfolio_access: PortfolioAccess,
         account_id: int,
         mock_db: Mock,
         expected_transactions: list[TransactionRead],
     ) -> None:
         get_forcasted_transactions_patch.return_value = []
+        # Everything is cleared, so the uncleared part of the ledger is empty
+        mock_db.exec.return_value.all.side_effect = [mock_db.exec.return_value.all.return_value, []]
 
-        response = await transaction.get_all_transactions(account_id=account_id, db=mock_db, current_user=user)
+        response = await transaction.get_all_transactions(account_id=account_id, db=mock_db, portfolio_access=portfolio_access)
         assert response == expected_transactions
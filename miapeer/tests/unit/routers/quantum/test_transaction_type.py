@@ -4,7 +4,7 @@ from unittest.mock import Mock
 import pytest
 from fastapi import HTTPException
 
-from miapeer.models.miapeer import User
+from miapeer.dependencies import PortfolioAccess
 from miapeer.models.quantum.transaction_type import (
     TransactionType,
     TransactionTypeCreate,
@@ -54,15 +54,17 @@ class TestGetAll:
         return [working_transaction_type, working_transaction_type]
 
     @pytest.fixture
-    def expected_sql(self, user_id: int) -> str:
-        return f"SELECT quantum_transaction_type.name, quantum_transaction_type.portfolio_id, quantum_transaction_type.transaction_type_id \nFROM quantum_transaction_type JOIN quantum_portfolio ON quantum_portfolio.portfolio_id = quantum_transaction_type.portfolio_id JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_portfolio_user.user_id = {user_id} ORDER BY quantum_transaction_type.name"
+    def expected_sql(self, portfolio_id: int) -> str:
+        return f"SELECT quantum_transaction_type.name, quantum_transaction_type.portfolio_id, quantum_transaction_type.transaction_type_id \nFROM quantum_transaction_type \nWHERE quantum_transaction_type.portfolio_id IN ({portfolio_id}) ORDER BY quantum_transaction_type.name"
 
     @pytest.mark.parametrize(
         "db_all_return_val, expected_response",
         [([], []), (pytest.lazy_fixture("multiple_transaction_types"), pytest.lazy_fixture("expected_multiple_transaction_types"))],
     )
-    async def test_get_all(self, user: User, mock_db: Mock, expected_sql: str, expected_response: list[TransactionTypeRead]) -> None:
-        response = await transaction_type.get_all_transaction_types(db=mock_db, current_user=user)
+    async def test_get_all(
+        self, portfolio_access: PortfolioAccess, mock_db: Mock, expected_sql: str, expected_response: list[TransactionTypeRead]
+    ) -> None:
+        response = await transaction_type.get_all_transaction_types(db=mock_db, portfolio_access=portfolio_access)
 
         sql = mock_db.exec.call_args.args[0]
         sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
@@ -79,26 +81,18 @@ class TestCreate:
     def transaction_type_to_create(self, transaction_type_name: str, portfolio_id: int) -> TransactionTypeCreate:
         return TransactionTypeCreate(name=transaction_type_name, portfolio_id=portfolio_id)
 
-    @pytest.fixture
-    def expected_sql(self, user_id: int) -> str:
-        return f"SELECT quantum_portfolio.portfolio_id \nFROM quantum_portfolio JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_portfolio_user.user_id = {user_id}"
-
-    @pytest.mark.parametrize("db_first_return_val, db_refresh_patch_method", [("some data", db_refresh)])
+    @pytest.mark.parametrize("db_refresh_patch_method", [db_refresh])
     async def test_create_with_portfolio_found(
         self,
-        user: User,
+        portfolio_access: PortfolioAccess,
         transaction_type_to_create: TransactionTypeCreate,
         complete_transaction_type: TransactionType,
         mock_db: Mock,
-        expected_sql: str,
     ) -> None:
 
-        await transaction_type.create_transaction_type(transaction_type=transaction_type_to_create, db=mock_db, current_user=user)
+        await transaction_type.create_transaction_type(transaction_type=transaction_type_to_create, db=mock_db, portfolio_access=portfolio_access)
 
-        sql = mock_db.exec.call_args.args[0]
-        sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
-
-        assert sql_str == expected_sql
+        mock_db.exec.assert_not_called()
 
         assert mock_db.add.call_count == 1
         add_call_param = mock_db.add.call_args[0][0]
@@ -112,17 +106,15 @@ class TestCreate:
 
         # Don't need to test the response here because it's just the updated transaction_type_to_add
 
-    @pytest.mark.parametrize("db_first_return_val", [None, ""])
     async def test_create_with_portfolio_not_found(
-        self, user: User, transaction_type_to_create: TransactionTypeCreate, mock_db: Mock, expected_sql: str
+        self, no_portfolio_access: PortfolioAccess, transaction_type_to_create: TransactionTypeCreate, mock_db: Mock
     ) -> None:
         with pytest.raises(HTTPException):
-            await transaction_type.create_transaction_type(transaction_type=transaction_type_to_create, db=mock_db, current_user=user)
-
-        sql = mock_db.exec.call_args.args[0]
-        sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
+            await transaction_type.create_transaction_type(
+                transaction_type=transaction_type_to_create, db=mock_db, portfolio_access=no_portfolio_access
+            )
 
-        assert sql_str == expected_sql
+        mock_db.exec.assert_not_called()
         mock_db.add.assert_not_called()
         mock_db.commit.assert_not_called()
         mock_db.refresh.assert_not_called()
@@ -134,19 +126,19 @@ class TestGet:
         return TransactionTypeRead.model_validate(complete_transaction_type)
 
     @pytest.fixture
-    def expected_sql(self, user_id: int, transaction_type_id: int) -> str:
-        return f"SELECT quantum_transaction_type.name, quantum_transaction_type.portfolio_id, quantum_transaction_type.transaction_type_id \nFROM quantum_transaction_type JOIN quantum_portfolio ON quantum_portfolio.portfolio_id = quantum_transaction_type.portfolio_id JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_transaction_type.transaction_type_id = {transaction_type_id} AND quantum_portfolio_user.user_id = {user_id}"
+    def expected_sql(self, portfolio_id: int, transaction_type_id: int) -> str:
+        return f"SELECT quantum_transaction_type.name, quantum_transaction_type.portfolio_id, quantum_transaction_type.transaction_type_id \nFROM quantum_transaction_type \nWHERE quantum_transaction_type.transaction_type_id = {transaction_type_id} AND quantum_transaction_type.portfolio_id IN ({portfolio_id})"
 
     @pytest.mark.parametrize("db_one_or_none_return_val", [pytest.lazy_fixture("complete_transaction_type")])
     async def test_get_with_data(
         self,
-        user: User,
+        portfolio_access: PortfolioAccess,
         transaction_type_id: int,
         mock_db: Mock,
         expected_sql: str,
         expected_response: TransactionTypeRead,
     ) -> None:
-        response = await transaction_type.get_transaction_type(transaction_type_id=transaction_type_id, db=mock_db, current_user=user)
+        response = await transaction_type.get_transaction_type(transaction_type_id=transaction_type_id, db=mock_db, portfolio_access=portfolio_access)
 
         sql = mock_db.exec.call_args.args[0]
         sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
@@ -155,9 +147,9 @@ class TestGet:
         assert response == expected_response
 
     @pytest.mark.parametrize("db_one_or_none_return_val", [None, []])
-    async def test_get_with_no_data(self, user: User, transaction_type_id: int, mock_db: Mock, expected_sql: str) -> None:
+    async def test_get_with_no_data(self, portfolio_access: PortfolioAccess, transaction_type_id: int, mock_db: Mock, expected_sql: str) -> None:
         with pytest.raises(HTTPException):
-            await transaction_type.get_transaction_type(transaction_type_id=transaction_type_id, db=mock_db, current_user=user)
+            await transaction_type.get_transaction_type(transaction_type_id=transaction_type_id, db=mock_db, portfolio_access=portfolio_access)
 
         sql = mock_db.exec.call_args.args[0]
         sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
@@ -167,14 +159,16 @@ class TestGet:
 
 class TestDelete:
     @pytest.fixture
-    def expected_sql(self, user_id: int, transaction_type_id: int) -> str:
-        return f"SELECT quantum_transaction_type.name, quantum_transaction_type.portfolio_id, quantum_transaction_type.transaction_type_id \nFROM quantum_transaction_type JOIN quantum_portfolio ON quantum_portfolio.portfolio_id = quantum_transaction_type.portfolio_id JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_transaction_type.transaction_type_id = {transaction_type_id} AND quantum_portfolio_user.user_id = {user_id}"
+    def expected_sql(self, portfolio_id: int, transaction_type_id: int) -> str:
+        return f"SELECT quantum_transaction_type.name, quantum_transaction_type.portfolio_id, quantum_transaction_type.transaction_type_id \nFROM quantum_transaction_type \nWHERE quantum_transaction_type.transaction_type_id = {transaction_type_id} AND quantum_transaction_type.portfolio_id IN ({portfolio_id})"
 
     @pytest.mark.parametrize("db_one_or_none_return_val", ["some data", 123])
     async def test_delete_with_transaction_type_found(
-        self, user: User, transaction_type_id: int, mock_db: Mock, expected_sql: str, db_one_or_none_return_val: Any
+        self, portfolio_access: PortfolioAccess, transaction_type_id: int, mock_db: Mock, expected_sql: str, db_one_or_none_return_val: Any
     ) -> None:
-        response = await transaction_type.delete_transaction_type(transaction_type_id=transaction_type_id, db=mock_db, current_user=user)
+        response = await transaction_type.delete_transaction_type(
+            transaction_type_id=transaction_type_id, db=mock_db, portfolio_access=portfolio_access
+        )
 
         sql = mock_db.exec.call_args.args[0]
         sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
@@ -185,9 +179,11 @@ class TestDelete:
         assert response == {"ok": True}
 
     @pytest.mark.parametrize("db_one_or_none_return_val", [None, []])
-    async def test_delete_with_transaction_type_not_found(self, user: User, transaction_type_id: int, mock_db: Mock, expected_sql: str) -> None:
+    async def test_delete_with_transaction_type_not_found(
+        self, portfolio_access: PortfolioAccess, transaction_type_id: int, mock_db: Mock, expected_sql: str
+    ) -> None:
         with pytest.raises(HTTPException):
-            await transaction_type.delete_transaction_type(transaction_type_id=transaction_type_id, db=mock_db, current_user=user)
+            await transaction_type.delete_transaction_type(transaction_type_id=transaction_type_id, db=mock_db, portfolio_access=portfolio_access)
 
         sql = mock_db.exec.call_args.args[0]
         sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
@@ -203,8 +199,8 @@ class TestUpdate:
         return TransactionTypeUpdate(name="some new name")
 
     @pytest.fixture
-    def expected_sql(self, user_id: int, transaction_type_id: int) -> str:
-        return f"SELECT quantum_transaction_type.name, quantum_transaction_type.portfolio_id, quantum_transaction_type.transaction_type_id \nFROM quantum_transaction_type JOIN quantum_portfolio ON quantum_portfolio.portfolio_id = quantum_transaction_type.portfolio_id JOIN quantum_portfolio_user ON quantum_portfolio.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_transaction_type.transaction_type_id = {transaction_type_id} AND quantum_portfolio_user.user_id = {user_id}"
+    def expected_sql(self, portfolio_id: int, transaction_type_id: int) -> str:
+        return f"SELECT quantum_transaction_type.name, quantum_transaction_type.portfolio_id, quantum_transaction_type.transaction_type_id \nFROM quantum_transaction_type \nWHERE quantum_transaction_type.transaction_type_id = {transaction_type_id} AND quantum_transaction_type.portfolio_id IN ({portfolio_id})"
 
     @pytest.fixture
     def updated_transaction_type(self, complete_transaction_type: TransactionType) -> TransactionType:
@@ -217,7 +213,7 @@ class TestUpdate:
     @pytest.mark.parametrize("db_one_or_none_return_val", [pytest.lazy_fixture("complete_transaction_type")])
     async def test_update_with_transaction_type_found(
         self,
-        user: User,
+        portfolio_access: PortfolioAccess,
         transaction_type_id: int,
         transaction_type_updates: TransactionTypeUpdate,
         mock_db: Mock,
@@ -229,7 +225,7 @@ class TestUpdate:
             transaction_type_id=transaction_type_id,
             transaction_type=transaction_type_updates,
             db=mock_db,
-            current_user=user,
+            portfolio_access=portfolio_access,
         )
 
         sql = mock_db.exec.call_args.args[0]
@@ -252,7 +248,7 @@ class TestUpdate:
     @pytest.mark.parametrize("db_one_or_none_return_val", [None, []])
     async def test_update_with_transaction_type_not_found(
         self,
-        user: User,
+        portfolio_access: PortfolioAccess,
         transaction_type_id: int,
         transaction_type_updates: TransactionTypeUpdate,
         mock_db: Mock,
@@ -263,7 +259,7 @@ class TestUpdate:
                 transaction_type_id=transaction_type_id,
                 transaction_type=transaction_type_updates,
                 db=mock_db,
-                current_user=user,
+                portfolio_access=portfolio_access,
             )
 
         sql = mock_db.exec.call_args.args[0]
@@ -5,7 +5,8 @@ import pytest
 from fastapi import HTTPException
 
 from miapeer import dependencies
-from miapeer.models.miapeer import User
+from miapeer.auth.jwt import TokenData
+from miapeer.models.miapeer import AuthenticatedUser, User
 
 
 class TestGetJwk:
@@ -17,21 +18,179 @@ class TestGetJwk:
         assert return_val == get_env_var
 
 
+@pytest.fixture
+def claims_enabled(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("JWT_AUTHORIZATION_CLAIMS", "true")
+
+
+@pytest.fixture(autouse=True)
+def empty_permissions_version_cache() -> None:
+    dependencies.permissions_version_cache.clear()
+
+
+@pytest.fixture
+def authenticated_user(user: User) -> AuthenticatedUser:
+    return AuthenticatedUser.model_validate(user)
+
+
+@pytest.fixture
+def claims_payload(valid_jwt_data: TokenData, user_id: int) -> TokenData:
+    dependencies.permissions_version_cache.set(user_id, 0)
+
+    return valid_jwt_data | {
+        "uid": user_id,
+        "disabled": False,
+        "perms": [["Quantum", "User"]],
+        "pv": 0,
+    }  # type: ignore
+
+
+@pytest.mark.asyncio
+class TestGetTokenPayload:
+    async def test_decodes_token(self, valid_jwt: str, jwk: str, valid_jwt_data: TokenData) -> None:
+        payload = await dependencies.get_token_payload(token=valid_jwt, jwt_key=jwk)
+        assert payload == valid_jwt_data
+
+
 @pytest.mark.asyncio
 class TestGetCurrentUser:
-    @pytest.mark.parametrize("db_first_return_val", ["some data", 123])
-    async def test_get_current_user(self, mock_db: Mock, valid_jwt: str, jwk: str, db_first_return_val: Any) -> None:
-        res = await dependencies.get_current_user(token=valid_jwt, jwt_key=jwk, db=mock_db)
-        assert res == db_first_return_val
+    @pytest.fixture(autouse=True)
+    def empty_user_cache(self) -> None:
+        dependencies.user_cache.clear()
+
+    @pytest.mark.parametrize("db_first_return_val", [pytest.lazy_fixture("user")])
+    async def test_get_current_user(self, mock_db: Mock, valid_jwt_data: TokenData, authenticated_user: AuthenticatedUser) -> None:
+        res = await dependencies.get_current_user(payload=valid_jwt_data, db=mock_db)
+        assert res == authenticated_user
 
-    async def test_get_current_user_raises_exception_when_username_not_provided(self, mock_db: Mock, jwt_missing_sub: str, jwk: str) -> None:
+    async def test_get_current_user_raises_exception_when_username_not_provided(self, mock_db: Mock) -> None:
         with pytest.raises(HTTPException):
-            await dependencies.get_current_user(token=jwt_missing_sub, jwt_key=jwk, db=mock_db)
+            await dependencies.get_current_user(payload={"sub": "", "exp": 7752937429}, db=mock_db)
 
     @pytest.mark.parametrize("db_first_return_val", [None])
-    async def test_get_current_user_raises_exception_when_user_not_found(self, mock_db: Mock, valid_jwt: str, jwk: str) -> None:
+    async def test_get_current_user_raises_exception_when_user_not_found(self, mock_db: Mock, valid_jwt_data: TokenData) -> None:
         with pytest.raises(HTTPException):
-            await dependencies.get_current_user(token=valid_jwt, jwt_key=jwk, db=mock_db)
+            await dependencies.get_current_user(payload=valid_jwt_data, db=mock_db)
+
+    @pytest.mark.parametrize("db_first_return_val", [pytest.lazy_fixture("user")])
+    async def test_user_is_cached(self, mock_db: Mock, valid_jwt_data: TokenData, authenticated_user: AuthenticatedUser) -> None:
+        for _ in range(3):
+            res = await dependencies.get_current_user(payload=valid_jwt_data, db=mock_db)
+            assert res == authenticated_user
+
+        mock_db.exec.assert_called_once()
+
+    @pytest.mark.parametrize("db_first_return_val", [pytest.lazy_fixture("user")])
+    async def test_cached_user_is_a_copy(self, mock_db: Mock, valid_jwt_data: TokenData, user: User) -> None:
+        await dependencies.get_current_user(payload=valid_jwt_data, db=mock_db)
+
+        first_copy = await dependencies.get_current_user(payload=valid_jwt_data, db=mock_db)
+        first_copy.disabled = True
+        second_copy = await dependencies.get_current_user(payload=valid_jwt_data, db=mock_db)
+
+        assert first_copy is not user
+        assert second_copy.disabled is False
+
+    @pytest.mark.parametrize("db_first_return_val", [pytest.lazy_fixture("user")])
+    async def test_invalidation_forces_lookup(self, mock_db: Mock, valid_jwt_data: TokenData) -> None:
+        await dependencies.get_current_user(payload=valid_jwt_data, db=mock_db)
+        dependencies.invalidate_user_cache(valid_jwt_data["sub"])
+        await dependencies.get_current_user(payload=valid_jwt_data, db=mock_db)
+
+        assert mock_db.exec.call_count == 2
+
+    async def test_current_claims_skip_the_db(self, claims_enabled: None, mock_db: Mock, claims_payload: TokenData, user_id: int) -> None:
+        res = await dependencies.get_current_user(payload=claims_payload, db=mock_db)
+
+        mock_db.exec.assert_not_called()
+        assert res == AuthenticatedUser(user_id=user_id, email=claims_payload["sub"], disabled=False, permissions_version=claims_payload["pv"])
+
+    @pytest.mark.parametrize("db_first_return_val", [pytest.lazy_fixture("user")])
+    async def test_claims_ignored_when_disabled(self, mock_db: Mock, claims_payload: TokenData, authenticated_user: AuthenticatedUser) -> None:
+        res = await dependencies.get_current_user(payload=claims_payload, db=mock_db)
+
+        mock_db.exec.assert_called_once()
+        assert res == authenticated_user
+
+    async def test_stale_claims_fall_back_to_db(
+        self, claims_enabled: None, mock_db: Mock, claims_payload: TokenData, user_id: int, user: User, authenticated_user: AuthenticatedUser
+    ) -> None:
+        dependencies.invalidate_permission_cache(user_id)
+        mock_db.exec.return_value.first.side_effect = [1, user]
+
+        res = await dependencies.get_current_user(payload=claims_payload, db=mock_db)
+
+        assert mock_db.exec.call_count == 2
+        assert res == authenticated_user
+
+
+@pytest.mark.asyncio
+class TestTokenClaimsAreCurrent:
+    async def test_other_users_are_unaffected(self, claims_enabled: None, mock_db: Mock, claims_payload: TokenData, user_id: int) -> None:
+        dependencies.invalidate_permission_cache(user_id + 1)
+
+        assert await dependencies.token_claims_are_current(mock_db, claims_payload) is True
+        mock_db.exec.assert_not_called()
+
+    @pytest.mark.parametrize("db_first_return_val", [0])
+    async def test_version_is_read_once(self, claims_enabled: None, mock_db: Mock, claims_payload: TokenData) -> None:
+        dependencies.invalidate_permission_cache()
+
+        for _ in range(3):
+            assert await dependencies.token_claims_are_current(mock_db, claims_payload) is True
+
+        mock_db.exec.assert_called_once()
+
+    @pytest.mark.parametrize("db_first_return_val", [1])
+    async def test_advanced_version(self, claims_enabled: None, mock_db: Mock, claims_payload: TokenData) -> None:
+        dependencies.invalidate_permission_cache()
+        assert await dependencies.token_claims_are_current(mock_db, claims_payload) is False
+
+    @pytest.mark.parametrize("db_first_return_val", [None])
+    async def test_user_not_found(self, claims_enabled: None, mock_db: Mock, claims_payload: TokenData) -> None:
+        dependencies.invalidate_permission_cache()
+        assert await dependencies.token_claims_are_current(mock_db, claims_payload) is False
+
+    async def test_token_without_claims(self, claims_enabled: None, mock_db: Mock, valid_jwt_data: TokenData) -> None:
+        assert await dependencies.token_claims_are_current(mock_db, valid_jwt_data) is False
+
+
+@pytest.mark.asyncio
+class TestAdvancePermissionsVersion:
+    async def test_one_user(self, mock_db: Mock, user_id: int) -> None:
+        await dependencies.advance_permissions_version(mock_db, user_id)
+
+        sql = str(mock_db.exec.call_args.args[0].compile(compile_kwargs={"literal_binds": True}))
+        assert "SET permissions_version=(miapeer_user.permissions_version + 1)" in sql
+        assert f"WHERE miapeer_user.user_id = {user_id}" in sql
+        mock_db.commit.assert_not_called()
+
+    async def test_every_user(self, mock_db: Mock) -> None:
+        await dependencies.advance_permissions_version(mock_db)
+
+        sql = str(mock_db.exec.call_args.args[0].compile(compile_kwargs={"literal_binds": True}))
+        assert "SET permissions_version=(miapeer_user.permissions_version + 1)" in sql
+        assert "WHERE" not in sql
+        mock_db.commit.assert_not_called()
+
+
+@pytest.mark.asyncio
+class TestAddAuthorizationClaims:
+    @patch(f"{dependencies.__name__}.get_permissions")
+    async def test_adds_claims(self, patched_get_permissions: Mock, mock_db: Mock, user: User, user_id: int) -> None:
+        patched_get_permissions.return_value = frozenset({("Quantum", "User"), ("Miapeer", "User")})
+        token_data: TokenData = {"sub": "aaa", "exp": 0}
+
+        await dependencies.add_authorization_claims(db=mock_db, user=user, token_data=token_data)
+
+        assert token_data == {
+            "sub": "aaa",
+            "exp": 0,
+            "uid": user_id,
+            "disabled": False,
+            "perms": [["Miapeer", "User"], ["Quantum", "User"]],
+            "pv": 0,
+        }
 
 
 @pytest.mark.asyncio
@@ -45,43 +204,148 @@ class TestGetCurrentActiveUser:
             await dependencies.get_current_active_user(current_user=inactive_user)
 
 
+@pytest.mark.asyncio
+class TestGetPermissions:
+    @pytest.fixture(autouse=True)
+    def empty_permission_cache(self) -> None:
+        dependencies.invalidate_permission_cache()
+
+    @pytest.fixture
+    def expected_sql(self, user_id: int) -> str:
+        return f"SELECT miapeer_application.name, miapeer_role.name AS name_1 \nFROM miapeer_permission JOIN miapeer_application_role ON miapeer_application_role.application_role_id = miapeer_permission.application_role_id JOIN miapeer_application ON miapeer_application.application_id = miapeer_application_role.application_id JOIN miapeer_role ON miapeer_role.role_id = miapeer_application_role.role_id \nWHERE miapeer_permission.user_id = {user_id}"
+
+    @pytest.mark.parametrize("db_all_return_val", [[("Miapeer", "User"), ("Quantum", "User"), ("Quantum", "User")]])
+    async def test_loads_all_permissions_in_one_query(self, mock_db: Mock, user_id: int, expected_sql: str) -> None:
+        permissions = await dependencies.get_permissions(db=mock_db, user_id=user_id)
+
+        sql = mock_db.exec.call_args.args[0]
+        sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
+
+        assert sql_str == expected_sql
+        assert permissions == frozenset({("Miapeer", "User"), ("Quantum", "User")})
+
+    @pytest.mark.parametrize("db_all_return_val", [[("Miapeer", "User")], []])
+    async def test_permissions_are_cached(self, mock_db: Mock, user_id: int) -> None:
+        first_permissions = await dependencies.get_permissions(db=mock_db, user_id=user_id)
+
+        for _ in range(3):
+            assert await dependencies.get_permissions(db=mock_db, user_id=user_id) == first_permissions
+
+        mock_db.exec.assert_called_once()
+
+    @pytest.mark.parametrize("db_all_return_val", [[("Miapeer", "User")]])
+    async def test_cache_is_keyed_by_user(self, mock_db: Mock, user_id: int) -> None:
+        await dependencies.get_permissions(db=mock_db, user_id=user_id)
+        await dependencies.get_permissions(db=mock_db, user_id=user_id + 1)
+
+        assert mock_db.exec.call_count == 2
+
+    @pytest.mark.parametrize("db_all_return_val", [[("Miapeer", "User")]])
+    async def test_invalidation_forces_lookup(self, mock_db: Mock, user_id: int) -> None:
+        await dependencies.get_permissions(db=mock_db, user_id=user_id)
+        dependencies.invalidate_permission_cache()
+        await dependencies.get_permissions(db=mock_db, user_id=user_id)
+
+        assert mock_db.exec.call_count == 2
+
+
+@pytest.mark.asyncio
+class TestGetPortfolioAccess:
+    @pytest.fixture
+    def expected_sql(self, user_id: int) -> str:
+        return f"SELECT quantum_portfolio_user.portfolio_id, quantum_account.account_id \nFROM quantum_portfolio_user LEFT OUTER JOIN quantum_account ON quantum_account.portfolio_id = quantum_portfolio_user.portfolio_id \nWHERE quantum_portfolio_user.user_id = {user_id}"
+
+    @pytest.mark.parametrize("db_all_return_val", [[(2, 20), (2, 21), (1, 10), (3, None)]])
+    async def test_loads_portfolios_and_accounts_in_one_query(self, mock_db: Mock, user: User, expected_sql: str) -> None:
+        access = await dependencies.get_portfolio_access(db=mock_db, user=user)
+
+        sql = mock_db.exec.call_args.args[0]
+        sql_str = str(sql.compile(compile_kwargs={"literal_binds": True}))
+
+        assert sql_str == expected_sql
+        mock_db.exec.assert_called_once()
+
+        assert access.portfolio_ids == [1, 2, 3]
+        assert access.account_ids == [10, 20, 21]
+        assert access.portfolio_of(21) == 2
+
+    @pytest.mark.parametrize("db_all_return_val", [[]])
+    async def test_user_without_portfolios(self, mock_db: Mock, user: User) -> None:
+        access = await dependencies.get_portfolio_access(db=mock_db, user=user)
+
+        assert access.portfolio_ids == []
+        assert access.account_ids == []
+
+
+class TestPortfolioAccess:
+    @pytest.fixture
+    def access(self) -> dependencies.PortfolioAccess:
+        return dependencies.PortfolioAccess(portfolio_ids=[1, 2], account_portfolios={10: 1})
+
+    def test_has_portfolio(self, access: dependencies.PortfolioAccess) -> None:
+        assert access.has_portfolio(1)
+        assert access.has_portfolio(2)
+        assert not access.has_portfolio(3)
+        assert not access.has_portfolio(None)
+
+    def test_has_account(self, access: dependencies.PortfolioAccess) -> None:
+        assert access.has_account(10)
+        assert not access.has_account(11)
+        assert not access.has_account(None)
+
+    def test_portfolio_of(self, access: dependencies.PortfolioAccess) -> None:
+        assert access.portfolio_of(10) == 1
+        assert access.portfolio_of(11) is None
+
+
+@pytest.mark.asyncio
+class TestGetCurrentUserPermissions:
+    @patch(f"{dependencies.__name__}.get_permissions")
+    async def test_uses_current_user(self, patched_get_permissions: Mock, mock_db: Mock, user: User, valid_jwt_data: TokenData) -> None:
+        patched_get_permissions.return_value = frozenset({("Quantum", "User")})
+
+        permissions = await dependencies.get_current_user_permissions(db=mock_db, user=user, payload=valid_jwt_data)
+
+        patched_get_permissions.assert_called_once_with(mock_db, user.user_id)
+        assert permissions == frozenset({("Quantum", "User")})
+
+    @patch(f"{dependencies.__name__}.get_permissions")
+    async def test_uses_current_claims(
+        self, patched_get_permissions: Mock, claims_enabled: None, mock_db: Mock, user: User, claims_payload: TokenData
+    ) -> None:
+        permissions = await dependencies.get_current_user_permissions(db=mock_db, user=user, payload=claims_payload)
+
+        patched_get_permissions.assert_not_called()
+        assert permissions == frozenset({("Quantum", "User")})
+
+
 class TestHasPermission:
-    @pytest.mark.parametrize("db_all_return_val", [[{}]])
-    def test_has_permission(self, mock_db: Mock) -> None:
-        permitted = dependencies.has_permission(db=mock_db, email="", application=dependencies.Applications.MIAPEER, role=dependencies.Roles.USER)
+    def test_has_permission(self) -> None:
+        permitted = dependencies.has_permission(frozenset({("Miapeer", "User")}), dependencies.Applications.MIAPEER, dependencies.Roles.USER)
         assert permitted is True
 
-    @pytest.mark.parametrize("db_all_return_val", [[]])
-    def test_no_permission(self, mock_db: Mock) -> None:
-        permitted = dependencies.has_permission(db=mock_db, email="", application=dependencies.Applications.MIAPEER, role=dependencies.Roles.USER)
+    @pytest.mark.parametrize("permissions", [frozenset(), frozenset({("Miapeer", "Administrator"), ("Quantum", "User")})])
+    def test_no_permission(self, permissions: dependencies.UserPermissions) -> None:
+        permitted = dependencies.has_permission(permissions, dependencies.Applications.MIAPEER, dependencies.Roles.USER)
         assert permitted is False
 
 
+@pytest.mark.asyncio
 class TestIndividualPermissions:
-    @patch(f"{dependencies.__name__}.has_permission")
     @pytest.mark.parametrize(
-        "permission_function",
+        "permission_function, required_permission",
         [
-            dependencies.is_miapeer_user,
-            dependencies.is_miapeer_admin,
-            dependencies.is_miapeer_super_user,
-            dependencies.is_quantum_user,
-            dependencies.is_quantum_admin,
-            dependencies.is_quantum_super_user,
+            (dependencies.is_miapeer_user, ("Miapeer", "User")),
+            (dependencies.is_miapeer_admin, ("Miapeer", "Administrator")),
+            (dependencies.is_miapeer_super_user, ("Miapeer", "Super User")),
+            (dependencies.is_quantum_user, ("Quantum", "User")),
+            (dependencies.is_quantum_admin, ("Quantum", "Administrator")),
+            (dependencies.is_quantum_super_user, ("Quantum", "Super User")),
         ],
     )
-    def test_has_permission(
-        self,
-        patched_has_permission: Mock,
-        mock_db: Mock,
-        permission_function: Any,
-        user: User,
-    ) -> None:
-        patched_has_permission.return_value = True
+    async def test_has_permission(self, permission_function: Any, required_permission: tuple[str, str]) -> None:
+        await permission_function(permissions=frozenset({required_permission}))
 
-        permission_function(db=mock_db, user=user)
-
-    @patch(f"{dependencies.__name__}.has_permission")
     @pytest.mark.parametrize(
         "permission_function",
         [
@@ -93,14 +357,6 @@ class TestIndividualPermissions:
             dependencies.is_quantum_super_user,
         ],
     )
-    def test_no_permission(
-        self,
-        patched_has_permission: Mock,
-        mock_db: Mock,
-        permission_function: Any,
-        user: User,
-    ) -> None:
-        patched_has_permission.return_value = False
-
+    async def test_no_permission(self, permission_function: Any) -> None:
         with pytest.raises(HTTPException):
-            permission_function(db=mock_db, user=user)
+            await permission_function(permissions=frozenset())